@@ -5,6 +5,9 @@
 import sys
 import os
 import atexit
+import time
+
+_STARTED_AT = time.perf_counter()   # بداية الإقلاع — لقياس زمن أول تحديث
 
 # Windows encoding fix
 if sys.platform == 'win32':
@@ -308,11 +311,14 @@ async def main():
     # Create application with increased timeouts
     from telegram.ext import ApplicationBuilder
     from config.settings import TIMEZONE
+    from core.session.persistence import SQLitePersistence
     import pytz
     
     app = (
         ApplicationBuilder()
         .token(BOT_TOKEN)
+        # 💾 user_data/chat_data تبقى بعد إعادة التشغيل (المسودات، مكدّس التنقل)
+        .persistence(SQLitePersistence())
         .connect_timeout(15.0)
         .read_timeout(60.0)   # وقت أطول لاستقبال الملفات الكبيرة
         .write_timeout(60.0)  # وقت أطول لرفع الملفات
@@ -327,6 +333,11 @@ async def main():
     from services.error_digest import install as install_error_digest
     install_error_digest()
 
+    # 📋 كل معالِجات الجذر (pm2 + مراقب الأخطاء) خلف طابور بكاتب خلفي واحد —
+    # logger.info على حلقة الأحداث يضع السجل في الطابور ويعود فوراً
+    from services.log_pipeline import install_log_pipeline
+    install_log_pipeline()
+
     # ✅ إعداد المجدول الزمني (JobQueue)
     if app.job_queue:
         from services.notification_service import send_daily_appointments_reminder
@@ -412,6 +423,23 @@ async def main():
     except Exception as e:
         logger.warning(f"⚠️ Could not delete webhook: {e}")
 
+    # ⏱️ زمن الإقلاع حتى أول تحديث فعلي (يُسجَّل مرة واحدة). لا نزيل المعالِج
+    # من داخله: PTB يمرّ على app.handlers أثناء تنفيذه.
+    from telegram.ext import TypeHandler
+    first_update_seen = []
+
+    async def _log_first_update(update, context):
+        if not first_update_seen:
+            first_update_seen.append(True)
+            logger.info(f"⏱️ First update received {time.perf_counter() - _STARTED_AT:.2f}s after process start")
+
+    app.add_handler(TypeHandler(Update, _log_first_update, block=False), group=-1000)
+
+    # 👤 نشاط التقارير لكل مستخدم (services/user_tracker): يُغذّى من مسار حفظ
+    # التقرير، ويُفرَّغ المعلّق عند الإيقاف أدناه
+    from services.user_tracker import flush_user_activity, init_user_activity_table
+    init_user_activity_table()
+
     await app.initialize()
     await app.start()
     
@@ -420,6 +448,44 @@ async def main():
         drop_pending_updates=True,
         allowed_updates=["message", "callback_query", "inline_query", "chosen_inline_result", "edited_message"]
     )
+    # 📈 مقياس تأخّر حلقة الأحداث — يُسجَّل مع "Bot alive" ويُثبت أثر نقل
+    # استعلامات قاعدة البيانات إلى db.async_session.run_db
+    from db.async_session import start_loop_lag_monitor, db_executor_stats, shutdown_db_executor
+    from db.write_queue import write_queue_stats, writer as db_writer
+    from services.send_scheduler import send_scheduler_stats
+    from services.log_pipeline import log_pipeline_stats
+    lag_monitor = start_loop_lag_monitor()
+
+    # 🔐 تحميل لقطة الصلاحيات مسبقاً — أول ضغطة زر لا تدفع ثمن التحميل
+    try:
+        from db.async_session import run_db
+        from core.access.permission_snapshot import permission_snapshot
+        await run_db(permission_snapshot.load)
+    except Exception as e:
+        logger.warning(f"⚠️ Permission snapshot preload failed (will load on demand): {e}")
+
+    # 📎 عمّال مهام نشر المرفقات (يكملون أي مهمة قطعتها إعادة التشغيل)
+    try:
+        from services.attachment_jobs import start_attachment_jobs
+        await start_attachment_jobs(app.bot)
+    except Exception as e:
+        logger.error(f"❌ Attachment job queue failed to start: {e}", exc_info=True)
+
+    # 🖼️ تشغيل عمّال pipeline الصور (وتحميل نموذج YOLO) في الخلفية
+    def _warm_image_pipeline():
+        try:
+            from image_pipeline.executor import get_pipeline_executor
+            get_pipeline_executor().warm_up()
+        except Exception as e:
+            logger.warning(f"⚠️ Image pipeline warm-up failed (will start on first job): {e}")
+
+    asyncio.get_running_loop().run_in_executor(None, _warm_image_pipeline)
+
+    # 🔥 PDF/رسوم/Excel تُستورد عند أول استعمال — نسخّنها هنا بعد بدء الـpolling
+    if os.getenv("PREWARM_HEAVY_MODULES", "1") == "1":
+        from bot.startup_profile import prewarm_deferred_modules
+        asyncio.get_running_loop().run_in_executor(None, prewarm_deferred_modules)
+
     logger.info("=" * 50)
     logger.info("Bot is running!")
     logger.info(f"Bot: @med_reports_bot")
@@ -441,12 +507,50 @@ async def main():
     try:
         while True:
             await asyncio.sleep(3600)  # Sleep for 1 hour to reduce CPU usage
-            logger.info("Bot alive...")
+            lag = lag_monitor.stats()
+            dbx = db_executor_stats()
+            wq = write_queue_stats()
+            sq = send_scheduler_stats()
+            lq = log_pipeline_stats()
+            logger.info(
+                "Bot alive... loop lag p99=%.1fms max=%.1fms | db wait p99=%.1fms run p99=%.1fms slow=%d"
+                " | writes queue=%d max=%d batch=%.1f commit p99=%.1fms"
+                " | sends queue=%d sent=%d failed=%d retried=%d | logs queue=%d dropped=%d",
+                lag["lag_p99_ms"], lag["lag_max_ms"],
+                dbx["wait_p99_ms"], dbx["run_p99_ms"], dbx["slow"],
+                wq["queue_depth"], wq["max_queue_depth"], wq["avg_batch_size"], wq["commit_p99_ms"],
+                sq["queue_depth"], sq["sent"], sq["failed"], sq["retried"],
+                lq["queue_depth"], lq["dropped"],
+            )
     except asyncio.CancelledError:
+        await lag_monitor.stop()
+        try:
+            from services.attachment_jobs import stop_attachment_jobs
+            await stop_attachment_jobs()
+        except Exception:
+            logger.debug("تم تجاهل استثناء في main", exc_info=True)
         await app.updater.stop()
         await app.stop()
         await app.shutdown()
+        try:
+            flush_user_activity()           # قبل إيقاف الكاتب الموحَّد
+        except Exception:
+            logger.warning("تعذّرت كتابة نشاط المستخدمين عند الإيقاف", exc_info=True)
+        db_writer.shutdown()
+        shutdown_db_executor()
+        try:
+            from image_pipeline.executor import shutdown_pipeline_executor
+            shutdown_pipeline_executor(wait=False)
+        except Exception:
+            logger.debug("تم تجاهل استثناء في main", exc_info=True)
+        try:
+            from services.chart_rendering import shutdown_chart_renderer
+            shutdown_chart_renderer(wait=False)
+        except Exception:
+            logger.debug("تم تجاهل استثناء في main", exc_info=True)
         logger.info("Bot stopped")
+        from services.log_pipeline import stop_log_pipeline
+        stop_log_pipeline()
 
 if __name__ == "__main__":
     try:
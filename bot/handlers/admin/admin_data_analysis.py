@@ -21,30 +21,12 @@ from bot.handlers.admin.decorators import require_admin
 from collections import Counter, defaultdict
 import re
 from statistics import mean, median
-import matplotlib
-matplotlib.use('Agg')
-import matplotlib.pyplot as plt
 import io
 import base64
 from pathlib import Path
-from jinja2 import Environment, FileSystemLoader
 import os
 import logging
 
-try:
-    import arabic_reshaper
-    from bidi.algorithm import get_display
-    _ARABIC_SUPPORT = True
-except ImportError:
-    logger_tmp = logging.getLogger(__name__)
-    logger_tmp.warning("⚠️ arabic_reshaper/bidi not installed — Arabic chart text will not be shaped correctly")
-    _ARABIC_SUPPORT = False
-    def arabic_reshaper_stub(t): return t
-    def get_display(t): return t  # noqa: F811
-    class arabic_reshaper:  # noqa: N801
-        @staticmethod
-        def reshape(t): return t
-
 # Logger
 logger = logging.getLogger(__name__)
 
@@ -476,6 +458,11 @@ def format_arabic_text(text):
     """تنسيق النص العربي للرسوم البيانية"""
     if not text:
         return ""
+    try:
+        import arabic_reshaper
+        from bidi.algorithm import get_display
+    except ImportError:
+        return text
     reshaped_text = arabic_reshaper.reshape(text)
     return get_display(reshaped_text)
 
@@ -483,6 +470,11 @@ def create_analysis_charts(analysis_type, data_dict):
     """إنشاء رسوم بيانية للتحليل"""
     charts = {}
 
+    # matplotlib ثقيل — يُحمَّل عند أول رسم وليس عند تسجيل الـhandlers
+    import matplotlib
+    matplotlib.use('Agg')
+    import matplotlib.pyplot as plt
+
     # إعدادات matplotlib للعربية
     plt.rcParams['font.family'] = ['Arial', 'DejaVu Sans', 'sans-serif']
     plt.rcParams['axes.unicode_minus'] = False
@@ -565,11 +557,9 @@ def create_analysis_charts(analysis_type, data_dict):
 # ✅ إعادة تصميم — نظام تحليل بيانات (BI) احترافي بفلاتر ديناميكية متسلسلة
 # =============================================================================
 #
-# من هنا فصاعداً: تصميم جديد بالكامل يعتمد على services/reports_repository.py
-# (get_reports, get_hospitals_in_scope, get_departments_in_scope,
-#  get_doctors_in_scope, get_actions_in_scope, aggregate_by_*, compute_stats,
-#  aggregate_cross, get_earliest_report_dates) بدل استعلامات SQLAlchemy
-# مكررة مباشرة — بنفس النمط المُثبت اليوم في admin_comprehensive_report.py
+# من هنا فصاعداً: تصميم جديد بالكامل يعتمد على services/report_analytics.py
+# (analyze, get_options_in_scope — كل الأقسام والعدّادات GROUP BY في SQL)
+# بدل استعلامات SQLAlchemy مكررة مباشرة — بنفس النمط المُثبت اليوم في admin_comprehensive_report.py
 # (فترة → مستشفيات → أقسام → أطباء → إجراءات، اختيار متعدد بالفهرسة).
 #
 # ✅ لا ConversationHandler هنا (بنفس سبب admin_evaluation_menu.py وغيره
@@ -802,23 +792,23 @@ async def _show_calendar(query, step: str, year: int | None = None, month: int |
 # ── Cascading filter tiers (نفس فكرة admin_comprehensive_report.py) ───────────
 
 async def _fetch_tier_options(tier: str, filt: dict) -> list[dict]:
-    from services.reports_repository import (
-        get_hospitals_in_scope, get_departments_in_scope,
-        get_doctors_in_scope, get_actions_in_scope,
-    )
+    from services.report_analytics import get_options_in_scope
+
     start, end = filt["start"], filt["end"]
     hospitals = None if filt["hospitals_all"] else filt["hospitals"]
     departments = None if filt["departments_all"] else filt["departments"]
     doctors = None if filt["doctors_all"] else filt["doctors"]
 
     if tier == "hospitals":
-        return await get_hospitals_in_scope(start, end)
+        return await get_options_in_scope("hospital", start, end)
     if tier == "departments":
-        return await get_departments_in_scope(start, end, hospitals=hospitals)
+        return await get_options_in_scope("department", start, end, hospitals=hospitals)
     if tier == "doctors":
-        return await get_doctors_in_scope(start, end, hospitals=hospitals, departments=departments)
+        return await get_options_in_scope("doctor", start, end, hospitals=hospitals, departments=departments)
     if tier == "actions":
-        return await get_actions_in_scope(start, end, hospitals=hospitals, departments=departments, doctors=doctors)
+        return await get_options_in_scope(
+            "action", start, end, hospitals=hospitals, departments=departments, doctors=doctors
+        )
     return []
 
 
@@ -861,18 +851,6 @@ async def _back_before_tier(query, context: ContextTypes.DEFAULT_TYPE, tier: str
 
 # ── Analysis renderers ──────────────────────────────────────────────────────────
 
-def _distinct_patients_by(reports: list[dict], key: str) -> dict[str, int]:
-    """عدد المرضى الفريدين (وليس عدد التقارير) مُجمَّعاً حسب حقل معيّن."""
-    groups: dict[str, set] = defaultdict(set)
-    for r in reports:
-        pid = r.get("patient_id")
-        if not pid:
-            continue
-        val = (r.get(key) or "غير محدد").strip() or "غير محدد"
-        groups[val].add(pid)
-    return dict(sorted(((k, len(v)) for k, v in groups.items()), key=lambda x: -x[1]))
-
-
 async def _run_analysis(query, context: ContextTypes.DEFAULT_TYPE) -> None:
     """بعد اكتمال كل الفلاتر: يجلب البيانات ويبني ملخص تيليجرام + يخزّن كل ما يلزم لتصدير PDF لاحقاً."""
     filt = _f(context)
@@ -885,22 +863,21 @@ async def _run_analysis(query, context: ContextTypes.DEFAULT_TYPE) -> None:
         logger.debug("تم تجاهل استثناء في _run_analysis", exc_info=True)
 
     try:
-        from services.reports_repository import (
-            get_reports, compute_stats, aggregate_by_hospital, aggregate_by_department,
-            aggregate_by_doctor, aggregate_by_action, aggregate_cross, get_earliest_report_dates,
-        )
+        from services.report_analytics import analyze
 
         hospitals = None if filt["hospitals_all"] else filt["hospitals"]
         departments = None if filt["departments_all"] else filt["departments"]
         doctors = None if filt["doctors_all"] else filt["doctors"]
         actions = None if filt["actions_all"] else filt["actions"]
 
-        reports = await get_reports(
-            filt["start"], filt["end"],
-            depts=departments, actions=actions, hospitals=hospitals, doctors=doctors,
+        # كل الأقسام تُحسب في SQL (GROUP BY / COUNT DISTINCT) — لا تُجلب صفوف التقارير
+        result = await analyze(
+            atype, filt["start"], filt["end"],
+            hospitals=hospitals, departments=departments, doctors=doctors, actions=actions,
         )
+        stats_raw = result["stats"]
 
-        if not reports:
+        if not stats_raw["total"]:
             await query.edit_message_text(
                 f"⚠️ لا توجد بيانات مطابقة لمعايير البحث المحددة.\n\n📅 الفترة: {filt['period_label']}",
                 parse_mode="Markdown",
@@ -908,8 +885,7 @@ async def _run_analysis(query, context: ContextTypes.DEFAULT_TYPE) -> None:
             context.user_data.pop(_KEY, None)
             return
 
-        stats_raw = compute_stats(reports)
-        n_doctors = len({r["doctor_name"] for r in reports if r.get("doctor_name")})
+        n_doctors = stats_raw["unique_doctors"]
 
         text_lines = [f"{meta['emoji']} *{meta['title']}*", f"📅 الفترة: {filt['period_label']}", ""]
         pdf_stats: dict[str, int] = {}
@@ -928,7 +904,7 @@ async def _run_analysis(query, context: ContextTypes.DEFAULT_TYPE) -> None:
                 text_lines.append(f"• {label}: {val}")
 
         elif atype == "hospitals":
-            hosp = aggregate_by_hospital(reports)
+            hosp = result["hospitals"]
             pdf_stats = {"إجمالي الحالات": stats_raw["total"], "عدد المستشفيات": len(hosp)}
             pdf_sections.append({"type": "ranked_table", "title": "المستشفيات", "data": hosp,
                                   "chart": "bar", "columns": ("المستشفى", "عدد الحالات")})
@@ -940,8 +916,8 @@ async def _run_analysis(query, context: ContextTypes.DEFAULT_TYPE) -> None:
                 text_lines.append(f"  • {name}: {cnt} ({pct:.1f}%)")
 
         elif atype == "departments":
-            dept = aggregate_by_department(reports)
-            cross = aggregate_cross(reports, "department", "medical_action")
+            dept = result["departments"]
+            cross = result["cross"]["department_action"]
             pdf_stats = {"إجمالي الحالات": stats_raw["total"], "عدد الأقسام": len(dept)}
             pdf_sections.append({"type": "ranked_table", "title": "الأقسام", "data": dept,
                                   "chart": "pie", "columns": ("القسم", "عدد الحالات")})
@@ -955,8 +931,8 @@ async def _run_analysis(query, context: ContextTypes.DEFAULT_TYPE) -> None:
                 text_lines.append(f"  • {name}: {cnt} ({pct:.1f}%)")
 
         elif atype == "doctors":
-            doc = aggregate_by_doctor(reports)
-            cross = aggregate_cross(reports, "doctor_name", "medical_action")
+            doc = result["doctors"]
+            cross = result["cross"]["doctor_action"]
             pdf_stats = {"إجمالي الحالات": stats_raw["total"], "عدد الأطباء": len(doc)}
             pdf_sections.append({"type": "ranked_table", "title": "الأطباء", "data": doc,
                                   "chart": "bar", "columns": ("الطبيب", "عدد الحالات")})
@@ -969,15 +945,13 @@ async def _run_analysis(query, context: ContextTypes.DEFAULT_TYPE) -> None:
                 text_lines.append(f"  {i}. {name}: {cnt} حالة")
 
         elif atype == "patients":
-            patient_ids = list({r["patient_id"] for r in reports if r.get("patient_id")})
-            earliest = await get_earliest_report_dates(patient_ids)
-            new_count = sum(1 for pid in patient_ids if earliest.get(pid) and earliest[pid] >= filt["start"])
-            returning_count = len(patient_ids) - new_count
-            by_hosp = _distinct_patients_by(reports, "hospital_name")
-            by_dept = _distinct_patients_by(reports, "department")
+            patients = result["patients"]
+            new_count, returning_count = patients["new"], patients["returning"]
+            by_hosp = result["patients_by_hospital"]
+            by_dept = result["patients_by_department"]
 
             pdf_stats = {
-                "إجمالي المرضى": len(patient_ids),
+                "إجمالي المرضى": patients["total"],
                 "مرضى جدد": new_count,
                 "مرضى متكررون": returning_count,
                 "إجمالي الحالات": stats_raw["total"],
@@ -987,14 +961,14 @@ async def _run_analysis(query, context: ContextTypes.DEFAULT_TYPE) -> None:
             pdf_sections.append({"type": "ranked_table", "title": "توزيع المرضى حسب القسم", "data": by_dept,
                                   "chart": "pie", "columns": ("القسم", "عدد المرضى")})
 
-            text_lines.append(f"👥 إجمالي المرضى: {len(patient_ids)}")
+            text_lines.append(f"👥 إجمالي المرضى: {patients['total']}")
             text_lines.append(f"🆕 مرضى جدد (أول تقرير ضمن الفترة): {new_count}")
             text_lines.append(f"🔁 مرضى متكررون: {returning_count}")
 
         elif atype == "actions":
-            act = aggregate_by_action(reports)
-            cross_hosp = aggregate_cross(reports, "medical_action", "hospital_name")
-            cross_doc = aggregate_cross(reports, "medical_action", "doctor_name")
+            act = result["actions"]
+            cross_hosp = result["cross"]["action_hospital"]
+            cross_doc = result["cross"]["action_doctor"]
             pdf_stats = {"إجمالي الحالات": stats_raw["total"], "عدد أنواع الإجراءات": len(act)}
             pdf_sections.append({"type": "ranked_table", "title": "أنواع الإجراءات", "data": act,
                                   "chart": "bar", "columns": ("نوع الإجراء", "عدد الحالات")})
@@ -1009,10 +983,10 @@ async def _run_analysis(query, context: ContextTypes.DEFAULT_TYPE) -> None:
                 text_lines.append(f"  • {name}: {cnt} ({pct:.1f}%)")
 
         elif atype == "system":
-            hosp = aggregate_by_hospital(reports)
-            dept = aggregate_by_department(reports)
-            doc = aggregate_by_doctor(reports)
-            act = aggregate_by_action(reports)
+            hosp = result["hospitals"]
+            dept = result["departments"]
+            doc = result["doctors"]
+            act = result["actions"]
             pdf_stats = {
                 "إجمالي الحالات": stats_raw["total"], "المرضى": stats_raw["unique_patients"],
                 "المستشفيات": stats_raw["unique_hospitals"], "الأقسام": stats_raw["unique_depts"],
@@ -1077,7 +1051,9 @@ async def _export_pdf(update: Update, context: ContextTypes.DEFAULT_TYPE) -> Non
     try:
         from services.data_analysis_pdf import build_analysis_pdf
 
-        pdf_buf = build_analysis_pdf(
+        # بناء المستند (reportlab + الرسوم) خارج event loop — كما في التقرير الشامل
+        pdf_buf = await asyncio.to_thread(
+            build_analysis_pdf,
             title=payload["title"], period_label=payload["period_label"],
             filters_summary=payload["filters_summary"], stats=payload["stats"],
             sections=payload["sections"],
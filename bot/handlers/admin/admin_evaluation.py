@@ -20,7 +20,7 @@ from telegram.constants import ParseMode
 from db.session import SessionLocal
 from db.models import MonthlyEvaluation, TranslatorDirectory
 from bot.shared_auth import is_admin
-from services.stats_service import get_monthly_stats, get_translator_stats, ALL_ACTION_TYPES
+from services.stats_service import get_monthly_stats, get_translator_stats, ALL_ACTION_TYPES, ACTIVE_IN_RANGE_SQL
 from services.inline_calendar import MONTHS_AR, DAYS_AR, format_date_arabic
 
 logger = logging.getLogger(__name__)
@@ -91,18 +91,14 @@ def _get_daily_counts(session, translator_id, start_date, end_date, translator_n
     """جلب عدد التقارير اليومية - بالاسم أولاً (لتوحيد المترجمين) ثم بالـ ID"""
     if not translator_id and not translator_name:
         return []
-    # شرط التاريخ المزدوج (يلتقط التقارير القديمة بـ UTC)
-    _DF = """(
-        (COALESCE(r.report_date, r.created_at) >= :start AND COALESCE(r.report_date, r.created_at) < :end)
-        OR (DATE(datetime(r.created_at, '+5 hours', '+30 minutes')) >= :start AND DATE(datetime(r.created_at, '+5 hours', '+30 minutes')) < :end)
-    )"""
+    # شرط التاريخ المزدوج (يلتقط التقارير القديمة بـ UTC) — نفس stats_service
+    _DF = ACTIVE_IN_RANGE_SQL
     if translator_name:
         sql = text(f"""
             SELECT DATE(COALESCE(r.report_date, r.created_at)) as day, COUNT(*) as count
             FROM reports r
             LEFT JOIN translators td ON r.translator_id = td.translator_id
             WHERE {_DF}
-            AND r.status = 'active'
             AND COALESCE(td.name, r.translator_name) = :tname
             GROUP BY day
             ORDER BY day
@@ -113,7 +109,6 @@ def _get_daily_counts(session, translator_id, start_date, end_date, translator_n
             SELECT DATE(COALESCE(r.report_date, r.created_at)) as day, COUNT(*) as count
             FROM reports r
             WHERE {_DF}
-            AND r.status = 'active'
             AND r.translator_id = :translator_id
             GROUP BY day
             ORDER BY day
@@ -9,6 +9,7 @@ from bot.shared_auth import is_admin
 from bot.keyboards import admin_main_kb, admin_main_inline_kb, reports_group_management_kb, admin_main_inline_kb_with_group
 from db.session import SessionLocal
 from db.models import Translator
+from core.access.permission_snapshot import set_user_access_state
 from datetime import datetime
 from bot.handlers.admin.decorators import require_admin
 import logging
@@ -84,6 +85,7 @@ async def handle_user_approval(update: Update, context: ContextTypes.DEFAULT_TYP
             translator.updated_at = datetime.now()
             # حفظ في SQLite
             s.commit()
+            set_user_access_state(user_id, None)
             await query.edit_message_text(f"✅ تم قبول المستخدم: {translator.full_name}")
 
             # إرسال إشعار للمستخدم المقبول مع القائمة الرئيسية
@@ -158,6 +160,7 @@ async def handle_user_approval(update: Update, context: ContextTypes.DEFAULT_TYP
             user_name = translator.full_name
             s.delete(translator)
             s.commit()
+            set_user_access_state(user_id, False)
             await query.edit_message_text(f"🚫 تم رفض المستخدم: {user_name}")
 
             # إرسال إشعار للمستخدم المرفوض
@@ -20,6 +20,7 @@ from sqlalchemy import func
 
 from bot.shared_auth import is_admin
 from core.access.access_service import resolve_tg_user_id
+from core.access.permission_snapshot import set_user_access_state
 from db.models import Translator, TranslatorDirectory
 from db.session import SessionLocal
 
@@ -307,6 +308,7 @@ async def _apply_action(query, context: ContextTypes.DEFAULT_TYPE, action: str,
         if action == "reject":
             s.delete(u)
             s.commit()
+            set_user_access_state(tg, False)
             try:
                 await context.bot.send_message(chat_id=tg, text="❌ تم رفض طلبك. تواصل مع الإدارة.")
             except Exception:
@@ -319,6 +321,7 @@ async def _apply_action(query, context: ContextTypes.DEFAULT_TYPE, action: str,
             u.suspended_at = datetime.utcnow()
             u.suspension_reason = "إيقاف بواسطة الأدمن"
             s.commit()
+            set_user_access_state(tg, False)
             try:
                 await context.bot.send_message(chat_id=tg, text="🔒 تم إيقاف حسابك مؤقتًا. تواصل مع الإدارة.")
             except Exception:
@@ -331,6 +334,7 @@ async def _apply_action(query, context: ContextTypes.DEFAULT_TYPE, action: str,
             u.suspended_at = None
             u.suspension_reason = None
             s.commit()
+            set_user_access_state(tg, None)
             try:
                 await context.bot.send_message(chat_id=tg, text="🔓 تم إعادة تفعيل حسابك. اضغط /start للمتابعة.")
             except Exception:
@@ -374,6 +378,7 @@ async def handle_approve_entry(update: Update, context: ContextTypes.DEFAULT_TYP
         u.is_suspended = False
         u.updated_at = datetime.utcnow()
         s.commit()
+        set_user_access_state(tg, True)
 
     try:
         await context.bot.send_message(chat_id=tg, text="✅ تم تفعيل حسابك. اضغط /start للبدء.")
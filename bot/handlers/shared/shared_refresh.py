@@ -5,7 +5,7 @@
 
 from telegram import Update
 from telegram.ext import ContextTypes, MessageHandler, filters
-from bot.shared_auth import is_admin, is_user_approved
+from bot.shared_auth import is_admin, is_user_approved_async
 
 
 async def handle_refresh_page(update: Update, context: ContextTypes.DEFAULT_TYPE):
@@ -33,7 +33,7 @@ async def handle_refresh_page(update: Update, context: ContextTypes.DEFAULT_TYPE
         )
     else:
         # للمستخدمين العاديين
-        if not is_user_approved(tg_id):
+        if not await is_user_approved_async(tg_id):
             await update.message.reply_text(
                 "⏳ **بانتظار الموافقة**\n\n"
                 "طلبك قيد المراجعة من قبل الإدارة.",
@@ -4,7 +4,9 @@
 # ================================================
 
 import calendar
+import hashlib
 import io
+import json
 import logging
 from datetime import datetime, date, timedelta
 from zoneinfo import ZoneInfo
@@ -21,67 +23,14 @@ logger = logging.getLogger(__name__)
 
 
 
-async def _photos_to_pdf(bot, photo_file_ids: list) -> io.BytesIO | None:
+async def _photos_to_pdf(bot, photo_file_ids: list, unique_ids: list | None = None) -> io.BytesIO | None:
     """
-    تحميل الصور من Telegram، تمريرها عبر pipeline التحسين، ثم تحويلها إلى PDF.
-    يرجع إلى التحويل المباشر إذا فشل pipeline.
+    صور المرفقات → PDF عبر مرحلة التحميل المشتركة (services/attachment_pdf.py):
+    تحميل محدود التزامن مع مهلة وإعادة محاولة، وكل صفحة تُحسَّن فور وصولها.
+    unique_ids (file_unique_id لكل صورة) يفعّل كاش image_pipeline/cache.py.
     """
-    # --- تحميل الصور الخام من Telegram ---
-    raw_images: list[bytes] = []
-    for file_id in photo_file_ids:
-        try:
-            tg_file = await bot.get_file(file_id)
-            buf = io.BytesIO()
-            await tg_file.download_to_memory(buf)
-            raw_images.append(buf.getvalue())
-        except Exception as img_err:
-            logger.error(f"❌ فشل تحميل صورة {file_id}: {img_err}", exc_info=True)
-
-    if not raw_images:
-        return None
-
-    # --- محاولة تشغيل pipeline التحسين ---
-    try:
-        from image_pipeline import run_pipeline_async
-        pdf = await run_pipeline_async(raw_images)
-        logger.info(f"✅ MA: pipeline نجح  pages={len(raw_images)}")
-        return pdf
-    except Exception as pipeline_err:
-        logger.warning(f"⚠️ MA: pipeline فشل ({pipeline_err}) — fallback to direct conversion")
-
-    # --- Fallback: تحويل مباشر بدون تحسين ---
-    return _direct_convert(raw_images)
-
-
-def _direct_convert(raw_images: list[bytes]) -> io.BytesIO | None:
-    """تحويل مباشر بدون أي معالجة — نفس السلوك القديم."""
-    try:
-        import img2pdf
-        from PIL import Image as PILImage
-
-        img_buffers = []
-        for raw in raw_images:
-            try:
-                pil_img = PILImage.open(io.BytesIO(raw))
-                pil_img.load()
-                if pil_img.format == "JPEG" and pil_img.mode == "RGB":
-                    img_buffers.append(raw)
-                else:
-                    if pil_img.mode in ("RGBA", "P", "LA"):
-                        pil_img = pil_img.convert("RGB")
-                    jpeg_buf = io.BytesIO()
-                    pil_img.save(jpeg_buf, format="JPEG", quality=95, subsampling=0)
-                    img_buffers.append(jpeg_buf.getvalue())
-            except Exception:
-                continue
-
-        if not img_buffers:
-            return None
-        return io.BytesIO(img2pdf.convert(img_buffers))
-
-    except Exception as e:
-        logger.error(f"❌ فشل التحويل المباشر: {e}", exc_info=True)
-        return None
+    from services.attachment_pdf import photos_to_pdf
+    return await photos_to_pdf(bot, photo_file_ids, unique_ids, label="MA")
 
 
 TZ = ZoneInfo("Asia/Riyadh")
@@ -358,6 +307,19 @@ async def handle_ma_callback(update: Update, context: ContextTypes.DEFAULT_TYPE)
         await _publish_attachments(query, context, complete_all=True)
         return
 
+    # ─── إعادة مهمة نشر فشلت نهائياً (من زر رسالة الفشل) ───
+    if parts[1] == "retry_job":
+        from services.attachment_jobs import job_queue
+        message = query.message
+        requeued = await job_queue.retry(
+            int(parts[2]), getattr(message, "chat_id", None), getattr(message, "message_id", None)
+        )
+        await query.edit_message_text(
+            "⏳ أُعيدت المحاولة — جارٍ النشر في الخلفية." if requeued
+            else "ℹ️ هذه المهمة ليست في حالة فشل (قيد التنفيذ أو اكتملت)."
+        )
+        return
+
     # ─── إلغاء الرفع ───
     if parts[1] == "cancel":
         context.user_data.pop("ma_state", None)
@@ -493,9 +455,11 @@ async def handle_ma_media(update: Update, context: ContextTypes.DEFAULT_TYPE):
     attachments = ma.setdefault("attachments", [])
 
     original_name = None
+    unique_id = None
     if msg.photo:
         file_id   = msg.photo[-1].file_id
         file_type = "photo"
+        unique_id = msg.photo[-1].file_unique_id  # ✅ مفتاح كاش pipeline الصور
     elif msg.document:
         file_id   = msg.document.file_id
         file_type = "document"
@@ -506,7 +470,8 @@ async def handle_ma_media(update: Update, context: ContextTypes.DEFAULT_TYPE):
     else:
         return
 
-    attachments.append({"file_id": file_id, "type": file_type, "file_name": original_name})
+    attachments.append({"file_id": file_id, "type": file_type, "file_name": original_name,
+                        "file_unique_id": unique_id})
     count = len(attachments)
 
     progress = _get_pending_progress(ma.get("report_id"))
@@ -590,7 +555,16 @@ def _resolve_attachment_group_id(report_id):
     return None
 
 
+def _publish_job_key(report_id, attachments: list, complete_all: bool) -> str:
+    """مفتاح idempotency: نفس التقرير + نفس الملفات + نفس الوضع ⇒ نفس المهمة."""
+    digest = hashlib.sha1(json.dumps(
+        [[a.get("file_unique_id") or a["file_id"] for a in attachments], complete_all]
+    ).encode()).hexdigest()[:16]
+    return f"ma:{report_id}:{digest}"
+
+
 async def _publish_attachments(query, context, complete_all: bool = False):
+    """يُدرج مهمة النشر في الطابور الخلفي ويعود فوراً (services/attachment_jobs.py)."""
     ma = context.user_data.get("ma_state", {})
     ma["complete_all"] = complete_all  # يُستخدم لو فشل النشر وأعاد المستخدم المحاولة
     attachments = ma.get("attachments", [])
@@ -600,7 +574,71 @@ async def _publish_attachments(query, context, complete_all: bool = False):
         await query.answer("⚠️ لم ترفع أي مرفقات بعد!", show_alert=True)
         return
 
-    bot = context.bot
+    payload = {
+        "report": report,
+        "attachments": attachments,
+        "complete_all": complete_all,
+        "uploaded_by": getattr(query.from_user, "full_name", None) or getattr(query.from_user, "first_name", None),
+        "uploaded_by_tg_id": getattr(query.from_user, "id", None),
+    }
+    message = query.message
+    try:
+        from services.attachment_jobs import job_queue
+        job_id, outcome = await job_queue.submit(
+            "ma_publish",
+            _publish_job_key(report.get("id"), attachments, complete_all),
+            payload,
+            report_id=report.get("id"),
+            chat_id=getattr(message, "chat_id", None),
+            message_id=getattr(message, "message_id", None),
+            wake=False,
+        )
+    except Exception as e:
+        logger.error(f"❌ MA: تعذّر إدراج مهمة النشر: {e}", exc_info=True)
+        retry_cb = "ma:done_all" if ma.get("complete_all") else "ma:done"
+        await query.edit_message_text(
+            f"❌ فشل النشر: {e}\n\nيرجى المحاولة مرة أخرى.",
+            reply_markup=InlineKeyboardMarkup([[
+                InlineKeyboardButton("🔄 إعادة المحاولة", callback_data=retry_cb),
+                InlineKeyboardButton("❌ إلغاء", callback_data="ma:cancel"),
+            ]])
+        )
+        return
+
+    # المرفقات صارت في سطر المهمة — الجلسة لم تعد لازمة
+    context.user_data.pop("ma_state", None)
+    if outcome == "created":
+        text = (
+            f"⏳ **تم استلام {len(attachments)} مرفق(ات)**\n\n"
+            f"جارٍ النشر في الخلفية — ستُحدَّث هذه الرسالة عند الانتهاء."
+        )
+    elif outcome == "queued":
+        # المهمة القائمة أُعيد توجيهها لهذه الرسالة
+        text = "ℹ️ هذه المرفقات في طابور النشر مسبقاً — ستُحدَّث هذه الرسالة بالنتيجة."
+    elif outcome == "running":
+        text = "ℹ️ هذه المرفقات قيد النشر الآن — تُحدَّث رسالة الطلب الأول بالنتيجة."
+    else:
+        text = "✅ هذه المرفقات نُشرت مسبقاً لهذا التقرير — لا حاجة لإعادة النشر."
+    await query.edit_message_text(text, parse_mode="Markdown")
+    logger.info(f"📥 MA: مهمة نشر #{job_id} للتقرير {report.get('id')} ({outcome})")
+    if outcome == "created":
+        job_queue.wake()
+
+
+async def _run_publish_job(bot, job):
+    """
+    تنفيذ مهمة ma_publish في عامل الطابور: الصور → PDF، الملفات كما هي،
+    ثم تتبّع الإكمال وزر البطاقة. كل مرحلة تُسجَّل في job.state بعد نجاحها،
+    فإعادة المحاولة تكمل من حيث توقفت ولا تُرسل نفس الملفات مرتين.
+    أي استثناء يُعاد للطابور (إعادة بتراجع)؛ PermanentJobError ⇒ فشل فوري.
+    """
+    from services.attachment_jobs import PermanentJobError
+
+    payload     = job.payload
+    attachments = payload.get("attachments", [])
+    report      = payload.get("report", {})
+    complete_all = payload.get("complete_all", False)
+
     # ✅ الأقسام المنفصلة (تشناي) تنزل مرفقاتها الورقية في مجموعتها الخاصة
     group_id = (
         _resolve_attachment_group_id(report.get("id"))
@@ -609,8 +647,7 @@ async def _publish_attachments(query, context, complete_all: bool = False):
     )
 
     if not group_id:
-        await query.edit_message_text("❌ معرف المجموعة غير مضبوط في الإعدادات.")
-        return
+        raise PermanentJobError("معرف المجموعة غير مضبوط في الإعدادات.")
 
     name       = report.get("patient_name", "—")
     hospital   = report.get("hospital_name", "—")
@@ -625,260 +662,266 @@ async def _publish_attachments(query, context, complete_all: bool = False):
 
     # بيانات لحفظ سجلات الملفات الطبية بعد إرسالها فعلياً
     report_id_for_persist = report.get("id")
-    uploaded_by_name = getattr(query.from_user, "full_name", None) or getattr(query.from_user, "first_name", None)
-    uploaded_by_tg_id = getattr(query.from_user, "id", None)
-    _persist_order = 0
+    uploaded_by_name = payload.get("uploaded_by")
+    uploaded_by_tg_id = payload.get("uploaded_by_tg_id")
+    _persist_order = job.state.get("persist_order", 0)
 
-    try:
-        from telegram import InputMediaDocument, InputMediaVideo, error as tg_error
+    from telegram import InputMediaDocument, InputMediaVideo, error as tg_error
 
-        # إذا هاجرت المجموعة إلى supergroup، نحدث الـ group_id تلقائياً
-        async def _send_with_migrate(coro_factory):
-            nonlocal group_id
-            try:
-                return await coro_factory(group_id)
-            except tg_error.ChatMigrated as e:
-                group_id = e.new_chat_id
-                logger.warning(f"⚠️ MA: المجموعة هاجرت، الـ ID الجديد: {group_id}")
-                return await coro_factory(group_id)
-
-        # فصل الصور عن باقي الملفات
-        photo_ids  = [a["file_id"] for a in attachments if a["type"] == "photo"]
-        other_atts = [a for a in attachments if a["type"] != "photo"]
-
-        # ── الصور → PDF واحد بجودة أصلية ────────────────────────────────
-        if photo_ids:
-            logger.info(f"📸 MA: محاولة تحويل {len(photo_ids)} صورة إلى PDF")
-            pdf_buf = await _photos_to_pdf(bot, photo_ids)
-            logger.info(f"📄 MA: نتيجة _photos_to_pdf = {pdf_buf}")
-            if pdf_buf:
-                pdf_data = pdf_buf.read()
-                logger.info(f"📄 MA: حجم PDF = {len(pdf_data)} bytes")
-                _pdf_filename = build_medical_pdf_filename(
-                    patient_name=name,
-                    departments=dept,
-                    workflow_type=action,
-                )
-                def _make_pdf_buf():
-                    b = io.BytesIO(pdf_data)
-                    b.name = _pdf_filename
-                    return b
+    # إذا هاجرت المجموعة إلى supergroup، نحدث الـ group_id تلقائياً
+    async def _send_with_migrate(coro_factory):
+        nonlocal group_id
+        try:
+            return await coro_factory(group_id)
+        except tg_error.ChatMigrated as e:
+            group_id = e.new_chat_id
+            logger.warning(f"⚠️ MA: المجموعة هاجرت، الـ ID الجديد: {group_id}")
+            return await coro_factory(group_id)
+
+    # فصل الصور عن باقي الملفات
+    photo_atts = [a for a in attachments if a["type"] == "photo"]
+    photo_ids  = [a["file_id"] for a in photo_atts]
+    other_atts = [a for a in attachments if a["type"] != "photo"]
+
+    # ── الصور → PDF واحد بجودة أصلية ────────────────────────────────
+    if photo_ids and not job.step_done("photos"):
+        await job.progress(f"⏳ جارٍ النشر…\n📸 تحويل {len(photo_ids)} صورة إلى PDF")
+        logger.info(f"📸 MA: محاولة تحويل {len(photo_ids)} صورة إلى PDF")
+        pdf_buf = await _photos_to_pdf(
+            bot, photo_ids, [a.get("file_unique_id") for a in photo_atts]
+        )
+        logger.info(f"📄 MA: نتيجة _photos_to_pdf = {pdf_buf}")
+        await job.progress("⏳ جارٍ النشر…\n📤 إرسال الملفات إلى المجموعة")
+        if pdf_buf:
+            pdf_data = pdf_buf.read()
+            logger.info(f"📄 MA: حجم PDF = {len(pdf_data)} bytes")
+            _pdf_filename = build_medical_pdf_filename(
+                patient_name=name,
+                departments=dept,
+                workflow_type=action,
+            )
+            def _make_pdf_buf():
+                b = io.BytesIO(pdf_data)
+                b.name = _pdf_filename
+                return b
+            sent = await _send_with_migrate(
+                lambda gid: bot.send_document(chat_id=gid, document=_make_pdf_buf(), caption=caption)
+            )
+            _persist_order += _persist_ma_sent_files(
+                sent, report_id_for_persist, uploaded_by_name, uploaded_by_tg_id, _persist_order,
+                filename_override=_pdf_filename,
+            )
+            logger.info(f"✅ MA: تم إرسال {len(photo_ids)} صورة كـ PDF للمجموعة")
+        else:
+            logger.error("❌ MA: _photos_to_pdf أعادت None — يتم إرسال صور كـ fallback")
+            from telegram import InputMediaPhoto
+            if len(photo_ids) == 1:
+                pid = photo_ids[0]
                 sent = await _send_with_migrate(
-                    lambda gid: bot.send_document(chat_id=gid, document=_make_pdf_buf(), caption=caption)
+                    lambda gid: bot.send_photo(chat_id=gid, photo=pid, caption=caption)
                 )
                 _persist_order += _persist_ma_sent_files(
                     sent, report_id_for_persist, uploaded_by_name, uploaded_by_tg_id, _persist_order,
-                    filename_override=_pdf_filename,
                 )
-                logger.info(f"✅ MA: تم إرسال {len(photo_ids)} صورة كـ PDF للمجموعة")
             else:
-                logger.error("❌ MA: _photos_to_pdf أعادت None — يتم إرسال صور كـ fallback")
-                from telegram import InputMediaPhoto
-                if len(photo_ids) == 1:
-                    pid = photo_ids[0]
+                media_group = [
+                    InputMediaPhoto(media=fid, caption=(caption if i == 0 else None))
+                    for i, fid in enumerate(photo_ids)
+                ]
+                sent = await _send_with_migrate(
+                    lambda gid: bot.send_media_group(chat_id=gid, media=media_group)
+                )
+                _persist_order += _persist_ma_sent_files(
+                    sent, report_id_for_persist, uploaded_by_name, uploaded_by_tg_id, _persist_order,
+                )
+        await job.mark_step("photos", persist_order=_persist_order)
+
+    # ── الفيديوهات والملفات → ترسل كما هي ──────────────────────────
+    if other_atts and not job.step_done("others"):
+        await job.progress("⏳ جارٍ النشر…\n📤 إرسال الملفات إلى المجموعة")
+        # ✅ إعادة تسمية ملفات "document" — تيليجرام لا يسمح بتغيير اسم
+        # ملف يُعاد إرساله بنفس file_id، لذا نُنزّل بايتات الملف مرة
+        # واحدة هنا ونرفعه من جديد باسم يحتوي على المريض/القسم/نوع
+        # الإجراء بدل الاسم الأصلي القادم من هاتف المترجم (مثل
+        # DOC-20260628-WA0046.pdf). الفيديوهات لا تُعاد تسميتها لأن
+        # تيليجرام لا يعرض اسم ملف لرسائل الفيديو أصلاً.
+        doc_payloads: dict[int, tuple[bytes, str]] = {}
+        for i, att in enumerate(other_atts):
+            if att["type"] != "document":
+                continue
+            try:
+                tg_file = await bot.get_file(att["file_id"])
+                dl_buf = io.BytesIO()
+                await tg_file.download_to_memory(dl_buf)
+                new_name = build_medical_attachment_filename(
+                    patient_name=name,
+                    departments=dept,
+                    workflow_type=action,
+                    original_filename=att.get("file_name"),
+                )
+                doc_payloads[i] = (dl_buf.getvalue(), new_name)
+            except Exception as dl_err:
+                logger.error(
+                    f"❌ MA: فشل تحميل مستند لإعادة تسميته (index={i}): {dl_err}",
+                    exc_info=True,
+                )
+                # سيُرسل بالاسم/الـ file_id الأصلي كـ fallback إن فشل التنزيل
+
+        if len(other_atts) == 1:
+            att = other_atts[0]
+            first_cap = caption if not photo_ids else None
+            if att["type"] == "document":
+                if 0 in doc_payloads:
+                    doc_data, doc_name = doc_payloads[0]
+                    def _make_doc_buf():
+                        b = io.BytesIO(doc_data)
+                        b.name = doc_name
+                        return b
                     sent = await _send_with_migrate(
-                        lambda gid: bot.send_photo(chat_id=gid, photo=pid, caption=caption)
+                        lambda gid: bot.send_document(chat_id=gid, document=_make_doc_buf(), caption=first_cap)
                     )
                     _persist_order += _persist_ma_sent_files(
                         sent, report_id_for_persist, uploaded_by_name, uploaded_by_tg_id, _persist_order,
+                        filename_override=doc_name,
                     )
                 else:
-                    media_group = [
-                        InputMediaPhoto(media=fid, caption=(caption if i == 0 else None))
-                        for i, fid in enumerate(photo_ids)
-                    ]
+                    fid = att["file_id"]
                     sent = await _send_with_migrate(
-                        lambda gid: bot.send_media_group(chat_id=gid, media=media_group)
+                        lambda gid: bot.send_document(chat_id=gid, document=fid, caption=first_cap)
                     )
                     _persist_order += _persist_ma_sent_files(
                         sent, report_id_for_persist, uploaded_by_name, uploaded_by_tg_id, _persist_order,
                     )
-
-        # ── الفيديوهات والملفات → ترسل كما هي ──────────────────────────
-        if other_atts:
-            # ✅ إعادة تسمية ملفات "document" — تيليجرام لا يسمح بتغيير اسم
-            # ملف يُعاد إرساله بنفس file_id، لذا نُنزّل بايتات الملف مرة
-            # واحدة هنا ونرفعه من جديد باسم يحتوي على المريض/القسم/نوع
-            # الإجراء بدل الاسم الأصلي القادم من هاتف المترجم (مثل
-            # DOC-20260628-WA0046.pdf). الفيديوهات لا تُعاد تسميتها لأن
-            # تيليجرام لا يعرض اسم ملف لرسائل الفيديو أصلاً.
-            doc_payloads: dict[int, tuple[bytes, str]] = {}
+            elif att["type"] == "video":
+                fid = att["file_id"]
+                sent = await _send_with_migrate(
+                    lambda gid: bot.send_video(chat_id=gid, video=fid, caption=first_cap)
+                )
+                _persist_order += _persist_ma_sent_files(
+                    sent, report_id_for_persist, uploaded_by_name, uploaded_by_tg_id, _persist_order,
+                )
+        else:
+            media_group = []
             for i, att in enumerate(other_atts):
-                if att["type"] != "document":
-                    continue
-                try:
-                    tg_file = await bot.get_file(att["file_id"])
-                    dl_buf = io.BytesIO()
-                    await tg_file.download_to_memory(dl_buf)
-                    new_name = build_medical_attachment_filename(
-                        patient_name=name,
-                        departments=dept,
-                        workflow_type=action,
-                        original_filename=att.get("file_name"),
-                    )
-                    doc_payloads[i] = (dl_buf.getvalue(), new_name)
-                except Exception as dl_err:
-                    logger.error(
-                        f"❌ MA: فشل تحميل مستند لإعادة تسميته (index={i}): {dl_err}",
-                        exc_info=True,
-                    )
-                    # سيُرسل بالاسم/الـ file_id الأصلي كـ fallback إن فشل التنزيل
-
-            if len(other_atts) == 1:
-                att = other_atts[0]
-                first_cap = caption if not photo_ids else None
+                cap = (caption if (i == 0 and not photo_ids) else None)
                 if att["type"] == "document":
-                    if 0 in doc_payloads:
-                        doc_data, doc_name = doc_payloads[0]
-                        def _make_doc_buf():
-                            b = io.BytesIO(doc_data)
-                            b.name = doc_name
-                            return b
-                        sent = await _send_with_migrate(
-                            lambda gid: bot.send_document(chat_id=gid, document=_make_doc_buf(), caption=first_cap)
-                        )
-                        _persist_order += _persist_ma_sent_files(
-                            sent, report_id_for_persist, uploaded_by_name, uploaded_by_tg_id, _persist_order,
-                            filename_override=doc_name,
-                        )
+                    if i in doc_payloads:
+                        doc_data, doc_name = doc_payloads[i]
+                        doc_buf = io.BytesIO(doc_data)
+                        doc_buf.name = doc_name
+                        media_group.append(InputMediaDocument(media=doc_buf, caption=cap))
                     else:
-                        fid = att["file_id"]
-                        sent = await _send_with_migrate(
-                            lambda gid: bot.send_document(chat_id=gid, document=fid, caption=first_cap)
-                        )
-                        _persist_order += _persist_ma_sent_files(
-                            sent, report_id_for_persist, uploaded_by_name, uploaded_by_tg_id, _persist_order,
-                        )
+                        media_group.append(InputMediaDocument(media=att["file_id"], caption=cap))
                 elif att["type"] == "video":
-                    fid = att["file_id"]
-                    sent = await _send_with_migrate(
-                        lambda gid: bot.send_video(chat_id=gid, video=fid, caption=first_cap)
-                    )
-                    _persist_order += _persist_ma_sent_files(
-                        sent, report_id_for_persist, uploaded_by_name, uploaded_by_tg_id, _persist_order,
-                    )
+                    media_group.append(InputMediaVideo(media=att["file_id"], caption=cap))
+            if media_group:
+                sent = await _send_with_migrate(
+                    lambda gid: bot.send_media_group(chat_id=gid, media=media_group)
+                )
+                _persist_order += _persist_ma_sent_files(
+                    sent, report_id_for_persist, uploaded_by_name, uploaded_by_tg_id, _persist_order,
+                )
+        await job.mark_step("others", persist_order=_persist_order)
+
+    logger.info(f"✅ MA: نُشرت {len(attachments)} مرفقات للتقرير {report.get('id')} في المجموعة {group_id}")
+
+    # ✅ تتبّع الإكمال الجزئي: هذه الجلسة تُحتسَب كفحص واحد مكتمل. تقرير
+    # كان معلَّقاً بعدة فحوصات منتظرة لا يُعتبر "جاهزاً" (has_paper_report=1)
+    # ولا يُغلَق في قائمة المعلقة إلا عند اكتمال كل الفحوصات المنتظرة —
+    # increment_pending_upload تتولّى هذا القرار (وتُعيد اكتمالاً فورياً
+    # للمسار العادي الذي لم يمرّ بحالة "لم يجهز بعد" أصلاً).
+    report_id = report.get("id")
+    report_medical_action = job.state.get("medical_action") or report.get("medical_action")
+    upload_progress = job.state.get("upload_progress")
+    # ⚠️ كان هنا شرط `and ma.get("mode") != "open"` يستثني "البحث المفتوح"
+    # من تتبّع الإكمال — بنيّة "ألّا يمسّ حالة تقرير مكتمل أو غير معلَّق
+    # أصلاً". لكن أثره الفعلي كان عطباً مُبلَّغاً عنه: من يرفع مرفق تقرير
+    # **معلَّق فعلاً** عبر البحث المفتوح يبقى تقريره في قائمة "المعلقة"
+    # إلى الأبد رغم رفعه — لأن السجل لا يُغلَق إطلاقاً في هذا المسار.
+    #
+    # إزالة الشرط آمنة ولا تُعيد الأثر الجانبي الذي خشيه التصميم الأصلي،
+    # لأن increment_pending_upload() تتحقّق بنفسها من وجود سجل معلَّق
+    # **نشط** وتعيد (True, 1, 1) بلا أي كتابة حين لا يوجد:
+    #   • تقرير لم يكن معلَّقاً قط  ⇐ لا سجل نشط ⇐ لا كتابة  ✅
+    #   • تقرير أُغلق مسبقاً        ⇐ لا سجل نشط ⇐ لا كتابة  ✅
+    #   • تقرير معلَّق فعلاً        ⇐ يُحتسَب ويُغلَق عند الاكتمال ← الإصلاح
+    if report_id and not job.step_done("tracking"):
+        try:
+            from services.pending_reports_service import increment_pending_upload, complete_pending_upload
+            if complete_all:
+                is_complete, uploaded_n, expected_n = complete_pending_upload(report_id)
             else:
-                media_group = []
-                for i, att in enumerate(other_atts):
-                    cap = (caption if (i == 0 and not photo_ids) else None)
-                    if att["type"] == "document":
-                        if i in doc_payloads:
-                            doc_data, doc_name = doc_payloads[i]
-                            doc_buf = io.BytesIO(doc_data)
-                            doc_buf.name = doc_name
-                            media_group.append(InputMediaDocument(media=doc_buf, caption=cap))
-                        else:
-                            media_group.append(InputMediaDocument(media=att["file_id"], caption=cap))
-                    elif att["type"] == "video":
-                        media_group.append(InputMediaVideo(media=att["file_id"], caption=cap))
-                if media_group:
-                    sent = await _send_with_migrate(
-                        lambda gid: bot.send_media_group(chat_id=gid, media=media_group)
-                    )
-                    _persist_order += _persist_ma_sent_files(
-                        sent, report_id_for_persist, uploaded_by_name, uploaded_by_tg_id, _persist_order,
-                    )
+                is_complete, uploaded_n, expected_n = increment_pending_upload(report_id)
+            upload_progress = (is_complete, uploaded_n, expected_n)
+        except Exception as pr_err:
+            logger.warning(f"⚠️ MA: فشل تتبّع تقدّم الرفع للتقرير #{report_id}: {pr_err}")
+            is_complete = True  # فشل التتبّع لا يجب أن يحجب اكتمال التقرير فعلياً
 
-        logger.info(f"✅ MA: نُشرت {len(attachments)} مرفقات للتقرير {report.get('id')} في المجموعة {group_id}")
-
-        # ✅ تتبّع الإكمال الجزئي: هذه الجلسة تُحتسَب كفحص واحد مكتمل. تقرير
-        # كان معلَّقاً بعدة فحوصات منتظرة لا يُعتبر "جاهزاً" (has_paper_report=1)
-        # ولا يُغلَق في قائمة المعلقة إلا عند اكتمال كل الفحوصات المنتظرة —
-        # increment_pending_upload تتولّى هذا القرار (وتُعيد اكتمالاً فورياً
-        # للمسار العادي الذي لم يمرّ بحالة "لم يجهز بعد" أصلاً).
-        report_id = report.get("id")
-        report_medical_action = report.get("medical_action")
-        upload_progress = None
-        # ⚠️ كان هنا شرط `and ma.get("mode") != "open"` يستثني "البحث المفتوح"
-        # من تتبّع الإكمال — بنيّة "ألّا يمسّ حالة تقرير مكتمل أو غير معلَّق
-        # أصلاً". لكن أثره الفعلي كان عطباً مُبلَّغاً عنه: من يرفع مرفق تقرير
-        # **معلَّق فعلاً** عبر البحث المفتوح يبقى تقريره في قائمة "المعلقة"
-        # إلى الأبد رغم رفعه — لأن السجل لا يُغلَق إطلاقاً في هذا المسار.
-        #
-        # إزالة الشرط آمنة ولا تُعيد الأثر الجانبي الذي خشيه التصميم الأصلي،
-        # لأن increment_pending_upload() تتحقّق بنفسها من وجود سجل معلَّق
-        # **نشط** وتعيد (True, 1, 1) بلا أي كتابة حين لا يوجد:
-        #   • تقرير لم يكن معلَّقاً قط  ⇐ لا سجل نشط ⇐ لا كتابة  ✅
-        #   • تقرير أُغلق مسبقاً        ⇐ لا سجل نشط ⇐ لا كتابة  ✅
-        #   • تقرير معلَّق فعلاً        ⇐ يُحتسَب ويُغلَق عند الاكتمال ← الإصلاح
-        if report_id:
+        if is_complete:
             try:
-                from services.pending_reports_service import increment_pending_upload, complete_pending_upload
-                if complete_all:
-                    is_complete, uploaded_n, expected_n = complete_pending_upload(report_id)
-                else:
-                    is_complete, uploaded_n, expected_n = increment_pending_upload(report_id)
-                upload_progress = (is_complete, uploaded_n, expected_n)
-            except Exception as pr_err:
-                logger.warning(f"⚠️ MA: فشل تتبّع تقدّم الرفع للتقرير #{report_id}: {pr_err}")
-                is_complete = True  # فشل التتبّع لا يجب أن يحجب اكتمال التقرير فعلياً
+                with SessionLocal() as s:
+                    r = s.query(Report).filter_by(id=report_id).first()
+                    if r:
+                        r.has_paper_report = 1
+                        report_medical_action = r.medical_action
+                        s.commit()
+                        logger.info(f"✅ MA: تم تحديث has_paper_report=1 للتقرير #{report_id}")
+            except Exception as db_err:
+                logger.warning(f"⚠️ MA: فشل تحديث has_paper_report للتقرير #{report_id}: {db_err}")
+
+        await job.mark_step("tracking", upload_progress=upload_progress, medical_action=report_medical_action)
+
+    # ✅ محاولة تحديث زر بطاقة الحالة الأصلية لإظهار "📂 فتح التقارير الطبية"
+    # (best-effort — الرسالة قد تكون قديمة/محذوفة/بلا صلاحية تعديل، هذا غير حرج)
+    if report_id:
+        try:
+            original_group_message_id = report.get("group_message_id")
+            if original_group_message_id and REPORTS_GROUP_ID:
+                from services.medical_attachment_files_service import count_medical_attachment_files
 
-            if is_complete:
-                try:
-                    with SessionLocal() as s:
-                        r = s.query(Report).filter_by(id=report_id).first()
-                        if r:
-                            r.has_paper_report = 1
-                            report_medical_action = r.medical_action
-                            s.commit()
-                            logger.info(f"✅ MA: تم تحديث has_paper_report=1 للتقرير #{report_id}")
-                except Exception as db_err:
-                    logger.warning(f"⚠️ MA: فشل تحديث has_paper_report للتقرير #{report_id}: {db_err}")
-
-        # ✅ محاولة تحديث زر بطاقة الحالة الأصلية لإظهار "📂 فتح التقارير الطبية"
-        # (best-effort — الرسالة قد تكون قديمة/محذوفة/بلا صلاحية تعديل، هذا غير حرج)
-        if report_id:
-            try:
-                original_group_message_id = report.get("group_message_id")
-                if original_group_message_id and REPORTS_GROUP_ID:
-                    from services.medical_attachment_files_service import count_medical_attachment_files
-
-                    if count_medical_attachment_files(report_id) > 0:
-                        card_rows = []
-                        if report_medical_action == "تأجيل موعد":
-                            card_rows.append([InlineKeyboardButton(
-                                "📅 عرض سبب التأجيل", callback_data=f"view_reschedule:{report_id}"
-                            )])
+                if count_medical_attachment_files(report_id) > 0:
+                    card_rows = []
+                    if report_medical_action == "تأجيل موعد":
                         card_rows.append([InlineKeyboardButton(
-                            "📂 فتح التقارير الطبية", callback_data=f"medfiles:{report_id}"
+                            "📅 عرض سبب التأجيل", callback_data=f"view_reschedule:{report_id}"
                         )])
-                        await bot.edit_message_reply_markup(
-                            chat_id=REPORTS_GROUP_ID,
-                            message_id=original_group_message_id,
-                            reply_markup=InlineKeyboardMarkup(card_rows),
-                        )
-                        logger.info(f"✅ MA: تم تحديث زر بطاقة التقرير #{report_id}")
-            except Exception as edit_err:
-                logger.info(f"ℹ️ MA: تعذّر تحديث زر بطاقة التقرير #{report_id} (best-effort, غير حرج): {edit_err}")
-
-        # تنظيف الجلسة
-        context.user_data.pop("ma_state", None)
-
-        success_text = f"✅ **تم النشر بنجاح**\n\nتم إرسال {len(attachments)} مرفق(ات) للمجموعة."
-        if upload_progress is not None:
-            is_complete, uploaded_n, expected_n = upload_progress
-            if expected_n > 1:
-                if is_complete:
-                    success_text += f"\n\n🎉 اكتملت كل الفحوصات المنتظرة ({expected_n}/{expected_n})."
-                else:
-                    remaining_n = expected_n - uploaded_n
-                    success_text += (
-                        f"\n\n📊 تقدّم الفحوصات: {uploaded_n} من {expected_n} — متبقي {remaining_n}.\n"
-                        f"ستبقى هذه الحالة في التقارير المعلقة حتى رفع بقية الفحوصات."
+                    card_rows.append([InlineKeyboardButton(
+                        "📂 فتح التقارير الطبية", callback_data=f"medfiles:{report_id}"
+                    )])
+                    await bot.edit_message_reply_markup(
+                        chat_id=REPORTS_GROUP_ID,
+                        message_id=original_group_message_id,
+                        reply_markup=InlineKeyboardMarkup(card_rows),
                     )
+                    logger.info(f"✅ MA: تم تحديث زر بطاقة التقرير #{report_id}")
+        except Exception as edit_err:
+            logger.info(f"ℹ️ MA: تعذّر تحديث زر بطاقة التقرير #{report_id} (best-effort, غير حرج): {edit_err}")
+
+    success_text = f"✅ **تم النشر بنجاح**\n\nتم إرسال {len(attachments)} مرفق(ات) للمجموعة."
+    if upload_progress is not None:
+        is_complete, uploaded_n, expected_n = upload_progress
+        if expected_n > 1:
+            if is_complete:
+                success_text += f"\n\n🎉 اكتملت كل الفحوصات المنتظرة ({expected_n}/{expected_n})."
+            else:
+                remaining_n = expected_n - uploaded_n
+                success_text += (
+                    f"\n\n📊 تقدّم الفحوصات: {uploaded_n} من {expected_n} — متبقي {remaining_n}.\n"
+                    f"ستبقى هذه الحالة في التقارير المعلقة حتى رفع بقية الفحوصات."
+                )
 
-        await query.edit_message_text(success_text, parse_mode="Markdown")
+    await job.progress(success_text, parse_mode="Markdown")
 
-    except Exception as e:
-        logger.error(f"❌ MA: فشل النشر: {e}", exc_info=True)
-        retry_cb = "ma:done_all" if ma.get("complete_all") else "ma:done"
-        await query.edit_message_text(
-            f"❌ فشل النشر: {e}\n\nيرجى المحاولة مرة أخرى.",
-            reply_markup=InlineKeyboardMarkup([[
-                InlineKeyboardButton("🔄 إعادة المحاولة", callback_data=retry_cb),
-                InlineKeyboardButton("❌ إلغاء", callback_data="ma:cancel"),
-            ]])
-        )
+
+async def _publish_job_failed(bot, job, error):
+    """آخر محاولة فشلت — زر لإعادة نفس المهمة (المرفقات محفوظة في سطرها)."""
+    await job.progress(
+        f"❌ فشل النشر: {error}\n\nيرجى المحاولة مرة أخرى.",
+        reply_markup=InlineKeyboardMarkup([[
+            InlineKeyboardButton("🔄 إعادة المحاولة", callback_data=f"ma:retry_job:{job.id}"),
+            InlineKeyboardButton("❌ إلغاء", callback_data="ma:cancel"),
+        ]]),
+    )
 
 
 # ─────────────────────────────────────────────
@@ -915,6 +958,10 @@ async def _entry_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
 
 
 def register(app):
+    # مهام النشر الخلفية (services/attachment_jobs.py) — قبل بدء العمّال
+    from services.attachment_jobs import register_job_handler
+    register_job_handler("ma_publish", _run_publish_job, on_failed=_publish_job_failed)
+
     # زر Inline (من القوائم الداخلية) — group=-1 لضمان الأولوية على ConversationHandlers
     app.add_handler(CallbackQueryHandler(_entry_callback, pattern=r"^user_action:medical_attachments$"), group=-1)
     # زر النص الثابت في لوحة المستخدم
@@ -275,6 +275,7 @@ def register(app):
             CallbackQueryHandler(cancel_paste_callback, pattern=r"^paste_report:cancel$"),
         ],
         name="admin_paste_full_report",
+        persistent=getattr(app, "persistence", None) is not None,  # 💾 يُستأنف بعد إعادة التشغيل
         per_chat=True,
         per_user=True,
         allow_reentry=True,
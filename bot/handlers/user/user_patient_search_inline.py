@@ -6,20 +6,83 @@
 
 from telegram import Update, InlineQueryResultArticle, InputTextMessageContent
 from telegram.ext import ContextTypes, InlineQueryHandler
+import functools
 import logging
 
+from db.async_session import run_db
+from db.patient_search import patients_in_order, search_patient_ids
+from services.log_pipeline import log_sampled
+
 # Imports قاعدة البيانات
 try:
-    from db.session import SessionLocal
+    from db.session import ReadSessionLocal
     from db.models import Patient
 except ImportError as e:
     logging.error(f"❌ خطأ في استيراد قاعدة البيانات: {e}")
-    SessionLocal = None
+    ReadSessionLocal = None
     Patient = None
 
 logger = logging.getLogger(__name__)
 
 
+def _report_flow_visible(report_city, p) -> bool:
+    """قاعدة تدفق تقارير المترجمين (بلا جلسة مُنتقي مشترك)."""
+    from shared.selectors.patient_selector._data import report_flow_patient_visible
+    return report_flow_patient_visible(
+        p.patient_type, report_city, getattr(p, "archived_at", None)
+    )
+
+
+def _selector_visible(include_pharmacy, include_companions, only_companion_flow,
+                      city, services_scope, p) -> bool:
+    """قاعدة جلسة مُنتقي المرضى المشترك النشطة (_type_visible)."""
+    from shared.selectors.patient_selector._data import _type_visible
+    return _type_visible(
+        p.patient_type, include_pharmacy, include_companions,
+        only_companion_flow, city, getattr(p, "archived_at", None),
+        getattr(p, "gs_onboarded_at", None), services_scope,
+    )
+
+
+def _search_patients_sync(query_text: str, visible) -> list[dict]:
+    """
+    استعلام البحث نفسه — متزامن، يُشغَّل عبر run_db على خيط قاعدة البيانات.
+
+    يُرجع dicts بسيطة (لا كائنات ORM) حتى لا يُلمَس الـSession خارج خيطه.
+    `visible(patient)` يطبّق قاعدة الظهور الخاصة بالشاشة الحالية.
+    """
+    with ReadSessionLocal() as s:
+        # ✅ فهرس FTS5 أولاً (مرتّب بالصلة، يطابق أ/ا و ة/ه و ى/ي)
+        ids = search_patient_ids(s, query_text, limit=50) if query_text else None
+        if ids is not None:
+            patients = patients_in_order(s, ids)
+        elif query_text:
+            # ✅ البحث عن الأسماء التي تحتوي على النص المدخل (بلا فهرس)
+            patients = s.query(Patient).filter(
+                Patient.full_name.isnot(None),
+                Patient.full_name != "",
+                Patient.full_name.ilike(f"%{query_text}%")
+            ).order_by(Patient.full_name).limit(50).all()
+        else:
+            # ✅ إذا لم يتم إدخال نص، عرض آخر 50 مريض (الأحدث أولاً)
+            patients = s.query(Patient).filter(
+                Patient.full_name.isnot(None),
+                Patient.full_name != ""
+            ).order_by(Patient.created_at.desc(), Patient.full_name).limit(50).all()
+
+        return [
+            {
+                "id": p.id,
+                "full_name": p.full_name.strip(),
+                "file_number": p.file_number,
+                "phone_number": p.phone_number,
+                "age": p.age,
+            }
+            for p in patients
+            if p.full_name and p.full_name.strip() and visible(p)
+        ]
+
+
 async def patient_search_inline_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """
     🔍 Handler منفصل للبحث عن المرضى باستخدام Inline Query
@@ -40,17 +103,12 @@ async def patient_search_inline_handler(update: Update, context: ContextTypes.DE
             query_text = ""
         user_id = update.inline_query.from_user.id if update.inline_query.from_user else None
 
-        logger.info("=" * 80)
-        logger.info("🎯🎯🎯 PATIENT_SEARCH_INLINE_HANDLER TRIGGERED! 🎯🎯🎯")
-        logger.info(f"🔍 patient_search_inline_handler: تم استدعاء البحث - النص: '{query_text}' للمستخدم {user_id}")
-        logger.info(f"🔍 Query object: {update.inline_query.query if update.inline_query.query else 'None'}")
-        logger.info(f"🔍 SessionLocal available: {SessionLocal is not None}")
-        logger.info(f"🔍 Patient model available: {Patient is not None}")
-        logger.info("=" * 80)
+        # يُستدعى مع كل حرف يكتبه المستخدم — سطر DEBUG واحد بدل كتلة INFO
+        logger.debug("🔍 patient_search_inline_handler: '%s' للمستخدم %s", query_text, user_id)
         
         # التحقق من توفر قاعدة البيانات
-        if not SessionLocal or not Patient:
-            logger.error("❌ SessionLocal أو Patient غير متاح")
+        if not ReadSessionLocal or not Patient:
+            logger.error("❌ ReadSessionLocal أو Patient غير متاح")
             error_result = InlineQueryResultArticle(
                 id="error_db",
                 title="❌ خطأ في قاعدة البيانات",
@@ -94,102 +152,67 @@ async def patient_search_inline_handler(update: Update, context: ContextTypes.DE
         except Exception:
             logger.debug("تم تجاهل استثناء في patient_search_inline_handler", exc_info=True)
 
-        # ✅ البحث مباشرة من قاعدة البيانات
-        with SessionLocal() as s:
-            try:
-                if query_text:
-                    # ✅ البحث عن الأسماء التي تحتوي على النص المدخل
-                    patients = s.query(Patient).filter(
-                        Patient.full_name.isnot(None),
-                        Patient.full_name != "",
-                        Patient.full_name.ilike(f"%{query_text}%")
-                    ).order_by(Patient.full_name).limit(50).all()
-
-                    logger.info(f"✅ تم العثور على {len(patients)} مريض بالبحث: '{query_text}'")
-                else:
-                    # ✅ إذا لم يتم إدخال نص، عرض آخر 50 مريض (الأحدث أولاً)
-                    patients = s.query(Patient).filter(
-                        Patient.full_name.isnot(None),
-                        Patient.full_name != ""
-                    ).order_by(Patient.created_at.desc(), Patient.full_name).limit(50).all()
-
-                    logger.info(f"✅ عرض آخر {len(patients)} مريض (بدون بحث)")
-
-                # ✅ لا توجد جلسة مُنتقي مشترك ⇒ المستخدم داخل تدفق تقارير
-                # المترجمين: تُطبَّق قاعدة التقارير نفسها المستخدَمة في
-                # القائمة المرقَّمة (استبعاد pharmacy_only ومرضى تشناي، أو
-                # مرضى تشناي حصراً داخل قسم "🏙️ تقارير تشناي") — حتى لا
-                # يسرّب البحث أسماء مخفية عن هذا القسم.
-                from shared.selectors.patient_selector._data import (
-                    _type_visible, report_flow_patient_visible,
+        # ✅ البحث على خيط قاعدة البيانات — لا يوقف حلقة الأحداث أثناء الاستعلام
+        try:
+            if _sel_state is None:
+                _visible = functools.partial(
+                    _report_flow_visible, context.user_data.get("report_city")
                 )
-                if _sel_state is None:
-                    _city = context.user_data.get("report_city")
-                    patients = [
-                        p for p in patients
-                        if report_flow_patient_visible(
-                            p.patient_type, _city, getattr(p, "archived_at", None)
-                        )
-                    ]
-                else:
-                    patients = [
-                        p for p in patients
-                        if _type_visible(
-                            p.patient_type, include_pharmacy, include_companions,
-                            only_companion_flow, _sel_city, getattr(p, "archived_at", None),
-                            getattr(p, "gs_onboarded_at", None), _sel_services,
-                        )
-                    ]
-
-                # ✅ إنشاء النتائج
-                for idx, patient in enumerate(patients):
-                    if not patient.full_name or not patient.full_name.strip():
-                        continue
-
-                    patient_name = patient.full_name.strip()
-
-                    # ✅ إعداد العنوان
-                    title = f"👤 {patient_name}"
-                    if len(title) > 64:
-                        title = f"👤 {patient_name[:60]}..."
-
-                    # ✅ إضافة معلومات إضافية في الوصف (إن وجدت)
-                    description_parts = []
-                    if patient.file_number:
-                        description_parts.append(f"📄 {patient.file_number}")
-                    if patient.phone_number:
-                        description_parts.append(f"📱 {patient.phone_number}")
-                    if patient.age:
-                        description_parts.append(f"🎂 {patient.age} سنة")
-
-                    description = " | ".join(description_parts) if description_parts else "اضغط للاختيار"
-                    if len(description) > 200:
-                        description = description[:197] + "..."
-
-                    # ✅ إنشاء النتيجة
-                    result = InlineQueryResultArticle(
-                        id=f"patient_search_{patient.id}",
-                        title=title,
-                        description=description,
-                        input_message_content=InputTextMessageContent(
-                            message_text=f"__PATIENT_SELECTED__:{patient.id}:{patient_name}"
-                        )
-                    )
-                    results.append(result)
+            else:
+                _visible = functools.partial(
+                    _selector_visible, include_pharmacy, include_companions,
+                    only_companion_flow, _sel_city, _sel_services,
+                )
+            patients = await run_db(_search_patients_sync, query_text, _visible)
+            log_sampled(logger, "patient_search_inline", "🔍 بحث مرضى inline: %d نتيجة (آخر نص: '%s')",
+                        len(patients), query_text)
+
+            # ✅ إنشاء النتائج
+            for patient in patients:
+                patient_name = patient["full_name"]
+
+                # ✅ إعداد العنوان
+                title = f"👤 {patient_name}"
+                if len(title) > 64:
+                    title = f"👤 {patient_name[:60]}..."
+
+                # ✅ إضافة معلومات إضافية في الوصف (إن وجدت)
+                description_parts = []
+                if patient["file_number"]:
+                    description_parts.append(f"📄 {patient['file_number']}")
+                if patient["phone_number"]:
+                    description_parts.append(f"📱 {patient['phone_number']}")
+                if patient["age"]:
+                    description_parts.append(f"🎂 {patient['age']} سنة")
 
-                logger.info(f"✅ تم إنشاء {len(results)} نتيجة للبحث")
+                description = " | ".join(description_parts) if description_parts else "اضغط للاختيار"
+                if len(description) > 200:
+                    description = description[:197] + "..."
 
-            except Exception as db_error:
-                logger.error(f"❌ خطأ في البحث من قاعدة البيانات: {db_error}", exc_info=True)
-                error_result = InlineQueryResultArticle(
-                    id="error_search",
-                    title="❌ خطأ في البحث",
-                    description=f"حدث خطأ: {str(db_error)[:100]}",
+                # ✅ إنشاء النتيجة
+                result = InlineQueryResultArticle(
+                    id=f"patient_search_{patient['id']}",
+                    title=title,
+                    description=description,
                     input_message_content=InputTextMessageContent(
-                        message_text="__PATIENT_SEARCH_ERROR__:خطأ في البحث"
+                        message_text=f"__PATIENT_SELECTED__:{patient['id']}:{patient_name}"
                     )
                 )
-                results.append(error_result)
+                results.append(result)
+
+            logger.info(f"✅ تم إنشاء {len(results)} نتيجة للبحث")
+
+        except Exception as db_error:
+            logger.error(f"❌ خطأ في البحث من قاعدة البيانات: {db_error}", exc_info=True)
+            error_result = InlineQueryResultArticle(
+                id="error_search",
+                title="❌ خطأ في البحث",
+                description=f"حدث خطأ: {str(db_error)[:100]}",
+                input_message_content=InputTextMessageContent(
+                    message_text="__PATIENT_SEARCH_ERROR__:خطأ في البحث"
+                )
+            )
+            results.append(error_result)
 
         # ✅ إرسال النتائج
         if not results:
@@ -1415,6 +1415,11 @@ def register(app):
         per_chat=True,
         per_user=True,
         allow_reentry=True,
+        # 💾 الحالة تُحفظ مع user_data (report_tmp، مكدّس التنقل) فتُستأنف
+        # المسودة بعد إعادة التشغيل من نفس الخطوة. الاسم ثابت — هو مفتاح
+        # الحالات المحفوظة في ptb_conversations.
+        name="user_add_report",
+        persistent=getattr(app, "persistence", None) is not None,
     )
 
     app.add_handler(conv_handler)
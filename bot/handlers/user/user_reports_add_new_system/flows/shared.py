@@ -738,7 +738,8 @@ async def handle_medical_report_image(update: Update, context: ContextTypes.DEFA
     if msg.photo:
         # أكبر جودة متاحة
         photo = msg.photo[-1]
-        file_info = {"type": "photo", "file_id": photo.file_id}
+        file_info = {"type": "photo", "file_id": photo.file_id,
+                     "file_unique_id": photo.file_unique_id}
     elif msg.document:
         file_info = {"type": "document", "file_id": msg.document.file_id,
                      "file_name": msg.document.file_name or "document"}
@@ -2387,6 +2388,7 @@ async def save_report_to_database(query, context, flow_type):
         session.refresh(new_report)
 
         report_id = new_report.id
+        report_updated_at = new_report.updated_at
 
         # ✅ تسجيل تفاصيل الحفظ للمراقبة
         logger.info(
@@ -2398,6 +2400,15 @@ async def save_report_to_database(query, context, flow_type):
             f"action={final_medical_action}"
         )
 
+        # 👤 عدّاد تقارير المستخدم وآخر تقرير (services/user_tracker): تسجيل
+        # في الذاكرة فقط، والكتابة دفعة upsert دورية خارج هذه المعاملة
+        if query and query.from_user:
+            try:
+                from services.user_tracker import update_user_activity
+                update_user_activity(query.from_user.id, query.from_user.username, query.from_user.full_name)
+            except Exception as e:
+                logger.warning(f"⚠️ Failed to record user activity: {e}")
+
         # ✅ حفظ التقرير المعلق فقط لحالة "🟡 لم يجهز بعد" — هذه وحدها التي
         # تظهر في قائمة التقارير المعلقة. حالة "❌ لا يوجد تقرير" (بسبب) حالة
         # منتهية ولا تُنشئ سجلاً معلقاً إطلاقاً.
@@ -2481,6 +2492,7 @@ async def save_report_to_database(query, context, flow_type):
             
             broadcast_data = {
                 'report_id': report_id,  # إضافة معرف التقرير لحفظ معرف الرسالة
+                'updated_at': report_updated_at,  # مفتاح ذاكرة البطاقة مع report_id
                 'report_date': data.get('report_date', datetime.now()).strftime('%Y-%m-%d %H:%M'),
                 'patient_name': patient_name,
                 'hospital_name': hospital_name,
@@ -1251,6 +1251,8 @@ async def handle_republish(update: Update, context: ContextTypes.DEFAULT_TYPE):
             # ✅ بناء broadcast_data مع جميع الحقول المطلوبة
             broadcast_data = {
                 'report_id': report_id,
+                # مفتاح ذاكرة البطاقة مع report_id (format_report_message)
+                'updated_at': report.updated_at,
                 'report_date': report.report_date.strftime('%Y-%m-%d %H:%M') if report.report_date else _ist_now().strftime('%Y-%m-%d %H:%M'),
                 'patient_name': patient.full_name if patient else 'غير معروف',
                 'hospital_name': hospital.name if hospital else 'غير معروف',
@@ -4,8 +4,9 @@
 # ================================================
 
 from config.settings import ADMIN_IDS
-from db.session import SessionLocal
+from db.session import SessionLocal, ReadSessionLocal
 from db.models import Translator
+from core.access.permission_snapshot import permission_snapshot
 from telegram import InlineKeyboardMarkup, InlineKeyboardButton
 import logging
 
@@ -47,13 +48,28 @@ def ensure_translator_record(tg_id, full_name=None):
 
 
 # ✅ فحص إن كان المستخدم معتمد (مقبول من الأدمن)
+# يُقرأ من permission_snapshot (قاموس في الذاكرة يُحدَّث عند الموافقة/التجميد)؛
+# قاعدة البيانات فقط إن تعذّرت اللقطة.
 def is_user_approved(tg_user_id: int) -> bool:
-    with SessionLocal() as s:
+    try:
+        return permission_snapshot.is_approved(tg_user_id)
+    except Exception:
+        logger.error("permission snapshot unavailable, falling back to DB", exc_info=True)
+    with ReadSessionLocal() as s:
         tr = s.query(Translator).filter_by(tg_user_id=tg_user_id).first()
         # التحقق من أنه معتمد وليس مجمد
         return bool(tr and tr.is_approved and not tr.is_suspended)
 
 
+async def is_user_approved_async(tg_user_id: int) -> bool:
+    """نفس is_user_approved — من اللقطة مباشرة، وإلا على خيط قاعدة البيانات."""
+    approved = permission_snapshot.peek_approved(tg_user_id)
+    if approved is not None:
+        return approved
+    from db.async_session import run_db
+    return await run_db(is_user_approved, tg_user_id)
+
+
 # ✅ تسجيل مستخدم جديد في انتظار موافقة الأدمن
 async def register_pending_user(user_id: int, full_name: str, phone: str, bot):
     """إرسال إشعار للأدمن بمستخدم جديد"""
@@ -110,7 +126,10 @@ async def register_pending_user(user_id: int, full_name: str, phone: str, bot):
     print(f"📊 تم إرسال الإشعار بنجاح إلى {success_count} من {len(ADMIN_IDS)} أدمن")
 
 
-# ✅ التحقق من أن المستخدم معتمد أو إدمن (مع cache)
+# ✅ التحقق من أن المستخدم معتمد أو إدمن
+# ⚠️ كانت النتيجة تُحفظ في context.user_data["_is_approved"] للأبد: تجميد
+# المستخدم لا يسري عليه حتى إعادة تشغيل البوت. permission_snapshot بنفس
+# السرعة (قاموس) لكنه يُحدَّث فور التجميد/الموافقة.
 async def ensure_approved(update, context) -> bool:
     user = update.effective_user
     if not user:
@@ -120,22 +139,8 @@ async def ensure_approved(update, context) -> bool:
     if is_admin(user.id):
         return True
 
-    # التحقق من cache أولاً
-    cached_approved = context.user_data.get("_is_approved")
-    if cached_approved is not None:
-        if not cached_approved:
-            try:
-                await update.message.reply_text(
-                    "🚫 لا يمكنك استخدام البوت قبل موافقة الإدارة."
-                )
-            except Exception:
-                logger.debug("تم تجاهل استثناء في ensure_approved", exc_info=True)
-        return cached_approved
-
-    # الاستعلام من قاعدة البيانات وحفظ في cache
-    approved = is_user_approved(user.id)
-    context.user_data["_is_approved"] = approved
-    
+    approved = await is_user_approved_async(user.id)
+
     if not approved:
         try:
             await update.message.reply_text(
@@ -0,0 +1,205 @@
+# ================================================
+# bot/startup_profile.py
+# 🔹 Startup profile: cold start → first routed update, per-module import cost
+# ================================================
+#
+# register_all_handlers يستورد كل وحدات الـhandlers مسبقاً — وهذا مقصود
+# (PTB يحتاج كائنات الـhandlers جاهزة). المكلف هو ما تسحبه تلك الوحدات
+# معها: reportlab/matplotlib/OpenCV/numpy/openpyxl/weasyprint/openai.
+# هذه تُستورد داخل الدوال التي تستخدمها (أول استعمال)، وتُسخَّن في الخلفية
+# بعد بدء الـpolling عبر prewarm_deferred_modules().
+#
+# measure_cold_start() تشغّل مفسّراً جديداً (cold) يسجّل كل الـhandlers ثم
+# يوجّه تحديث /start نموذجياً عبر المجموعات كما يفعل PTB، وتعيد:
+#   elapsed_s        — من بدء المفسّر حتى توجيه أول تحديث
+#   deferred_loaded  — أي حزمة من DEFERRED_MODULES حُمِّلت أثناء الإقلاع
+#   packages / modules — كلفة الاستيراد لكل حزمة/وحدة (-X importtime)
+#
+# Run: python scripts/profile_startup.py [--top 25]
+
+import importlib
+import json
+import logging
+import os
+import re
+import subprocess
+import sys
+import time
+from collections import Counter
+from typing import Dict, Iterable, List
+
+logger = logging.getLogger(__name__)
+
+_PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# حزم يجب ألا يحمّلها تسجيل الـhandlers (PDF / رسوم / رؤية حاسوبية / AI / Excel)
+DEFERRED_MODULES = (
+    "reportlab",
+    "matplotlib",
+    "cv2",
+    "numpy",
+    "pandas",
+    "weasyprint",
+    "openpyxl",
+    "openai",
+    "image_pipeline",
+    "services.pdf_generation",
+)
+
+# ما يُسخَّن بعد بدء الـpolling — أول PDF/رسم/Excel لا يدفع ثمن الاستيراد
+PREWARM_MODULES = (
+    "numpy",
+    "matplotlib.pyplot",
+    "reportlab.platypus",
+    "openpyxl",
+    "services.pdf_generation.pdf_builder",
+)
+
+STARTUP_BUDGET_SECONDS = float(os.getenv("STARTUP_BUDGET_SECONDS", "5"))
+
+_IMPORTTIME_RE = re.compile(r"import time:\s+(\d+) \|\s+(\d+) \|(\s*)(\S+)")
+
+
+def prewarm_deferred_modules(modules: Iterable[str] = PREWARM_MODULES) -> Dict[str, float]:
+    """
+    استيراد الوحدات الثقيلة مسبقاً (يُستدعى في خيط خلفي بعد بدء الـpolling).
+
+    Returns:
+        {module: seconds} للوحدات التي حُمِّلت؛ الناقصة تُتجاهَل.
+    """
+    os.environ.setdefault("MPLBACKEND", "Agg")   # قبل أي استيراد لـpyplot
+    timings = {}
+    for name in modules:
+        if name in sys.modules:
+            continue
+        t0 = time.perf_counter()
+        try:
+            importlib.import_module(name)
+        except Exception as e:
+            logger.debug(f"prewarm skipped {name}: {e}")
+            continue
+        timings[name] = time.perf_counter() - t0
+    if timings:
+        logger.info(
+            "🔥 Prewarmed %d modules in %.0fms (%s)",
+            len(timings), sum(timings.values()) * 1000,
+            ", ".join(f"{k}={v * 1000:.0f}ms" for k, v in timings.items()),
+        )
+    return timings
+
+
+def deferred_modules_loaded(modules: Iterable[str] = None) -> List[str]:
+    """الحزم من DEFERRED_MODULES الموجودة حالياً في sys.modules."""
+    targets = tuple(modules or DEFERRED_MODULES)
+    return sorted({
+        t for name in sys.modules for t in targets
+        if name == t or name.startswith(t + ".")
+    })
+
+
+# ── Child process ────────────────────────────────────────────────────────────
+
+class _HandlerRecorder:
+    """بديل Application حين يتعذّر بناؤه (يكفي لتسجيل الـhandlers وتوجيه التحديث)."""
+
+    def __init__(self):
+        self.handlers = {}
+        self.bot_data = {}
+
+    def add_handler(self, handler, group=0):
+        self.handlers.setdefault(group, []).append(handler)
+
+    def add_handlers(self, handlers, group=0):
+        for h in handlers:
+            self.add_handler(h, group)
+
+    def add_error_handler(self, *args, **kwargs):
+        pass
+
+
+def _sample_update():
+    from datetime import datetime
+    from telegram import Chat, Message, MessageEntity, Update, User
+
+    user = User(id=999_000_222, first_name="startup", is_bot=False)
+    message = Message(
+        message_id=1, date=datetime.now(), chat=Chat(id=user.id, type="private"), from_user=user,
+        text="/start", entities=(MessageEntity(type=MessageEntity.BOT_COMMAND, offset=0, length=6),),
+    )
+    return Update(update_id=1, message=message)
+
+
+def _route(app, update) -> int:
+    """مثل Application.process_update: أول handler مطابق في كل مجموعة."""
+    matched = 0
+    for group in sorted(app.handlers):
+        for handler in app.handlers[group]:
+            try:
+                check = handler.check_update(update)
+            except Exception:
+                continue
+            if check is not None and check is not False:
+                matched += 1
+                break
+    return matched
+
+
+def _child_main() -> None:
+    sys.path.insert(0, _PROJECT_ROOT)
+    t0 = float(os.environ["_STARTUP_T0"])
+    note = None
+    try:
+        from telegram.ext import Application
+        app = Application.builder().token("1:startup-profile").build()
+    except Exception as e:
+        note = f"Application unavailable ({type(e).__name__}) — handler recorder used"
+        app = _HandlerRecorder()
+
+    from bot.handlers_registry import register_all_handlers
+    register_all_handlers(app)
+    registered = time.time() - t0
+    matched = _route(app, _sample_update())
+
+    print(json.dumps({
+        "elapsed_s": time.time() - t0,
+        "registered_s": registered,
+        "handlers": sum(len(v) for v in app.handlers.values()),
+        "groups_matched": matched,
+        "deferred_loaded": deferred_modules_loaded(),
+        "note": note,
+    }))
+
+
+# ── Parent ──────────────────────────────────────────────────────────────────
+
+def _parse_importtime(stderr: str):
+    packages, modules = Counter(), {}
+    for line in stderr.splitlines():
+        m = _IMPORTTIME_RE.match(line)
+        if not m:
+            continue
+        self_us, cumulative_us, name = int(m.group(1)), int(m.group(2)), m.group(4)
+        packages[name.split(".")[0]] += self_us
+        modules[name] = cumulative_us
+    return packages, modules
+
+
+def measure_cold_start(importtime: bool = True, timeout: float = 120) -> dict:
+    """إقلاع بارد في مفسّر جديد — انظر رأس الملف للحقول المعادة."""
+    cmd = [sys.executable]
+    if importtime:
+        cmd += ["-X", "importtime"]
+    cmd += ["-c", "from bot.startup_profile import _child_main; _child_main()"]
+    env = {**os.environ, "_STARTUP_T0": repr(time.time()), "PYTHONPATH": _PROJECT_ROOT}
+    proc = subprocess.run(cmd, cwd=_PROJECT_ROOT, env=env, capture_output=True, text=True, timeout=timeout)
+    lines = [l for l in proc.stdout.splitlines() if l.startswith("{")]
+    if proc.returncode != 0 or not lines:
+        tail = "\n".join(l for l in proc.stderr.splitlines() if not l.startswith("import time:"))[-2000:]
+        raise RuntimeError(f"startup profile child failed (rc={proc.returncode}):\n{tail}")
+
+    result = json.loads(lines[-1])
+    if importtime:
+        packages, modules = _parse_importtime(proc.stderr)
+        result["packages"] = dict(packages.most_common())
+        result["modules"] = dict(sorted(modules.items(), key=lambda kv: -kv[1]))
+    return result
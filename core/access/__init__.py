@@ -7,17 +7,24 @@
 from .access_service import (
     resolve_tg_user_id,
     get_user_modules,
+    get_user_modules_async,
     user_has_module,
+    user_has_module_async,
     grant_module,
     revoke_module,
     list_user_module_access,
 )
+from .permission_snapshot import permission_snapshot, set_user_access_state
 
 __all__ = [
     "resolve_tg_user_id",
     "get_user_modules",
+    "get_user_modules_async",
     "user_has_module",
+    "user_has_module_async",
     "grant_module",
     "revoke_module",
     "list_user_module_access",
+    "permission_snapshot",
+    "set_user_access_state",
 ]
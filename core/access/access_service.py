@@ -9,10 +9,14 @@
 #     granted "user_reports" on their first access check, keeping production
 #     working with zero downtime.
 #   - No module name is hardcoded outside this file and modules_bootstrap.py.
+#   - Reads go through the in-memory permission_snapshot; every write here
+#     updates it write-through after the commit.
 
 import logging
 from datetime import datetime
 
+from .permission_snapshot import permission_snapshot
+
 logger = logging.getLogger(__name__)
 
 # The default module granted to every approved translator who has no records yet.
@@ -43,77 +47,96 @@ def get_user_modules(tg_user_id: int) -> list[str]:
     """
     Return ordered list of active module keys for this user.
 
+    Served from the in-memory permission snapshot; only users with no access
+    records at all fall through to the DB (see _get_user_modules_db).
+    """
+    try:
+        modules = permission_snapshot.get_modules(tg_user_id)
+        if modules is not None:
+            return list(modules)
+    except Exception as exc:
+        logger.error(f"[access] permission snapshot unavailable: {exc}", exc_info=True)
+
+    try:
+        modules = _get_user_modules_db(tg_user_id)
+    except Exception as exc:
+        logger.error(f"[access] get_user_modules({tg_user_id}) failed: {exc}", exc_info=True)
+        return []
+    permission_snapshot.record_modules(tg_user_id, modules)
+    return modules
+
+
+def _get_user_modules_db(tg_user_id: int) -> list[str]:
+    """
+    Resolve modules from the DB (raises on DB errors).
+
     Lazy migration: if the user is an approved, non-suspended translator with
     no module access records, they are silently granted _DEFAULT_TRANSLATOR_MODULE
     and it is persisted to the DB on the spot.
     """
-    try:
-        from db.session import SessionLocal
-        from db.models import UserModuleAccess, Translator, TranslatorDirectory
-
-        with SessionLocal() as s:
-            # ✅ نجلب كل السجلات (النشطة والمُلغاة) لا النشطة فقط.
-            # السبب: الهجرة الكسولة أدناه كانت تُدرِج user_reports لكل من
-            # "لا سجل نشط له"، فتصطدم بقيد UNIQUE(tg_user_id, module_key)
-            # إن وُجد سجل مُلغى لنفس الوحدة ⇒ IntegrityError ⇒ تُرجِع []
-            # فيفقد المستخدم كل أزراره.
-            # وهذا يقع بالضبط في حالة مشروعة: مترجم مخصَّص لقسم واحد (مثل
-            # "🏙️ تقارير تشناي") أُلغيت عنه user_reports عمداً.
-            all_records = (
-                s.query(UserModuleAccess)
-                .filter_by(tg_user_id=tg_user_id)
-                .order_by(UserModuleAccess.granted_at)
-                .all()
+    from db.session import SessionLocal
+    from db.models import UserModuleAccess, Translator, TranslatorDirectory
+
+    with SessionLocal() as s:
+        # ✅ نجلب كل السجلات (النشطة والمُلغاة) لا النشطة فقط.
+        # السبب: الهجرة الكسولة أدناه كانت تُدرِج user_reports لكل من
+        # "لا سجل نشط له"، فتصطدم بقيد UNIQUE(tg_user_id, module_key)
+        # إن وُجد سجل مُلغى لنفس الوحدة ⇒ IntegrityError ⇒ تُرجِع []
+        # فيفقد المستخدم كل أزراره.
+        # وهذا يقع بالضبط في حالة مشروعة: مترجم مخصَّص لقسم واحد (مثل
+        # "🏙️ تقارير تشناي") أُلغيت عنه user_reports عمداً.
+        all_records = (
+            s.query(UserModuleAccess)
+            .filter_by(tg_user_id=tg_user_id)
+            .order_by(UserModuleAccess.granted_at)
+            .all()
+        )
+        active_records = [r for r in all_records if r.is_active]
+
+        if active_records:
+            return [r.module_key for r in active_records]
+
+        # ✅ توجد سجلات لكنها كلها مُلغاة ⇒ الوصول أُدير صراحةً من الأدمن.
+        # لا نُعيد منح الوحدة الافتراضية تلقائياً — ذلك ينقض قرار الأدمن
+        # ويُعيد للمستخدم قسماً سُحب منه عمداً.
+        if all_records:
+            logger.info(
+                f"[access] tg_user_id={tg_user_id}: كل سجلات الوصول مُلغاة "
+                f"— لا هجرة كسولة (قرار أدمن صريح)"
             )
-            active_records = [r for r in all_records if r.is_active]
-
-            if active_records:
-                return [r.module_key for r in active_records]
-
-            # ✅ توجد سجلات لكنها كلها مُلغاة ⇒ الوصول أُدير صراحةً من الأدمن.
-            # لا نُعيد منح الوحدة الافتراضية تلقائياً — ذلك ينقض قرار الأدمن
-            # ويُعيد للمستخدم قسماً سُحب منه عمداً.
-            if all_records:
-                logger.info(
-                    f"[access] tg_user_id={tg_user_id}: كل سجلات الوصول مُلغاة "
-                    f"— لا هجرة كسولة (قرار أدمن صريح)"
-                )
-                return []
-
-            # لا سجلات إطلاقاً — مستخدم جديد: تحقّق أنه معتمَد ثم امنحه الافتراضي.
-            user = s.query(Translator).filter_by(tg_user_id=tg_user_id).first()
-            if user and getattr(user, "is_approved", False) and not getattr(user, "is_suspended", False):
-                _insert_access(s, tg_user_id, _DEFAULT_TRANSLATOR_MODULE, granted_by=None)
-                s.commit()
-                logger.info(
-                    f"[access] lazy-migrated tg_user_id={tg_user_id} "
-                    f"→ module={_DEFAULT_TRANSLATOR_MODULE!r}"
-                )
-                return [_DEFAULT_TRANSLATOR_MODULE]
+            return []
 
-            if user:
-                return []
-
-            # Legacy production compatibility: the translators directory stores
-            # Telegram user ids in translator_id for established translators.
-            directory_user = (
-                s.query(TranslatorDirectory)
-                .filter_by(translator_id=tg_user_id)
-                .first()
+        # لا سجلات إطلاقاً — مستخدم جديد: تحقّق أنه معتمَد ثم امنحه الافتراضي.
+        user = s.query(Translator).filter_by(tg_user_id=tg_user_id).first()
+        if user and getattr(user, "is_approved", False) and not getattr(user, "is_suspended", False):
+            _insert_access(s, tg_user_id, _DEFAULT_TRANSLATOR_MODULE, granted_by=None)
+            s.commit()
+            logger.info(
+                f"[access] lazy-migrated tg_user_id={tg_user_id} "
+                f"→ module={_DEFAULT_TRANSLATOR_MODULE!r}"
             )
-            if directory_user:
-                _insert_access(s, tg_user_id, _DEFAULT_TRANSLATOR_MODULE, granted_by=None)
-                s.commit()
-                logger.info(
-                    f"[access] lazy-migrated legacy translator_id={tg_user_id} "
-                    f"→ module={_DEFAULT_TRANSLATOR_MODULE!r}"
-                )
-                return [_DEFAULT_TRANSLATOR_MODULE]
+            return [_DEFAULT_TRANSLATOR_MODULE]
+
+        if user:
+            return []
+
+        # Legacy production compatibility: the translators directory stores
+        # Telegram user ids in translator_id for established translators.
+        directory_user = (
+            s.query(TranslatorDirectory)
+            .filter_by(translator_id=tg_user_id)
+            .first()
+        )
+        if directory_user:
+            _insert_access(s, tg_user_id, _DEFAULT_TRANSLATOR_MODULE, granted_by=None)
+            s.commit()
+            logger.info(
+                f"[access] lazy-migrated legacy translator_id={tg_user_id} "
+                f"→ module={_DEFAULT_TRANSLATOR_MODULE!r}"
+            )
+            return [_DEFAULT_TRANSLATOR_MODULE]
 
-        return []
-    except Exception as exc:
-        logger.error(f"[access] get_user_modules({tg_user_id}) failed: {exc}", exc_info=True)
-        return []
+    return []
 
 
 def user_has_module(tg_user_id: int, module_key: str) -> bool:
@@ -121,6 +144,20 @@ def user_has_module(tg_user_id: int, module_key: str) -> bool:
     return module_key in get_user_modules(tg_user_id)
 
 
+async def get_user_modules_async(tg_user_id: int) -> list[str]:
+    """Awaitable get_user_modules — snapshot hit inline, DB work on the DB executor."""
+    modules = permission_snapshot.peek_modules(tg_user_id)
+    if modules is not None:
+        return list(modules)
+    from db.async_session import run_db
+    return await run_db(get_user_modules, tg_user_id)
+
+
+async def user_has_module_async(tg_user_id: int, module_key: str) -> bool:
+    """Awaitable user_has_module for async handlers."""
+    return module_key in await get_user_modules_async(tg_user_id)
+
+
 def list_users_with_module(module_key: str) -> list[int]:
     """
     كل المستخدمين الذين لديهم وصول **نشط** لوحدة معيّنة.
@@ -157,55 +194,16 @@ def grant_module(tg_user_id: int, module_key: str, granted_by: int | None = None
     Returns False if the module was already active (no-op).
     """
     try:
-        from db.session import SessionLocal
-        from db.models import UserModuleAccess
-        from sqlalchemy.exc import IntegrityError
-
-        with SessionLocal() as s:
-            existing = (
-                s.query(UserModuleAccess)
-                .filter_by(tg_user_id=tg_user_id, module_key=module_key)
-                .first()
-            )
-
-            if existing:
-                if existing.is_active:
-                    return False  # Already active — nothing to do
-                # Re-activate a previously revoked record
-                existing.is_active = True
-                existing.granted_by = granted_by
-                existing.granted_at = datetime.utcnow()
-                existing.revoked_by = None
-                existing.revoked_at = None
-            else:
-                _insert_access(s, tg_user_id, module_key, granted_by)
-
-            try:
-                s.commit()
-            except IntegrityError:
-                # Race condition: a concurrent call inserted the row between our
-                # SELECT and INSERT. Roll back and activate the existing record.
-                s.rollback()
-                s.query(UserModuleAccess).filter_by(
-                    tg_user_id=tg_user_id, module_key=module_key
-                ).update({
-                    "is_active": True,
-                    "granted_by": granted_by,
-                    "granted_at": datetime.utcnow(),
-                    "revoked_by": None,
-                    "revoked_at": None,
-                })
-                s.commit()
-                logger.info(
-                    f"[access] grant_module recovered from race condition "
-                    f"module={module_key!r} tg_user_id={tg_user_id}"
-                )
+        from db.write_queue import write
 
+        changed = write(_grant_module_tx, tg_user_id, module_key, granted_by)
+        permission_snapshot.module_granted(tg_user_id, module_key)
+        if changed:
             logger.info(
                 f"[access] granted module={module_key!r} "
                 f"to tg_user_id={tg_user_id} by admin={granted_by}"
             )
-            return True
+        return changed
     except Exception as exc:
         logger.error(f"[access] grant_module failed: {exc}", exc_info=True)
         return False
@@ -219,27 +217,16 @@ def revoke_module(tg_user_id: int, module_key: str, revoked_by: int | None = Non
     Returns False if there was no active record to revoke.
     """
     try:
-        from db.session import SessionLocal
-        from db.models import UserModuleAccess
+        from db.write_queue import write
 
-        with SessionLocal() as s:
-            record = (
-                s.query(UserModuleAccess)
-                .filter_by(tg_user_id=tg_user_id, module_key=module_key, is_active=True)
-                .first()
-            )
-            if not record:
-                return False
-
-            record.is_active = False
-            record.revoked_by = revoked_by
-            record.revoked_at = datetime.utcnow()
-            s.commit()
+        changed = write(_revoke_module_tx, tg_user_id, module_key, revoked_by)
+        permission_snapshot.module_revoked(tg_user_id, module_key)
+        if changed:
             logger.info(
                 f"[access] revoked module={module_key!r} "
                 f"from tg_user_id={tg_user_id} by admin={revoked_by}"
             )
-            return True
+        return changed
     except Exception as exc:
         logger.error(f"[access] revoke_module failed: {exc}", exc_info=True)
         return False
@@ -279,6 +266,45 @@ def list_user_module_access(tg_user_id: int) -> list[dict]:
 
 # ── Internal helpers ──────────────────────────────────────────────────────────
 
+def _grant_module_tx(session, tg_user_id: int, module_key: str, granted_by: int | None) -> bool:
+    """Grant inside the single-writer transaction — no commit.
+
+    The SELECT and the INSERT run under the same BEGIN IMMEDIATE, so no other
+    writer can slip a row in between (the old IntegrityError race recovery).
+    """
+    from db.models import UserModuleAccess
+
+    existing = (
+        session.query(UserModuleAccess)
+        .filter_by(tg_user_id=tg_user_id, module_key=module_key)
+        .first()
+    )
+    if existing is not None and existing.is_active:
+        return False  # Already active — nothing to do
+    _insert_access(session, tg_user_id, module_key, granted_by)
+    session.flush()
+    return True
+
+
+def _revoke_module_tx(session, tg_user_id: int, module_key: str, revoked_by: int | None) -> bool:
+    """Revoke inside the single-writer transaction — no commit."""
+    from db.models import UserModuleAccess
+
+    record = (
+        session.query(UserModuleAccess)
+        .filter_by(tg_user_id=tg_user_id, module_key=module_key, is_active=True)
+        .first()
+    )
+    if not record:
+        return False
+
+    record.is_active = False
+    record.revoked_by = revoked_by
+    record.revoked_at = datetime.utcnow()
+    session.flush()
+    return True
+
+
 def _insert_access(session, tg_user_id: int, module_key: str, granted_by: int | None) -> None:
     """Insert (or re-activate) an active access record — no commit.
 
@@ -0,0 +1,212 @@
+# core/access/permission_snapshot.py
+# Process-wide permission snapshot: tg_user_id -> approved flag + active modules.
+#
+# Every update passes through ensure_approved / user_has_module. Before this
+# snapshot each check opened a session and ran 1–3 queries; now it is a dict
+# lookup. The snapshot is:
+#   - loaded once (two table scans: users, active user_module_access),
+#   - kept current write-through by grant_module / revoke_module and the
+#     approval / suspension / rejection handlers,
+#   - fully reloaded after ACCESS_SNAPSHOT_MAX_AGE seconds as a safety net for
+#     writes that bypass those paths (scripts, manual SQL),
+#   - reloaded if db.session.SessionLocal is swapped (tests, scripts).
+#
+# Users with no access records at all still go through the DB path in
+# access_service.get_user_modules once (lazy migration), and the result is
+# recorded here.
+
+import logging
+import os
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+ACCESS_SNAPSHOT_MAX_AGE = float(os.getenv("ACCESS_SNAPSHOT_MAX_AGE", "900"))
+
+
+def _current_session_factory():
+    from db import session as _db_session
+    return _db_session.SessionLocal
+
+
+class PermissionSnapshot:
+    """In-memory view of who is approved and which modules they hold."""
+
+    def __init__(self, max_age: float = ACCESS_SNAPSHOT_MAX_AGE):
+        self.max_age = max_age
+        self._lock = threading.RLock()
+        self._approved: dict[int, bool] = {}
+        self._modules: dict[int, tuple[str, ...]] = {}
+        self._loaded_at: float | None = None
+        self._factory = None
+        self._stats = {"hits": 0, "misses": 0, "loads": 0, "writes": 0}
+
+    # ── Loading ───────────────────────────────────────────────────────────
+
+    def is_fresh(self) -> bool:
+        return (
+            self._loaded_at is not None
+            and self._factory is _current_session_factory()
+            and time.monotonic() - self._loaded_at < self.max_age
+        )
+
+    def load(self) -> None:
+        """(Re)build the snapshot from the DB in one pass."""
+        from db.models import User, UserModuleAccess
+
+        factory = _current_session_factory()
+        started = time.perf_counter()
+        with factory() as s:
+            users = s.query(User.tg_user_id, User.is_approved, User.is_suspended).all()
+            access = (
+                s.query(UserModuleAccess.tg_user_id, UserModuleAccess.module_key,
+                        UserModuleAccess.is_active)
+                .order_by(UserModuleAccess.granted_at)
+                .all()
+            )
+
+        approved = {
+            tg: bool(is_approved and not is_suspended)
+            for tg, is_approved, is_suspended in users if tg
+        }
+        modules: dict[int, list[str]] = {}
+        for tg, key, is_active in access:
+            # كل من له سجل (حتى لو مُلغى) يُحفظ — [] تعني "أُدير صراحةً"
+            lst = modules.setdefault(tg, [])
+            if is_active:
+                lst.append(key)
+
+        with self._lock:
+            self._approved = approved
+            self._modules = {tg: tuple(v) for tg, v in modules.items()}
+            self._factory = factory
+            self._loaded_at = time.monotonic()
+            self._stats["loads"] += 1
+        logger.info(
+            f"[access] permission snapshot loaded: {len(approved)} users, "
+            f"{len(modules)} with module records in {(time.perf_counter() - started) * 1000:.1f}ms"
+        )
+
+    def _ensure_loaded(self) -> None:
+        if not self.is_fresh():
+            with self._lock:
+                if not self.is_fresh():
+                    self.load()
+
+    # ── Lookups ───────────────────────────────────────────────────────────
+
+    def is_approved(self, tg_user_id: int) -> bool:
+        self._ensure_loaded()
+        approved = self._approved.get(tg_user_id)
+        if approved is not None:
+            self._stats["hits"] += 1
+            return approved
+        # مستخدم سجّل بعد التحميل ولم يمرّ بمسار الموافقة بعد
+        self._stats["misses"] += 1
+        from db.models import User
+
+        with self._factory() as s:
+            row = (
+                s.query(User.is_approved, User.is_suspended)
+                .filter(User.tg_user_id == tg_user_id)
+                .first()
+            )
+        approved = bool(row and row.is_approved and not row.is_suspended)
+        with self._lock:
+            self._approved.setdefault(tg_user_id, approved)
+        return approved
+
+    def get_modules(self, tg_user_id: int) -> tuple[str, ...] | None:
+        """Active module keys, or None if the user must be resolved from the DB."""
+        self._ensure_loaded()
+        modules = self._modules.get(tg_user_id)
+        self._stats["hits" if modules is not None else "misses"] += 1
+        return modules
+
+    def peek_approved(self, tg_user_id: int) -> bool | None:
+        """Snapshot-only lookup (never touches the DB) — safe on the event loop."""
+        if not self.is_fresh():
+            return None
+        approved = self._approved.get(tg_user_id)
+        if approved is not None:
+            self._stats["hits"] += 1
+        return approved
+
+    def peek_modules(self, tg_user_id: int) -> tuple[str, ...] | None:
+        """Snapshot-only lookup (never touches the DB) — safe on the event loop."""
+        if not self.is_fresh():
+            return None
+        modules = self._modules.get(tg_user_id)
+        if modules is not None:
+            self._stats["hits"] += 1
+        return modules
+
+    # ── Write-through ─────────────────────────────────────────────────────
+
+    def record_modules(self, tg_user_id: int, modules) -> None:
+        with self._lock:
+            if self._loaded_at is not None:
+                self._modules[tg_user_id] = tuple(modules)
+
+    def module_granted(self, tg_user_id: int, module_key: str) -> None:
+        with self._lock:
+            if self._loaded_at is None:
+                return
+            current = self._modules.get(tg_user_id, ())
+            if module_key not in current:
+                self._modules[tg_user_id] = current + (module_key,)
+            self._stats["writes"] += 1
+
+    def module_revoked(self, tg_user_id: int, module_key: str) -> None:
+        with self._lock:
+            if self._loaded_at is None:
+                return
+            current = self._modules.get(tg_user_id, ())
+            self._modules[tg_user_id] = tuple(k for k in current if k != module_key)
+            self._stats["writes"] += 1
+
+    def set_user_state(self, tg_user_id: int, approved: bool | None) -> None:
+        """Approval / suspension changed for a user.
+
+        approved=None drops the entry so the next lookup re-reads that one row
+        (for changes whose outcome depends on other columns, e.g. unsuspend).
+        """
+        if not tg_user_id:
+            return
+        with self._lock:
+            if self._loaded_at is None:
+                return
+            if approved is None:
+                self._approved.pop(tg_user_id, None)
+            else:
+                self._approved[tg_user_id] = bool(approved)
+            # مستخدم بلا سجلات وصول صار معتمداً ⇒ يمرّ بالهجرة الكسولة من جديد
+            if approved is not False and not self._modules.get(tg_user_id):
+                self._modules.pop(tg_user_id, None)
+            self._stats["writes"] += 1
+
+    def invalidate(self) -> None:
+        with self._lock:
+            self._loaded_at = None
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                **self._stats,
+                "users": len(self._approved),
+                "users_with_modules": len(self._modules),
+                "age_s": (time.monotonic() - self._loaded_at) if self._loaded_at else None,
+            }
+
+
+permission_snapshot = PermissionSnapshot()
+
+
+def set_user_access_state(tg_user_id: int, approved: bool | None) -> None:
+    """Call after committing an approve / suspend / unsuspend / reject.
+
+    approved=True for approve, False for suspend / reject, None when the
+    result depends on other columns (unsuspend) and should be re-read.
+    """
+    permission_snapshot.set_user_state(tg_user_id, approved)
@@ -0,0 +1,385 @@
+# core/session/persistence.py
+# SQLite-backed PTB persistence for user_data / chat_data / bot_data and
+# persistent ConversationHandler states.
+#
+# Without persistence every restart dropped all in-flight drafts: the
+# SessionManager drafts, the core navigation stack, multiselect and upload
+# sessions — all of which live in user_data.
+#
+# Write-behind, per key:
+#   • update_*() (called by Application.update_persistence every
+#     update_interval, with deep copies) only parks the snapshot in memory —
+#     no pickling, no I/O on the event loop.
+#   • flush_delay seconds later one background flush (thread) pickles each
+#     top-level key, compares a digest with what is already stored and
+#     writes only the changed / removed keys, all in one transaction.
+#   • Application.stop() → update_persistence() + flush() writes the rest.
+#
+# Layout (separate file, so it never contends with the main DB writer):
+#   ptb_data(kind, owner, key, value, updated_at)   kind ∈ user/chat/bot/callback
+#   ptb_conversations(name, key, state)
+# Values are pickled (Bot references restored on load) and zlib-compressed
+# when large. A key that cannot be pickled is skipped and logged once —
+# it never blocks the rest of the user's data. user/chat rows untouched for
+# PERSISTENCE_TTL_DAYS are pruned on load.
+#
+# Usage (app.py):
+#   ApplicationBuilder()...persistence(SQLitePersistence()).build()
+#
+# user_data alone does not resume a draft — the ConversationHandler must
+# also come back in the same state. Report-entry conversations therefore
+# opt in with a stable name (the ptb_conversations key):
+#   ConversationHandler(..., name="user_add_report",
+#                       persistent=getattr(app, "persistence", None) is not None)
+# (user_add_report, admin_paste_full_report). Other conversations are not
+# persistent and start over from their entry point after a restart.
+
+import asyncio
+import hashlib
+import io
+import logging
+import os
+import pickle
+import sqlite3
+import threading
+import time
+import zlib
+from typing import Dict, Optional
+
+from telegram import Bot
+from telegram.ext import BasePersistence, PersistenceInput
+
+logger = logging.getLogger(__name__)
+
+_PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+BOT_STATE_DB = os.getenv("BOT_STATE_DB", os.path.join(_PROJECT_ROOT, "data", "bot_state.db"))
+PERSISTENCE_UPDATE_INTERVAL = float(os.getenv("PERSISTENCE_UPDATE_INTERVAL", "15"))
+PERSISTENCE_FLUSH_DELAY = float(os.getenv("PERSISTENCE_FLUSH_DELAY", "2"))
+PERSISTENCE_TTL_DAYS = float(os.getenv("PERSISTENCE_TTL_DAYS", "30"))
+
+_COMPRESS_ABOVE = 512
+_BOT_REF = "bot"
+
+_SCHEMA = (
+    """CREATE TABLE IF NOT EXISTS ptb_data (
+         kind TEXT NOT NULL,
+         owner INTEGER NOT NULL,
+         key BLOB NOT NULL,
+         value BLOB NOT NULL,
+         updated_at REAL NOT NULL,
+         PRIMARY KEY (kind, owner, key)
+       ) WITHOUT ROWID""",
+    """CREATE TABLE IF NOT EXISTS ptb_conversations (
+         name TEXT NOT NULL,
+         key BLOB NOT NULL,
+         state BLOB NOT NULL,
+         PRIMARY KEY (name, key)
+       ) WITHOUT ROWID""",
+)
+
+
+class _Pickler(pickle.Pickler):
+    def persistent_id(self, obj):
+        return _BOT_REF if isinstance(obj, Bot) else None
+
+
+class _Unpickler(pickle.Unpickler):
+    def __init__(self, file, bot):
+        super().__init__(file)
+        self._bot = bot
+
+    def persistent_load(self, pid):
+        if pid == _BOT_REF:
+            return self._bot
+        raise pickle.UnpicklingError(f"unknown persistent id: {pid!r}")
+
+
+def _dumps(obj) -> bytes:
+    buf = io.BytesIO()
+    _Pickler(buf, protocol=pickle.HIGHEST_PROTOCOL).dump(obj)
+    raw = buf.getvalue()
+    if len(raw) > _COMPRESS_ABOVE:
+        return b"z" + zlib.compress(raw, 6)
+    return b"p" + raw
+
+
+def _loads(blob: bytes, bot=None):
+    raw = zlib.decompress(blob[1:]) if blob[:1] == b"z" else blob[1:]
+    return _Unpickler(io.BytesIO(raw), bot).load()
+
+
+def _digest(blob: bytes) -> bytes:
+    return hashlib.blake2b(blob, digest_size=16).digest()
+
+
+class SQLitePersistence(BasePersistence):
+    """BasePersistence over a small SQLite file; see module header for the write path."""
+
+    def __init__(
+        self,
+        path: str = BOT_STATE_DB,
+        update_interval: float = PERSISTENCE_UPDATE_INTERVAL,
+        flush_delay: float = PERSISTENCE_FLUSH_DELAY,
+        ttl_days: float = PERSISTENCE_TTL_DAYS,
+        store_data: Optional[PersistenceInput] = None,
+    ):
+        super().__init__(
+            store_data=store_data or PersistenceInput(callback_data=False),
+            update_interval=update_interval,
+        )
+        self.path = path
+        self.flush_delay = flush_delay
+        self.ttl_days = ttl_days
+
+        self._conn: Optional[sqlite3.Connection] = None
+        self._io_lock = threading.Lock()          # one flush/load at a time
+        self._pending_lock = threading.Lock()     # loop thread ↔ flush thread
+        self._pending: dict = {}                  # (kind, owner) → snapshot | None (drop)
+        self._pending_conv: dict = {}             # (name, key) → state | None
+        self._digests: Dict[tuple, Dict[bytes, bytes]] = {}   # stored key → value digest
+        self._unpicklable: set = set()
+        self._flush_task: Optional[asyncio.Task] = None
+        self._stats = {"flushes": 0, "written": 0, "deleted": 0, "skipped": 0, "last_flush_ms": 0.0}
+
+    # ── Connection ────────────────────────────────────────────────────────
+
+    def _db(self) -> sqlite3.Connection:
+        if self._conn is None:
+            os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+            conn = sqlite3.connect(self.path, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            for ddl in _SCHEMA:
+                conn.execute(ddl)
+            conn.commit()
+            self._conn = conn
+        return self._conn
+
+    def _close(self) -> None:
+        with self._io_lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+    # ── Loading ───────────────────────────────────────────────────────────
+
+    def _load_kind_sync(self, kind: str) -> dict:
+        with self._io_lock:
+            conn = self._db()
+            if self.ttl_days and kind in ("user", "chat"):
+                cutoff = time.time() - self.ttl_days * 86400
+                pruned = conn.execute(
+                    "DELETE FROM ptb_data WHERE kind = ? AND owner IN ("
+                    "  SELECT owner FROM ptb_data WHERE kind = ? GROUP BY owner HAVING MAX(updated_at) < ?)",
+                    (kind, kind, cutoff),
+                ).rowcount
+                conn.commit()
+                if pruned:
+                    logger.info(f"[persistence] pruned {pruned} stale {kind}_data rows")
+
+            out: dict = {}
+            for owner, key_blob, value_blob in conn.execute(
+                "SELECT owner, key, value FROM ptb_data WHERE kind = ?", (kind,)
+            ):
+                try:
+                    key = _loads(key_blob)
+                    value = _loads(value_blob, self.bot)
+                except Exception as exc:
+                    logger.warning(f"[persistence] dropping unreadable {kind}_data key for {owner}: {exc}")
+                    continue
+                out.setdefault(owner, {})[key] = value
+                self._digests.setdefault((kind, owner), {})[key_blob] = _digest(value_blob)
+        return out
+
+    async def get_user_data(self) -> Dict[int, dict]:
+        data = await asyncio.to_thread(self._load_kind_sync, "user")
+        logger.info(f"[persistence] restored user_data for {len(data)} users")
+        return data
+
+    async def get_chat_data(self) -> Dict[int, dict]:
+        return await asyncio.to_thread(self._load_kind_sync, "chat")
+
+    async def get_bot_data(self) -> dict:
+        return (await asyncio.to_thread(self._load_kind_sync, "bot")).get(0, {})
+
+    async def get_callback_data(self):
+        stored = (await asyncio.to_thread(self._load_kind_sync, "callback")).get(0, {})
+        return stored.get("data")
+
+    def _load_conversations_sync(self, name: str) -> dict:
+        with self._io_lock:
+            out = {}
+            for key_blob, state_blob in self._db().execute(
+                "SELECT key, state FROM ptb_conversations WHERE name = ?", (name,)
+            ):
+                try:
+                    out[_loads(key_blob)] = _loads(state_blob, self.bot)
+                except Exception as exc:
+                    logger.warning(f"[persistence] dropping unreadable state of conversation {name}: {exc}")
+            return out
+
+    async def get_conversations(self, name: str) -> dict:
+        return await asyncio.to_thread(self._load_conversations_sync, name)
+
+    # ── Updates: in-memory only, flushed later ────────────────────────────
+
+    def _park(self, kind: str, owner: int, data) -> None:
+        with self._pending_lock:
+            self._pending[(kind, owner)] = data
+        self._schedule_flush()
+
+    async def update_user_data(self, user_id: int, data: dict) -> None:
+        self._park("user", user_id, data)
+
+    async def update_chat_data(self, chat_id: int, data: dict) -> None:
+        self._park("chat", chat_id, data)
+
+    async def update_bot_data(self, data: dict) -> None:
+        self._park("bot", 0, data)
+
+    async def update_callback_data(self, data) -> None:
+        self._park("callback", 0, {"data": data})
+
+    async def drop_user_data(self, user_id: int) -> None:
+        self._park("user", user_id, None)
+
+    async def drop_chat_data(self, chat_id: int) -> None:
+        self._park("chat", chat_id, None)
+
+    async def update_conversation(self, name: str, key, new_state) -> None:
+        with self._pending_lock:
+            self._pending_conv[(name, key)] = new_state
+        self._schedule_flush()
+
+    # البيانات في الذاكرة هي المرجع — لا شيء يُعاد تحميله أثناء التشغيل
+    async def refresh_user_data(self, user_id: int, user_data: dict) -> None:
+        return None
+
+    async def refresh_chat_data(self, chat_id: int, chat_data: dict) -> None:
+        return None
+
+    async def refresh_bot_data(self, bot_data: dict) -> None:
+        return None
+
+    # ── Flushing ──────────────────────────────────────────────────────────
+
+    def _schedule_flush(self) -> None:
+        if self._flush_task is not None and not self._flush_task.done():
+            return
+        try:
+            self._flush_task = asyncio.get_running_loop().create_task(self._delayed_flush())
+        except RuntimeError:
+            self._flush_sync()
+
+    async def _delayed_flush(self) -> None:
+        await asyncio.sleep(self.flush_delay)
+        try:
+            await asyncio.to_thread(self._flush_sync)
+        except Exception as exc:
+            logger.error(f"[persistence] background flush failed: {exc}", exc_info=True)
+
+    def _serialize(self, kind: str, owner: int, data: dict, now: float):
+        """(upserts, deleted key blobs, new digests) for one owner's snapshot."""
+        known = self._digests.get((kind, owner), {})
+        current: Dict[bytes, bytes] = {}
+        upserts = []
+        for key, value in data.items():
+            try:
+                key_blob = _dumps(key)
+                value_blob = _dumps(value)
+            except Exception as exc:
+                tag = (kind, repr(key))
+                if tag not in self._unpicklable:
+                    self._unpicklable.add(tag)
+                    logger.warning(f"[persistence] {kind}_data key {key!r} is not picklable, skipped: {exc}")
+                self._stats["skipped"] += 1
+                continue
+            digest = _digest(value_blob)
+            current[key_blob] = digest
+            if known.get(key_blob) != digest:
+                upserts.append((kind, owner, key_blob, value_blob, now))
+        removed = [(kind, owner, k) for k in known.keys() - current.keys()]
+        return upserts, removed, current
+
+    def _flush_sync(self) -> None:
+        with self._pending_lock:
+            pending, self._pending = self._pending, {}
+            pending_conv, self._pending_conv = self._pending_conv, {}
+        if not pending and not pending_conv:
+            return
+
+        t0 = time.perf_counter()
+        with self._io_lock:
+            now = time.time()
+            upserts, removed, dropped, digests = [], [], [], {}
+            for (kind, owner), data in pending.items():
+                if data is None:
+                    dropped.append((kind, owner))
+                    continue
+                rows, gone, current = self._serialize(kind, owner, data, now)
+                upserts.extend(rows)
+                removed.extend(gone)
+                digests[(kind, owner)] = current
+
+            conv_upserts, conv_removed = [], []
+            for (name, key), state in pending_conv.items():
+                try:
+                    key_blob = _dumps(key)
+                    if state is None:
+                        conv_removed.append((name, key_blob))
+                    else:
+                        conv_upserts.append((name, key_blob, _dumps(state)))
+                except Exception as exc:
+                    logger.warning(f"[persistence] conversation {name} state not picklable, skipped: {exc}")
+
+            conn = self._db()
+            try:
+                with conn:
+                    conn.executemany("DELETE FROM ptb_data WHERE kind = ? AND owner = ?", dropped)
+                    conn.executemany("DELETE FROM ptb_data WHERE kind = ? AND owner = ? AND key = ?", removed)
+                    conn.executemany(
+                        "INSERT INTO ptb_data (kind, owner, key, value, updated_at) VALUES (?, ?, ?, ?, ?) "
+                        "ON CONFLICT(kind, owner, key) DO UPDATE SET value = excluded.value, "
+                        "updated_at = excluded.updated_at",
+                        upserts,
+                    )
+                    conn.executemany("DELETE FROM ptb_conversations WHERE name = ? AND key = ?", conv_removed)
+                    conn.executemany(
+                        "INSERT OR REPLACE INTO ptb_conversations (name, key, state) VALUES (?, ?, ?)",
+                        conv_upserts,
+                    )
+            except Exception:
+                # أعِد اللقطات للطابور (ما لم تصل أحدث منها) لتُكتب في الدورة التالية
+                with self._pending_lock:
+                    for k, v in pending.items():
+                        self._pending.setdefault(k, v)
+                    for k, v in pending_conv.items():
+                        self._pending_conv.setdefault(k, v)
+                raise
+
+            for key in dropped:
+                self._digests.pop(key, None)
+            self._digests.update(digests)
+
+        elapsed = (time.perf_counter() - t0) * 1000
+        self._stats["flushes"] += 1
+        self._stats["written"] += len(upserts) + len(conv_upserts)
+        self._stats["deleted"] += len(removed) + len(dropped) + len(conv_removed)
+        self._stats["last_flush_ms"] = elapsed
+        logger.debug(
+            f"[persistence] flushed {len(pending)} owners: {len(upserts)} keys written, "
+            f"{len(removed)} removed, {len(dropped)} dropped in {elapsed:.1f}ms"
+        )
+
+    async def flush(self) -> None:
+        """Called by Application.stop(): write everything pending, then close the file."""
+        if self._flush_task is not None and not self._flush_task.done():
+            self._flush_task.cancel()
+        await asyncio.to_thread(self._flush_sync)
+        await asyncio.to_thread(self._close)
+
+    def stats(self) -> dict:
+        with self._pending_lock:
+            pending = len(self._pending) + len(self._pending_conv)
+        return {**self._stats, "pending": pending}
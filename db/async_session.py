@@ -0,0 +1,210 @@
+# ================================================
+# db/async_session.py
+# 🔹 Async facade over db/session.py — blocking SQLite work off the event loop
+# ================================================
+#
+# كل معالِج يفتح SessionLocal() مباشرة داخل حلقة أحداث PTB: أي استعلام
+# بطيء يوقف تحديثات **كل** المترجمين الآخرين حتى ينتهي. هذا الملف يوفّر
+# مُنفِّذاً (executor) مخصّصاً ومحدوداً لقاعدة البيانات:
+#
+#   • run_db(fn, *args)      → ينفّذ دالة متزامنة على خيط قاعدة البيانات
+#   • db_executor_stats()    → عدد المهام المعلّقة/المنفّذة وزمن الانتظار
+#   • LoopLagMonitor         → يقيس تأخّر حلقة الأحداث (p50/p99/max)
+#
+# لماذا مُنفِّذ مخصّص وليس asyncio.to_thread؟ المُنفِّذ الافتراضي مشترك مع
+# pipeline الصور وتوليد PDF؛ مهمة CV طويلة تحجز كل خيوطه فتنتظر استعلامات
+# المصادقة خلفها. هنا عدد الخيوط مضبوط على حجم pool المحرّك (pool_size)
+# فلا يتجاوز عدد الاتصالات المفتوحة ما يتحمّله SQLite.
+#
+# الاستخدام:
+#     from db.async_session import run_db
+#     rows = await run_db(_search_patients_sync, query_text)
+
+import asyncio
+import functools
+import logging
+import os
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Optional, TypeVar
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+# عدد خيوط قاعدة البيانات — يطابق pool_size في db/session.py افتراضياً
+DB_EXECUTOR_WORKERS = int(os.getenv("DB_EXECUTOR_WORKERS", "5"))
+
+# استعلام يتجاوز هذا الزمن (ثوانٍ) يُسجَّل كتحذير
+SLOW_DB_CALL_SECONDS = float(os.getenv("SLOW_DB_CALL_SECONDS", "1.0"))
+
+
+# ================================================
+# Dedicated DB executor
+# ================================================
+
+_executor: Optional[ThreadPoolExecutor] = None
+_executor_lock = threading.Lock()
+
+_stats_lock = threading.Lock()
+_stats = {
+    "submitted": 0,
+    "completed": 0,
+    "failed": 0,
+    "slow": 0,
+    "in_flight": 0,
+    "max_in_flight": 0,
+}
+# آخر 1000 قياس (ثوانٍ) — نفس نافذة PerformanceMonitor
+_wait_samples: deque = deque(maxlen=1000)
+_run_samples: deque = deque(maxlen=1000)
+
+
+def get_db_executor() -> ThreadPoolExecutor:
+    """Return the process-wide DB executor, creating it on first use."""
+    global _executor
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                _executor = ThreadPoolExecutor(
+                    max_workers=max(1, DB_EXECUTOR_WORKERS),
+                    thread_name_prefix="db",
+                )
+                logger.info(f"[db-async] executor started with {DB_EXECUTOR_WORKERS} workers")
+    return _executor
+
+
+def shutdown_db_executor(wait: bool = True) -> None:
+    """Stop the DB executor. Call on application shutdown."""
+    global _executor
+    with _executor_lock:
+        if _executor is not None:
+            _executor.shutdown(wait=wait)
+            _executor = None
+            logger.info("[db-async] executor stopped")
+
+
+def _timed_call(fn: Callable[..., T], submitted_at: float) -> T:
+    """Run *fn* on a DB thread, recording queue wait and run time."""
+    started = time.perf_counter()
+    with _stats_lock:
+        _wait_samples.append(started - submitted_at)
+    try:
+        result = fn()
+    except Exception:
+        with _stats_lock:
+            _stats["failed"] += 1
+        raise
+    finally:
+        elapsed = time.perf_counter() - started
+        with _stats_lock:
+            _run_samples.append(elapsed)
+            _stats["completed"] += 1
+            _stats["in_flight"] -= 1
+            if elapsed >= SLOW_DB_CALL_SECONDS:
+                _stats["slow"] += 1
+        if elapsed >= SLOW_DB_CALL_SECONDS:
+            logger.warning(
+                f"⚠️ Slow DB call {getattr(fn, '__name__', fn)}: {elapsed:.2f}s"
+            )
+    return result
+
+
+async def run_db(fn: Callable[..., T], *args: Any, **kwargs: Any) -> T:
+    """
+    Await a blocking DB function on the dedicated executor.
+
+    *fn* must be a plain synchronous function that opens (and closes) its own
+    session — ORM objects must not escape it, return plain values/dicts.
+    """
+    call = functools.partial(fn, *args, **kwargs)
+    call.__name__ = getattr(fn, "__name__", "db_call")
+    with _stats_lock:
+        _stats["submitted"] += 1
+        _stats["in_flight"] += 1
+        _stats["max_in_flight"] = max(_stats["max_in_flight"], _stats["in_flight"])
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(
+        get_db_executor(), _timed_call, call, time.perf_counter()
+    )
+
+
+def _percentile(samples, pct: float) -> float:
+    if not samples:
+        return 0.0
+    ordered = sorted(samples)
+    idx = min(len(ordered) - 1, int(round(pct / 100.0 * (len(ordered) - 1))))
+    return ordered[idx]
+
+
+def db_executor_stats() -> dict:
+    """Counters and latency percentiles (ms) for the DB executor."""
+    with _stats_lock:
+        waits = list(_wait_samples)
+        runs = list(_run_samples)
+        stats = dict(_stats)
+    stats.update({
+        "workers": DB_EXECUTOR_WORKERS,
+        "wait_p50_ms": _percentile(waits, 50) * 1000,
+        "wait_p99_ms": _percentile(waits, 99) * 1000,
+        "run_p50_ms": _percentile(runs, 50) * 1000,
+        "run_p99_ms": _percentile(runs, 99) * 1000,
+    })
+    return stats
+
+
+# ================================================
+# Event-loop lag metric
+# ================================================
+
+class LoopLagMonitor:
+    """
+    يقيس تأخّر حلقة الأحداث: ينام `interval` ثانية ويسجّل كم تأخّر استيقاظه
+    فوق ذلك. أي عمل متزامن على الحلقة (استعلام SQLite، تنسيق ثقيل) يظهر
+    هنا مباشرة كقفزة في p99 — وهو المقياس الذي يُثبت أثر run_db.
+    """
+
+    def __init__(self, interval: float = 0.1, window: int = 1000):
+        self.interval = interval
+        self.samples: deque = deque(maxlen=window)
+        self._task: Optional[asyncio.Task] = None
+
+    async def _run(self) -> None:
+        loop = asyncio.get_running_loop()
+        while True:
+            expected = loop.time() + self.interval
+            await asyncio.sleep(self.interval)
+            self.samples.append(max(0.0, loop.time() - expected))
+
+    def start(self) -> None:
+        if self._task is None or self._task.done():
+            self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def stats(self) -> dict:
+        samples = list(self.samples)
+        return {
+            "samples": len(samples),
+            "lag_p50_ms": _percentile(samples, 50) * 1000,
+            "lag_p99_ms": _percentile(samples, 99) * 1000,
+            "lag_max_ms": (max(samples) * 1000) if samples else 0.0,
+        }
+
+
+loop_lag_monitor = LoopLagMonitor()
+
+
+def start_loop_lag_monitor() -> LoopLagMonitor:
+    """Start the process-wide loop-lag monitor on the running loop."""
+    loop_lag_monitor.start()
+    return loop_lag_monitor
@@ -6,7 +6,7 @@
 import logging
 from datetime import datetime, date, timedelta, timezone
 from typing import Optional
-from sqlalchemy import Column, Integer, String, Boolean, DateTime, Date, Text, Float, ForeignKey, UniqueConstraint, create_engine
+from sqlalchemy import Column, Integer, String, Boolean, DateTime, Date, Text, Float, ForeignKey, Index, UniqueConstraint, create_engine
 from sqlalchemy.ext.declarative import declarative_base
 
 logger = logging.getLogger(__name__)
@@ -183,6 +183,12 @@ class Doctor(Base):
 class Report(Base):
     """Medical Report model"""
     __tablename__ = "reports"
+    __table_args__ = (
+        # تقارير اليوم/الفترة النشطة لكل مترجم (stats_service، التذكيرات، التتبع)
+        Index("ix_reports_status_ist_day_translator", "status", "ist_day", "translator_id"),
+        # سجل المريض بالترتيب الزمني، وأول ظهور له (report_analytics)
+        Index("ix_reports_patient_report_date", "patient_id", "report_date"),
+    )
     
     id = Column(Integer, primary_key=True, autoincrement=True)
     
@@ -228,13 +234,19 @@ class Report(Base):
     followup_reason = Column(Text, nullable=True)
     # حقول خاصة بتأجيل الموعد
     app_reschedule_reason = Column(Text, nullable=True)
-    app_reschedule_return_date = Column(DateTime, nullable=True)
+    app_reschedule_return_date = Column(DateTime, nullable=True, index=True)
     app_reschedule_return_reason = Column(Text, nullable=True)
     
     # Metadata
     status = Column(String(50), default="active", nullable=True)
     created_at = Column(DateTime, default=datetime.utcnow, nullable=True, index=True)
     updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow, nullable=True)
+
+    # ✅ يوم الرفع بتوقيت IST ('YYYY-MM-DD'): DATE(created_at + 5:30)، أو يوم
+    # report_date إن غاب created_at. مخزَّن ومفهرس بدل حسابه في كل استعلام —
+    # تملؤه triggers في قاعدة البيانات عند الإدراج وتعديل created_at/report_date
+    # (db/session.py::_ensure_schema_compatibility)، فلا يُضبط من الكود.
+    ist_day = Column(String(10), nullable=True)
     
     # ✅ معرف المستخدم الذي أنشأ التقرير (Telegram User ID)
     submitted_by_user_id = Column(Integer, nullable=True, index=True)
@@ -244,14 +256,14 @@ class Report(Base):
     
     # ✅ حقول الأشعة والفحوصات
     radiology_type = Column(String(255), nullable=True)
-    radiology_delivery_date = Column(DateTime, nullable=True)
+    radiology_delivery_date = Column(DateTime, nullable=True, index=True)
     
     # ✅ حقول العلاج الإشعاعي
     radiation_therapy_type = Column(String(255), nullable=True)
     radiation_therapy_session_number = Column(String(100), nullable=True)
     radiation_therapy_remaining = Column(String(100), nullable=True)
     radiation_therapy_recommendations = Column(Text, nullable=True)  # ملاحظات أو توصيات
-    radiation_therapy_return_date = Column(DateTime, nullable=True)
+    radiation_therapy_return_date = Column(DateTime, nullable=True, index=True)
     radiation_therapy_return_reason = Column(Text, nullable=True)
     radiation_therapy_final_notes = Column(Text, nullable=True)
     radiation_therapy_completed = Column(Boolean, default=False, nullable=True)
@@ -520,6 +532,10 @@ class PharmacyFinancialRecord(Base):
     المشروع) — source_type/source_record_id يُحلّان عبر استعلام صريح.
     """
     __tablename__ = "pharmacy_financial_records"
+    __table_args__ = (
+        # ربط المسير (JOIN على نوع/معرّف سجل الصرف) — services/pharmacy_evacuation_service.py
+        Index("ix_pharmacy_financial_source", "source_type", "source_record_id"),
+    )
 
     id               = Column(Integer, primary_key=True, autoincrement=True)
     source_type       = Column(String(20), nullable=False, index=True)   # "medication" | "supplies"
@@ -1080,6 +1096,40 @@ class MedicalAttachmentFile(Base):
         return f"<MedicalAttachmentFile(id={self.id}, report_id={self.report_id}, type={self.file_type})>"
 
 
+class AttachmentPublishJob(Base):
+    """مهمة نشر مرفقات في الخلفية (services/attachment_jobs.py).
+
+    الضغط على "تم الانتهاء" يُنشئ سطراً هنا ويعود فوراً؛ عمّال الطابور
+    ينفّذون التحميل/التحويل/الإرسال. السطر يبقى بعد إعادة تشغيل البوت
+    (المهام "running" تعود "queued" عند الإقلاع)، و steps يحفظ المراحل
+    المنجزة حتى لا تُرسَل نفس الملفات مرتين عند إعادة المحاولة.
+    """
+    __tablename__ = "attachment_publish_jobs"
+    __table_args__ = (
+        Index("ix_attachment_publish_jobs_due", "status", "next_run_at"),
+    )
+
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    kind = Column(String(50), nullable=False, default="ma_publish")
+    idempotency_key = Column(String(255), nullable=False, unique=True)
+    report_id = Column(Integer, nullable=True, index=True)
+    status = Column(String(20), nullable=False, default="queued")  # queued|running|done|failed
+    payload = Column(Text, nullable=False)                          # JSON — مدخلات المهمة
+    state = Column(Text, nullable=True)                             # JSON — المراحل المنجزة
+    attempts = Column(Integer, nullable=False, default=0)
+    max_attempts = Column(Integer, nullable=False, default=5)
+    next_run_at = Column(DateTime, nullable=False, default=datetime.utcnow)
+    last_error = Column(Text, nullable=True)
+    chat_id = Column(Integer, nullable=True)      # رسالة المستخدم التي تُحدَّث بالتقدّم
+    message_id = Column(Integer, nullable=True)
+    created_at = Column(DateTime, default=datetime.utcnow, nullable=True)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow, nullable=True)
+    finished_at = Column(DateTime, nullable=True)
+
+    def __repr__(self):
+        return f"<AttachmentPublishJob(id={self.id}, kind={self.kind}, status={self.status}, attempts={self.attempts})>"
+
+
 # ================================================
 # Treatment Plans — نظام عام لتتبّع خطط الجلسات/الدورات العلاجية
 # (العلاج الكيماوي، الموجه، المناعي، غسيل الكلى، وأي برنامج مستقبلي)
@@ -1186,5 +1236,6 @@ __all__ = [
     'PublicServiceRecord',
     'TreatmentPlan',
     'TreatmentPlanChangeLog',
+    'AttachmentPublishJob',
     'desc'
 ]
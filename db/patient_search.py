@@ -0,0 +1,199 @@
+# ================================================
+# db/patient_search.py
+# 🔹 FTS5 (trigram) patient name index
+# ================================================
+#
+# البحث عن المرضى كان `full_name ILIKE '%q%'` — مسح كامل للجدول مع كل
+# حرف في inline query، ولا يطابق "احمد" مع "أحمد" ولا "فاطمه" مع "فاطمة".
+#
+# هنا جدول ظلّ FTS5 بمُقسِّم trigram فوق الاسم بعد التطبيع:
+#   • أ/إ/آ/ٱ → ا ، ة → ه ، ى → ي ، ؤ → و ، ئ → ي ، حذف التشكيل والتطويل
+#   • rowid = patients.id
+#   • Triggers على patients تُبقيه متزامناً مع كل كتابة — من أي مسار
+#     (الخدمة، حفظ التقارير، الاستيراد، SQL يدوي) — والتطبيع داخل الـtrigger
+#     بـreplace() صِرف، فلا يحتاج دوال Python مسجّلة على الاتصال.
+#
+#     ids = search_patient_ids(session, "احمد", limit=50)   # مرتّبة بالصلة
+#
+# إن لم يوجد الجدول (SQLite بلا FTS5، أو قاعدة اختبار) تُرجع None ويعود
+# المستدعي لاستعلام LIKE القديم.
+
+import logging
+import re
+import weakref
+
+from sqlalchemy import text
+
+logger = logging.getLogger(__name__)
+
+FTS_TABLE = "patients_name_fts"
+
+# حذف: التشكيل (U+064B..U+0652) والألف الخنجرية والتطويل
+_STRIP_CHARS = [chr(c) for c in range(0x064B, 0x0653)] + ["ٰ", "ـ"]
+
+# توحيد أشكال الحروف
+_FOLD_CHARS = {
+    "أ": "ا", "إ": "ا", "آ": "ا", "ٱ": "ا",
+    "ة": "ه",
+    "ى": "ي",
+    "ؤ": "و",
+    "ئ": "ي",
+}
+
+_TRANSLATE = {ord(c): None for c in _STRIP_CHARS}
+_TRANSLATE.update({ord(k): v for k, v in _FOLD_CHARS.items()})
+
+_SPACES = re.compile(r"\s+")
+
+
+def normalize_name(value: str | None) -> str:
+    """Same folding as the SQL triggers — used for queries and tests."""
+    if not value:
+        return ""
+    return _SPACES.sub(" ", value.translate(_TRANSLATE).lower()).strip()
+
+
+def _sql_normalize(column: str) -> str:
+    """Nested replace() chain equivalent to normalize_name (minus whitespace collapse)."""
+    expr = f"lower(coalesce({column}, ''))"
+    for ch in _STRIP_CHARS:
+        expr = f"replace({expr}, '{ch}', '')"
+    for src, dst in _FOLD_CHARS.items():
+        expr = f"replace({expr}, '{src}', '{dst}')"
+    return f"trim({expr})"
+
+
+def _ddl() -> list[str]:
+    norm_new = _sql_normalize("new.full_name")
+    return [
+        f"CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} "
+        f"USING fts5(name_norm, tokenize='trigram')",
+        f"""CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_ai AFTER INSERT ON patients BEGIN
+              INSERT INTO {FTS_TABLE}(rowid, name_norm) VALUES (new.id, {norm_new});
+            END""",
+        f"""CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_au AFTER UPDATE OF full_name ON patients BEGIN
+              DELETE FROM {FTS_TABLE} WHERE rowid = old.id;
+              INSERT INTO {FTS_TABLE}(rowid, name_norm) VALUES (new.id, {norm_new});
+            END""",
+        f"""CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_ad AFTER DELETE ON patients BEGIN
+              DELETE FROM {FTS_TABLE} WHERE rowid = old.id;
+            END""",
+    ]
+
+
+def ensure_patient_search_index(target_engine) -> bool:
+    """Create the FTS table + triggers and backfill if out of step. Idempotent."""
+    try:
+        with target_engine.begin() as conn:
+            for stmt in _ddl():
+                conn.execute(text(stmt))
+            indexed = conn.execute(text(f"SELECT count(*) FROM {FTS_TABLE}")).scalar()
+            total = conn.execute(text("SELECT count(*) FROM patients")).scalar()
+            if indexed != total:
+                conn.execute(text(f"DELETE FROM {FTS_TABLE}"))
+                conn.execute(text(
+                    f"INSERT INTO {FTS_TABLE}(rowid, name_norm) "
+                    f"SELECT id, {_sql_normalize('full_name')} FROM patients"
+                ))
+                logger.info(f"[db] patient search index rebuilt: {total} names")
+        _ready.pop(target_engine, None)
+        return True
+    except Exception as exc:
+        logger.warning(f"⚠️ Patient FTS index unavailable, falling back to LIKE: {exc}")
+        return False
+
+
+# engine → هل جدول FTS موجود (يُفحص مرة لكل engine)
+_ready: "weakref.WeakKeyDictionary" = weakref.WeakKeyDictionary()
+
+
+def _index_ready(session) -> bool:
+    bind = session.get_bind()
+    engine = getattr(bind, "engine", bind)
+    ready = _ready.get(engine)
+    if ready is None:
+        ready = session.execute(
+            text("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = :n"),
+            {"n": FTS_TABLE},
+        ).first() is not None
+        _ready[engine] = ready
+    return ready
+
+
+def _like_escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+
+
+def _fts_phrase(value: str) -> str:
+    return '"' + value.replace('"', '""') + '"'
+
+
+def search_patient_ids(session, query: str, limit: int = 50) -> list[int] | None:
+    """
+    Patient ids whose normalized name contains every word of `query`, best first:
+    name starts with the query → a word starts with it → anywhere; shorter
+    (then alphabetical) names first inside each tier.
+
+    Returns None when the index is unavailable (caller falls back to LIKE).
+    """
+    q = normalize_name(query)
+    if not q:
+        return []
+    if not _index_ready(session):
+        return None
+
+    words = q.split(" ")
+    long_words = [w for w in words if len(w) >= 3]
+    # كلمات < 3 أحرف لا تُفهرَس كـtrigram — تُطابَق بـLIKE على نفس الجدول
+    short_words = [w for w in words if len(w) < 3]
+
+    params: dict = {
+        "prefix": f"{_like_escape(q)}%",
+        "word_prefix": f"% {_like_escape(q)}%",
+    }
+    where = []
+    if long_words:
+        params["match"] = " AND ".join(_fts_phrase(w) for w in long_words)
+        where.append(f"{FTS_TABLE} MATCH :match")
+    for i, w in enumerate(short_words):
+        params[f"w{i}"] = f"%{_like_escape(w)}%"
+        where.append(f"name_norm LIKE :w{i} ESCAPE '\\'")
+
+    is_prefix = "name_norm LIKE :prefix ESCAPE '\\'"
+    starts = f"({is_prefix} OR name_norm LIKE :word_prefix ESCAPE '\\')"
+
+    # الطبقة الأولى: الاسم أو إحدى كلماته يبدأ بالنص كاملاً — النص كله
+    # (بمسافاته) عبارة trigram واحدة تضيّق المرشحين كثيراً.
+    if len(q) >= 3:
+        params["phrase"] = _fts_phrase(q)
+        first = [f"{FTS_TABLE} MATCH :phrase", starts]
+    else:
+        first = where + [starts]
+
+    # ترتيب كل التطابقات دفعة واحدة يكلّف مع الأسماء الشائعة ("محمد" قد يطابق
+    # آلاف الصفوف) — فكل طبقة تتوقف عند LIMIT (الأحدث أولاً، rowid DESC
+    # يخدمه FTS5 بلا فرز) ولا تُفرَز إلا الصفوف المُعادة.
+    ids: list[int] = []
+    for conditions in (first, where + [f"NOT {starts}"]):
+        remaining = limit - len(ids)
+        if remaining <= 0:
+            break
+        sql = (
+            f"SELECT rowid, name_norm, {is_prefix} FROM {FTS_TABLE} "
+            f"WHERE {' AND '.join(conditions)} "
+            f"ORDER BY rowid DESC LIMIT {int(remaining)}"
+        )
+        rows = session.execute(text(sql), params).all()
+        rows.sort(key=lambda r: (not r[2], len(r[1]), r[1]))
+        ids.extend(r[0] for r in rows)
+    return ids
+
+
+def patients_in_order(session, ids: list[int]) -> list:
+    """Patient rows for `ids`, in the same (ranked) order."""
+    if not ids:
+        return []
+    from db.models import Patient
+
+    by_id = {p.id: p for p in session.query(Patient).filter(Patient.id.in_(ids)).all()}
+    return [by_id[i] for i in ids if i in by_id]
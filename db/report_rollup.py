@@ -0,0 +1,207 @@
+# ================================================
+# db/report_rollup.py
+# 🔹 Daily rollup of active reports (translator / hospital statistics)
+# ================================================
+#
+# إحصائيات المترجمين (services/stats_service.py) كانت تمسح جدول reports
+# كاملاً بتعابير datetime(created_at, '+5 hours', '+30 minutes') وشروط OR
+# لا يخدمها أي فهرس — أربعة استعلامات لكل نداء، ولكل مترجم في التقييم الشهري.
+#
+# هنا جدول مُجمَّع مسبقاً، صف لكل:
+#   (event_day, ist_day, translator_id, translator_name, medical_action, hospital_id)
+# حيث
+#   event_day = DATE(COALESCE(report_date, created_at))   — يوم التقرير
+#   ist_day   = DATE(created_at + 5:30)                  — يوم الرفع بتوقيت IST
+# والقيم: report_count, late_count, paper_yes, paper_no, paper_pending.
+#
+# المفتاحان اليوميان معاً يحفظان تعريف stats_service حرفياً: التقرير يدخل
+# الفترة إن وقع أيٌّ منهما فيها، ويوم الحضور = ist_day (أو event_day إن غاب
+# created_at). الحالة 'active' فقط.
+#
+# Triggers على reports (إدراج/تعديل/حذف) تُحدِّث الصف المعني بـ±1 داخل نفس
+# المعاملة — من أي مسار كتابة. rebuild_report_rollup() يعيد بناءه من الصفر،
+# و scripts/check_report_rollup.py يقارنه بالمسح الخام.
+#
+# المفاتيح NOT NULL (المفتاح الأساسي لا يطابق NULL مع NULL): '' للأيام و 0
+# للأرقام بدل NULL. اسم المترجم NULL يُخزَّن NO_NAME لأن stats_service يميّز
+# بين الاسم الفارغ '' والاسم الغائب.
+
+import logging
+import re
+import weakref
+
+from sqlalchemy import text
+
+logger = logging.getLogger(__name__)
+
+ROLLUP_TABLE = "report_daily_rollup"
+
+# translator_name IS NULL في reports (يختلف عن '') — NULLIF(m.translator_name, NO_NAME) يعيده
+NO_NAME = "\u2400"
+
+# ساعة «وقت التقرير» 0–23 بالـ IST — «متأخر» إن كانت >= 20. نفس ترتيب
+# services/stats_service._effective_ist_hour_for_late: ساعة report_date، ثم
+# visit_time، ثم created_at بعد التحويل إلى IST. الاسم المستعار للصف: r.
+EFF_HOUR_IST_FOR_LATE_SQL = """(
+    CASE
+        WHEN r.report_date IS NOT NULL AND (
+             CAST(strftime('%H', r.report_date) AS INTEGER) != 0
+             OR CAST(strftime('%M', r.report_date) AS INTEGER) != 0
+        )
+        THEN CAST(strftime('%H', r.report_date) AS INTEGER)
+        WHEN r.visit_time IS NOT NULL AND length(trim(r.visit_time)) >= 3
+             AND instr(trim(r.visit_time), ':') > 0
+        THEN (
+            CASE
+                WHEN (
+                    lower(trim(r.visit_time)) LIKE '%pm%'
+                    OR trim(r.visit_time) LIKE '%مساء%'
+                )
+                AND CAST(substr(trim(r.visit_time), 1, instr(trim(r.visit_time), ':') - 1) AS INTEGER) < 12
+                THEN CAST(substr(trim(r.visit_time), 1, instr(trim(r.visit_time), ':') - 1) AS INTEGER) + 12
+
+                WHEN (
+                    lower(trim(r.visit_time)) LIKE '%am%'
+                    OR trim(r.visit_time) LIKE '%صباح%'
+                )
+                AND CAST(substr(trim(r.visit_time), 1, instr(trim(r.visit_time), ':') - 1) AS INTEGER) = 12
+                THEN 0
+
+                ELSE CAST(substr(trim(r.visit_time), 1, instr(trim(r.visit_time), ':') - 1) AS INTEGER)
+            END
+        )
+        ELSE CAST(strftime('%H', datetime(r.created_at, '+5 hours', '+30 minutes')) AS INTEGER)
+    END
+)"""
+
+_KEY_COLUMNS = ("event_day", "ist_day", "translator_id", "translator_name", "medical_action", "hospital_id")
+_VALUE_COLUMNS = ("report_count", "late_count", "paper_yes", "paper_no", "paper_pending")
+
+
+def _key_exprs(row: str) -> list[str]:
+    return [
+        f"coalesce(DATE(coalesce({row}.report_date, {row}.created_at)), '')",
+        f"coalesce(DATE(datetime({row}.created_at, '+5 hours', '+30 minutes')), '')",
+        f"coalesce({row}.translator_id, 0)",
+        f"coalesce({row}.translator_name, '{NO_NAME}')",
+        f"coalesce({row}.medical_action, 'أخرى')",
+        f"coalesce({row}.hospital_id, 0)",
+    ]
+
+
+def _value_exprs(row: str, sign: int) -> list[str]:
+    late = re.sub(r"\br\.", f"{row}.", EFF_HOUR_IST_FOR_LATE_SQL)
+    return [
+        f"{sign}",
+        f"(CASE WHEN {late} >= 20 THEN {sign} ELSE 0 END)",
+        f"(CASE WHEN {row}.has_paper_report = 1 THEN {sign} ELSE 0 END)",
+        f"(CASE WHEN {row}.has_paper_report = 0 THEN {sign} ELSE 0 END)",
+        f"(CASE WHEN {row}.has_paper_report = 2 THEN {sign} ELSE 0 END)",
+    ]
+
+
+def _apply(row: str, sign: int) -> str:
+    """INSERT … ON CONFLICT DO UPDATE: يضيف (sign=+1) أو يطرح (sign=-1) تقرير row."""
+    cols = ", ".join(_KEY_COLUMNS + _VALUE_COLUMNS)
+    exprs = ", ".join(_key_exprs(row) + _value_exprs(row, sign))
+    updates = ", ".join(f"{c} = {c} + excluded.{c}" for c in _VALUE_COLUMNS)
+    return (
+        f"INSERT INTO {ROLLUP_TABLE} ({cols}) SELECT {exprs} "
+        f"WHERE {row}.status = 'active' "
+        f"ON CONFLICT({', '.join(_KEY_COLUMNS)}) DO UPDATE SET {updates};"
+    )
+
+
+# الأعمدة التي تغيّر مفتاح الصف أو قيمه — أي تعديل آخر (ملاحظات، نص...) لا يلمس الجدول
+_TRACKED = (
+    "status", "report_date", "created_at", "translator_id", "translator_name",
+    "medical_action", "hospital_id", "visit_time", "has_paper_report",
+)
+
+
+def _ddl() -> list[str]:
+    return [
+        f"""CREATE TABLE IF NOT EXISTS {ROLLUP_TABLE} (
+              event_day TEXT NOT NULL,
+              ist_day TEXT NOT NULL,
+              translator_id INTEGER NOT NULL,
+              translator_name TEXT NOT NULL,
+              medical_action TEXT NOT NULL,
+              hospital_id INTEGER NOT NULL,
+              report_count INTEGER NOT NULL DEFAULT 0,
+              late_count INTEGER NOT NULL DEFAULT 0,
+              paper_yes INTEGER NOT NULL DEFAULT 0,
+              paper_no INTEGER NOT NULL DEFAULT 0,
+              paper_pending INTEGER NOT NULL DEFAULT 0,
+              PRIMARY KEY ({', '.join(_KEY_COLUMNS)})
+            )""",
+        f"CREATE INDEX IF NOT EXISTS ix_{ROLLUP_TABLE}_ist_day ON {ROLLUP_TABLE} (ist_day)",
+        f"""CREATE TRIGGER IF NOT EXISTS {ROLLUP_TABLE}_ai AFTER INSERT ON reports BEGIN
+              {_apply('new', 1)}
+            END""",
+        f"""CREATE TRIGGER IF NOT EXISTS {ROLLUP_TABLE}_au AFTER UPDATE OF {', '.join(_TRACKED)} ON reports BEGIN
+              {_apply('old', -1)}
+              {_apply('new', 1)}
+            END""",
+        f"""CREATE TRIGGER IF NOT EXISTS {ROLLUP_TABLE}_ad AFTER DELETE ON reports BEGIN
+              {_apply('old', -1)}
+            END""",
+    ]
+
+
+def _rebuild(conn) -> int:
+    keys = _key_exprs("r")
+    values = _value_exprs("r", 1)
+    conn.execute(text(f"DELETE FROM {ROLLUP_TABLE}"))
+    conn.execute(text(
+        f"INSERT INTO {ROLLUP_TABLE} ({', '.join(_KEY_COLUMNS + _VALUE_COLUMNS)}) "
+        f"SELECT {', '.join(keys)}, {', '.join(f'SUM({v})' for v in values)} "
+        f"FROM reports r WHERE r.status = 'active' "
+        f"GROUP BY {', '.join(keys)}"
+    ))
+    return conn.execute(text(f"SELECT coalesce(SUM(report_count), 0) FROM {ROLLUP_TABLE}")).scalar()
+
+
+def rebuild_report_rollup(target_engine) -> int:
+    """Recompute the whole rollup from reports. Returns the number of active reports."""
+    with target_engine.begin() as conn:
+        total = _rebuild(conn)
+    logger.info(f"[db] report rollup rebuilt: {total} active reports")
+    return total
+
+
+def ensure_report_rollup(target_engine) -> bool:
+    """Create the rollup table + triggers and rebuild if out of step. Idempotent."""
+    try:
+        with target_engine.begin() as conn:
+            for stmt in _ddl():
+                conn.execute(text(stmt))
+            rolled = conn.execute(
+                text(f"SELECT coalesce(SUM(report_count), 0) FROM {ROLLUP_TABLE}")
+            ).scalar()
+            active = conn.execute(text("SELECT count(*) FROM reports WHERE status = 'active'")).scalar()
+            if rolled != active:
+                _rebuild(conn)
+                logger.info(f"[db] report rollup rebuilt: {active} active reports")
+        _ready.pop(target_engine, None)
+        return True
+    except Exception as exc:
+        logger.warning(f"⚠️ Report rollup unavailable, stats fall back to the raw scan: {exc}")
+        return False
+
+
+# engine → هل جدول الـrollup موجود (يُفحص مرة لكل engine)
+_ready: "weakref.WeakKeyDictionary" = weakref.WeakKeyDictionary()
+
+
+def rollup_ready(session) -> bool:
+    bind = session.get_bind()
+    engine = getattr(bind, "engine", bind)
+    ready = _ready.get(engine)
+    if ready is None:
+        ready = session.execute(
+            text("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = :n"),
+            {"n": ROLLUP_TABLE},
+        ).first() is not None
+        _ready[engine] = ready
+    return ready
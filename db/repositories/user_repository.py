@@ -161,6 +161,9 @@ class UserRepository:
                 user.updated_at = datetime.utcnow()
                 
                 db.commit()
+                if "is_approved" in update_data or "is_suspended" in update_data:
+                    from core.access.permission_snapshot import set_user_access_state
+                    set_user_access_state(tg_user_id, None)
                 logger.info(f"✅ User updated: {tg_user_id}")
                 return True
                 
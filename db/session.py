@@ -69,6 +69,48 @@ SessionLocal = sessionmaker(
 )
 
 
+# 📖 Read-only pool — اتصالات query_only منفصلة عن مسار الكتابة.
+# في WAL لا يحجب القارئ الكاتب أبداً، لكن مشاركة pool واحد كانت تجعل
+# دفعات حفظ التقارير تنتظر اتصالاً حرّاً خلف استعلامات البحث والإحصاءات.
+# أي كتابة عبر هذه الجلسات تفشل فوراً ("attempt to write a readonly
+# database") بدل أن تتنافس على قفل الكتابة بصمت. الكتابات تمرّ عبر
+# db/write_queue.py (كاتب واحد متسلسل).
+READ_POOL_SIZE = int(os.getenv("DB_READ_POOL_SIZE", "5"))
+
+read_engine = create_engine(
+    DATABASE_URL,
+    echo=False,
+    connect_args={
+        "check_same_thread": False,
+        "timeout": 30,
+        "isolation_level": None
+    },
+    pool_pre_ping=True,
+    pool_recycle=600,
+    pool_size=READ_POOL_SIZE,
+    max_overflow=READ_POOL_SIZE,
+    pool_timeout=20,
+)
+
+
+@event.listens_for(read_engine, "connect")
+def _set_sqlite_read_pragmas(dbapi_connection, connection_record):
+    """Same PRAGMAs as the main pool, plus query_only for every reader."""
+    _set_sqlite_pragmas(dbapi_connection, connection_record)
+    cursor = dbapi_connection.cursor()
+    try:
+        cursor.execute("PRAGMA query_only=ON")
+    finally:
+        cursor.close()
+
+
+ReadSessionLocal = sessionmaker(
+    autocommit=False,
+    autoflush=False,
+    bind=read_engine
+)
+
+
 def _table_exists(conn, table_name: str) -> bool:
     row = conn.execute(
         text("SELECT 1 FROM sqlite_master WHERE type='table' AND name=:name"),
@@ -94,6 +136,47 @@ def _add_column_if_missing(conn, table_name: str, columns: set[str], column_name
     logger.info(f"[db] added column {table_name}.{column_name}")
 
 
+# reports.ist_day — نفس تعريف يوم الحضور في services/stats_service
+def _report_ist_day_sql(row: str) -> str:
+    return (
+        f"DATE(COALESCE(datetime({row}.created_at, '+5 hours', '+30 minutes'), {row}.report_date))"
+    )
+
+
+def _ensure_report_ist_day(conn) -> None:
+    """reports.ist_day: العمود، triggers الإدراج/التعديل، ملء القديم، والفهارس المركّبة."""
+    rep_cols = _table_columns(conn, "reports")
+    _add_column_if_missing(conn, "reports", rep_cols, "ist_day", "VARCHAR(10)")
+
+    for name, event in (
+        ("reports_ist_day_ai", "AFTER INSERT ON reports"),
+        ("reports_ist_day_au", "AFTER UPDATE OF created_at, report_date ON reports"),
+    ):
+        conn.execute(text(f"""
+            CREATE TRIGGER IF NOT EXISTS {name} {event}
+            WHEN new.ist_day IS NOT {_report_ist_day_sql('new')}
+            BEGIN
+                UPDATE reports SET ist_day = {_report_ist_day_sql('new')} WHERE id = new.id;
+            END
+        """))
+
+    filled = conn.execute(text(
+        f"UPDATE reports SET ist_day = {_report_ist_day_sql('reports')} "
+        f"WHERE ist_day IS NULL AND (created_at IS NOT NULL OR report_date IS NOT NULL)"
+    )).rowcount
+    if filled:
+        logger.info(f"[db] backfilled reports.ist_day for {filled} rows")
+
+    for ddl in (
+        "CREATE INDEX IF NOT EXISTS ix_reports_status_ist_day_translator ON reports (status, ist_day, translator_id)",
+        "CREATE INDEX IF NOT EXISTS ix_reports_patient_report_date ON reports (patient_id, report_date)",
+        "CREATE INDEX IF NOT EXISTS ix_reports_app_reschedule_return_date ON reports (app_reschedule_return_date)",
+        "CREATE INDEX IF NOT EXISTS ix_reports_radiology_delivery_date ON reports (radiology_delivery_date)",
+        "CREATE INDEX IF NOT EXISTS ix_reports_radiation_therapy_return_date ON reports (radiation_therapy_return_date)",
+    ):
+        conn.execute(text(ddl))
+
+
 def _ensure_schema_compatibility(target_engine=None) -> None:
     """
     Idempotent SQLite compatibility migration for older production databases.
@@ -108,11 +191,20 @@ def _ensure_schema_compatibility(target_engine=None) -> None:
         • gs_arrival_patients
         • gs_departure_records
         • gs_arrival_companions (residency fields)
+        • reports (ist_day column + triggers, composite date indexes)
 
     Phase 2 — translator link (optional, only when translators table exists):
         • link legacy translator rows to the users table.
+
+    The patient name FTS index (db/patient_search.py) and the daily report
+    rollup (db/report_rollup.py) are ensured first, each in its own
+    transaction, so the early returns below never skip them.
     """
     target_engine = target_engine or engine
+    from db.patient_search import ensure_patient_search_index
+    from db.report_rollup import ensure_report_rollup
+    ensure_patient_search_index(target_engine)
+    ensure_report_rollup(target_engine)
     try:
         logger.info("[db] schema compatibility check started")
         with target_engine.begin() as conn:
@@ -231,6 +323,14 @@ def _ensure_schema_compatibility(target_engine=None) -> None:
                 _add_column_if_missing(conn, "pharmacy_financial_records", pfr_cols, "is_deleted", "BOOLEAN DEFAULT 0")
                 _add_column_if_missing(conn, "pharmacy_financial_records", pfr_cols, "deleted_by", "INTEGER")
                 _add_column_if_missing(conn, "pharmacy_financial_records", pfr_cols, "deleted_at", "DATETIME")
+                conn.execute(text(
+                    "CREATE INDEX IF NOT EXISTS ix_pharmacy_financial_source "
+                    "ON pharmacy_financial_records (source_type, source_record_id)"
+                ))
+
+            # ── Phase 1g: reports — يوم الرفع IST مخزَّن ومفهرس ───────────────
+            if _table_exists(conn, "reports"):
+                _ensure_report_ist_day(conn)
 
             # ── Phase 2: translator link (optional) ───────────────────────────
             # This block is entirely optional — it only runs when the legacy
@@ -407,6 +507,22 @@ def get_db() -> Generator[Session, None, None]:
         session.close()
 
 
+@contextmanager
+def get_read_db() -> Generator[Session, None, None]:
+    """
+    Read-only session from the query_only pool
+
+    Usage:
+        with get_read_db() as db:
+            rows = db.query(Patient.id, Patient.full_name).all()
+    """
+    session = ReadSessionLocal()
+    try:
+        yield session
+    finally:
+        session.close()
+
+
 def get_session() -> Session:
     """
     Get a new database session
@@ -480,6 +596,7 @@ def close_connection():
     """
     try:
         engine.dispose()
+        read_engine.dispose()
         logger.info("✅ Database connection pool closed")
     except Exception as e:
         logger.error(f"❌ Error closing database: {e}")
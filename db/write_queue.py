@@ -0,0 +1,279 @@
+# ================================================
+# db/write_queue.py
+# 🔹 Single serialized SQLite writer with group commit
+# ================================================
+#
+# SQLite يسمح بكاتب واحد فقط في أي لحظة (قفل WAL). حين تتزامن دفعات حفظ
+# التقارير ومنح الصلاحيات وتتبّع النشاط، كل منها يفتح جلسة ويحاول الكتابة
+# بنفسه فتتنافس على القفل، ويظهر أحياناً "database is locked" بعد
+# busy_timeout. هنا تمرّ كل الكتابات عبر مسار واحد متسلسل:
+#
+#   • write(fn, *args)        → متزامن: ينتظر التنفيذ ويُرجع نتيجة fn
+#   • await run_write(fn, ...) → نفس write لكن على خيط قاعدة البيانات
+#   • enqueue(fn, *args)      → إطلاق وتجاهل: يُنفَّذ في الدفعة التالية
+#   • write_queue_stats()     → عمق الطابور، حجم الدفعات، زمن الـcommit
+#
+# Group commit: كل الطلبات المنتظرة لحظة الكتابة تُنفَّذ في معاملة واحدة
+# (BEGIN IMMEDIATE … COMMIT)، كل طلب داخل SAVEPOINT خاص به — فشل طلب
+# واحد يتراجع عن نفسه فقط ولا يُسقط بقية الدفعة. قفل كتابة واحد و commit
+# واحد لعدة كتابات صغيرة يُبقيان الإنتاجية ثابتة مع زيادة عدد المترجمين،
+# ولا يبقى داخل العملية من يتنافس على قفل WAL أصلاً.
+#
+# كل fn تستقبل الجلسة كأول وسيط ولا تستدعي commit بنفسها:
+#
+#     def _save_tx(session, report_id, msg_id):
+#         session.query(Report).filter_by(id=report_id).update({...})
+#
+#     write(_save_tx, report_id, msg_id)
+
+import logging
+import os
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future
+from typing import Any, Callable, Optional, TypeVar
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+# أقصى عدد طلبات في معاملة واحدة
+WRITE_MAX_BATCH = int(os.getenv("DB_WRITE_MAX_BATCH", "64"))
+
+# فترة الدفع الخلفي لطلبات enqueue (ثوانٍ)
+WRITE_FLUSH_INTERVAL = float(os.getenv("DB_WRITE_FLUSH_INTERVAL", "0.05"))
+
+
+def _session_factory():
+    """SessionLocal resolved at call time so engine overrides (tests/scripts) apply."""
+    from db import session as _db_session
+    return _db_session.SessionLocal()
+
+
+class _Job:
+    __slots__ = ("fn", "args", "kwargs", "future", "queued_at")
+
+    def __init__(self, fn, args, kwargs):
+        self.fn = fn
+        self.args = args
+        self.kwargs = kwargs
+        self.future: Future = Future()
+        self.queued_at = time.perf_counter()
+
+
+class SingleWriter:
+    """Serialize all writes through one committer, batching whatever is queued."""
+
+    def __init__(self, max_batch: int = WRITE_MAX_BATCH, flush_interval: float = WRITE_FLUSH_INTERVAL):
+        self.max_batch = max(1, max_batch)
+        self.flush_interval = flush_interval
+        self._pending: deque = deque()
+        self._cond = threading.Condition()
+        self._commit_lock = threading.Lock()
+        self._flusher: Optional[threading.Thread] = None
+        self._stopping = False
+
+        self._stats_lock = threading.Lock()
+        self._stats = {
+            "jobs": 0,
+            "failed_jobs": 0,
+            "batches": 0,
+            "failed_batches": 0,
+            "max_queue_depth": 0,
+        }
+        self._commit_samples: deque = deque(maxlen=1000)
+        self._wait_samples: deque = deque(maxlen=1000)
+        self._batch_sizes: deque = deque(maxlen=1000)
+
+    # ── Submission ────────────────────────────────────────────────────────
+
+    def _submit(self, fn, args, kwargs) -> _Job:
+        job = _Job(fn, args, kwargs)
+        with self._cond:
+            self._pending.append(job)
+            depth = len(self._pending)
+            self._cond.notify()
+        with self._stats_lock:
+            if depth > self._stats["max_queue_depth"]:
+                self._stats["max_queue_depth"] = depth
+        return job
+
+    def write(self, fn: Callable[..., T], *args: Any, **kwargs: Any) -> T:
+        """Run ``fn(session, *args, **kwargs)`` in the next batch and return its result."""
+        job = self._submit(fn, args, kwargs)
+        # الطالب نفسه يصبح "القائد" إن كان القفل حرّاً وينفّذ كل ما ينتظر؛
+        # وإلا ينتظر القائد الحالي الذي غالباً سيحمل طلبه ضمن دفعته.
+        while not job.future.done():
+            if self._commit_lock.acquire(timeout=0.05):
+                try:
+                    self._run_batch()
+                finally:
+                    self._commit_lock.release()
+        return job.future.result()
+
+    def enqueue(self, fn: Callable[..., Any], *args: Any, **kwargs: Any) -> Future:
+        """Fire-and-forget write, committed by the background flusher."""
+        job = self._submit(fn, args, kwargs)
+        self._ensure_flusher()
+        return job.future
+
+    def flush(self) -> None:
+        """Commit everything queued so far (blocking). Call at shutdown."""
+        while True:
+            with self._cond:
+                if not self._pending:
+                    return
+            with self._commit_lock:
+                self._run_batch()
+
+    # ── Batch execution ───────────────────────────────────────────────────
+
+    def _take_batch(self) -> list:
+        with self._cond:
+            n = min(self.max_batch, len(self._pending))
+            return [self._pending.popleft() for _ in range(n)]
+
+    def _run_batch(self) -> None:
+        """Caller must hold _commit_lock."""
+        jobs = self._take_batch()
+        if not jobs:
+            return
+
+        started = time.perf_counter()
+        outcomes = []
+        session = _session_factory()
+        try:
+            # BEGIN IMMEDIATE يحجز قفل الكتابة من البداية — لا "upgrade" لاحق
+            # يفشل بـSQLITE_BUSY في منتصف الدفعة.
+            session.connection().exec_driver_sql("BEGIN IMMEDIATE")
+            if len(jobs) == 1:
+                # طلب وحيد: لا حاجة لـSAVEPOINT — فشله يتراجع عن المعاملة كلها
+                job = jobs[0]
+                try:
+                    result = job.fn(session, *job.args, **job.kwargs)
+                    session.flush()
+                    outcomes.append((job, result, None))
+                except Exception as exc:
+                    session.rollback()
+                    outcomes.append((job, None, exc))
+            else:
+                for job in jobs:
+                    try:
+                        with session.begin_nested():
+                            result = job.fn(session, *job.args, **job.kwargs)
+                        outcomes.append((job, result, None))
+                    except Exception as exc:
+                        outcomes.append((job, None, exc))
+            if session.in_transaction():
+                session.commit()
+        except Exception as exc:
+            logger.error(f"❌ [write-queue] batch of {len(jobs)} failed to commit: {exc}", exc_info=True)
+            try:
+                session.rollback()
+            except Exception:
+                logger.debug("تم تجاهل استثناء في _run_batch", exc_info=True)
+            outcomes = [(job, None, exc) for job in jobs]
+            with self._stats_lock:
+                self._stats["failed_batches"] += 1
+        finally:
+            session.close()
+
+        elapsed = time.perf_counter() - started
+        failed = 0
+        for job, result, exc in outcomes:
+            if exc is None:
+                job.future.set_result(result)
+            else:
+                failed += 1
+                job.future.set_exception(exc)
+        with self._stats_lock:
+            self._stats["jobs"] += len(jobs)
+            self._stats["failed_jobs"] += failed
+            self._stats["batches"] += 1
+            self._commit_samples.append(elapsed)
+            self._batch_sizes.append(len(jobs))
+            for job in jobs:
+                self._wait_samples.append(started - job.queued_at)
+
+    # ── Background flusher (enqueue) ──────────────────────────────────────
+
+    def _ensure_flusher(self) -> None:
+        if self._flusher is not None and self._flusher.is_alive():
+            return
+        with self._cond:
+            if self._flusher is not None and self._flusher.is_alive():
+                return
+            self._stopping = False
+            self._flusher = threading.Thread(
+                target=self._flush_loop, name="db-writer", daemon=True
+            )
+            self._flusher.start()
+
+    def _flush_loop(self) -> None:
+        while True:
+            with self._cond:
+                while not self._pending and not self._stopping:
+                    self._cond.wait()
+                if self._stopping and not self._pending:
+                    return
+            # نافذة قصيرة لتجميع الكتابات المتلاحقة في دفعة واحدة
+            time.sleep(self.flush_interval)
+            try:
+                with self._commit_lock:
+                    self._run_batch()
+            except Exception:
+                logger.error("❌ [write-queue] flusher error", exc_info=True)
+
+    def shutdown(self) -> None:
+        """Flush pending writes and stop the background flusher."""
+        self.flush()
+        with self._cond:
+            self._stopping = True
+            self._cond.notify_all()
+        if self._flusher is not None:
+            self._flusher.join(timeout=5)
+            self._flusher = None
+
+    # ── Metrics ───────────────────────────────────────────────────────────
+
+    def stats(self) -> dict:
+        from db.async_session import _percentile
+
+        with self._stats_lock:
+            stats = dict(self._stats)
+            commits = list(self._commit_samples)
+            waits = list(self._wait_samples)
+            sizes = list(self._batch_sizes)
+        with self._cond:
+            stats["queue_depth"] = len(self._pending)
+        stats.update({
+            "avg_batch_size": (sum(sizes) / len(sizes)) if sizes else 0.0,
+            "commit_p50_ms": _percentile(commits, 50) * 1000,
+            "commit_p99_ms": _percentile(commits, 99) * 1000,
+            "queue_wait_p99_ms": _percentile(waits, 99) * 1000,
+        })
+        return stats
+
+
+writer = SingleWriter()
+
+
+def write(fn: Callable[..., T], *args: Any, **kwargs: Any) -> T:
+    """Blocking write through the single writer. See module docstring."""
+    return writer.write(fn, *args, **kwargs)
+
+
+async def run_write(fn: Callable[..., T], *args: Any, **kwargs: Any) -> T:
+    """Awaitable write — waits for the commit on the DB executor, not the loop."""
+    from db.async_session import run_db
+    return await run_db(writer.write, fn, *args, **kwargs)
+
+
+def enqueue(fn: Callable[..., Any], *args: Any, **kwargs: Any) -> Future:
+    """Fire-and-forget write, batched with whatever else is queued."""
+    return writer.enqueue(fn, *args, **kwargs)
+
+
+def write_queue_stats() -> dict:
+    return writer.stats()
@@ -1,4 +1,10 @@
 from .pipeline import run_pipeline, run_pipeline_async
 from .config import DEFAULT_CONFIG, PipelineConfig
+from .executor import PipelineBusy, pipeline_executor_stats, shutdown_pipeline_executor
+from .cache import attachment_cache_stats, run_pipeline_cached_async
 
-__all__ = ["run_pipeline", "run_pipeline_async", "DEFAULT_CONFIG", "PipelineConfig"]
+__all__ = [
+    "run_pipeline", "run_pipeline_async", "DEFAULT_CONFIG", "PipelineConfig",
+    "PipelineBusy", "pipeline_executor_stats", "shutdown_pipeline_executor",
+    "run_pipeline_cached_async", "attachment_cache_stats",
+]
@@ -0,0 +1,292 @@
+# image_pipeline/cache.py
+# Content-addressed disk cache for processed pages and assembled PDFs.
+#
+# Publishing (or re-publishing / editing) a report used to download every
+# Telegram photo again and run the full pipeline on it. Telegram's
+# file_unique_id is stable for the same file, so it identifies the input;
+# together with a hash of the pipeline config it identifies the output:
+#
+#   page  key = (file_unique_id, config hash)            → enhanced JPEG
+#   pdf   key = (file_unique_id₁…ₙ in order, config hash) → final PDF
+#
+# A PDF hit skips download, CV and assembly entirely; page hits skip
+# download + CV for those pages only. Entries are plain files under
+# ATTACHMENT_CACHE_DIR, evicted least-recently-used (by mtime, refreshed on
+# every hit) once the total exceeds ATTACHMENT_CACHE_MAX_MB.
+# Only results that really went through the pipeline are stored: a page
+# whose CV stage failed (original used as fallback) is not cached, nor is a
+# PDF containing such a page — the next publish retries the enhancement.
+#
+# Usage:
+#   pdf = await run_pipeline_cached_async(unique_ids, fetch_raw)
+#   attachment_cache_stats()    # hits / misses / hit rate / bytes / evictions
+
+import asyncio
+import dataclasses
+import hashlib
+import io
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Awaitable, Callable, List, Optional
+
+from .config import DEFAULT_CONFIG, PipelineConfig
+
+logger = logging.getLogger(__name__)
+
+_PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+ATTACHMENT_CACHE_DIR = os.getenv(
+    "ATTACHMENT_CACHE_DIR", os.path.join(_PROJECT_ROOT, "data", "attachment_cache")
+)
+ATTACHMENT_CACHE_MAX_MB = float(os.getenv("ATTACHMENT_CACHE_MAX_MB", "512"))
+
+# Bump when stage code changes in a way that alters output for the same config
+PIPELINE_CACHE_VERSION = 1
+
+
+def config_hash(cfg: PipelineConfig) -> str:
+    """Stable hash of everything that affects pipeline output (debug excluded)."""
+    parts = {
+        "version": PIPELINE_CACHE_VERSION,
+        **{
+            name: dataclasses.asdict(getattr(cfg, name))
+            for name in ("detector", "cropper", "corrector", "enhancer", "pdf")
+        },
+    }
+    return hashlib.sha256(repr(sorted(parts.items())).encode()).hexdigest()[:16]
+
+
+class AttachmentCache:
+    """Size-capped LRU of files on disk. Thread-safe; all methods are blocking."""
+
+    def __init__(self, root: str = ATTACHMENT_CACHE_DIR, max_bytes: Optional[int] = None):
+        self.root = root
+        self.max_bytes = int(ATTACHMENT_CACHE_MAX_MB * 1024 * 1024) if max_bytes is None else max_bytes
+        self._lock = threading.Lock()
+        self._index: Optional["OrderedDict[str, int]"] = None   # path → size, oldest first
+        self._total = 0
+        self._stats = {
+            "page_hits": 0, "page_misses": 0,
+            "pdf_hits": 0, "pdf_misses": 0,
+            "writes": 0, "evictions": 0,
+        }
+
+    # ── Keys ──────────────────────────────────────────────────────────────
+
+    def _path(self, kind: str, key: str, ext: str) -> str:
+        digest = hashlib.sha256(f"{kind}:{key}".encode()).hexdigest()
+        return os.path.join(self.root, kind, digest[:2], f"{digest[2:34]}.{ext}")
+
+    def page_path(self, unique_id: str, cfg_hash: str) -> str:
+        return self._path("pages", f"{cfg_hash}:{unique_id}", "jpg")
+
+    def pdf_path(self, unique_ids: List[str], cfg_hash: str) -> str:
+        return self._path("pdfs", f"{cfg_hash}:{'|'.join(unique_ids)}", "pdf")
+
+    # ── Index (lazy scan of the directory on first use) ───────────────────
+
+    def _ensure_index(self) -> "OrderedDict[str, int]":
+        if self._index is None:
+            entries = []
+            for dirpath, _, filenames in os.walk(self.root):
+                for name in filenames:
+                    if name.endswith(".tmp"):
+                        continue
+                    path = os.path.join(dirpath, name)
+                    try:
+                        st = os.stat(path)
+                    except OSError:
+                        continue
+                    entries.append((st.st_mtime, path, st.st_size))
+            entries.sort()
+            self._index = OrderedDict((path, size) for _, path, size in entries)
+            self._total = sum(self._index.values())
+        return self._index
+
+    # ── Get / put ─────────────────────────────────────────────────────────
+
+    def get(self, path: str, kind: str) -> Optional[bytes]:
+        with self._lock:
+            index = self._ensure_index()
+            if path not in index:
+                self._stats[f"{kind}_misses"] += 1
+                return None
+            try:
+                with open(path, "rb") as f:
+                    data = f.read()
+                os.utime(path)
+            except OSError:
+                # removed behind our back — treat as a miss
+                self._total -= index.pop(path, 0)
+                self._stats[f"{kind}_misses"] += 1
+                return None
+            index.move_to_end(path)
+            self._stats[f"{kind}_hits"] += 1
+            return data
+
+    def put(self, path: str, data: bytes) -> None:
+        if not data or len(data) > self.max_bytes:
+            return
+        with self._lock:
+            index = self._ensure_index()
+            try:
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                tmp = f"{path}.{threading.get_ident()}.tmp"
+                with open(tmp, "wb") as f:
+                    f.write(data)
+                os.replace(tmp, path)
+            except OSError as exc:
+                logger.warning(f"[cache] write failed {path}: {exc}")
+                return
+            self._total += len(data) - index.pop(path, 0)
+            index[path] = len(data)
+            self._stats["writes"] += 1
+            self._evict_locked(index)
+
+    def _evict_locked(self, index: "OrderedDict[str, int]") -> None:
+        while self._total > self.max_bytes and index:
+            path, size = index.popitem(last=False)
+            self._total -= size
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+            self._stats["evictions"] += 1
+
+    def clear(self) -> None:
+        with self._lock:
+            index = self._ensure_index()
+            for path in list(index):
+                try:
+                    os.remove(path)
+                except OSError:
+                    pass
+            index.clear()
+            self._total = 0
+
+    # ── Metrics ───────────────────────────────────────────────────────────
+
+    def stats(self) -> dict:
+        with self._lock:
+            s = dict(self._stats)
+            entries = len(self._index) if self._index is not None else None
+            total = self._total
+        page_lookups = s["page_hits"] + s["page_misses"]
+        pdf_lookups = s["pdf_hits"] + s["pdf_misses"]
+        s.update({
+            "page_hit_rate": s["page_hits"] / page_lookups if page_lookups else 0.0,
+            "pdf_hit_rate": s["pdf_hits"] / pdf_lookups if pdf_lookups else 0.0,
+            "entries": entries,
+            "bytes": total,
+            "max_bytes": self.max_bytes,
+        })
+        return s
+
+
+_cache: Optional[AttachmentCache] = None
+_cache_lock = threading.Lock()
+
+
+def get_attachment_cache() -> AttachmentCache:
+    global _cache
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                _cache = AttachmentCache()
+    return _cache
+
+
+def attachment_cache_stats() -> dict:
+    return get_attachment_cache().stats()
+
+
+async def run_pipeline_cached_async(
+    unique_ids: List[Optional[str]],
+    fetch_raw: Callable[[int], Awaitable[Optional[bytes]]],
+    config: Optional[PipelineConfig] = None,
+    job_id: Optional[str] = None,
+    cache: Optional[AttachmentCache] = None,
+    timings: Optional[dict] = None,
+) -> io.BytesIO:
+    """
+    run_pipeline_async with the cache in front.
+
+    unique_ids — Telegram file_unique_id per page (None = not cacheable)
+    fetch_raw  — awaitable(page_idx) → raw bytes; only called on a page miss.
+                 All misses are started at once (the fetcher bounds its own
+                 concurrency) and each page is enhanced as soon as it arrives.
+    timings    — optional dict filled with enhance_s, pdf_s, pages, page_hits
+
+    Raises like run_pipeline_async (the caller keeps its direct-conversion
+    fallback). Pages whose download fails are skipped, as before.
+    """
+    from .executor import get_pipeline_executor
+    from .stages.pdf_builder import build_pdf_from_jpegs
+
+    cfg = config or DEFAULT_CONFIG
+    cache = cache or get_attachment_cache()
+    cfg_hash = config_hash(cfg)
+    cacheable = bool(unique_ids) and all(unique_ids)
+
+    if cacheable:
+        pdf_path = cache.pdf_path(unique_ids, cfg_hash)
+        pdf_bytes = await asyncio.to_thread(cache.get, pdf_path, "pdf")
+        if pdf_bytes is not None:
+            logger.info(f"[cache] PDF hit  pages={len(unique_ids)}")
+            if timings is not None:
+                timings.update(pages=len(unique_ids), page_hits=len(unique_ids), pdf_hit=True)
+            return io.BytesIO(pdf_bytes)
+
+    def _page_path(idx: int) -> Optional[str]:
+        uid = unique_ids[idx]
+        return cache.page_path(uid, cfg_hash) if uid else None
+
+    pages: List[Optional[bytes]] = [None] * len(unique_ids)
+    missing: List[int] = []
+    for idx in range(len(unique_ids)):
+        path = _page_path(idx)
+        hit = await asyncio.to_thread(cache.get, path, "page") if path else None
+        if hit is not None:
+            pages[idx] = hit
+        else:
+            missing.append(idx)
+
+    timings = timings if timings is not None else {}
+    timings.update(pages=len(unique_ids), page_hits=len(unique_ids) - len(missing), enhance_s=0.0)
+    all_enhanced = True
+    if missing:
+        # التحميلات تبدأ الآن (قبل انتظار مقعد في الـpool)؛ كل صفحة تُعالَج فور وصولها
+        sources = [asyncio.ensure_future(fetch_raw(idx)) for idx in missing]
+        processed = await get_pipeline_executor().process_page_sources(sources, cfg, job_id, timings)
+        for idx, page in zip(missing, processed):
+            if page is None:
+                continue
+            jpeg, enhanced_ok = page
+            pages[idx] = jpeg
+            path = _page_path(idx)
+            # صفحة فشلت إحدى مراحلها (الأصل كبديل) تُستخدم الآن ولا تُخزَّن —
+            # وإلا صار فشل عابر دائماً لكل إعادة نشر
+            if enhanced_ok and path:
+                await asyncio.to_thread(cache.put, path, jpeg)
+            else:
+                all_enhanced = False
+
+    jpegs = [p for p in pages if p is not None]
+    if not jpegs:
+        raise RuntimeError("[pipeline] all pages failed — cannot generate PDF")
+
+    t0 = time.perf_counter()
+    pdf = build_pdf_from_jpegs(jpegs)
+    timings["pdf_s"] = time.perf_counter() - t0
+    # Only complete, fully enhanced PDFs are cached — a partial or fallback
+    # result must not be replayed
+    if cacheable and all_enhanced and len(jpegs) == len(unique_ids):
+        await asyncio.to_thread(cache.put, pdf_path, pdf.getvalue())
+    logger.info(
+        f"[pipeline] done (cached)  pages={len(jpegs)}  "
+        f"page_hits={len(unique_ids) - len(missing)}"
+    )
+    return pdf
@@ -72,5 +72,23 @@ class PipelineConfig:
     debug: DebugConfig = field(default_factory=DebugConfig)
 
 
+# ---------------------------------------------------------------------------
+# Process pool (executor.py) — process-wide, not per job
+# ---------------------------------------------------------------------------
+
+@dataclass
+class ExecutorConfig:
+    # Worker processes; each holds its own YOLO model (~150–250 MB with torch)
+    workers: int = int(os.getenv("IMAGE_PIPELINE_WORKERS", "2"))
+    # Jobs processed concurrently (pages of running jobs share the workers)
+    max_running_jobs: int = int(os.getenv("IMAGE_PIPELINE_MAX_JOBS", "2"))
+    # Jobs allowed to wait for a slot; beyond this run_pipeline_async raises
+    # PipelineBusy and the caller falls back to direct conversion
+    max_queued_jobs: int = int(os.getenv("IMAGE_PIPELINE_MAX_QUEUED", "8"))
+    # Load the YOLO model in each worker at start-up, not on the first page
+    warm_up_model: bool = True
+
+
 # Module-level singleton — import this everywhere
 DEFAULT_CONFIG = PipelineConfig()
+DEFAULT_EXECUTOR_CONFIG = ExecutorConfig()
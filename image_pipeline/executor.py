@@ -0,0 +1,315 @@
+# image_pipeline/executor.py
+# Dedicated process pool for run_pipeline_async.
+#
+# The old async wrapper pushed the whole job onto the default thread pool:
+# pages ran one after another, and OpenCV / YOLO / JPEG work competed with
+# SQLAlchemy for the same threads (and the GIL for the non-native parts).
+# Here:
+#   • a ProcessPoolExecutor sized by ExecutorConfig.workers (spawn context —
+#     no fork of a threaded bot process, OpenCV/torch are not fork-safe),
+#   • each worker warms up the YOLO model once at start (detector._get_model)
+#     and pins OpenCV to one thread so N workers ≈ N cores,
+#   • pages of a job are submitted individually and run in parallel; workers
+#     return encoded JPEG bytes (small) plus an enhanced_ok flag (False when
+#     a stage failed and the original was used), the PDF is assembled in the
+#     parent,
+#   • process_page_sources takes pages still being downloaded: each page goes
+#     to the pool as soon as its bytes arrive (CV overlaps the downloads),
+#   • at most max_running_jobs jobs run at once and at most max_queued_jobs
+#     wait — beyond that PipelineBusy is raised immediately (backpressure)
+#     instead of growing an unbounded backlog.
+#
+# Usage:
+#   pdf = await get_pipeline_executor().run([image_bytes, ...])
+#   pipeline_executor_stats()      # jobs, pages, rejected, p50/p95 latency
+
+import asyncio
+import inspect
+import io
+import logging
+import multiprocessing
+import threading
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Awaitable, List, Optional, Tuple, Union
+
+from .config import DEFAULT_CONFIG, DEFAULT_EXECUTOR_CONFIG, ExecutorConfig, PipelineConfig
+
+logger = logging.getLogger(__name__)
+
+
+class PipelineBusy(RuntimeError):
+    """Raised when the job queue is full — caller should fall back."""
+
+
+# ---------------------------------------------------------------------------
+# Worker side (runs in the child processes)
+# ---------------------------------------------------------------------------
+
+def _init_worker(detector_cfg, warm_up_model: bool) -> None:
+    try:
+        import cv2
+        cv2.setNumThreads(1)
+    except Exception:
+        logger.debug("تم تجاهل استثناء في _init_worker", exc_info=True)
+
+    if not (warm_up_model and detector_cfg.enabled):
+        return
+    try:
+        from .stages.detector import _get_model
+        _get_model(detector_cfg.model_path)
+        logger.info(f"[executor] worker ready  model={detector_cfg.model_path}")
+    except ImportError:
+        logger.info("[executor] worker ready  (ultralytics not installed — detector falls back)")
+    except Exception as exc:
+        logger.warning(f"[executor] model warm-up failed: {exc}")
+
+
+def _process_page_to_jpeg(
+    raw_bytes: bytes, cfg: PipelineConfig, job_id: str, page_idx: int
+) -> Optional[Tuple[bytes, bool]]:
+    from .pipeline import process_page_with_status
+    from .stages.pdf_builder import encode_page
+
+    img, enhanced_ok = process_page_with_status(raw_bytes, cfg, job_id, page_idx)
+    if img is None:
+        return None
+    return encode_page(img, cfg.pdf), enhanced_ok
+
+
+def _ping() -> bool:
+    return True
+
+
+# ---------------------------------------------------------------------------
+# Parent side
+# ---------------------------------------------------------------------------
+
+def _discard_sources(sources) -> None:
+    """Close coroutines / cancel futures of a refused job (no 'never awaited' leak)."""
+    for source in sources:
+        if inspect.iscoroutine(source):
+            source.close()
+        elif isinstance(source, asyncio.Future):
+            source.cancel()
+
+
+class PipelineExecutor:
+    """Process pool + bounded job admission for the image pipeline."""
+
+    def __init__(self, config: Optional[ExecutorConfig] = None):
+        self.config = config or DEFAULT_EXECUTOR_CONFIG
+        self._pool: Optional[ProcessPoolExecutor] = None
+        self._pool_lock = threading.Lock()
+        # asyncio.Semaphore is bound to one loop — recreated if the loop changes
+        self._slots: Optional[asyncio.Semaphore] = None
+        self._slots_loop = None
+        self._waiting = 0
+        self._running = 0
+
+        self._stats = {"jobs": 0, "pages": 0, "failed": 0, "rejected": 0, "pool_restarts": 0}
+        self._latency_samples: deque = deque(maxlen=1000)
+
+    # ── Pool lifecycle ────────────────────────────────────────────────────
+
+    def _get_pool(self, cfg: PipelineConfig) -> ProcessPoolExecutor:
+        if self._pool is None:
+            with self._pool_lock:
+                if self._pool is None:
+                    workers = max(1, self.config.workers)
+                    self._pool = ProcessPoolExecutor(
+                        max_workers=workers,
+                        mp_context=multiprocessing.get_context("spawn"),
+                        initializer=_init_worker,
+                        initargs=(cfg.detector, self.config.warm_up_model),
+                    )
+                    logger.info(f"[executor] process pool started with {workers} workers")
+        return self._pool
+
+    def warm_up(self, config: Optional[PipelineConfig] = None) -> None:
+        """Start every worker now (model load included) instead of on the first job."""
+        pool = self._get_pool(config or DEFAULT_CONFIG)
+        futures = [pool.submit(_ping) for _ in range(max(1, self.config.workers))]
+        for f in futures:
+            f.result()
+
+    def _reset_pool(self) -> None:
+        with self._pool_lock:
+            if self._pool is not None:
+                self._pool.shutdown(wait=False, cancel_futures=True)
+                self._pool = None
+                self._stats["pool_restarts"] += 1
+
+    def shutdown(self, wait: bool = True) -> None:
+        with self._pool_lock:
+            if self._pool is not None:
+                self._pool.shutdown(wait=wait, cancel_futures=True)
+                self._pool = None
+                logger.info("[executor] process pool stopped")
+
+    # ── Jobs ──────────────────────────────────────────────────────────────
+
+    def _get_slots(self) -> asyncio.Semaphore:
+        loop = asyncio.get_running_loop()
+        if self._slots is None or self._slots_loop is not loop:
+            self._slots = asyncio.Semaphore(max(1, self.config.max_running_jobs))
+            self._slots_loop = loop
+        return self._slots
+
+    async def process_pages(
+        self,
+        image_bytes_list: List[bytes],
+        config: Optional[PipelineConfig] = None,
+        job_id: Optional[str] = None,
+    ) -> List[Optional[bytes]]:
+        """
+        Stages 1–4 + JPEG encoding for each page, in parallel.
+        Returns one entry per input page: JPEG bytes, or None if undecodable.
+        Counts as one job for admission / backpressure.
+        """
+        pages = await self.process_page_sources(list(image_bytes_list), config, job_id)
+        return [p[0] if p is not None else None for p in pages]
+
+    async def process_page_sources(
+        self,
+        sources: List[Union[bytes, Awaitable[Optional[bytes]]]],
+        config: Optional[PipelineConfig] = None,
+        job_id: Optional[str] = None,
+        timings: Optional[dict] = None,
+    ) -> List[Optional[Tuple[bytes, bool]]]:
+        """
+        Like process_pages, but a page may be an awaitable (e.g. a download
+        still in flight): a page is submitted to the pool as soon as its bytes
+        arrive, so CV work overlaps the remaining downloads. Plain bytes are
+        used as they are. If the job is refused (PipelineBusy), pending
+        awaitables are closed / cancelled, never left dangling. Each entry is
+        (jpeg, enhanced_ok); a source that yields None (failed download) or
+        an undecodable page gives None.
+
+        timings, if given, receives enhance_s — wall time from the first page
+        submitted to the last page done.
+        """
+        from .pipeline import _ensure_debug_dir, _make_job_id
+
+        cfg = config or DEFAULT_CONFIG
+        job_id = job_id or _make_job_id()
+        slots = self._get_slots()
+
+        # Backpressure: the job is refused outright if too many are already waiting
+        if slots.locked() and self._waiting >= self.config.max_queued_jobs:
+            self._stats["rejected"] += 1
+            _discard_sources(sources)
+            raise PipelineBusy(
+                f"image pipeline busy ({self._running} running, {self._waiting} queued)"
+            )
+
+        submitted = time.perf_counter()
+        self._waiting += 1
+        try:
+            await slots.acquire()
+        finally:
+            self._waiting -= 1
+
+        self._running += 1
+        try:
+            _ensure_debug_dir(cfg.debug)
+            loop = asyncio.get_running_loop()
+            pool = self._get_pool(cfg)
+            cpu = {"first": None, "last": None}
+
+            async def _one(idx: int, source) -> Optional[Tuple[bytes, bool]]:
+                raw = await source if inspect.isawaitable(source) else source
+                if not raw:
+                    return None
+                if cpu["first"] is None:
+                    cpu["first"] = time.perf_counter()
+                page = await loop.run_in_executor(pool, _process_page_to_jpeg, raw, cfg, job_id, idx)
+                cpu["last"] = time.perf_counter()
+                return page
+
+            try:
+                pages = await asyncio.gather(*[_one(idx, src) for idx, src in enumerate(sources)])
+            except BrokenProcessPool:
+                # A worker died (OOM, native crash) — the next job gets a fresh pool
+                self._reset_pool()
+                raise
+
+            if timings is not None:
+                timings["enhance_s"] = (cpu["last"] - cpu["first"]) if cpu["first"] and cpu["last"] else 0.0
+            self._stats["jobs"] += 1
+            self._stats["pages"] += sum(1 for p in pages if p is not None)
+            self._latency_samples.append(time.perf_counter() - submitted)
+            return list(pages)
+        except Exception:
+            self._stats["failed"] += 1
+            raise
+        finally:
+            self._running -= 1
+            slots.release()
+
+    async def run(
+        self,
+        image_bytes_list: List[bytes],
+        config: Optional[PipelineConfig] = None,
+        job_id: Optional[str] = None,
+    ) -> io.BytesIO:
+        from .pipeline import _make_job_id, _save_debug_pdf
+        from .stages.pdf_builder import build_pdf_from_jpegs
+
+        cfg = config or DEFAULT_CONFIG
+        job_id = job_id or _make_job_id()
+
+        pages = await self.process_pages(image_bytes_list, cfg, job_id)
+        jpegs = [p for p in pages if p is not None]
+        if not jpegs:
+            raise RuntimeError("[pipeline] all pages failed — cannot generate PDF")
+
+        pdf = build_pdf_from_jpegs(jpegs)
+        _save_debug_pdf(pdf, cfg.debug, job_id)
+        logger.info(f"[pipeline] done  job={job_id}  pages={len(jpegs)}")
+        return pdf
+
+    # ── Metrics ───────────────────────────────────────────────────────────
+
+    def stats(self) -> dict:
+        samples = sorted(self._latency_samples)
+
+        def pct(p: float) -> float:
+            if not samples:
+                return 0.0
+            return samples[min(len(samples) - 1, int(round(p / 100.0 * (len(samples) - 1))))] * 1000
+
+        return {
+            **self._stats,
+            "running": self._running,
+            "queued": self._waiting,
+            "workers": max(1, self.config.workers),
+            "job_p50_ms": pct(50),
+            "job_p95_ms": pct(95),
+        }
+
+
+_executor: Optional[PipelineExecutor] = None
+_executor_lock = threading.Lock()
+
+
+def get_pipeline_executor() -> PipelineExecutor:
+    """Process-wide executor, created on first use (the pool itself starts lazily too)."""
+    global _executor
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                _executor = PipelineExecutor()
+    return _executor
+
+
+def pipeline_executor_stats() -> dict:
+    return get_pipeline_executor().stats()
+
+
+def shutdown_pipeline_executor(wait: bool = True) -> None:
+    """Stop the worker processes. Call on application shutdown."""
+    if _executor is not None:
+        _executor.shutdown(wait=wait)
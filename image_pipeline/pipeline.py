@@ -5,7 +5,7 @@
 #   from image_pipeline.pipeline import run_pipeline
 #   pdf_bytes_io = run_pipeline([image_bytes, ...])
 #
-# Usage (async wrapper):
+# Usage (async, process pool — pages in parallel):
 #   pdf_bytes_io = await run_pipeline_async([image_bytes, ...])
 
 import io
@@ -13,7 +13,7 @@ import logging
 import os
 import cv2
 import numpy as np
-from typing import List, Optional
+from typing import List, Optional, Tuple
 
 from .config import PipelineConfig, DEFAULT_CONFIG
 from .stages.detector import detect_document
@@ -50,65 +50,84 @@ def run_pipeline(
     processed_images: List[np.ndarray] = []
 
     for page_idx, raw_bytes in enumerate(image_bytes_list):
-        try:
-            img = _decode_image(raw_bytes)
-            if img is None:
-                logger.warning(f"[pipeline] page {page_idx}: could not decode image — skipping")
-                continue
+        img = process_page(raw_bytes, cfg, job_id, page_idx)
+        if img is not None:
+            processed_images.append(img)
 
-            _save_debug(img, cfg.debug, job_id, page_idx, "original")
-            logger.info(f"[pipeline] page {page_idx}: {img.shape[1]}x{img.shape[0]}")
+    if not processed_images:
+        raise RuntimeError("[pipeline] all pages failed — cannot generate PDF")
 
-            # Stage 1 — Detect
-            detection = detect_document(img, cfg.detector)
+    # Stage 5 — Build PDF
+    pdf = build_pdf(processed_images, cfg.pdf)
+    _save_debug_pdf(pdf, cfg.debug, job_id)
 
-            # Stage 2 — Crop
-            img, _ = smart_crop(img, detection.polygon, cfg.cropper)
-            _save_debug(img, cfg.debug, job_id, page_idx, "cropped")
+    logger.info(f"[pipeline] done  job={job_id}  pages={len(processed_images)}")
+    return pdf
 
-            # Stage 3 — Perspective correction
-            # Only apply warp if detection actually found a quadrilateral document
-            if detection.success and not detection.fallback_used:
-                img, corrected = correct_perspective(img, detection.polygon, cfg.corrector)
-                if corrected:
-                    _save_debug(img, cfg.debug, job_id, page_idx, "corrected")
 
-            # Stage 4 — Enhancement
-            img, _ = enhance(img, cfg.enhancer)
-            _save_debug(img, cfg.debug, job_id, page_idx, "enhanced")
+def process_page(
+    raw_bytes: bytes,
+    config: Optional[PipelineConfig] = None,
+    job_id: str = "job",
+    page_idx: int = 0,
+) -> Optional[np.ndarray]:
+    """
+    Run stages 1–4 on a single page.
 
-            processed_images.append(img)
+    Returns the enhanced BGR image, the plain decoded original if a stage
+    failed, or None if the bytes cannot be decoded at all (page skipped).
+    """
+    return process_page_with_status(raw_bytes, config, job_id, page_idx)[0]
 
-        except Exception as exc:
-            logger.error(f"[pipeline] page {page_idx} failed: {exc}", exc_info=True)
-            # Fallback: use the original undecoded image if possible
-            fallback = _safe_decode(raw_bytes)
-            if fallback is not None:
-                processed_images.append(fallback)
-                logger.info(f"[pipeline] page {page_idx}: using original as fallback")
 
-    if not processed_images:
-        raise RuntimeError("[pipeline] all pages failed — cannot generate PDF")
+def process_page_with_status(
+    raw_bytes: bytes,
+    config: Optional[PipelineConfig] = None,
+    job_id: str = "job",
+    page_idx: int = 0,
+) -> Tuple[Optional[np.ndarray], bool]:
+    """
+    process_page + whether stages 1–4 actually ran: (image, enhanced_ok).
+    enhanced_ok is False for the original-image fallback (and for None) —
+    callers that persist results must not store those as enhanced.
+    """
+    cfg = config or DEFAULT_CONFIG
+    try:
+        img = _decode_image(raw_bytes)
+        if img is None:
+            logger.warning(f"[pipeline] page {page_idx}: could not decode image — skipping")
+            return None, False
 
-    # Stage 5 — Build PDF
-    pdf = build_pdf(processed_images, cfg.pdf)
+        _save_debug(img, cfg.debug, job_id, page_idx, "original")
+        logger.info(f"[pipeline] page {page_idx}: {img.shape[1]}x{img.shape[0]}")
 
-    # Save final PDF debug copy
-    if cfg.debug.enabled:
-        debug_pdf_path = os.path.join(
-            cfg.debug.output_dir, f"{job_id}_final.pdf"
-        )
-        try:
-            pdf.seek(0)
-            with open(debug_pdf_path, "wb") as f:
-                f.write(pdf.read())
-            pdf.seek(0)
-            logger.info(f"[pipeline] debug PDF saved: {debug_pdf_path}")
-        except Exception:
-            logger.debug("تم تجاهل استثناء في run_pipeline", exc_info=True)
+        # Stage 1 — Detect
+        detection = detect_document(img, cfg.detector)
 
-    logger.info(f"[pipeline] done  job={job_id}  pages={len(processed_images)}")
-    return pdf
+        # Stage 2 — Crop
+        img, _ = smart_crop(img, detection.polygon, cfg.cropper)
+        _save_debug(img, cfg.debug, job_id, page_idx, "cropped")
+
+        # Stage 3 — Perspective correction
+        # Only apply warp if detection actually found a quadrilateral document
+        if detection.success and not detection.fallback_used:
+            img, corrected = correct_perspective(img, detection.polygon, cfg.corrector)
+            if corrected:
+                _save_debug(img, cfg.debug, job_id, page_idx, "corrected")
+
+        # Stage 4 — Enhancement
+        img, _ = enhance(img, cfg.enhancer)
+        _save_debug(img, cfg.debug, job_id, page_idx, "enhanced")
+
+        return img, True
+
+    except Exception as exc:
+        logger.error(f"[pipeline] page {page_idx} failed: {exc}", exc_info=True)
+        # Fallback: use the original undecoded image if possible
+        fallback = _safe_decode(raw_bytes)
+        if fallback is not None:
+            logger.info(f"[pipeline] page {page_idx}: using original as fallback")
+        return fallback, False
 
 
 async def run_pipeline_async(
@@ -117,15 +136,15 @@ async def run_pipeline_async(
     job_id: Optional[str] = None,
 ) -> io.BytesIO:
     """
-    Async wrapper — runs the CPU-bound pipeline in a thread pool
-    so it doesn't block the Telegram bot event loop.
+    Async entry point — pages are processed in parallel on the dedicated
+    process pool (see executor.py), off the event loop and off the thread
+    pools used by SQLAlchemy.
+
+    Raises PipelineBusy when the job queue is full; callers already fall
+    back to direct conversion on any exception.
     """
-    import asyncio
-    loop = asyncio.get_event_loop()
-    return await loop.run_in_executor(
-        None,
-        lambda: run_pipeline(image_bytes_list, config, job_id),
-    )
+    from .executor import get_pipeline_executor
+    return await get_pipeline_executor().run(image_bytes_list, config, job_id)
 
 
 # ---------------------------------------------------------------------------
@@ -161,6 +180,20 @@ def _ensure_debug_dir(debug_cfg):
         os.makedirs(debug_cfg.output_dir, exist_ok=True)
 
 
+def _save_debug_pdf(pdf: io.BytesIO, debug_cfg, job_id: str):
+    if not debug_cfg.enabled:
+        return
+    debug_pdf_path = os.path.join(debug_cfg.output_dir, f"{job_id}_final.pdf")
+    try:
+        pdf.seek(0)
+        with open(debug_pdf_path, "wb") as f:
+            f.write(pdf.read())
+        pdf.seek(0)
+        logger.info(f"[pipeline] debug PDF saved: {debug_pdf_path}")
+    except Exception:
+        logger.debug("تم تجاهل استثناء في _save_debug_pdf", exc_info=True)
+
+
 def _make_job_id() -> str:
     import time
     return f"job_{int(time.time() * 1000) % 10_000_000:07d}"
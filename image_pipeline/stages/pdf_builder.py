@@ -33,12 +33,34 @@ def build_pdf(images: List[np.ndarray], cfg) -> io.BytesIO:
         img_buffers.append(buf)
         logger.debug(f"[pdf_builder] page {i+1}: {len(buf)} bytes")
 
+    return build_pdf_from_jpegs(img_buffers)
+
+
+def encode_page(image: np.ndarray, cfg) -> bytes:
+    """
+    Encode one page exactly as build_pdf would (resize + JPEG).
+    Used by the process pool so workers ship compact JPEG bytes back,
+    not full-resolution arrays.
+    """
+    return _image_to_jpeg_bytes(image, cfg)
+
+
+def build_pdf_from_jpegs(img_buffers: List[bytes]) -> io.BytesIO:
+    """
+    Assemble already-encoded JPEG pages into a PDF (no re-encoding).
+
+    Returns:
+        BytesIO containing the PDF, rewound to position 0
+    """
+    if not img_buffers:
+        raise ValueError("build_pdf_from_jpegs: no pages provided")
+
     try:
         import img2pdf
         pdf_bytes = img2pdf.convert(img_buffers)
         out = io.BytesIO(pdf_bytes)
         out.seek(0)
-        logger.info(f"[pdf_builder] PDF generated  pages={len(images)}  size={len(pdf_bytes)/1024:.1f} KB")
+        logger.info(f"[pdf_builder] PDF generated  pages={len(img_buffers)}  size={len(pdf_bytes)/1024:.1f} KB")
         return out
 
     except ImportError:
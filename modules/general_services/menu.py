@@ -18,8 +18,8 @@ _BUTTON = "🔧 الخدمات العامة"
 async def _handle_gs_button(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     tg_id = update.effective_user.id
 
-    from core.access.access_service import user_has_module
-    if not user_has_module(tg_id, "general_services"):
+    from core.access.access_service import user_has_module_async
+    if not await user_has_module_async(tg_id, "general_services"):
         logger.warning(
             f"[general_services] {_BUTTON!r} pressed by unauthorized user={tg_id}"
             " — re-routing to user_start"
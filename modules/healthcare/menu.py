@@ -34,8 +34,8 @@ async def _show_menu(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None
     """
     tg_id = update.effective_user.id
 
-    from core.access.access_service import user_has_module
-    if not user_has_module(tg_id, "healthcare"):
+    from core.access.access_service import user_has_module_async
+    if not await user_has_module_async(tg_id, "healthcare"):
         logger.warning(
             f"[healthcare] {HEALTHCARE_BUTTON!r} pressed by non-healthcare "
             f"user={tg_id} — re-routing to user_start"
@@ -62,8 +62,8 @@ async def _show_menu_chennai(update: Update, context: ContextTypes.DEFAULT_TYPE)
     """
     tg_id = update.effective_user.id
 
-    from core.access.access_service import user_has_module
-    if not user_has_module(tg_id, "chennai_healthcare"):
+    from core.access.access_service import user_has_module_async
+    if not await user_has_module_async(tg_id, "chennai_healthcare"):
         logger.warning(
             f"[healthcare] {CHENNAI_HEALTHCARE_BUTTON!r} pressed by non-chennai_healthcare "
             f"user={tg_id} — re-routing to user_start"
@@ -5,6 +5,7 @@
 # تقويم مستقل خاص بهذا المسار (وليس تعديل shared/calendar_picker.py
 # المشترك) — نفس الاتفاقية المتّبعة في hceval:/cr:/da: هذه الجلسة.
 
+import asyncio
 import logging
 from calendar import monthcalendar
 from datetime import date, datetime
@@ -214,8 +215,24 @@ async def _handle_cal_nav(update: Update, context: ContextTypes.DEFAULT_TYPE, st
 
 # ── Generate ledger + show export choice ────────────────────────────────────
 
+def _ledger_filters(update: Update, state: dict) -> dict:
+    """فلاتر المسير المشتركة بين الملخص والتصدير (الصفوف نفسها لا تُحفظ في الجلسة)."""
+    user = update.effective_user
+    # ✅ عزل: كل مستخدم يطبع مسيره الخاص (ما أدخله هو فقط)، إلا الأدمن
+    # فيرى الكل — نفس قاعدة العزل المعتمدة في pharmacy_finance.
+    # specialist_name فلتر مستقل تماماً: "من أدخل السجل" لا علاقة له
+    # بـ"المختص الصحي المسؤول عن الحالة" — انظر التعليق في
+    # services/pharmacy_evacuation_service.py.
+    return {
+        "manifest_type": state.get("manifest_type"),      # None = الكل، بلا فلترة
+        "requester_id": user.id if user else None,
+        "is_admin": bool(user and is_admin(user.id)),
+        "specialist_name": state.get("specialist_name"),  # None = كل المختصين
+    }
+
+
 async def _generate_and_show_export_choice(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
-    from services.pharmacy_evacuation_service import get_evacuation_ledger_rows
+    from services.pharmacy_evacuation_service import get_evacuation_ledger_summary
 
     state = context.user_data.get(_KEY, {})
     start = state.get("start_date")
@@ -224,27 +241,18 @@ async def _generate_and_show_export_choice(update: Update, context: ContextTypes
         await _show_period_menu(update)
         return
 
-    user = update.effective_user
-    manifest_type = state.get("manifest_type")  # None = الكل، بلا فلترة
-    specialist_name = state.get("specialist_name")  # None = كل المختصين
-    # ✅ عزل: كل مستخدم يطبع مسيره الخاص (ما أدخله هو فقط)، إلا الأدمن
-    # فيرى الكل — نفس قاعدة العزل المعتمدة في pharmacy_finance.
-    # specialist_name فلتر مستقل تماماً: "من أدخل السجل" لا علاقة له
-    # بـ"المختص الصحي المسؤول عن الحالة" — انظر التعليق في
-    # services/pharmacy_evacuation_service.py.
-    rows = await get_evacuation_ledger_rows(
-        start, end, manifest_type=manifest_type,
-        requester_id=user.id if user else None,
-        is_admin=bool(user and is_admin(user.id)),
-        specialist_name=specialist_name,
-    )
-    state["rows"] = rows
+    manifest_type = state.get("manifest_type")
+    specialist_name = state.get("specialist_name")
+    # ✅ العدد والإجمالي فقط (COUNT/SUM في SQL) — الصفوف تُقرأ كتدفّق عند
+    # التصدير، فلا يُحفظ مسير سنة كاملة في user_data (والـpersistence)
+    count, total = await get_evacuation_ledger_summary(start, end, **_ledger_filters(update, state))
+    state["summary"] = (count, total)
     context.user_data[_KEY] = state
 
     manifest_label = _MANIFEST_TYPE_LABELS.get(manifest_type, "📋 الكل")
     specialist_label = specialist_name or "📋 الكل"
 
-    if not rows:
+    if not count:
         text = (
             f"⚠️ لا توجد بيانات مطابقة لمعايير البحث المحددة.\n\n"
             f"الفترة: من {start.strftime('%Y-%m-%d')} إلى {end.strftime('%Y-%m-%d')}\n"
@@ -255,13 +263,12 @@ async def _generate_and_show_export_choice(update: Update, context: ContextTypes
         await _edit_or_reply(update, text, kb)
         return
 
-    total = sum(r["amount"] for r in rows)
     text = (
         f"✅ *تم إعداد المسير*\n\n"
         f"الفترة: من {start.strftime('%Y-%m-%d')} إلى {end.strftime('%Y-%m-%d')}\n"
         f"نوع المسير: {manifest_label}\n"
         f"المختص: {specialist_label}\n"
-        f"عدد السجلات: {len(rows)}\n"
+        f"عدد السجلات: {count}\n"
         f"إجمالي المبلغ: {total:,.2f}\n\n"
         f"اختر صيغة التصدير:"
     )
@@ -277,27 +284,34 @@ async def _generate_and_show_export_choice(update: Update, context: ContextTypes
 async def _handle_export(update: Update, context: ContextTypes.DEFAULT_TYPE, choice: str) -> None:
     from services.pharmacy_evacuation_pdf import build_evacuation_pdf
     from services.pharmacy_evacuation_excel import build_evacuation_excel
+    from services.pharmacy_evacuation_service import get_evacuation_ledger_rows, iter_evacuation_ledger_rows
 
     state = context.user_data.get(_KEY, {})
-    rows = state.get("rows")
     start = state.get("start_date")
     end = state.get("end_date")
-    if rows is None or start is None or end is None:
+    if state.get("summary") is None or start is None or end is None:
         await _show_period_menu(update)
         return
+    filters_ = _ledger_filters(update, state)
 
     query = update.callback_query
     chat_id = update.effective_chat.id if update.effective_chat else None
 
     try:
         if choice in ("pdf", "both"):
-            pdf_buf = build_evacuation_pdf(rows, start, end)
+            rows = await get_evacuation_ledger_rows(start, end, **filters_)
+            pdf_buf = await asyncio.to_thread(build_evacuation_pdf, rows, start, end)
             await context.bot.send_document(
                 chat_id=chat_id, document=pdf_buf,
                 filename=f"مسير_اخلاء_{start.strftime('%Y-%m-%d')}_الى_{end.strftime('%Y-%m-%d')}.pdf",
             )
         if choice in ("excel", "both"):
-            xlsx_buf = build_evacuation_excel(rows, start, end)
+            # Excel يستهلك التدفّق مباشرة (write-only) — الذاكرة ثابتة مهما طال النطاق
+            xlsx_buf = await asyncio.to_thread(
+                build_evacuation_excel,
+                iter_evacuation_ledger_rows(start, end, **filters_),
+                start, end,
+            )
             await context.bot.send_document(
                 chat_id=chat_id, document=xlsx_buf,
                 filename=f"مسير_اخلاء_{start.strftime('%Y-%m-%d')}_الى_{end.strftime('%Y-%m-%d')}.xlsx",
@@ -7,7 +7,7 @@ from telegram import Update
 from telegram.ext import ContextTypes, MessageHandler, filters
 
 from bot.shared_auth import is_admin
-from core.access.access_service import user_has_module
+from core.access.access_service import user_has_module_async
 
 logger = logging.getLogger(__name__)
 
@@ -18,7 +18,7 @@ _MODULE_KEY = "residency"
 async def _show_menu(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     tg_id = update.effective_user.id if update.effective_user else 0
 
-    if not (is_admin(tg_id) or user_has_module(tg_id, _MODULE_KEY)):
+    if not (is_admin(tg_id) or await user_has_module_async(tg_id, _MODULE_KEY)):
         logger.warning(f"[residency] {RESIDENCY_BUTTON!r} pressed by unauthorized user={tg_id}")
         from bot.handlers.user.user_start import user_start
         await user_start(update, context)
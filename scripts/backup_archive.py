@@ -0,0 +1,95 @@
+# Backup archive tool: the compressed, deduplicated snapshot store
+# (services/incremental_backup.py).
+#
+# كل الأوامر تقرأ من الأرشيف بالتدفق (قطعة بقطعة) — لا نسخة كاملة وسيطة
+# إلا للاستعادة نفسها أو verify --deep (integrity_check).
+# Exit code 1 إن فشل verify لأي نسخة.
+#
+# Run from project root:
+#   python scripts/backup_archive.py backup [--label manual]
+#   python scripts/backup_archive.py list
+#   python scripts/backup_archive.py stats
+#   python scripts/backup_archive.py verify [--at 2026-03-10T14:00 | --at <id>] [--all] [--deep]
+#   python scripts/backup_archive.py restore /tmp/restored.db [--at ...]
+#   python scripts/backup_archive.py prune [--last 6 --hourly 48 --daily 30 --monthly 12]
+import argparse
+import os
+import sys
+from datetime import datetime
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from services import incremental_backup as archive  # noqa: E402
+
+
+def _at(value):
+    """--at: id نسخة كما هو، أو وقت ISO (UTC)."""
+    if not value:
+        return None
+    try:
+        return datetime.fromisoformat(value)
+    except ValueError:
+        return value
+
+
+def _kb(n: int) -> str:
+    return f"{n / 1024:,.1f} KB"
+
+
+def main() -> int:
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--dir", default=archive.INCREMENTAL_BACKUP_DIR, help="archive directory")
+    sub = ap.add_subparsers(dest="cmd", required=True)
+    b = sub.add_parser("backup")
+    b.add_argument("--label", default="manual")
+    b.add_argument("--db", default=None)
+    sub.add_parser("list")
+    sub.add_parser("stats")
+    v = sub.add_parser("verify")
+    v.add_argument("--at")
+    v.add_argument("--all", action="store_true")
+    v.add_argument("--deep", action="store_true", help="also rebuild and run integrity_check")
+    r = sub.add_parser("restore")
+    r.add_argument("target")
+    r.add_argument("--at")
+    p = sub.add_parser("prune")
+    p.add_argument("--last", type=int, default=archive.BACKUP_KEEP_LAST)
+    p.add_argument("--hourly", type=int, default=archive.BACKUP_KEEP_HOURLY)
+    p.add_argument("--daily", type=int, default=archive.BACKUP_KEEP_DAILY)
+    p.add_argument("--monthly", type=int, default=archive.BACKUP_KEEP_MONTHLY)
+    args = ap.parse_args()
+
+    backend = archive.LocalDirectoryBackend(args.dir)
+
+    if args.cmd == "backup":
+        m = archive.backup(args.db, backend, label=args.label)
+        metrics = m["metrics"]
+        print(f"{m['id']}: {metrics['chunks_written']}/{metrics['chunks_total']} chunks new, "
+              f"{_kb(metrics['bytes_written'])} written for {_kb(m['size'])}, "
+              f"{metrics['duration_ms']:.0f}ms (lock wait {metrics['lock_wait_ms']:.0f}ms)")
+    elif args.cmd == "list":
+        for s in archive.list_snapshots(backend):
+            print(f"{s['id']}  {s['label']:>8}  {_kb(s['size']):>14}  +{_kb(s['bytes_written'])}")
+    elif args.cmd == "stats":
+        for key, value in archive.archive_stats(backend).items():
+            print(f"{key:>14}: {value}")
+    elif args.cmd == "verify":
+        ids = backend.list_manifests() if args.all else [None]
+        failed = 0
+        for snapshot_id in ids:
+            result = archive.verify(snapshot_id or _at(args.at), backend, deep=args.deep)
+            status = "ok" if result["ok"] else f"FAILED: {result['error']}"
+            print(f"{result['id']}  {_kb(result['bytes']):>14}  {status}")
+            failed += not result["ok"]
+        return 1 if failed else 0
+    elif args.cmd == "restore":
+        m = archive.restore(args.target, at=_at(args.at), backend=backend)
+        print(f"restored {m['id']} ({m['created_at']} UTC) → {args.target}")
+    elif args.cmd == "prune":
+        result = archive.prune(backend, args.hourly, args.daily, args.monthly, args.last)
+        print(f"removed {result['manifests']} snapshots, {result['chunks']} orphan chunks")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,91 @@
+# Benchmark: event-loop lag under concurrent DB load, inline vs run_db.
+#
+# يحاكي N مترجماً يرسلون تحديثات متزامنة، كل تحديث يُنفّذ استعلام SQLite
+# (بحث مرضى ilike على جدول مُعبّأ). يقيس LoopLagMonitor تأخّر الحلقة في
+# وضعين:
+#   inline  — الاستعلام مباشرة على حلقة الأحداث (السلوك القديم)
+#   run_db  — الاستعلام على مُنفِّذ قاعدة البيانات المخصّص
+#
+# Run from project root (uses a temporary DB, production DB untouched):
+#   python scripts/bench_db_loop_lag.py [--patients 20000] [--updates 400]
+import argparse
+import asyncio
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+_tmp = tempfile.mkdtemp(prefix="bench_db_")
+os.environ["DATABASE_PATH"] = os.path.join(_tmp, "bench.db")
+
+from db.session import SessionLocal          # noqa: E402
+from db.models import Patient                # noqa: E402
+from db.async_session import LoopLagMonitor, run_db, db_executor_stats, shutdown_db_executor  # noqa: E402
+
+
+def _seed(n: int) -> None:
+    with SessionLocal() as s:
+        s.bulk_save_objects([
+            Patient(full_name=f"مريض تجريبي {i} محمد أحمد", file_number=str(i))
+            for i in range(n)
+        ])
+        s.commit()
+
+
+def _search_sync(q: str) -> int:
+    with SessionLocal() as s:
+        return len(
+            s.query(Patient.id)
+            .filter(Patient.full_name.ilike(f"%{q}%"))
+            .limit(50)
+            .all()
+        )
+
+
+async def _scenario(mode: str, updates: int, concurrency: int) -> dict:
+    monitor = LoopLagMonitor(interval=0.005, window=100_000)
+    monitor.start()
+    sem = asyncio.Semaphore(concurrency)
+    latencies = []
+
+    async def _one(i: int) -> None:
+        async with sem:
+            t0 = time.perf_counter()
+            q = f"{i % 997}"
+            if mode == "inline":
+                _search_sync(q)
+            else:
+                await run_db(_search_sync, q)
+            await asyncio.sleep(0)  # simulate the answer() round trip yielding
+            latencies.append(time.perf_counter() - t0)
+
+    t0 = time.perf_counter()
+    await asyncio.gather(*(_one(i) for i in range(updates)))
+    wall = time.perf_counter() - t0
+    await monitor.stop()
+    latencies.sort()
+    p99 = latencies[min(len(latencies) - 1, int(0.99 * len(latencies)))]
+    return {"mode": mode, "wall_s": wall, "update_p99_ms": p99 * 1000, **monitor.stats()}
+
+
+async def _main(args) -> None:
+    print(f"Seeding {args.patients} patients in {os.environ['DATABASE_PATH']} ...")
+    _seed(args.patients)
+    for mode in ("inline", "run_db"):
+        r = await _scenario(mode, args.updates, args.concurrency)
+        print(
+            f"{r['mode']:>7}: wall={r['wall_s']:.2f}s  update p99={r['update_p99_ms']:.1f}ms  "
+            f"loop lag p50={r['lag_p50_ms']:.1f}ms p99={r['lag_p99_ms']:.1f}ms max={r['lag_max_ms']:.1f}ms"
+        )
+    print("db executor:", db_executor_stats())
+    shutdown_db_executor()
+
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--patients", type=int, default=20000)
+    ap.add_argument("--updates", type=int, default=400)
+    ap.add_argument("--concurrency", type=int, default=20)
+    asyncio.run(_main(ap.parse_args()))
@@ -0,0 +1,59 @@
+# Benchmark: doctor search latency per keystroke over the real doctors data.
+#
+# يحاكي inline query: المستخدم يكتب اسم طبيب حرفاً حرفاً داخل شاشة
+# مستشفى/قسم محددين، وكل حرف يستدعي search_doctors. يقيس:
+#   cold — أول استدعاء لتركيبة فلترة جديدة (يشمل بناء الفلترة)
+#   warm — بقية الضغطات (الفلترة محفوظة، الـfuzzy على المرشحين فقط)
+#
+# Run from project root:
+#   python scripts/bench_doctor_search.py [--rounds 50]
+import argparse
+import logging
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from services.doctors_smart_search import get_doctor_index, search_doctors  # noqa: E402
+
+
+def _pct(samples, pct):
+    samples = sorted(samples)
+    return samples[min(len(samples) - 1, int(pct / 100 * len(samples)))] * 1000
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--rounds", type=int, default=50)
+    args = ap.parse_args()
+    logging.disable(logging.INFO)
+
+    t0 = time.perf_counter()
+    index = get_doctor_index(force_reload=True)
+    print(f"index: {len(index)} doctors, {len(index.tree)} hospitals, "
+          f"{len(index.postings)} trigrams, built in {(time.perf_counter() - t0) * 1000:.0f}ms")
+
+    random.seed(7)
+    docs = index.doctors
+    cold, warm, unfiltered = [], [], []
+    for _ in range(args.rounds):
+        doc = random.choice(docs)
+        hospital = doc["hospital"]
+        department = f"{doc['department_ar']} | {doc['department_en']}"
+        typed = doc["name"].replace("Dr. ", "")[:8]
+        for n in range(0, len(typed) + 1):
+            t = time.perf_counter()
+            search_doctors(typed[:n], hospital=hospital, department=department)
+            (cold if n == 0 else warm).append(time.perf_counter() - t)
+        t = time.perf_counter()
+        search_doctors(typed)
+        unfiltered.append(time.perf_counter() - t)
+
+    for label, s in (("cold filter", cold), ("keystroke", warm), ("no filter", unfiltered)):
+        print(f"{label:>11}: p50={_pct(s, 50):7.2f}ms  p99={_pct(s, 99):7.2f}ms  n={len(s)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,93 @@
+# Benchmark: image pipeline, old thread wrapper vs the process pool.
+#
+# يولّد صوراً اصطناعية (صفحة بيضاء بنص وضوضاء، ~2MP مثل صور الهاتف)
+# ويُرسل عدة مهام متزامنة بأحجام 1 و5 و20 صفحة:
+#   thread — run_pipeline كاملة في المُنفِّذ الافتراضي (السلوك القديم، صفحات متتالية)
+#   pool   — run_pipeline_async عبر image_pipeline/executor.py (صفحات متوازية)
+# ويطبع pages/sec و p95 لزمن المهمة.
+#
+# Run from project root (needs opencv-python, numpy, Pillow, img2pdf):
+#   python scripts/bench_image_pipeline.py [--jobs 4] [--workers 4]
+import argparse
+import asyncio
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+
+def _make_page(seed: int) -> bytes:
+    import cv2
+    import numpy as np
+
+    rnd = np.random.default_rng(seed)
+    img = np.full((1600, 1200, 3), 235, dtype=np.uint8)
+    for line in range(40):
+        y = 80 + line * 36
+        cv2.putText(img, f"Patient report line {line} value {rnd.integers(1000)}",
+                    (60, y), cv2.FONT_HERSHEY_SIMPLEX, 0.8, (30, 30, 30), 2)
+    noise = rnd.normal(0, 12, img.shape).astype(np.int16)
+    img = np.clip(img.astype(np.int16) + noise, 0, 255).astype(np.uint8)
+    ok, buf = cv2.imencode(".jpg", img, [cv2.IMWRITE_JPEG_QUALITY, 85])
+    return buf.tobytes()
+
+
+def _p95(samples: list[float]) -> float:
+    s = sorted(samples)
+    return s[min(len(s) - 1, int(round(0.95 * (len(s) - 1))))] * 1000
+
+
+async def _bench(label: str, submit, pages: list[bytes], jobs: int) -> None:
+    latencies: list[float] = []
+
+    async def _one(i: int) -> None:
+        t0 = time.perf_counter()
+        await submit(pages, f"bench_{label}_{len(pages)}_{i}")
+        latencies.append(time.perf_counter() - t0)
+
+    t0 = time.perf_counter()
+    await asyncio.gather(*[_one(i) for i in range(jobs)])
+    elapsed = time.perf_counter() - t0
+    print(f"{label:>6} | {len(pages):>5} | {jobs * len(pages) / elapsed:>9.2f} | {_p95(latencies):>9.0f}")
+
+
+async def main() -> None:
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--jobs", type=int, default=4, help="concurrent jobs per size")
+    ap.add_argument("--workers", type=int, default=os.cpu_count() or 2)
+    args = ap.parse_args()
+
+    os.environ["IMAGE_PIPELINE_WORKERS"] = str(args.workers)
+    os.environ["IMAGE_PIPELINE_MAX_JOBS"] = str(args.jobs)
+    os.environ["IMAGE_PIPELINE_MAX_QUEUED"] = str(args.jobs)
+
+    from image_pipeline.config import ExecutorConfig, PipelineConfig
+    from image_pipeline.executor import PipelineExecutor
+    from image_pipeline.pipeline import run_pipeline
+
+    cfg = PipelineConfig()
+    cfg.debug.enabled = False
+    executor = PipelineExecutor(ExecutorConfig())
+    executor.warm_up(cfg)
+
+    loop = asyncio.get_running_loop()
+
+    async def _thread(pages, job_id):
+        return await loop.run_in_executor(None, lambda: run_pipeline(pages, cfg, job_id))
+
+    async def _pool(pages, job_id):
+        return await executor.run(pages, cfg, job_id)
+
+    print(f"workers={args.workers}  concurrent jobs={args.jobs}")
+    print(f"{'mode':>6} | {'pages':>5} | {'pages/sec':>9} | {'p95 ms':>9}")
+    for n in (1, 5, 20):
+        pages = [_make_page(i) for i in range(n)]
+        await _bench("thread", _thread, pages, args.jobs)
+        await _bench("pool", _pool, pages, args.jobs)
+    print("executor:", executor.stats())
+    executor.shutdown()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,150 @@
+# Benchmark: logging overhead per update on the event-loop thread.
+#
+# يقيس زمن استدعاءات التسجيل كما يراه الخيط المستدعي (حلقة الأحداث) لكل
+# تحديث، لمسارين ساخنين:
+#   search    — ضغطة حرف في البحث المباشر عن مريض (كتلة 7 أسطر + سطر النتائج
+#               سابقاً؛ الآن سطر DEBUG + log_sampled)
+#   broadcast — نشر تقرير (≈9 أسطر INFO سابقاً؛ الآن سطر نجاح واحد)
+# بثلاثة أوضاع:
+#   legacy — الأسطر القديمة، معالِجات مباشرة (stdout-like + ملف) على المسجِّل
+#   queue  — الأسطر القديمة خلف QueueHandler (الكاتب الخلفي يكتب)
+#   new    — الأسطر الحالية خلف QueueHandler
+# ومراقب الأخطاء: فتح/إلحاق/إغلاق لكل خطأ مقابل ملف مفتوح يُفرَّغ مع كل سطر.
+#
+# Run from project root:
+#   python scripts/bench_logging.py [--updates 5000]
+import argparse
+import json
+import logging
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+import services.error_digest as error_digest  # noqa: E402
+from services.log_pipeline import LogPipeline, log_sampled  # noqa: E402
+
+FMT = logging.Formatter("%(asctime)s - %(levelname)s - %(message)s")
+
+
+def legacy_search(log, i):
+    query_text, user_id = f"محمد {i % 50}", 1000 + i % 7
+    log.info("=" * 80)
+    log.info("🎯🎯🎯 PATIENT_SEARCH_INLINE_HANDLER TRIGGERED! 🎯🎯🎯")
+    log.info(f"🔍 patient_search_inline_handler: تم استدعاء البحث - النص: '{query_text}' للمستخدم {user_id}")
+    log.info(f"🔍 Query object: {query_text}")
+    log.info(f"🔍 ReadSessionLocal available: {True}")
+    log.info(f"🔍 Patient model available: {True}")
+    log.info("=" * 80)
+    log.info(f"✅ تم العثور على {i % 20} مريض بالبحث: '{query_text}'")
+
+
+def new_search(log, i):
+    query_text, user_id = f"محمد {i % 50}", 1000 + i % 7
+    log.debug("🔍 patient_search_inline_handler: '%s' للمستخدم %s", query_text, user_id)
+    log_sampled(log, "bench_search", "🔍 بحث مرضى inline: %d نتيجة (آخر نص: '%s')", i % 20, query_text)
+
+
+def legacy_broadcast(log, i):
+    data = {"report_id": i, "medical_action": "متابعة", "user_id": 5, "translator_id": 9}
+    group, message = -100123, "x" * 1800
+    log.info(f"📤 broadcast_new_report: بدء البث - report_id={data.get('report_id')}, medical_action={data.get('medical_action')}, group={group}")
+    log.info(f"✅ broadcast_new_report: تم تنسيق الرسالة بنجاح (طول: {len(message)} حرف)")
+    log.info(f"📤 broadcast_new_report: BROADCAST_ENABLED={True}, REPORTS_GROUP_ID='{group}' (len={len(str(group))})")
+    log.info(f"📤 broadcast_new_report: محاولة الإرسال للمجموعة {group}")
+    log.info(f"📤 broadcast_new_report: محاولة إرسال الرسالة للمجموعة (طول الرسالة: {len(message)} حرف)")
+    log.info(f"📤 broadcast_new_report: report_id={data.get('report_id')}, user_id={data.get('user_id')}, translator_id={data.get('translator_id')}")
+    log.info(f"✅ broadcast_new_report: تم إرسال التقرير للمجموعة: {group}, message_id: {i}")
+    log.info(f"✅ broadcast_new_report: اكتمل البث للمجموعة بنجاح")  # noqa: F541
+    log.info(f"📤 broadcast_new_report: إرسال التقرير للأدمن (دائماً مفعل) - BROADCAST_ENABLED={True}")
+
+
+def new_broadcast(log, i):
+    data = {"report_id": i, "medical_action": "متابعة", "user_id": 5, "translator_id": 9}
+    group, message = -100123, "x" * 1800
+    log.debug("📤 broadcast_new_report: بدء البث - report_id=%s, medical_action=%s, group=%s",
+              data.get('report_id'), data.get('medical_action'), group)
+    log.debug("✅ broadcast_new_report: تم تنسيق الرسالة بنجاح (طول: %d حرف)", len(message))
+    log.debug("📤 broadcast_new_report: BROADCAST_ENABLED=%s, REPORTS_GROUP_ID='%s'", True, group)
+    log.debug("📤 broadcast_new_report: محاولة الإرسال للمجموعة %s", group)
+    log.debug("📤 broadcast_new_report: report_id=%s, user_id=%s, translator_id=%s, طول الرسالة=%d",
+              data.get('report_id'), data.get('user_id'), data.get('translator_id'), len(message))
+    log.info(f"✅ broadcast_new_report: تم إرسال التقرير للمجموعة: {group}, message_id: {i}")
+    log.debug("✅ broadcast_new_report: اكتمل البث للمجموعة بنجاح")
+    log.debug("📤 broadcast_new_report: إرسال التقرير للأدمن (دائماً مفعل) - BROADCAST_ENABLED=%s", True)
+
+
+def _logger(tmp: str, name: str) -> logging.Logger:
+    log = logging.getLogger(f"bench.{name}")
+    log.propagate = False
+    log.setLevel(logging.INFO)
+    for h in list(log.handlers):
+        log.removeHandler(h)
+    for path in ("console.log", "bot.log"):      # pm2 stdout + ملف السجل
+        h = logging.FileHandler(os.path.join(tmp, f"{name}-{path}"), encoding="utf-8")
+        h.setFormatter(FMT)
+        log.addHandler(h)
+    return log
+
+
+def _run(label, fn, log, updates, queued) -> None:
+    pipeline = None
+    if queued:
+        pipeline = LogPipeline(log, queue_size=0)
+        pipeline.start()
+    t0 = time.perf_counter()
+    for i in range(updates):
+        fn(log, i)
+    caller = (time.perf_counter() - t0) / updates * 1e6
+    if pipeline is not None:
+        pipeline.stop()
+    total = (time.perf_counter() - t0) / updates * 1e6
+    for h in log.handlers:
+        h.close()
+    print(f"{label:>18}: {caller:8.1f} µs/update on caller  ({total:8.1f} µs incl. writer drain)")
+
+
+def _bench_digest(tmp: str, errors: int) -> None:
+    error_digest.LOGS_DIR = error_digest.Path(tmp) / "digest"
+    record = logging.LogRecord("bench", logging.ERROR, __file__, 1, "❌ فشل %s", ("x",), None)
+
+    # السابق: فتح/إلحاق/إغلاق لكل خطأ
+    error_digest.LOGS_DIR.mkdir(parents=True, exist_ok=True)
+    path = error_digest._day_file(error_digest._today_local())
+    t0 = time.perf_counter()
+    for _ in range(errors):
+        line = json.dumps(error_digest._redact(record), ensure_ascii=False)
+        with open(path, "a", encoding="utf-8") as f:
+            f.write(line + "\n")
+    legacy = (time.perf_counter() - t0) / errors * 1e6
+
+    handler = error_digest._DigestHandler()
+    t0 = time.perf_counter()
+    for _ in range(errors):
+        handler.handle(record)
+    handler.close()
+    kept_open = (time.perf_counter() - t0) / errors * 1e6
+    print(f"{'digest open/close':>18}: {legacy:8.1f} µs/error")
+    print(f"{'digest kept open':>18}: {kept_open:8.1f} µs/error")
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--updates", type=int, default=5000)
+    args = ap.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        for name, legacy_fn, new_fn in (("search", legacy_search, new_search),
+                                        ("broadcast", legacy_broadcast, new_broadcast)):
+            print(f"── {name}")
+            _run("legacy", legacy_fn, _logger(tmp, f"{name}-legacy"), args.updates, queued=False)
+            _run("queue", legacy_fn, _logger(tmp, f"{name}-queue"), args.updates, queued=True)
+            _run("new", new_fn, _logger(tmp, f"{name}-new"), args.updates, queued=True)
+        print("── error digest")
+        _bench_digest(tmp, args.updates)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,85 @@
+# Benchmark: patient name search, ILIKE full scan vs the FTS5 trigram index.
+#
+# يملأ قاعدة مؤقتة بـN اسم عربي/لاتيني عشوائي ثم يقيس زمن استعلام البحث
+# كما يفعله inline query مع كل حرف يكتبه المستخدم:
+#   like — Patient.full_name.ilike('%q%') (السلوك القديم)
+#   fts  — db.patient_search.search_patient_ids + جلب الصفوف بالترتيب
+#
+# Run from project root (temporary DB, production untouched):
+#   python scripts/bench_patient_search.py [--patients 50000]
+import argparse
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+_tmp = tempfile.mkdtemp(prefix="bench_ps_")
+os.environ["DATABASE_PATH"] = os.path.join(_tmp, "bench.db")
+
+from sqlalchemy import text                                                # noqa: E402
+
+from db.session import SessionLocal, engine                                # noqa: E402
+from db.models import Patient                                              # noqa: E402
+from db.patient_search import (                                            # noqa: E402
+    ensure_patient_search_index, patients_in_order, search_patient_ids,
+)
+
+_FIRST = ["أحمد", "محمد", "فاطمة", "مصطفى", "إبراهيم", "ليلى", "عائشة", "يوسف",
+          "Ali", "Rahul", "Priya", "Omar", "Sara", "Hassan", "Khalid", "Noor"]
+_LAST = ["علي", "حسن", "الزهراء", "كمال", "يحيى", "سالم", "العمري", "الحربي",
+         "Kumar", "Reddy", "Hussein", "Ahmed", "Iyer", "Khan", "Mansour", "Saleh"]
+_QUERIES = ["احم", "احمد", "فاطمه", "مصطفي", "ابراهيم ك", "ali", "kum", "sara khan", "يوسف العمري"]
+
+
+def _seed(n: int) -> None:
+    rnd = random.Random(7)
+    with engine.begin() as conn:
+        conn.execute(
+            text("INSERT INTO patients (full_name) VALUES (:n)"),
+            [{"n": f"{rnd.choice(_FIRST)} {rnd.choice(_FIRST)} {rnd.choice(_LAST)} {i}"}
+             for i in range(n)],
+        )
+
+
+def _like(s, q):
+    return s.query(Patient).filter(Patient.full_name.ilike(f"%{q}%")) \
+        .order_by(Patient.full_name).limit(50).all()
+
+
+def _fts(s, q):
+    return patients_in_order(s, search_patient_ids(s, q, limit=50))
+
+
+def _time(fn, rounds: int = 20) -> tuple[float, float]:
+    samples = []
+    with SessionLocal() as s:
+        for _ in range(rounds):
+            for q in _QUERIES:
+                t0 = time.perf_counter()
+                fn(s, q)
+                samples.append(time.perf_counter() - t0)
+    samples.sort()
+    return statistics.median(samples) * 1000, samples[int(len(samples) * 0.99) - 1] * 1000
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--patients", type=int, default=50_000)
+    args = ap.parse_args()
+
+    _seed(args.patients)
+    t0 = time.perf_counter()
+    ensure_patient_search_index(engine)
+    print(f"index check/backfill: {(time.perf_counter() - t0) * 1000:.0f}ms for {args.patients} patients")
+
+    for label, fn in (("like", _like), ("fts", _fts)):
+        p50, p99 = _time(fn)
+        print(f"{label:>5}: p50 {p50:7.2f}ms   p99 {p99:7.2f}ms")
+
+
+if __name__ == "__main__":
+    main()
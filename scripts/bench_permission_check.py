@@ -0,0 +1,80 @@
+# Benchmark: per-callback auth overhead, DB queries vs the permission snapshot.
+#
+# كل ضغطة زر تمرّ بـ is_user_approved ثم user_has_module. يقارن:
+#   db       — المسار القديم: جلسة جديدة واستعلام لكل فحص
+#   snapshot — core.access.permission_snapshot (قاموس في الذاكرة)
+#
+# Run from project root (temporary DB, production untouched):
+#   python scripts/bench_permission_check.py [--users 500] [--checks 20000]
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+_tmp = tempfile.mkdtemp(prefix="bench_acl_")
+os.environ["DATABASE_PATH"] = os.path.join(_tmp, "bench.db")
+
+from db.session import SessionLocal                                  # noqa: E402
+from db.models import User, UserModuleAccess                         # noqa: E402
+from core.access.access_service import _get_user_modules_db, get_user_modules  # noqa: E402
+from core.access.permission_snapshot import permission_snapshot      # noqa: E402
+from bot.shared_auth import is_user_approved                         # noqa: E402
+
+_BASE_TG = 7_000_000
+
+
+def _seed(n: int) -> None:
+    with SessionLocal() as s:
+        for i in range(n):
+            tg = _BASE_TG + i
+            s.add(User(tg_user_id=tg, full_name=f"u{i}", is_approved=True, is_active=True))
+            s.add(UserModuleAccess(tg_user_id=tg, module_key="user_reports", is_active=True))
+            if i % 3 == 0:
+                s.add(UserModuleAccess(tg_user_id=tg, module_key="healthcare", is_active=True))
+        s.commit()
+
+
+def _db_check(tg: int) -> bool:
+    with SessionLocal() as s:
+        u = s.query(User).filter_by(tg_user_id=tg).first()
+        if not (u and u.is_approved and not u.is_suspended):
+            return False
+    return "user_reports" in _get_user_modules_db(tg)
+
+
+def _snapshot_check(tg: int) -> bool:
+    return is_user_approved(tg) and "user_reports" in get_user_modules(tg)
+
+
+def _bench(fn, ids) -> tuple[float, float]:
+    samples = []
+    for tg in ids:
+        t0 = time.perf_counter()
+        fn(tg)
+        samples.append(time.perf_counter() - t0)
+    samples.sort()
+    return (sum(samples) / len(samples)) * 1e6, samples[int(0.99 * (len(samples) - 1))] * 1e6
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--users", type=int, default=500)
+    ap.add_argument("--checks", type=int, default=20000)
+    args = ap.parse_args()
+
+    _seed(args.users)
+    ids = [_BASE_TG + random.randrange(args.users) for _ in range(args.checks)]
+
+    permission_snapshot.load()
+    for mode, fn in (("db", _db_check), ("snapshot", _snapshot_check)):
+        mean_us, p99_us = _bench(fn, ids)
+        print(f"{mode:>8}: mean={mean_us:8.1f}µs  p99={p99_us:8.1f}µs per callback")
+    print("snapshot:", permission_snapshot.stats())
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,149 @@
+# Benchmark: pharmacy evacuation ledger (query + Excel export) on a long manifest.
+#
+# مسير سنة كاملة = عشرات آلاف سجلات صرف. يقيس لكل حجم (زمن + ذروة الذاكرة
+# عبر tracemalloc):
+#   legacy — كائنات ORM كاملة للنوعين + IN (...) بكل المعرّفات + قائمة صفوف
+#            (السلوك السابق؛ على SQLite أقدم من 3.32 يفشل فوق 999 متغيراً — يُطبع الخطأ)
+#   list   — استعلام JOIN الجديد كقائمة (مسار PDF)
+#   stream — iter_evacuation_ledger_rows → build_evacuation_excel (write-only)
+#
+# ذروة "stream" يجب أن تبقى ثابتة تقريباً من 10k إلى 100k صف؛ الحجم
+# النهائي لملف xlsx نفسه (BytesIO) هو الجزء الوحيد الذي ينمو. مرجع:
+#     10000  legacy:  0.95 s  peak  38.8 MiB | stream:  6.16 s  peak 1.3 MiB
+#    100000  legacy: 14.13 s  peak 391.1 MiB | stream: 30.12 s  peak 4.9 MiB (3.9 MB xlsx)
+#
+# قاعدة SQLite مؤقتة تُزرع بسجلات صرف (60% أدوية / 40% مستلزمات) مع
+# سجل مالي لكل منها (وبعضها بتعديل لاحق — آخر سجل هو المعتمد).
+#
+# Run from project root:
+#   python scripts/bench_pharmacy_ledger.py [--rows 10000,100000]
+import argparse
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import date, datetime, timedelta
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from sqlalchemy import create_engine, insert  # noqa: E402
+from sqlalchemy.orm import sessionmaker      # noqa: E402
+
+import db.session as db_session  # noqa: E402
+from db.models import Base, MedicationRecord, PharmacyFinancialRecord, SuppliesRecord  # noqa: E402
+import services.pharmacy_evacuation_service as pes  # noqa: E402
+from services.pharmacy_evacuation_excel import build_evacuation_excel  # noqa: E402
+
+START = date(2025, 1, 1)
+END = date(2025, 12, 31)
+
+
+def seed(factory, n: int) -> None:
+    """n سجلات صرف من الصيدلية موزعة على سنة، كلها ببيانات مالية."""
+    base = datetime(2025, 1, 1, 8)
+    step = timedelta(minutes=max(1, 365 * 24 * 60 // max(n, 1)))
+    meds, sups = [], []
+    for i in range(n):
+        row = {
+            "id": i + 1,
+            "patient_name": f"مريض {i}",
+            "item_count": str(1 + i % 9) if i % 3 else "باراسيتامول 500، أموكسيسيلين",
+            "dispense_source": pes._PHARMACY_SOURCE,
+            "specialist_name": f"مختص {i % 4}",
+            "created_by": 1 + i % 5,
+            "created_at": base + step * i,
+        }
+        (meds if i % 5 < 3 else sups).append(row)
+    fins = []
+    for kind, rows in (("medication", meds), ("supplies", sups)):
+        for r in rows:
+            fin = {
+                "source_type": kind, "source_record_id": r["id"],
+                "invoice_number": f"INV-{r['id']}", "expense_item": "أدوية",
+                "net_amount": 100.0 + r["id"] % 250, "manifest_type": "ABC"[r["id"] % 3],
+                "is_deleted": False,
+            }
+            fins.append(fin)
+            if r["id"] % 10 == 0:
+                fins.append(dict(fin, net_amount=fin["net_amount"] + 1))   # تعديل لاحق
+    with factory() as s:
+        for model, rows in ((MedicationRecord, meds), (SuppliesRecord, sups), (PharmacyFinancialRecord, fins)):
+            for i in range(0, len(rows), 5000):
+                s.execute(insert(model), rows[i:i + 5000])
+        s.commit()
+
+
+def legacy_rows(factory) -> list:
+    """الاستعلام السابق: ORM كامل للنوعين + IN (...) بكل المعرّفات."""
+    start_dt = datetime.combine(START, datetime.min.time())
+    end_dt = datetime.combine(END, datetime.max.time())
+    with factory() as s:
+        source = []
+        for kind, model in (("medication", MedicationRecord), ("supplies", SuppliesRecord)):
+            source += [(kind, r) for r in s.query(model).filter(
+                model.dispense_source == pes._PHARMACY_SOURCE,
+                model.created_at >= start_dt, model.created_at <= end_dt,
+            ).all()]
+        fin_rows = s.query(PharmacyFinancialRecord).filter(
+            PharmacyFinancialRecord.source_type.in_({k for k, _ in source}),
+            PharmacyFinancialRecord.source_record_id.in_({r.id for _, r in source}),
+        ).all()
+        by_key = {(f.source_type, f.source_record_id): f for f in fin_rows}
+        rows = []
+        for kind, r in source:
+            fin = by_key.get((kind, r.id))
+            if fin is not None:
+                rows.append({
+                    "amount": fin.net_amount or 0.0, "name": r.patient_name or "—",
+                    "invoice_number": fin.invoice_number or "—", "expense_item": fin.expense_item or "—",
+                    "statement": pes._format_dispense_statement(r.item_count, kind),
+                    "date": r.created_at.date(), "manifest_type": fin.manifest_type or "A",
+                    "_sort_dt": r.created_at,
+                })
+        rows.sort(key=lambda r: r["_sort_dt"])
+        return rows
+
+
+def _measure(label: str, n: int, fn) -> None:
+    """الزمن من تشغيل عادي، والذروة من تشغيل ثانٍ تحت tracemalloc (يبطئ كثيراً)."""
+    t0 = time.perf_counter()
+    try:
+        out = fn()
+    except Exception as exc:
+        print(f"{n:>7} {label:>7}: FAILED ({str(exc).splitlines()[0][:70]})")
+        return
+    elapsed = time.perf_counter() - t0
+    size = f"{len(out):>7} rows" if isinstance(out, list) else f"{len(out.getvalue()) // 1024:>7} KiB"
+    del out
+    tracemalloc.start()
+    fn()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    print(f"{n:>7} {label:>7}: {elapsed:7.2f} s  peak {peak / 2**20:7.1f} MiB  {size}")
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--rows", default="10000,100000", help="comma-separated dispense row counts")
+    args = ap.parse_args()
+
+    for n in (int(x) for x in args.rows.split(",")):
+        with tempfile.TemporaryDirectory() as tmp:
+            engine = create_engine(f"sqlite:///{os.path.join(tmp, 'ledger.db')}")
+            Base.metadata.create_all(engine)
+            factory = sessionmaker(bind=engine)
+            db_session.SessionLocal = factory
+            seed(factory, n)
+
+            _measure("legacy", n, lambda: legacy_rows(factory))
+            _measure("list", n, lambda: pes._get_evacuation_ledger_rows_sync(START, END))
+            _measure("stream", n, lambda: build_evacuation_excel(
+                pes.iter_evacuation_ledger_rows(START, END), START, END))
+            count, total = pes._get_evacuation_ledger_summary_sync(START, END)
+            print(f"{'':>7} summary: {count} rows, total {total:,.2f}")
+            engine.dispose()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,145 @@
+# Benchmark: report card formatting cost per publish.
+#
+# نشر واحد = بطاقة المجموعة + نسخة لكل أدمن + نسخة المستخدم، وكل نسخة
+# كانت تُقسَّم (_split_telegram_message) من جديد؛ ومسار التعديل يعيد تنسيق
+# البطاقة مرتين (البث + رسالة النجاح). يقيس لكل تقرير في المدوّنة:
+#   cold   — أول نشر (تنسيق + تقسيم مرة واحدة)
+#   warm   — إعادة نشر/تعديل لنفس التقرير بنفس البيانات → من الذاكرة
+#   legacy — تنسيق بلا ذاكرة + تقسيم لكل مستلم (السلوك السابق)
+#
+# المدوّنة: مدوّنة اصطناعية تغطي كل أنواع الإجراءات، أو التقارير المحفوظة
+# في DATABASE_PATH مع --from-db.
+#
+# Run from project root:
+#   python scripts/bench_report_format.py [--reports 2000] [--admins 3] [--from-db]
+import argparse
+import os
+import sys
+import time
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+import services.broadcast_service as bs  # noqa: E402
+from services.caching import get_cache   # noqa: E402
+
+ACTIONS = (
+    "استشارة جديدة", "متابعة", "متابعة في الرقود", "طوارئ", "عملية", "ترقيد",
+    "خروج من المستشفى", "علاج طبيعي", "أجهزة تعويضية", "المناظير", "تأجيل موعد",
+    "استشارة مع قرار عملية", "أشعة وفحوصات", "استشارة أخيرة", "جلسة إشعاعي",
+    "العلاج الكيماوي", "جلسات غسيل الكلى", "العلاج الكيماوي + جلسة إشعاعي", "معاملة الزراعة",
+)
+
+
+def synthetic_corpus(n: int) -> list:
+    """n تقارير بحقول ممتلئة لكل أنواع الإجراءات (نصوص فيها محارف Markdown)."""
+    base = datetime(2026, 3, 10, 9, 30)
+    corpus = []
+    for i in range(n):
+        action = ACTIONS[i % len(ACTIONS)]
+        long_text = f"Patient_{i} reports *pain* [grade {i % 5}] — " + "متابعة الحالة اليومية. " * (1 + i % 40)
+        corpus.append({
+            "report_id": i + 1,
+            "updated_at": base + timedelta(minutes=i),
+            "report_date": (base + timedelta(hours=i % 48)).strftime("%Y-%m-%d %H:%M"),
+            "patient_name": f"مريض_{i}",
+            "hospital_name": "Apollo Hospital (Chennai)",
+            "department_name": "Oncology_Dept",
+            "doctor_name": "د. سرور" if i % 3 else "لم يتم التحديد",
+            "medical_action": action,
+            "complaint_text": long_text,
+            "diagnosis": f"Diagnosis {i}: C_{i % 7}",
+            "decision": f"قرار {i}: continue `plan`",
+            "tests": "CBC, LFT" if i % 2 else "",
+            "notes": long_text if i % 4 == 0 else "",
+            "operation_name_en": "Laparoscopic cholecystectomy",
+            "operation_details": "تفاصيل العملية",
+            "success_rate": "95%",
+            "benefit_rate": "80%",
+            "admission_reason": "مراقبة",
+            "room_number": str(100 + i % 50),
+            "app_reschedule_reason": "انشغال الطبيب",
+            "app_reschedule_return_date": "2026-03-20",
+            "radiology_type": "MRI",
+            "radiology_delivery_date": "2026-03-12",
+            "radiation_therapy_type": "IMRT",
+            "radiation_therapy_session_number": str(1 + i % 20),
+            "radiation_therapy_remaining": str(i % 10),
+            "treatment_plan_summary": "6 جلسات",
+            "chemo_session_number": 1 + i % 6,
+            "transplant_type": "كلى",
+            "transplant_parties": "المتبرع: أخ",
+            "followup_date": "2026-03-25" if i % 2 else "",
+            "followup_time": "10:00",
+            "followup_reason": "مراجعة النتائج",
+            "translator_name": f"مترجم_{i % 12}",
+            "has_paper_report": i % 3,
+            "is_edit": i % 5 == 0,
+        })
+    return corpus
+
+
+def saved_corpus(limit: int) -> list:
+    """آخر التقارير المحفوظة (أعمدة Report كما هي، كمسار إعادة النشر)."""
+    from db.session import SessionLocal
+    from db.models import Report
+
+    rows = []
+    with SessionLocal() as s:
+        for r in s.query(Report).order_by(Report.id.desc()).limit(limit):
+            data = {c.name: getattr(r, c.name) for c in Report.__table__.columns}
+            data.update({
+                "report_id": r.id,
+                "report_date": r.report_date.strftime("%Y-%m-%d %H:%M") if r.report_date else None,
+                "patient_name": data.get("patient_name") or f"#{r.patient_id}",
+                "decision": "",
+            })
+            rows.append(data)
+    return rows
+
+
+def _publish(message, admins: int) -> int:
+    """ما يفعله broadcast_new_report لنصّ واحد: مجموعة + أدمن + مستخدم."""
+    parts = 0
+    for text in [message] * (admins + 1) + ["📋 **نسخة التقرير المنشور:**\n\n" + message]:
+        parts += len(getattr(text, "chunks", None) or bs._split_telegram_message(text))
+    return parts
+
+
+def _run(label: str, corpus: list, fmt, admins: int) -> None:
+    t0 = time.perf_counter()
+    for data in corpus:
+        _publish(fmt(data), admins)
+    per = (time.perf_counter() - t0) / len(corpus) * 1e6
+    print(f"{label:>8}: {per:8.1f} µs/publish  ({len(corpus)} reports)")
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--reports", type=int, default=2000)
+    ap.add_argument("--admins", type=int, default=3)
+    ap.add_argument("--from-db", action="store_true", help="use saved reports from DATABASE_PATH")
+    args = ap.parse_args()
+
+    corpus = saved_corpus(args.reports) if args.from_db else synthetic_corpus(args.reports)
+    if not corpus:
+        print("no reports in corpus")
+        return
+
+    # كل المدوّنة في الذاكرة: "warm" يقيس إعادة النشر لا الإخلاء
+    bs.REPORT_RENDER_CACHE_SIZE = max(bs.REPORT_RENDER_CACHE_SIZE, len(corpus))
+    cache = get_cache("report_cards", default_ttl=bs.REPORT_RENDER_CACHE_TTL,
+                      max_entries=bs.REPORT_RENDER_CACHE_SIZE)
+    cache.max_entries = bs.REPORT_RENDER_CACHE_SIZE
+    cache.clear()
+
+    legacy = lambda data: str(bs.render_report_card(data))  # noqa: E731
+    _run("legacy", corpus, legacy, args.admins)
+    _run("cold", corpus, bs.format_report_message, args.admins)
+    _run("warm", corpus, bs.format_report_message, args.admins)
+    stats = cache.stats()
+    print(f"   cache: {stats['hits']} hits / {stats['misses']} misses, {stats['items']} entries")
+
+
+if __name__ == "__main__":
+    main()
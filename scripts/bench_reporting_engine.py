@@ -0,0 +1,118 @@
+# Benchmark: reporting engine data collection, ORM rows vs SQL aggregation.
+#
+# يملأ قاعدة مؤقتة بـN تقرير على مدى سنة ثم يبني تقريراً شاملاً لكامل السنة:
+#   orm — المسار القديم: query(Report).all() ثم العدّ في Python
+#   sql — ReportDataCollector الحالي: GROUP BY في قاعدة البيانات
+#   rows — iter_detail_rows(): بث صفوف الجدول التفصيلي على دفعات
+# ويطبع الزمن وذروة الذاكرة (tracemalloc) لكل مسار.
+#
+# Run from project root (temporary DB, production untouched):
+#   python scripts/bench_reporting_engine.py [--reports 200000]
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+import tracemalloc
+from collections import defaultdict
+from datetime import date, datetime, timedelta
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+_tmp = tempfile.mkdtemp(prefix="bench_re_")
+os.environ["DATABASE_PATH"] = os.path.join(_tmp, "bench.db")
+
+from db.session import SessionLocal, engine                                # noqa: E402
+from db.models import Report                                               # noqa: E402
+from services.reporting_engine.filters import CompositeFilter, DateRangeFilter  # noqa: E402
+from services.reporting_engine.report_data_collector import ReportDataCollector  # noqa: E402
+from shared.report_constants import ReportType                             # noqa: E402
+
+_HOSPITALS = [f"Hospital {i}" for i in range(40)]
+_DEPARTMENTS = [f"Department {i}" for i in range(25)]
+_ACTIONS = ["استشارة جديدة", "متابعة", "عملية", "أشعة", "مراجعة", "علاج طبيعي", None]
+
+
+def _seed(n: int) -> None:
+    rnd = random.Random(7)
+    start = datetime(2025, 1, 1)
+    batch = []
+    for i in range(n):
+        batch.append({
+            "hospital_id": rnd.randrange(40),
+            "hospital_name": rnd.choice(_HOSPITALS),
+            "department": rnd.choice(_DEPARTMENTS),
+            "medical_action": rnd.choice(_ACTIONS),
+            "doctor_name": f"Dr {rnd.randrange(300)}",
+            "translator_name": f"Translator {rnd.randrange(30)}",
+            "patient_id": rnd.randrange(n // 4 or 1),
+            "patient_name": f"Patient {i}",
+            "report_date": start + timedelta(minutes=rnd.randrange(365 * 24 * 60)),
+            "complaint_text": "شكوى " * rnd.randrange(20, 120),
+            "doctor_decision": "قرار " * rnd.randrange(20, 120),
+        })
+        if len(batch) == 10_000:
+            with engine.begin() as conn:
+                conn.execute(Report.__table__.insert(), batch)
+            batch = []
+    if batch:
+        with engine.begin() as conn:
+            conn.execute(Report.__table__.insert(), batch)
+
+
+def _filters() -> CompositeFilter:
+    f = CompositeFilter()
+    f.add("date", DateRangeFilter(start_date=date(2025, 1, 1), end_date=date(2025, 12, 31)))
+    return f
+
+
+def _orm(filters):
+    with SessionLocal() as s:
+        reports = filters.apply(s.query(Report)).all()
+        out = defaultdict(lambda: defaultdict(int))
+        for r in reports:
+            for field in ("hospital_name", "department", "medical_action", "doctor_name", "translator_name"):
+                value = getattr(r, field)
+                if value:
+                    out[field][value] += 1
+            if r.report_date:
+                out["by_date"][r.report_date.strftime("%Y-%m-%d")] += 1
+        return len(reports)
+
+
+def _sql(filters):
+    return ReportDataCollector().collect(ReportType.GLOBAL, filters)["total_records"]
+
+
+def _rows(filters):
+    return sum(1 for _ in ReportDataCollector().iter_detail_rows(filters))
+
+
+def _measure(fn, filters):
+    tracemalloc.start()
+    t0 = time.perf_counter()
+    total = fn(filters)
+    elapsed = time.perf_counter() - t0
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return total, elapsed, peak / (1024 * 1024)
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--reports", type=int, default=200_000)
+    args = ap.parse_args()
+
+    t0 = time.perf_counter()
+    _seed(args.reports)
+    print(f"seeded {args.reports} reports in {time.perf_counter() - t0:.1f}s")
+
+    filters = _filters()
+    for label, fn in (("orm", _orm), ("sql", _sql), ("rows", _rows)):
+        total, elapsed, peak = _measure(fn, filters)
+        print(f"{label:>4}: {elapsed * 1000:8.0f}ms   peak {peak:7.1f}MB   records={total}")
+
+
+if __name__ == "__main__":
+    main()
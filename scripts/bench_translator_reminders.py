@@ -0,0 +1,103 @@
+# Benchmark: translator reminder jobs as the roster grows.
+#
+# يملأ قاعدة مؤقتة بـN مترجم (نصفهم رفع تقريراً اليوم، وبعضهم له سجل تتبع)
+# ثم يشغّل مهمتَي التنبيه مع بوت وهمي (لا Telegram):
+#   reminders — services/translator_reminders.check_and_send_reminders (2 PM)
+#   tracker   — services/schedule_tracker: تحديث العدد + تذكير بعد الظهر
+# ويطبع الزمن وعدد استعلامات SQL لكل N — يجب أن يبقى العدد ثابتاً.
+#
+# Run from project root (temporary DB, production untouched):
+#   python scripts/bench_translator_reminders.py [--sizes 50 500 5000]
+import argparse
+import asyncio
+import os
+import sys
+import tempfile
+import time
+from datetime import date, datetime
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+_tmp = tempfile.mkdtemp(prefix="bench_rem_")
+os.environ["DATABASE_PATH"] = os.path.join(_tmp, "bench.db")
+# بوت وهمي: لا حدود معدل Telegram في القياس
+os.environ.setdefault("SEND_GLOBAL_RATE", "1000000")
+os.environ.setdefault("SEND_MAX_CONCURRENCY", "256")
+
+from sqlalchemy import event, text                                   # noqa: E402
+
+from db.session import engine                                        # noqa: E402
+from db.models import DailyReportTracking, Report, User              # noqa: E402
+import services.schedule_tracker as tracker_mod                      # noqa: E402
+from services.translator_reminders import check_and_send_reminders   # noqa: E402
+
+NOW = datetime(2026, 3, 10, 14, 30)
+
+
+class _Day(date):
+    @classmethod
+    def today(cls):
+        return NOW.date()
+
+
+class _FakeBot:
+    sent = 0
+
+    async def send_message(self, chat_id, text, **kwargs):
+        _FakeBot.sent += 1
+
+
+def _seed(n: int) -> None:
+    with engine.begin() as conn:
+        for table in ("translator_notifications", "daily_report_tracking", "reports", "users"):
+            conn.execute(text(f"DELETE FROM {table}"))
+        conn.execute(User.__table__.insert(), [
+            {"id": i, "tg_user_id": 10_000 + i, "full_name": f"Translator {i}", "is_active": True}
+            for i in range(1, n + 1)
+        ])
+        conn.execute(Report.__table__.insert(), [
+            {"translator_id": i, "status": "active", "report_date": NOW, "created_at": datetime(2026, 3, 10, 6)}
+            for i in range(2, n + 1, 2)
+        ])
+        conn.execute(DailyReportTracking.__table__.insert(), [
+            {"translator_id": i, "translator_name": f"Translator {i}", "date": NOW.date(),
+             "expected_reports": 1, "reminder_sent": False}
+            for i in range(1, n + 1, 3)
+        ])
+
+
+async def _tracker(bot):
+    tracker = tracker_mod.ScheduleTracker(bot=bot)
+    await tracker.update_daily_reports_count()
+    await tracker._send_afternoon_reminders(NOW.date())
+
+
+def _measure(label: str, coro_fn) -> None:
+    statements = []
+    listener = lambda *a: statements.append(1)  # noqa: E731
+    event.listen(engine, "before_cursor_execute", listener)
+    _FakeBot.sent = 0
+    t0 = time.perf_counter()
+    try:
+        asyncio.run(coro_fn(_FakeBot()))
+    finally:
+        event.remove(engine, "before_cursor_execute", listener)
+    elapsed = time.perf_counter() - t0
+    print(f"   {label:>9}: {elapsed * 1000:8.1f}ms   sql={len(statements):3d}   sent={_FakeBot.sent}")
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--sizes", type=int, nargs="+", default=[50, 500, 5000])
+    args = ap.parse_args()
+
+    tracker_mod.date = _Day
+    for n in args.sizes:
+        _seed(n)
+        print(f"translators={n}")
+        _measure("tracker", _tracker)
+        _measure("reminders", lambda bot: check_and_send_reminders(bot, now=NOW))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,79 @@
+# Benchmark: small concurrent writes, one-session-per-write vs the single writer.
+#
+# يحاكي N مترجماً (خيوط) يكتب كل منهم M سجلاً صغيراً (مثل حفظ ملف مرفق
+# أو تتبّع نشاط). يقارن:
+#   direct — كل كتابة تفتح SessionLocal وتعمل commit بنفسها (السلوك القديم)
+#   writer — كل كتابة تمرّ عبر db.write_queue.write (group commit)
+#
+# Run from project root (temporary DB, production untouched):
+#   python scripts/bench_write_queue.py [--writes 200]
+import argparse
+import os
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+_tmp = tempfile.mkdtemp(prefix="bench_wq_")
+os.environ["DATABASE_PATH"] = os.path.join(_tmp, "bench.db")
+
+from db.session import SessionLocal                   # noqa: E402
+from db.models import MedicalAttachmentFile           # noqa: E402
+from db.write_queue import write, write_queue_stats   # noqa: E402
+
+
+def _row(i: int) -> MedicalAttachmentFile:
+    return MedicalAttachmentFile(report_id=i, file_id=f"f{i}", file_type="photo")
+
+
+def _direct(i: int) -> None:
+    with SessionLocal() as s:
+        s.add(_row(i))
+        s.commit()
+
+
+def _insert_tx(session, i: int) -> None:
+    session.add(_row(i))
+
+
+def _via_writer(i: int) -> None:
+    write(_insert_tx, i)
+
+
+def _run(fn, threads: int, writes: int) -> tuple[float, int]:
+    errors = []
+
+    def _worker(tid: int) -> None:
+        for j in range(writes):
+            try:
+                fn(tid * 100_000 + j)
+            except Exception as e:
+                errors.append(e)
+
+    ts = [threading.Thread(target=_worker, args=(t,)) for t in range(threads)]
+    t0 = time.perf_counter()
+    for t in ts:
+        t.start()
+    for t in ts:
+        t.join()
+    return time.perf_counter() - t0, len(errors)
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--writes", type=int, default=200, help="writes per translator")
+    args = ap.parse_args()
+
+    print(f"{'translators':>11} | {'direct w/s':>10} {'errors':>6} | {'writer w/s':>10} {'errors':>6}")
+    for threads in (1, 5, 20, 50):
+        total = threads * args.writes
+        d_t, d_err = _run(_direct, threads, args.writes)
+        w_t, w_err = _run(_via_writer, threads, args.writes)
+        print(f"{threads:>11} | {total / d_t:>10.0f} {d_err:>6} | {total / w_t:>10.0f} {w_err:>6}")
+    print("write queue:", write_queue_stats())
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,71 @@
+# Consistency check: report_daily_rollup vs the raw scan of reports.
+#
+# يحسب إحصائيات المترجمين للفترة مرتين — من الـrollup (db/report_rollup.py)
+# ومن المسح الخام في services/stats_service — ويطبع كل فرق لكل مترجم وحقل.
+# Exit code 1 إن وُجد فرق.
+#
+# Run from project root:
+#   python scripts/check_report_rollup.py --year 2026 [--month 3]
+#   python scripts/check_report_rollup.py --start 2026-03-01 --end 2026-04-01
+#   python scripts/check_report_rollup.py --year 2026 --rebuild   # إعادة البناء ثم الفحص
+import argparse
+import os
+import sys
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from db.report_rollup import ensure_report_rollup, rebuild_report_rollup  # noqa: E402
+from db.session import SessionLocal, engine                               # noqa: E402
+from services import stats_service                                         # noqa: E402
+
+
+def _range(args) -> tuple[str, str]:
+    if args.start and args.end:
+        return args.start, args.end
+    if args.month:
+        end = f"{args.year + 1}-01-01" if args.month == 12 else f"{args.year}-{args.month + 1:02d}-01"
+        return f"{args.year}-{args.month:02d}-01", end
+    return f"{args.year}-01-01", f"{args.year + 1}-01-01"
+
+
+def main() -> int:
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--year", type=int)
+    ap.add_argument("--month", type=int)
+    ap.add_argument("--start")
+    ap.add_argument("--end", help="exclusive")
+    ap.add_argument("--rebuild", action="store_true")
+    args = ap.parse_args()
+    if not (args.year or (args.start and args.end)):
+        ap.error("--year or --start/--end required")
+
+    start, end = _range(args)
+    if args.rebuild:
+        rebuild_report_rollup(engine)
+    else:
+        ensure_report_rollup(engine)
+
+    with SessionLocal() as s:
+        rolled = stats_service._build_results(*stats_service._fetch_from_rollup(s, start, end), start, end)
+        raw = stats_service._build_results(*stats_service._fetch_from_reports(s, start, end), start, end)
+
+    rolled_by_name = {r["translator_name"]: r for r in rolled}
+    raw_by_name = {r["translator_name"]: r for r in raw}
+    diffs = 0
+    for name in sorted(set(rolled_by_name) | set(raw_by_name), key=str):
+        a, b = rolled_by_name.get(name), raw_by_name.get(name)
+        if a is None or b is None:
+            print(f"✗ {name}: {'missing from rollup' if a is None else 'missing from raw scan'}")
+            diffs += 1
+            continue
+        for field in b:
+            if a[field] != b[field]:
+                print(f"✗ {name}.{field}: rollup={a[field]!r} raw={b[field]!r}")
+                diffs += 1
+
+    print(f"[{start} → {end}) translators={len(raw)} reports={sum(r['total_reports'] for r in raw)} diffs={diffs}")
+    return 1 if diffs else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,47 @@
+# Startup profile: cold interpreter → all handlers registered → first update routed.
+#
+# يطبع الزمن الكلي، الحزم الأغلى استيراداً (self time من -X importtime)،
+# الوحدات الأغلى (cumulative)، وأي حزمة ثقيلة (PDF/رسوم/CV/AI) حُمِّلت
+# أثناء الإقلاع رغم أنها يجب أن تنتظر أول استعمال.
+#
+# Run from project root:
+#   python scripts/profile_startup.py [--top 25] [--no-importtime]
+import argparse
+import os
+import sys
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from bot.startup_profile import DEFERRED_MODULES, STARTUP_BUDGET_SECONDS, measure_cold_start  # noqa: E402
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--top", type=int, default=25)
+    ap.add_argument("--no-importtime", action="store_true", help="time only (no -X importtime overhead)")
+    args = ap.parse_args()
+
+    result = measure_cold_start(importtime=not args.no_importtime)
+    if result.get("note"):
+        print(f"note: {result['note']}")
+    print(f"cold start → first update routed: {result['elapsed_s']:.2f}s "
+          f"(registration {result['registered_s']:.2f}s, budget {STARTUP_BUDGET_SECONDS:.1f}s)")
+    print(f"handlers: {result['handlers']}   groups matched by /start: {result['groups_matched']}")
+
+    if "packages" in result:
+        print(f"\ntop {args.top} packages (self import time):")
+        for name, us in list(result["packages"].items())[:args.top]:
+            print(f"  {us / 1000:8.1f}ms  {name}")
+        print(f"\ntop {args.top} modules (cumulative import time):")
+        for name, us in list(result["modules"].items())[:args.top]:
+            print(f"  {us / 1000:8.1f}ms  {name}")
+
+    loaded = result["deferred_loaded"]
+    print(f"\ndeferred packages loaded at startup: {', '.join(loaded) if loaded else 'none'}")
+    print(f"(deferred: {', '.join(DEFERRED_MODULES)})")
+    if loaded:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,451 @@
+# ================================================
+# services/attachment_jobs.py
+# 🔹 Persistent background job queue (attachment publishing)
+# ================================================
+#
+# نشر المرفقات (تحميل الصور، pipeline التحسين، بناء PDF، الإرسال للمجموعة،
+# حفظ السجلات) كان يجري داخل callback الزر: المترجم ينتظر دوّامة التحميل،
+# وإعادة تشغيل البوت في المنتصف تُضيّع العمل.
+#
+# هنا طابور مهام في جدول SQLite (AttachmentPublishJob):
+#   • submit_job(...)   → يُدرج المهمة (عبر الكاتب الموحَّد) ويوقظ العمّال؛
+#                          الـhandler يعود خلال ميلي ثوانٍ
+#   • مفتاح idempotency لكل مهمة (تقرير + ملفاته): الضغط المزدوج أو إعادة
+#     إرسال نفس الزر لا يُنشئ مهمة ثانية ما دامت الأولى في الطابور/تعمل، أو
+#     اكتملت قبل أقل من ATTACHMENT_JOB_DEDUPE_WINDOW ثانية؛ بعدها إعادة نشر
+#     نفس الملفات عمداً تعيد نفس السطر للطابور
+#   • ATTACHMENT_JOB_WORKERS عامل (coroutines) — الإنتاجية تتبع عدد العمّال
+#   • فشل ⇒ إعادة بتراجع أُسّي حتى max_attempts؛ PermanentJobError ⇒ فشل فوري
+#   • المهام "running" عند الإقلاع تعود للطابور (أُوقفت بإعادة التشغيل)
+#   • JobContext.progress() يحدّث رسالة المستخدم بالتقدّم، و mark_step()
+#     يحفظ المراحل المنجزة فلا تتكرر عند إعادة المحاولة
+#
+# المهام تُنفَّذ بدوال مسجّلة لكل نوع:
+#
+#     register_job_handler("ma_publish", _run_publish_job, on_failed=_publish_failed)
+#
+#     async def _run_publish_job(bot, job: JobContext):
+#         if not job.step_done("photos"):
+#             ...send...
+#             await job.mark_step("photos")
+#         await job.progress("✅ تم النشر")
+
+import asyncio
+import json
+import logging
+import os
+import time
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta
+from typing import Awaitable, Callable, Dict, Optional, Tuple
+
+from db.models import AttachmentPublishJob
+from db.write_queue import run_write
+
+logger = logging.getLogger(__name__)
+
+ATTACHMENT_JOB_WORKERS = int(os.getenv("ATTACHMENT_JOB_WORKERS", "2"))
+ATTACHMENT_JOB_MAX_ATTEMPTS = int(os.getenv("ATTACHMENT_JOB_MAX_ATTEMPTS", "5"))
+ATTACHMENT_JOB_RETRY_BASE = float(os.getenv("ATTACHMENT_JOB_RETRY_BASE", "5"))
+ATTACHMENT_JOB_RETRY_MAX = float(os.getenv("ATTACHMENT_JOB_RETRY_MAX", "300"))
+# أقصى انتظار قبل فحص الجدول من جديد (مهام مؤجَّلة لإعادة المحاولة)
+ATTACHMENT_JOB_POLL_INTERVAL = float(os.getenv("ATTACHMENT_JOB_POLL_INTERVAL", "5"))
+# مهمة مكتملة تحجب نفس الطلب هذه المدة فقط (زر قديم يُضغط مجدداً)
+ATTACHMENT_JOB_DEDUPE_WINDOW = float(os.getenv("ATTACHMENT_JOB_DEDUPE_WINDOW", "300"))
+
+
+class PermanentJobError(Exception):
+    """فشل لن تصلحه إعادة المحاولة (إعدادات ناقصة، تقرير محذوف…)."""
+
+
+@dataclass
+class _JobHandler:
+    run: Callable[..., Awaitable[None]]
+    on_failed: Optional[Callable[..., Awaitable[None]]] = None
+
+
+_HANDLERS: Dict[str, _JobHandler] = {}
+
+
+def register_job_handler(kind: str, run, on_failed=None) -> None:
+    """run(bot, job) ينفّذ المهمة؛ on_failed(bot, job, error) بعد آخر محاولة فاشلة."""
+    _HANDLERS[kind] = _JobHandler(run, on_failed)
+
+
+def retry_delay(attempt: int) -> float:
+    """تراجع أُسّي: 5s, 10s, 20s… حتى ATTACHMENT_JOB_RETRY_MAX."""
+    return min(ATTACHMENT_JOB_RETRY_MAX, ATTACHMENT_JOB_RETRY_BASE * 2 ** max(0, attempt - 1))
+
+
+# ---------------------------------------------------------------------------
+# Transactions (run through db.write_queue — fn(session, ...), no commit)
+# ---------------------------------------------------------------------------
+
+def _enqueue_tx(session, kind, key, payload, report_id, chat_id, message_id, max_attempts) -> Tuple[int, str]:
+    """(job_id, outcome): "created"، أو حالة المهمة القائمة التي أغنت عنها."""
+    job = session.query(AttachmentPublishJob).filter_by(idempotency_key=key).first()
+    if job is not None:
+        now = datetime.utcnow()
+        if job.status == "queued":
+            # لم تبدأ بعد ⇒ نتيجتها تُكتب في رسالة آخر طلب
+            if chat_id and message_id:
+                job.chat_id, job.message_id = chat_id, message_id
+            return job.id, "queued"
+        if job.status == "running":
+            return job.id, "running"
+        if job.status == "done":
+            if job.finished_at and now - job.finished_at < timedelta(seconds=ATTACHMENT_JOB_DEDUPE_WINDOW):
+                return job.id, "done"
+            # إعادة نشر نفس الملفات عمداً ⇒ من البداية (لا مراحل منجزة)
+            job.state = "{}"
+            job.payload = json.dumps(payload, ensure_ascii=False, default=str)
+        # فشلت نهائياً (تكمل من آخر مرحلة) أو اكتملت منذ مدة ⇒ نفس السطر يعود للطابور
+        job.status = "queued"
+        job.attempts = 0
+        job.last_error = None
+        job.finished_at = None
+        job.next_run_at = now
+        job.chat_id, job.message_id = chat_id, message_id
+        return job.id, "created"
+    job = AttachmentPublishJob(
+        kind=kind,
+        idempotency_key=key,
+        report_id=report_id,
+        status="queued",
+        payload=json.dumps(payload, ensure_ascii=False, default=str),
+        state="{}",
+        attempts=0,
+        max_attempts=max_attempts,
+        next_run_at=datetime.utcnow(),
+        chat_id=chat_id,
+        message_id=message_id,
+    )
+    session.add(job)
+    session.flush()
+    return job.id, "created"
+
+
+def _retry_tx(session, job_id, chat_id=None, message_id=None) -> bool:
+    job = session.get(AttachmentPublishJob, job_id)
+    if job is None or job.status != "failed":
+        return False
+    job.status = "queued"
+    job.attempts = 0
+    job.next_run_at = datetime.utcnow()
+    if chat_id and message_id:
+        job.chat_id, job.message_id = chat_id, message_id
+    return True
+
+
+def _claim_tx(session) -> Optional[dict]:
+    """أقدم مهمة مستحقة → running (الكاتب الموحَّد يضمن ألا يأخذها عاملان)."""
+    now = datetime.utcnow()
+    job = (
+        session.query(AttachmentPublishJob)
+        .filter(AttachmentPublishJob.status == "queued", AttachmentPublishJob.next_run_at <= now)
+        .order_by(AttachmentPublishJob.next_run_at, AttachmentPublishJob.id)
+        .first()
+    )
+    if job is None:
+        return None
+    job.status = "running"
+    job.attempts = (job.attempts or 0) + 1
+    return {
+        "id": job.id,
+        "kind": job.kind,
+        "report_id": job.report_id,
+        "payload": json.loads(job.payload or "{}"),
+        "state": json.loads(job.state or "{}"),
+        "attempts": job.attempts,
+        "max_attempts": job.max_attempts or ATTACHMENT_JOB_MAX_ATTEMPTS,
+        "chat_id": job.chat_id,
+        "message_id": job.message_id,
+        "queued_at": job.created_at,
+    }
+
+
+def _next_due_tx(session) -> Optional[datetime]:
+    job = (
+        session.query(AttachmentPublishJob.next_run_at)
+        .filter(AttachmentPublishJob.status == "queued")
+        .order_by(AttachmentPublishJob.next_run_at)
+        .first()
+    )
+    return job[0] if job else None
+
+
+def _save_state_tx(session, job_id, state) -> None:
+    session.query(AttachmentPublishJob).filter_by(id=job_id).update(
+        {"state": json.dumps(state, ensure_ascii=False, default=str)}, synchronize_session=False
+    )
+
+
+def _finish_tx(session, job_id, status, error=None, next_run_at=None) -> None:
+    values = {"status": status, "last_error": error}
+    if next_run_at is not None:
+        values["next_run_at"] = next_run_at
+    if status in ("done", "failed"):
+        values["finished_at"] = datetime.utcnow()
+    session.query(AttachmentPublishJob).filter_by(id=job_id).update(values, synchronize_session=False)
+
+
+def _recover_tx(session) -> int:
+    """مهام كانت تعمل لحظة توقف البوت ⇒ تعود للطابور فوراً."""
+    return (
+        session.query(AttachmentPublishJob)
+        .filter_by(status="running")
+        .update({"status": "queued", "next_run_at": datetime.utcnow()}, synchronize_session=False)
+    )
+
+
+def _counts_tx(session) -> dict:
+    from sqlalchemy import func
+    rows = (
+        session.query(AttachmentPublishJob.status, func.count(AttachmentPublishJob.id))
+        .group_by(AttachmentPublishJob.status)
+        .all()
+    )
+    return dict(rows)
+
+
+# ---------------------------------------------------------------------------
+# Job context
+# ---------------------------------------------------------------------------
+
+@dataclass
+class JobContext:
+    """ما تراه دالة المهمة: المدخلات، الحالة المحفوظة، وتحديث رسالة المستخدم."""
+
+    id: int
+    kind: str
+    payload: dict
+    state: dict
+    attempts: int
+    max_attempts: int
+    bot: object
+    chat_id: Optional[int] = None
+    message_id: Optional[int] = None
+    report_id: Optional[int] = None
+    queued_at: Optional[datetime] = None
+    _last_progress: Optional[str] = field(default=None, repr=False)
+
+    def step_done(self, name: str) -> bool:
+        return name in self.state.get("steps", [])
+
+    async def mark_step(self, name: str, **data) -> None:
+        """يحفظ مرحلة منجزة (وبياناتها) قبل الانتقال للتالية."""
+        steps = self.state.setdefault("steps", [])
+        if name not in steps:
+            steps.append(name)
+        self.state.update(data)
+        await run_write(_save_state_tx, self.id, self.state)
+
+    async def progress(self, text: str, reply_markup=None, parse_mode: Optional[str] = None) -> None:
+        """تحديث رسالة المستخدم (best-effort — فشل التعديل لا يُفشل المهمة)."""
+        if not (self.chat_id and self.message_id) or text == self._last_progress:
+            return
+        self._last_progress = text
+        from services.send_scheduler import send as send_via_scheduler
+        try:
+            await send_via_scheduler(
+                lambda: self.bot.edit_message_text(
+                    chat_id=self.chat_id, message_id=self.message_id, text=text,
+                    reply_markup=reply_markup, parse_mode=parse_mode,
+                ),
+                self.chat_id,
+            )
+        except Exception as e:
+            logger.debug(f"[jobs] progress edit skipped for job {self.id}: {e}")
+
+
+# ---------------------------------------------------------------------------
+# Queue
+# ---------------------------------------------------------------------------
+
+class AttachmentJobQueue:
+    """عمّال asyncio فوق جدول attachment_publish_jobs."""
+
+    def __init__(self, workers: int = ATTACHMENT_JOB_WORKERS):
+        self.workers = max(1, workers)
+        self.bot = None
+        self._tasks = []
+        self._wakeup: Optional[asyncio.Event] = None
+        self._stats = {"submitted": 0, "deduplicated": 0, "done": 0, "failed": 0, "retried": 0}
+        self._latencies = []
+
+    @property
+    def running(self) -> bool:
+        return any(not t.done() for t in self._tasks)
+
+    async def start(self, bot) -> None:
+        if self.running:
+            return
+        self.bot = bot
+        self._wakeup = asyncio.Event()
+        recovered = await run_write(_recover_tx)
+        if recovered:
+            logger.info(f"[jobs] {recovered} interrupted job(s) re-queued after restart")
+        self._tasks = [
+            asyncio.create_task(self._worker(i), name=f"attachment-job-worker-{i}")
+            for i in range(self.workers)
+        ]
+        logger.info(f"[jobs] attachment job queue started ({self.workers} workers)")
+
+    async def stop(self) -> None:
+        for t in self._tasks:
+            t.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    def wake(self) -> None:
+        if self._wakeup is not None:
+            self._wakeup.set()
+
+    async def submit(self, kind: str, key: str, payload: dict, report_id=None,
+                     chat_id=None, message_id=None, wake: bool = True) -> Tuple[int, str]:
+        """
+        يُدرج المهمة ويعيد (job_id, outcome). outcome == "created" ⇒ مهمة في
+        الطابور لهذا الطلب؛ وإلا حالة المهمة القائمة بنفس المفتاح ("queued"،
+        "running"، أو "done" خلال ATTACHMENT_JOB_DEDUPE_WINDOW) — لم يُنشأ شيء.
+        """
+        job_id, outcome = await run_write(
+            _enqueue_tx, kind, key, payload, report_id, chat_id, message_id,
+            ATTACHMENT_JOB_MAX_ATTEMPTS,
+        )
+        created = outcome == "created"
+        self._stats["submitted" if created else "deduplicated"] += 1
+        if created and wake:
+            self.wake()
+        return job_id, outcome
+
+    async def retry(self, job_id: int, chat_id=None, message_id=None) -> bool:
+        """إعادة مهمة فشلت نهائياً إلى الطابور (زر "إعادة المحاولة")."""
+        requeued = await run_write(_retry_tx, job_id, chat_id, message_id)
+        if requeued:
+            self.wake()
+        return requeued
+
+    async def run_once(self) -> bool:
+        """يأخذ مهمة مستحقة وينفّذها؛ False إن لم توجد مهمة."""
+        claimed = await run_write(_claim_tx)
+        if claimed is None:
+            return False
+        await self._execute(claimed)
+        return True
+
+    async def _worker(self, index: int) -> None:
+        while True:
+            try:
+                # clear قبل الفحص: إدراج يحدث بينهما يوقظ الانتظار التالي فوراً
+                self._wakeup.clear()
+                if await self.run_once():
+                    continue
+                timeout = await self._idle_timeout()
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), timeout)
+                except asyncio.TimeoutError:
+                    pass
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"[jobs] worker {index} error: {e}", exc_info=True)
+                await asyncio.sleep(ATTACHMENT_JOB_POLL_INTERVAL)
+
+    async def _idle_timeout(self) -> float:
+        from db.async_session import run_db
+        from db.session import SessionLocal
+
+        def _read():
+            with SessionLocal() as s:
+                return _next_due_tx(s)
+
+        due = await run_db(_read)
+        if due is None:
+            return ATTACHMENT_JOB_POLL_INTERVAL
+        wait = (due - datetime.utcnow()).total_seconds()
+        return min(ATTACHMENT_JOB_POLL_INTERVAL, max(0.05, wait))
+
+    async def _execute(self, claimed: dict) -> None:
+        handler = _HANDLERS.get(claimed["kind"])
+        job = JobContext(bot=self.bot, **{k: claimed[k] for k in (
+            "id", "kind", "payload", "state", "attempts", "max_attempts",
+            "chat_id", "message_id", "report_id", "queued_at",
+        )})
+        started = time.perf_counter()
+        try:
+            if handler is None:
+                raise PermanentJobError(f"no handler registered for job kind {job.kind!r}")
+            await handler.run(self.bot, job)
+        except asyncio.CancelledError:
+            # إيقاف البوت أثناء التنفيذ — السطر يبقى running ويعود للطابور عند الإقلاع
+            raise
+        except Exception as e:
+            await self._handle_failure(job, handler, e)
+            return
+        await run_write(_finish_tx, job.id, "done")
+        self._stats["done"] += 1
+        self._latencies = (self._latencies + [time.perf_counter() - started])[-200:]
+        logger.info(
+            f"[jobs] {job.kind} #{job.id} done in {time.perf_counter() - started:.2f}s "
+            f"(attempt {job.attempts}/{job.max_attempts})"
+        )
+
+    async def _handle_failure(self, job: JobContext, handler, error: Exception) -> None:
+        permanent = isinstance(error, PermanentJobError)
+        if permanent or job.attempts >= job.max_attempts:
+            logger.error(f"[jobs] {job.kind} #{job.id} failed permanently: {error}", exc_info=not permanent)
+            await run_write(_finish_tx, job.id, "failed", str(error)[:2000])
+            self._stats["failed"] += 1
+            if handler is not None and handler.on_failed is not None:
+                try:
+                    await handler.on_failed(self.bot, job, error)
+                except Exception as cb_err:
+                    logger.warning(f"[jobs] on_failed for #{job.id} raised: {cb_err}")
+            return
+
+        delay = retry_delay(job.attempts)
+        logger.warning(
+            f"[jobs] {job.kind} #{job.id} attempt {job.attempts}/{job.max_attempts} failed: {error!r} "
+            f"— retry in {delay:.0f}s"
+        )
+        await run_write(
+            _finish_tx, job.id, "queued", str(error)[:2000],
+            datetime.utcnow() + timedelta(seconds=delay),
+        )
+        self._stats["retried"] += 1
+        await job.progress(
+            f"⚠️ تعثّر النشر (محاولة {job.attempts} من {job.max_attempts}) — "
+            f"إعادة المحاولة تلقائياً خلال {delay:.0f} ثانية."
+        )
+
+    def stats(self) -> dict:
+        lat = sorted(self._latencies)
+        p95 = lat[min(len(lat) - 1, int(0.95 * (len(lat) - 1) + 0.5))] if lat else 0.0
+        return {**self._stats, "workers": self.workers if self.running else 0, "job_p95_s": p95}
+
+
+job_queue = AttachmentJobQueue()
+
+
+async def submit_job(kind: str, key: str, payload: dict, **kwargs) -> Tuple[int, bool]:
+    return await job_queue.submit(kind, key, payload, **kwargs)
+
+
+async def start_attachment_jobs(bot) -> None:
+    await job_queue.start(bot)
+
+
+async def stop_attachment_jobs() -> None:
+    await job_queue.stop()
+
+
+async def attachment_job_queue_stats() -> dict:
+    """عدّادات العمّال + عدد المهام في كل حالة (من الجدول)."""
+    from db.async_session import run_db
+    from db.session import SessionLocal
+
+    def _read():
+        with SessionLocal() as s:
+            return _counts_tx(s)
+
+    return {**job_queue.stats(), "by_status": await run_db(_read)}
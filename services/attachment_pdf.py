@@ -0,0 +1,234 @@
+# ================================================
+# services/attachment_pdf.py
+# 📎 صور المرفقات الطبية → PDF: مرحلة تحميل مشتركة + image_pipeline
+# ================================================
+#
+# مساران كانا يكرران نفس المنطق (النشر في broadcast_service وإضافة مرفقات
+# لتقرير منشور في user_medical_attachments): تحميل كل الصور بـgather بلا حد
+# ولا مهلة ولا إعادة محاولة، ثم انتظار آخر صورة قبل بدء أي معالجة.
+#
+# هنا مرحلة واحدة مشتركة:
+#   • حد عام للتحميلات المتزامنة من Telegram (ATTACHMENT_DOWNLOAD_CONCURRENCY)
+#     لكل العمليات معاً — ألبوم من 10 صور لا يفتح 10 اتصالات فوق غيره،
+#   • مهلة لكل ملف (get_file + download) وإعادة محاولة بتراجع للأخطاء العابرة؛
+#     RetryAfter ينتظر المدة المطلوبة، BadRequest/Forbidden لا يُعاد،
+#   • تسليم متدفق: كل صفحة تذهب إلى process pool فور وصولها
+#     (ImagePipeline.process_page_sources) فتتداخل المعالجة مع بقية التحميلات،
+#   • كل صفحة تُحمَّل مرة واحدة لكل مهمة (الـfallback يعيد استخدام نفس البايتات)،
+#   • توقيت لكل مرحلة لكل مهمة (download / enhance / pdf / total) في السجل،
+#     و attachment_job_stats() يعطي p50/p95 لآخر المهام.
+
+import asyncio
+import io
+import logging
+import os
+import threading
+import time
+from collections import deque
+from typing import Dict, List, Optional
+
+from telegram.error import BadRequest, Forbidden, RetryAfter
+
+from services.send_scheduler import retry_after_seconds
+
+logger = logging.getLogger(__name__)
+
+ATTACHMENT_DOWNLOAD_CONCURRENCY = int(os.getenv("ATTACHMENT_DOWNLOAD_CONCURRENCY", "4"))
+ATTACHMENT_DOWNLOAD_TIMEOUT = float(os.getenv("ATTACHMENT_DOWNLOAD_TIMEOUT", "30"))
+ATTACHMENT_DOWNLOAD_RETRIES = int(os.getenv("ATTACHMENT_DOWNLOAD_RETRIES", "2"))
+ATTACHMENT_RETRY_BACKOFF = float(os.getenv("ATTACHMENT_RETRY_BACKOFF", "1.0"))
+
+# أخطاء لن تنجح بإعادة المحاولة (file_id منتهٍ/غير صالح، لا صلاحية)
+_PERMANENT_ERRORS = (BadRequest, Forbidden)
+
+_slots: Optional[asyncio.Semaphore] = None
+_slots_loop = None
+
+_recent_jobs: deque = deque(maxlen=200)
+_stats_lock = threading.Lock()
+
+
+def _get_slots() -> asyncio.Semaphore:
+    """Semaphore التحميل المشترك — مربوط بالـloop الحالية (يُعاد إنشاؤه عند تغيّرها)."""
+    global _slots, _slots_loop
+    loop = asyncio.get_running_loop()
+    if _slots is None or _slots_loop is not loop:
+        _slots = asyncio.Semaphore(max(1, ATTACHMENT_DOWNLOAD_CONCURRENCY))
+        _slots_loop = loop
+    return _slots
+
+
+class TelegramDownloadStage:
+    """
+    تحميلات مهمة واحدة. fetch(idx) يبدأ تحميل الصفحة مرة واحدة ويعيد نفس
+    الـtask لكل استدعاء لاحق؛ النتيجة bytes أو None عند الفشل النهائي.
+    """
+
+    def __init__(self, bot, file_ids: List[str]):
+        self.bot = bot
+        self.file_ids = list(file_ids)
+        self.retries = 0
+        self.failed = 0
+        self._tasks: Dict[int, asyncio.Task] = {}
+        self._first_start: Optional[float] = None
+        self._last_done: Optional[float] = None
+
+    @property
+    def download_s(self) -> float:
+        """زمن التحميل الفعلي: من بدء أول ملف حتى انتهاء آخر ملف."""
+        if self._first_start is None or self._last_done is None:
+            return 0.0
+        return self._last_done - self._first_start
+
+    def fetch(self, idx: int) -> "asyncio.Task":
+        task = self._tasks.get(idx)
+        if task is None:
+            task = self._tasks[idx] = asyncio.ensure_future(self._download(idx))
+        return task
+
+    async def fetch_all(self) -> List[Optional[bytes]]:
+        return list(await asyncio.gather(*[self.fetch(i) for i in range(len(self.file_ids))]))
+
+    async def _download(self, idx: int) -> Optional[bytes]:
+        file_id = self.file_ids[idx]
+        attempt = 0
+        while True:
+            try:
+                async with _get_slots():
+                    if self._first_start is None:
+                        self._first_start = time.perf_counter()
+                    raw = await asyncio.wait_for(self._get_bytes(file_id), ATTACHMENT_DOWNLOAD_TIMEOUT)
+                self._last_done = time.perf_counter()
+                return raw
+            except _PERMANENT_ERRORS as e:
+                logger.error(f"❌ فشل تحميل صورة {file_id}: {e}")
+                break
+            except Exception as e:
+                if attempt >= ATTACHMENT_DOWNLOAD_RETRIES:
+                    logger.error(f"❌ فشل تحميل صورة {file_id} بعد {attempt + 1} محاولات: {e!r}")
+                    break
+                # خارج الـsemaphore: الانتظار لا يحجز مقعد تحميل عن غيره
+                delay = retry_after_seconds(e) if isinstance(e, RetryAfter) else ATTACHMENT_RETRY_BACKOFF * 2 ** attempt
+                logger.warning(f"⚠️ تحميل {file_id} فشل ({e!r}) — إعادة بعد {delay:.1f}s")
+                attempt += 1
+                self.retries += 1
+                await asyncio.sleep(delay)
+        self.failed += 1
+        self._last_done = time.perf_counter()
+        return None
+
+    async def _get_bytes(self, file_id: str) -> bytes:
+        tg_file = await self.bot.get_file(file_id)
+        buf = io.BytesIO()
+        await tg_file.download_to_memory(buf)
+        return buf.getvalue()
+
+
+def direct_convert(raw_images: List[bytes]) -> Optional[io.BytesIO]:
+    """تحويل مباشر بدون أي معالجة — نفس السلوك القديم."""
+    try:
+        import img2pdf
+        from PIL import Image as PILImage
+
+        img_buffers = []
+        for raw in raw_images:
+            try:
+                pil_img = PILImage.open(io.BytesIO(raw))
+                pil_img.load()
+                if pil_img.format == "JPEG" and pil_img.mode == "RGB":
+                    img_buffers.append(raw)
+                else:
+                    if pil_img.mode in ("RGBA", "P", "LA"):
+                        pil_img = pil_img.convert("RGB")
+                    jpeg_buf = io.BytesIO()
+                    pil_img.save(jpeg_buf, format="JPEG", quality=95, subsampling=0)
+                    img_buffers.append(jpeg_buf.getvalue())
+            except Exception:
+                continue
+
+        if not img_buffers:
+            return None
+        return io.BytesIO(img2pdf.convert(img_buffers))
+
+    except Exception as e:
+        logger.error(f"❌ فشل التحويل المباشر: {e}", exc_info=True)
+        return None
+
+
+async def photos_to_pdf(bot, file_ids: List[str], unique_ids: Optional[List[Optional[str]]] = None,
+                        label: str = "attachments") -> Optional[io.BytesIO]:
+    """
+    تحميل الصور من Telegram، تحسينها عبر image_pipeline، ثم تحويلها لـ PDF.
+    يرجع إلى التحويل المباشر إذا فشل pipeline.
+
+    unique_ids (file_unique_id لكل صورة) يفعّل كاش image_pipeline/cache.py:
+    الصفحات/PDF المعالَجة سابقاً لا تُحمَّل ولا تُعالَج من جديد.
+    """
+    if not file_ids:
+        return None
+    started = time.perf_counter()
+    stage = TelegramDownloadStage(bot, file_ids)
+    timings: dict = {}
+    mode = "pipeline"
+    pdf = None
+
+    try:
+        from image_pipeline import run_pipeline_cached_async
+        pdf = await run_pipeline_cached_async(
+            unique_ids or [None] * len(file_ids), stage.fetch, timings=timings
+        )
+    except Exception as pipeline_err:
+        logger.warning(f"⚠️ {label}: pipeline فشل ({pipeline_err}) — fallback to direct conversion")
+
+    if pdf is None:
+        mode = "direct"
+        raw_images = [raw for raw in await stage.fetch_all() if raw]
+        if raw_images:
+            t0 = time.perf_counter()
+            pdf = await asyncio.to_thread(direct_convert, raw_images)
+            timings["pdf_s"] = time.perf_counter() - t0
+
+    job = {
+        "label": label,
+        "mode": "cached" if timings.get("pdf_hit") else mode,
+        "pages": len(file_ids),
+        "downloaded": len(stage._tasks) - stage.failed,
+        "failed": stage.failed,
+        "retries": stage.retries,
+        "download_s": stage.download_s,
+        "enhance_s": timings.get("enhance_s", 0.0),
+        "pdf_s": timings.get("pdf_s", 0.0),
+        "total_s": time.perf_counter() - started,
+        "ok": pdf is not None,
+    }
+    with _stats_lock:
+        _recent_jobs.append(job)
+    logger.info(
+        f"📄 {label}: {job['mode']} pages={job['pages']} downloaded={job['downloaded']} "
+        f"failed={job['failed']} retries={job['retries']} | download={job['download_s']:.2f}s "
+        f"enhance={job['enhance_s']:.2f}s pdf={job['pdf_s']:.2f}s total={job['total_s']:.2f}s"
+    )
+    return pdf
+
+
+def _percentile(values: List[float], pct: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))]
+
+
+def attachment_job_stats() -> dict:
+    """p50/p95 لكل مرحلة عبر آخر المهام (للتشخيص ولوحة الأداء)."""
+    with _stats_lock:
+        jobs = list(_recent_jobs)
+    stats = {
+        "jobs": len(jobs),
+        "failed_jobs": sum(1 for j in jobs if not j["ok"]),
+        "retries": sum(j["retries"] for j in jobs),
+        "failed_downloads": sum(j["failed"] for j in jobs),
+    }
+    for key in ("download_s", "enhance_s", "pdf_s", "total_s"):
+        values = [j[key] for j in jobs]
+        stats[key] = {"p50": _percentile(values, 50), "p95": _percentile(values, 95)}
+    return stats
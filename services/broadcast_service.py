@@ -5,14 +5,17 @@
 
 from db.session import SessionLocal
 from db.models import Translator
-import io
+import asyncio
 from config.settings import ADMIN_IDS, REPORTS_GROUP_ID as _SETTINGS_GROUP_ID, MEDICAL_REPORTS_GROUP_ID as _SETTINGS_MEDICAL_GROUP_ID
 from bot.broadcast_control import is_broadcast_enabled
 from telegram import Bot, InlineKeyboardButton, InlineKeyboardMarkup
 from telegram.constants import ParseMode
 from shared.files.filename_builder import build_medical_pdf_filename
+from services.send_scheduler import Priority, fan_out, send as send_via_scheduler, send_to_admins
 import logging
 import os
+from datetime import date
+from typing import Callable, NamedTuple
 
 logger = logging.getLogger(__name__)
 
@@ -153,62 +156,15 @@ def _build_attachment_caption(report_data: dict) -> str:
     return " — ".join(parts)
 
 
-async def _photos_to_pdf(bot: Bot, photo_file_ids: list, caption_text: str):
+async def _photos_to_pdf(bot: Bot, photo_file_ids: list, caption_text: str,
+                         unique_ids: list | None = None):
     """
-    تحميل الصور من Telegram، تحسينها عبر image_pipeline، ثم تحويلها لـ PDF.
-    يرجع إلى التحويل المباشر إذا فشل pipeline.
+    صور المرفقات → PDF عبر مرحلة التحميل المشتركة (services/attachment_pdf.py).
+    unique_ids (file_unique_id لكل صورة) يفعّل كاش image_pipeline/cache.py:
+    إعادة النشر/التعديل بنفس الصور لا تُعيد التحميل ولا المعالجة.
     """
-    # --- تحميل الصور الخام ---
-    raw_images: list[bytes] = []
-    for file_id in photo_file_ids:
-        try:
-            tg_file = await bot.get_file(file_id)
-            buf = io.BytesIO()
-            await tg_file.download_to_memory(buf)
-            raw_images.append(buf.getvalue())
-        except Exception as img_err:
-            logger.warning(f"⚠️ فشل تحميل صورة {file_id}: {img_err}")
-
-    if not raw_images:
-        return None
-
-    # --- pipeline التحسين ---
-    try:
-        from image_pipeline import run_pipeline_async
-        pdf = await run_pipeline_async(raw_images)
-        logger.info(f"✅ broadcast: pipeline نجح  pages={len(raw_images)}")
-        return pdf
-    except Exception as pipeline_err:
-        logger.warning(f"⚠️ broadcast: pipeline فشل ({pipeline_err}) — fallback")
-
-    # --- Fallback مباشر ---
-    try:
-        import img2pdf
-        from PIL import Image as PILImage
-
-        img_buffers = []
-        for raw in raw_images:
-            try:
-                pil_img = PILImage.open(io.BytesIO(raw))
-                pil_img.load()
-                if pil_img.format == "JPEG" and pil_img.mode == "RGB":
-                    img_buffers.append(raw)
-                else:
-                    if pil_img.mode in ("RGBA", "P", "LA"):
-                        pil_img = pil_img.convert("RGB")
-                    jpeg_buf = io.BytesIO()
-                    pil_img.save(jpeg_buf, format="JPEG", quality=95, subsampling=0)
-                    img_buffers.append(jpeg_buf.getvalue())
-            except Exception:
-                continue
-
-        if not img_buffers:
-            return None
-        return io.BytesIO(img2pdf.convert(img_buffers))
-
-    except Exception as e:
-        logger.error(f"❌ فشل التحويل المباشر: {e}", exc_info=True)
-        return None
+    from services.attachment_pdf import photos_to_pdf
+    return await photos_to_pdf(bot, photo_file_ids, unique_ids, label="broadcast")
 
 
 def _persist_sent_medical_file(sent_message, report_id, uploaded_by, uploaded_by_tg_id, order, source="creation"):
@@ -236,6 +192,17 @@ def _persist_sent_medical_file(sent_message, report_id, uploaded_by, uploaded_by
         logger.warning(f"⚠️ فشل حفظ سجل ملف طبي (report_id={report_id}): {e}")
 
 
+def _save_group_message_id_tx(session, report_id, group_message_id) -> bool:
+    """حفظ معرف رسالة المجموعة داخل معاملة الكاتب الموحَّد — بلا commit."""
+    from db.models import Report
+    updated = (
+        session.query(Report)
+        .filter_by(id=report_id)
+        .update({"group_message_id": group_message_id}, synchronize_session=False)
+    )
+    return bool(updated)
+
+
 async def _send_medical_attachments(
     bot: Bot,
     attachments: list,
@@ -270,7 +237,8 @@ async def _send_medical_attachments(
         logger.warning("⚠️ لا يوجد معرف مجموعة للمرفقات الطبية")
         return len(attachments), 0
 
-    photo_ids = [a["file_id"] for a in attachments if a.get("type") == "photo"]
+    photo_atts = [a for a in attachments if a.get("type") == "photo"]
+    photo_ids = [a["file_id"] for a in photo_atts]
     other_atts = [a for a in attachments if a.get("type") != "photo"]
     _persist_order = 0
     attempted = 0
@@ -279,14 +247,20 @@ async def _send_medical_attachments(
     # ── الصور → PDF ────────────────────────────────────────
     if photo_ids:
         attempted += 1  # وحدة واحدة: "دفعة الصور" (PDF واحد أو صور فرادى كـfallback)
-        pdf_buf = await _photos_to_pdf(bot, photo_ids, caption)
+        pdf_buf = await _photos_to_pdf(
+            bot, photo_ids, caption, [a.get("file_unique_id") for a in photo_atts]
+        )
         if pdf_buf:
             pdf_buf.name = build_medical_pdf_filename(
                 patient_name=patient_name,
                 departments=department_name,
             )
             try:
-                sent_msg = await bot.send_document(chat_id=target_group, document=pdf_buf, caption=caption)
+                async def _send_pdf():
+                    pdf_buf.seek(0)  # قد يُعاد الطلب بعد RetryAfter
+                    return await bot.send_document(chat_id=target_group, document=pdf_buf, caption=caption)
+
+                sent_msg = await send_via_scheduler(_send_pdf, target_group, Priority.REPORT)
                 logger.info(f"✅ أُرسل PDF ({len(photo_ids)} صورة) للمجموعة {target_group}")
                 _persist_sent_medical_file(sent_msg, report_id, uploaded_by, uploaded_by_tg_id, _persist_order)
                 _persist_order += 1
@@ -299,7 +273,10 @@ async def _send_medical_attachments(
             any_photo_sent = False
             for fid in photo_ids:
                 try:
-                    sent_msg = await bot.send_photo(chat_id=target_group, photo=fid, caption=caption)
+                    sent_msg = await send_via_scheduler(
+                        lambda fid=fid: bot.send_photo(chat_id=target_group, photo=fid, caption=caption),
+                        target_group, Priority.REPORT,
+                    )
                     _persist_sent_medical_file(sent_msg, report_id, uploaded_by, uploaded_by_tg_id, _persist_order)
                     _persist_order += 1
                     any_photo_sent = True
@@ -318,14 +295,14 @@ async def _send_medical_attachments(
                 continue
             cap = caption if not photo_ids else None
             sent_msg = None
-            if ftype == "document":
-                sent_msg = await bot.send_document(chat_id=target_group, document=fid, caption=cap)
-            elif ftype == "video":
-                sent_msg = await bot.send_video(chat_id=target_group, video=fid, caption=cap)
-            elif ftype == "audio":
-                sent_msg = await bot.send_audio(chat_id=target_group, audio=fid, caption=cap)
-            elif ftype == "voice":
-                sent_msg = await bot.send_voice(chat_id=target_group, voice=fid, caption=cap)
+            send_fn = {
+                "document": lambda: bot.send_document(chat_id=target_group, document=fid, caption=cap),
+                "video": lambda: bot.send_video(chat_id=target_group, video=fid, caption=cap),
+                "audio": lambda: bot.send_audio(chat_id=target_group, audio=fid, caption=cap),
+                "voice": lambda: bot.send_voice(chat_id=target_group, voice=fid, caption=cap),
+            }.get(ftype)
+            if send_fn is not None:
+                sent_msg = await send_via_scheduler(send_fn, target_group, Priority.REPORT)
 
             if sent_msg is not None:
                 _persist_sent_medical_file(sent_msg, report_id, uploaded_by, uploaded_by_tg_id, _persist_order)
@@ -337,27 +314,47 @@ async def _send_medical_attachments(
     return attempted, sent_count
 
 
-async def _send_message_in_chunks(bot: Bot, chat_id, text: str, parse_mode=None, reply_markup=None):
+async def _send_message_in_chunks(bot: Bot, chat_id, text: str, parse_mode=None, reply_markup=None,
+                                  priority: Priority = Priority.NORMAL):
     """
     إرسال رسالة (طويلة أو قصيرة) على أجزاء.
     - تُضاف reply_markup للجزء الأخير فقط.
     - تُعاد آخر رسالة مُرسلة (مهم لحفظ message_id).
+    - كل جزء يمرّ عبر services/send_scheduler (حدود Telegram + RetryAfter).
+    - بطاقة التقرير (RenderedReport) مقسَّمة مسبقاً — لا تُقسَّم لكل مستلم.
     """
-    chunks = _split_telegram_message(text)
+    chunks = getattr(text, "chunks", None) or _split_telegram_message(text)
     last_message = None
 
     for idx, chunk in enumerate(chunks):
         is_last = idx == (len(chunks) - 1)
-        last_message = await bot.send_message(
-            chat_id=chat_id,
-            text=chunk,
-            parse_mode=parse_mode,
-            reply_markup=reply_markup if is_last else None,
+        last_message = await send_via_scheduler(
+            lambda chunk=chunk, is_last=is_last: bot.send_message(
+                chat_id=chat_id,
+                text=chunk,
+                parse_mode=parse_mode,
+                reply_markup=reply_markup if is_last else None,
+            ),
+            chat_id,
+            priority,
         )
 
     return last_message
 
 
+async def _send_admin_copies(bot: Bot, message: str) -> None:
+    """نسخة التقرير لكل الأدمن معاً عبر send_to_admins (Markdown ثم بدونه)."""
+    if not ADMIN_IDS:
+        logger.warning(f"⚠️ broadcast_new_report: ADMIN_IDS فارغ - لن يتم إرسال التقرير للأدمن")
+        return
+    chunks = getattr(message, "chunks", None) or _split_telegram_message(message)
+    results = await send_to_admins(bot, message, Priority.NORMAL, chunks=chunks)
+    for admin_id, result in zip(ADMIN_IDS, results):
+        if isinstance(result, Exception):
+            logger.error(f"❌ فشل إرسال التقرير للأدمن {admin_id}: {result}")
+    logger.info(f"✅ تم إرسال التقرير للأدمن: {sum(not isinstance(r, Exception) for r in results)}/{len(ADMIN_IDS)}")
+
+
 async def send_user_notification(bot: Bot, report_data: dict):
     """
     تنبيه بسيط للمستخدم الذي أنشأ التقرير.
@@ -380,9 +377,13 @@ async def send_user_notification(bot: Bot, report_data: dict):
         text += f"🆔 التقرير: #{report_id}"
 
     try:
-        await bot.send_message(chat_id=user_id, text=text, parse_mode=ParseMode.MARKDOWN)
+        await send_via_scheduler(
+            lambda: bot.send_message(chat_id=user_id, text=text, parse_mode=ParseMode.MARKDOWN), user_id
+        )
     except Exception:
-        await bot.send_message(chat_id=user_id, text=text, parse_mode=None)
+        await send_via_scheduler(
+            lambda: bot.send_message(chat_id=user_id, text=text, parse_mode=None), user_id
+        )
 
 
 async def broadcast_new_report(bot: Bot, report_data: dict):
@@ -405,16 +406,21 @@ async def broadcast_new_report(bot: Bot, report_data: dict):
     # بلا أي تعديل عليها (ولا يمسّ القيمة العامة للوحدة).
     REPORTS_GROUP_ID = report_data.get('target_group_id') or globals()['REPORTS_GROUP_ID']
 
-    logger.info(f"📤 broadcast_new_report: بدء البث - report_id={report_data.get('report_id')}, medical_action={report_data.get('medical_action')}, group={REPORTS_GROUP_ID}")
+    # خطوات المسار بمستوى DEBUG وبمعاملات كسولة (لا تنسيق إن كان معطلاً)؛
+    # الإرسال الفعلي والفشل يبقيان INFO/WARNING — سطر أو اثنان لكل تقرير
+    logger.debug("📤 broadcast_new_report: بدء البث - report_id=%s, medical_action=%s, group=%s",
+                 report_data.get('report_id'), report_data.get('medical_action'), REPORTS_GROUP_ID)
 
     # ✅ نتيجة إرسال المرفقات الطبية (None إن لم توجد مرفقات أصلاً أو لم يُصَل
     # لخطوة البث) — يسمح للمستدعي باكتشاف فشل إرسال المرفقات بصمت.
     attachments_result = None
+    # نسخ الأدمن (تنطلق مع المرفقات بعد نجاح بطاقة المجموعة) — لا تُكرَّر لاحقاً
+    admins_task = None
 
     # تنسيق الرسالة
     try:
         message = format_report_message(report_data)
-        logger.info(f"✅ broadcast_new_report: تم تنسيق الرسالة بنجاح (طول: {len(message)} حرف)")
+        logger.debug("✅ broadcast_new_report: تم تنسيق الرسالة بنجاح (طول: %d حرف)", len(message))
     except Exception as format_error:
         logger.error(f"❌ broadcast_new_report: خطأ في تنسيق الرسالة: {format_error}", exc_info=True)
         # ✅ حتى لو فشل التنسيق، نحاول إرسال رسالة بسيطة للأدمن
@@ -423,7 +429,7 @@ async def broadcast_new_report(bot: Bot, report_data: dict):
 
     # ✅ حالة البث للمجموعة (لا تؤثر على الأدمن)
     broadcast_enabled = is_broadcast_enabled()
-    logger.info(f"📤 broadcast_new_report: BROADCAST_ENABLED={broadcast_enabled}, REPORTS_GROUP_ID='{REPORTS_GROUP_ID}' (len={len(str(REPORTS_GROUP_ID)) if REPORTS_GROUP_ID else 0})")
+    logger.debug("📤 broadcast_new_report: BROADCAST_ENABLED=%s, REPORTS_GROUP_ID='%s'", broadcast_enabled, REPORTS_GROUP_ID)
 
     # ✅ إرسال للمجموعة (فقط إذا كان البث مفعل)
     if not broadcast_enabled:
@@ -432,7 +438,7 @@ async def broadcast_new_report(bot: Bot, report_data: dict):
         logger.warning(f"⚠️ broadcast_new_report: REPORTS_GROUP_ID فارغ! لن يتم إرسال التقرير للمجموعة")
 
     if broadcast_enabled and REPORTS_GROUP_ID:
-        logger.info(f"📤 broadcast_new_report: محاولة الإرسال للمجموعة {REPORTS_GROUP_ID}")
+        logger.debug("📤 broadcast_new_report: محاولة الإرسال للمجموعة %s", REPORTS_GROUP_ID)
         try:
             # إرسال للمجموعة
             # إضافة زر تفاعلي لعرض سبب التأجيل إذا كان التقرير من نوع "تأجيل موعد"
@@ -489,8 +495,9 @@ async def broadcast_new_report(bot: Bot, report_data: dict):
             except Exception:
                 reply_markup = None
 
-            logger.info(f"📤 broadcast_new_report: محاولة إرسال الرسالة للمجموعة (طول الرسالة: {len(message)} حرف)")
-            logger.info(f"📤 broadcast_new_report: report_id={report_data.get('report_id')}, user_id={report_data.get('user_id')}, translator_id={report_data.get('translator_id')}")
+            logger.debug("📤 broadcast_new_report: report_id=%s, user_id=%s, translator_id=%s, طول الرسالة=%d",
+                         report_data.get('report_id'), report_data.get('user_id'),
+                         report_data.get('translator_id'), len(message))
             
             # محاولة إرسال الرسالة للمجموعة
             group_message_id = None
@@ -503,7 +510,8 @@ async def broadcast_new_report(bot: Bot, report_data: dict):
                     chat_id=REPORTS_GROUP_ID,
                     text=message,
                     parse_mode=ParseMode.MARKDOWN,
-                    reply_markup=reply_markup
+                    reply_markup=reply_markup,
+                    priority=Priority.REPORT,
                 )
                 group_message_id = sent_message.message_id
                 send_success = True
@@ -511,9 +519,8 @@ async def broadcast_new_report(bot: Bot, report_data: dict):
             except Exception as send_error:
                 error_type = type(send_error).__name__
                 error_msg = str(send_error)
-                logger.warning(f"⚠️ broadcast_new_report: فشل الإرسال مع Markdown للمجموعة {REPORTS_GROUP_ID}")
-                logger.warning(f"⚠️ broadcast_new_report: نوع الخطأ: {error_type}")
-                logger.warning(f"⚠️ broadcast_new_report: رسالة الخطأ: {error_msg}")
+                logger.warning("⚠️ broadcast_new_report: فشل الإرسال مع Markdown للمجموعة %s: %s: %s",
+                               REPORTS_GROUP_ID, error_type, error_msg)
                 
                 # التحقق من نوع الخطأ
                 if "Chat not found" in error_msg or "chat_id is empty" in error_msg:
@@ -534,7 +541,8 @@ async def broadcast_new_report(bot: Bot, report_data: dict):
                             chat_id=REPORTS_GROUP_ID,
                             text=message,
                             parse_mode=None,  # بدون Markdown
-                            reply_markup=reply_markup
+                            reply_markup=reply_markup,
+                            priority=Priority.REPORT,
                         )
                         group_message_id = sent_message.message_id
                         send_success = True
@@ -551,7 +559,8 @@ async def broadcast_new_report(bot: Bot, report_data: dict):
                             chat_id=REPORTS_GROUP_ID,
                             text=message,
                             parse_mode=None,  # بدون Markdown
-                            reply_markup=reply_markup
+                            reply_markup=reply_markup,
+                            priority=Priority.REPORT,
                         )
                         group_message_id = sent_message.message_id
                         send_success = True
@@ -571,17 +580,16 @@ async def broadcast_new_report(bot: Bot, report_data: dict):
             report_id = report_data.get('report_id') or report_id
             if report_id and group_message_id:
                 try:
-                    from db.session import SessionLocal
-                    from db.models import Report
-                    with SessionLocal() as s:
-                        report = s.query(Report).filter_by(id=report_id).first()
-                        if report:
-                            report.group_message_id = group_message_id
-                            s.commit()
-                            logger.info(f"✅ تم حفظ معرف الرسالة {group_message_id} للتقرير {report_id}")
+                    from db.write_queue import run_write
+                    if await run_write(_save_group_message_id_tx, report_id, group_message_id):
+                        logger.info(f"✅ تم حفظ معرف الرسالة {group_message_id} للتقرير {report_id}")
                 except Exception as e:
                     logger.error(f"❌ فشل حفظ معرف الرسالة في قاعدة البيانات: {e}")
 
+            # ✅ نسخ الأدمن تنطلق فوراً عبر المُجدوِل، بالتوازي مع المرفقات
+            # (لا تنتظر تحميل الصور ومعالجة PDF)
+            admins_task = asyncio.create_task(_send_admin_copies(bot, message))
+
             # ✅ إرسال المرفقات الطبية لمجموعة المرفقات (MEDICAL_REPORTS_GROUP_ID)
             medical_attachments = report_data.get('medical_attachments', [])
             if medical_attachments:
@@ -610,7 +618,6 @@ async def broadcast_new_report(bot: Bot, report_data: dict):
             # ✅ إرسال نسخة التقرير للمستخدم في الخلفية (لا يعطّل event loop)
             user_id = report_data.get('user_id') or report_data.get('translator_id')
             if user_id:
-                import asyncio
                 header = "📋 **نسخة التقرير المنشور:**\n\n"
                 async def _send_user_copy():
                     await asyncio.sleep(1)  # تأخير بسيط بعيداً عن المسار الرئيسي
@@ -626,33 +633,10 @@ async def broadcast_new_report(bot: Bot, report_data: dict):
                         logger.warning(f"⚠️ فشل إرسال نسخة التقرير للمستخدم {user_id}: {e}")
                 asyncio.create_task(_send_user_copy())
 
-            # ✅ إرسال للأدمن دائماً (حتى عندما يكون البث للمجموعة مفعل)
-            if ADMIN_IDS:
-                for admin_id in ADMIN_IDS:
-                    try:
-                        try:
-                            await _send_message_in_chunks(
-                                bot=bot,
-                                chat_id=admin_id,
-                                text=message,
-                                parse_mode=ParseMode.MARKDOWN
-                            )
-                            logger.info(f"✅ تم إرسال التقرير للأدمن: {admin_id}")
-                        except Exception as markdown_error:
-                            try:
-                                await _send_message_in_chunks(
-                                    bot=bot,
-                                    chat_id=admin_id,
-                                    text=message,
-                                    parse_mode=None
-                                )
-                                logger.info(f"✅ تم إرسال التقرير للأدمن {admin_id} بدون Markdown")
-                            except Exception as fallback_error:
-                                logger.error(f"❌ فشل إرسال التقرير للأدمن {admin_id}: {fallback_error}")
-                    except Exception as e:
-                        logger.error(f"❌ فشل إرسال التقرير للأدمن {admin_id}: {e}")
+            # ✅ نسخ الأدمن انطلقت بالتوازي مع المرفقات — ننتظر اكتمالها فقط
+            await admins_task
 
-            logger.info(f"✅ broadcast_new_report: اكتمل البث للمجموعة بنجاح")
+            logger.debug("✅ broadcast_new_report: اكتمل البث للمجموعة بنجاح")
             return {"attachments_result": attachments_result}  # ✅ إنهاء الدالة بعد الإرسال الناجح للمجموعة
             
         except Exception as e:
@@ -663,38 +647,13 @@ async def broadcast_new_report(bot: Bot, report_data: dict):
     
     # ✅ إرسال للأدمن دائماً (بغض النظر عن حالة BROADCAST_ENABLED)
     # هذا يضمن أن الأدمن يتلقى جميع التقارير حتى لو كان البث للمجموعة معطل
-    logger.info(f"📤 broadcast_new_report: إرسال التقرير للأدمن (دائماً مفعل) - BROADCAST_ENABLED={broadcast_enabled}")
-    
-    if ADMIN_IDS:
-        for admin_id in ADMIN_IDS:
-            try:
-                # المحاولة الأولى: مع Markdown
-                try:
-                    await _send_message_in_chunks(
-                        bot=bot,
-                        chat_id=admin_id,
-                        text=message,
-                        parse_mode=ParseMode.MARKDOWN
-                    )
-                    logger.info(f"✅ تم إرسال التقرير للأدمن: {admin_id}")
-                except Exception as markdown_error:
-                    error_msg = str(markdown_error)
-                    logger.warning(f"⚠️ فشل الإرسال للأدمن {admin_id} مع Markdown: {error_msg}")
-                    # المحاولة الثانية: بدون Markdown
-                    try:
-                        await _send_message_in_chunks(
-                            bot=bot,
-                            chat_id=admin_id,
-                            text=message,
-                            parse_mode=None
-                        )
-                        logger.info(f"✅ تم إرسال التقرير للأدمن {admin_id} بدون Markdown")
-                    except Exception as fallback_error:
-                        logger.error(f"❌ فشل إرسال التقرير للأدمن {admin_id} حتى بدون Markdown: {fallback_error}")
-            except Exception as e:
-                logger.error(f"❌ فشل إرسال التقرير للأدمن {admin_id}: {e}")
+    logger.debug("📤 broadcast_new_report: إرسال التقرير للأدمن (دائماً مفعل) - BROADCAST_ENABLED=%s", broadcast_enabled)
+
+    if admins_task is not None:
+        # انطلقت قبل فشل خطوة لاحقة (المرفقات) — لا نرسل نسخة ثانية
+        await admins_task
     else:
-        logger.warning(f"⚠️ broadcast_new_report: ADMIN_IDS فارغ - لن يتم إرسال التقرير للأدمن")
+        await _send_admin_copies(bot, message)
 
 
 async def broadcast_initial_case(bot: Bot, case_data: dict):
@@ -711,36 +670,30 @@ async def broadcast_initial_case(bot: Bot, case_data: dict):
 
     message = format_initial_case_message(case_data)
     
-    # إرسال لجميع المستخدمين المعتمدين
+    # المستخدمون المعتمدون + الأدمن — كلهم معاً عبر المُجدوِل
     with SessionLocal() as s:
-        approved_users = s.query(Translator).filter_by(
-            is_approved=True,
-            is_suspended=False
-        ).all()
-        
-        for user in approved_users:
-            if user.tg_user_id:
-                try:
-                    await bot.send_message(
-                        chat_id=user.tg_user_id,
-                        text=message,
-                        parse_mode=ParseMode.MARKDOWN
-                    )
-                    print(f"تم ارسال الحالة الاولية الى {user.full_name}")
-                except Exception as e:
-                    print(f"فشل ارسال الحالة الاولية الى {user.full_name}: {e}")
-    
-    # إرسال للأدمن
-    for admin_id in ADMIN_IDS:
-        try:
-            await bot.send_message(
-                chat_id=admin_id,
-                text=message,
-                parse_mode=ParseMode.MARKDOWN
-            )
-            print(f"تم ارسال الحالة الاولية الى الادمن {admin_id}")
-        except Exception as e:
-            print(f"فشل ارسال الى الادمن {admin_id}: {e}")
+        recipients = [
+            (u.tg_user_id, u.full_name)
+            for u in s.query(Translator).filter_by(is_approved=True, is_suspended=False).all()
+            if u.tg_user_id
+        ]
+    recipients += [(admin_id, f"admin {admin_id}") for admin_id in ADMIN_IDS]
+
+    results = await fan_out(
+        [
+            (chat_id, lambda chat_id=chat_id: bot.send_message(
+                chat_id=chat_id, text=message, parse_mode=ParseMode.MARKDOWN
+            ))
+            for chat_id, _ in recipients
+        ],
+        priority=Priority.DIGEST,
+    )
+    for (chat_id, name), result in zip(recipients, results):
+        if isinstance(result, Exception):
+            logger.warning(f"فشل ارسال الحالة الاولية الى {name}: {result}")
+    logger.info(
+        f"broadcast_initial_case: {sum(not isinstance(r, Exception) for r in results)}/{len(recipients)} delivered"
+    )
 
 
 def _build_medical_report_status(data: dict) -> list:
@@ -766,152 +719,137 @@ def _build_medical_report_status(data: dict) -> list:
     return lines
 
 
-def format_report_message(data: dict) -> str:
-    """
-    ✅ دالة واحدة فقط لبناء نص التقرير (Report Builder)
-    - استخدام list + join بدل +=
-    - فصل الحقول بشكل صريح
-    - عدم استخدام reply_markup قديم
-    """
-    # ✅ إعادة تهيئة النص دائمًا - استخدام list
-    lines = []
-    
-    # ✅ رأس التقرير
-    if data.get('is_edit'):
-        lines.append("✏️ **تقرير معدل**")
-    else:
-        lines.append("🆕 **تقرير جديد**")
-    lines.append("")  # سطر فارغ
-    
-    # ✅ التاريخ
-    if data.get('report_date'):
-        date_str = _format_report_date(data.get('report_date'))
-        if date_str:
-            lines.append(f"📅🕐 التاريخ: {date_str}")
-            lines.append("")  # سطر فارغ
-    
-    # ✅ المعلومات الأساسية - مع escape_markdown لمنع أخطاء Markdown
-    if data.get('patient_name'):
-        lines.append(f"👤 اسم المريض: {escape_markdown(str(data['patient_name']))}")
+# ── بطاقة التقرير: قوالب مُجمَّعة لكل نوع إجراء ─────────────────────────────
+#
+# البطاقة نفسها تُرسَل للمجموعة وللأدمن وللمستخدم، وتُعاد في إعادة النشر
+# ورسالة نجاح التعديل. الرأس والتذييل مُعلَنان مرة واحدة (_HEADER_FIELDS)،
+# وجسم كل إجراء يُختار من _REPORT_TEMPLATES بقاموس بدل سلسلة if/elif،
+# والنص يُقسَّم لأجزاء تيليجرام مرة واحدة عند البناء (RenderedReport.chunks).
+# الناتج محفوظ في الذاكرة لكل (report_id, قاموس الإدخال كاملاً) — لا
+# updated_at وحده: مزامنة أسماء المترجمين تعدّل reports بـUPDATE خام لا يلمسه،
+# وأسماء المريض/المستشفى في إعادة النشر تأتي من جداول أخرى. أي تغيّر في أي
+# حقل يغيّر المفتاح فلا تُعرض بطاقة قديمة.
 
-    if data.get('hospital_name'):
-        lines.append(f"🏥 المستشفى: {escape_markdown(str(data['hospital_name']))}")
+_CARD_DIVIDER = "━━━━━━━━━━━━━━━━━━━━"
 
-    if data.get('department_name'):
-        lines.append(f"🏷️ القسم: {escape_markdown(str(data['department_name']))}")
+# (المفتاح، التسمية) — القيمة تُهرَّب دائماً؛ doctor_name يُتجاهل إن لم يُحدد
+_HEADER_FIELDS = (
+    ('patient_name', "👤 اسم المريض"),
+    ('hospital_name', "🏥 المستشفى"),
+    ('department_name', "🏷️ القسم"),
+    ('doctor_name', "👨‍⚕️ اسم الطبيب"),
+)
+_UNSET_VALUES = {'doctor_name': 'لم يتم التحديد'}
 
-    if data.get('doctor_name') and data.get('doctor_name') != 'لم يتم التحديد':
-        lines.append(f"👨‍⚕️ اسم الطبيب: {escape_markdown(str(data['doctor_name']))}")
+_TREATMENT_SESSION_ACTIONS = ('العلاج الكيماوي', 'العلاج الموجه', 'العلاج المناعي', 'جلسات غسيل الكلى')
 
-    # ✅ نوع الإجراء
-    if data.get('medical_action'):
-        lines.append(f"📌 نوع الإجراء: {escape_markdown(str(data['medical_action']))}")
-        lines.append("")
-        lines.append("━━━━━━━━━━━━━━━━━━━━")
-        lines.append("")
-    
-    # ✅ معالجة خاصة لكل نوع إجراء
-    medical_action = data.get('medical_action', '')
-    
-    if medical_action == 'تأجيل موعد':
-        lines.extend(_build_appointment_reschedule_fields(data))
-        lines.append("")
-        lines.append("━━━━━━━━━━━━━━━━━━━━")
-        lines.append("")
-        lines.extend(_build_medical_report_status(data))
-        if data.get('translator_name'):
-            lines.append(f"👨‍⚕️ المترجم: {escape_markdown(str(data['translator_name']))}")
-        return "\n".join(lines)
+REPORT_RENDER_CACHE_SIZE = int(os.getenv("REPORT_RENDER_CACHE_SIZE", "512"))
+REPORT_RENDER_CACHE_TTL = int(os.getenv("REPORT_RENDER_CACHE_TTL", "3600"))
 
-    elif medical_action == 'استشارة مع قرار عملية':
-        lines.extend(_build_surgery_consult_fields(data))
-        lines.append("")
-        lines.append("━━━━━━━━━━━━━━━━━━━━")
-        lines.append("")
-        lines.extend(_build_medical_report_status(data))
-        if data.get('translator_name'):
-            lines.append(f"👨‍⚕️ المترجم: {escape_markdown(str(data['translator_name']))}")
-        return "\n".join(lines)
-
-    elif medical_action == 'أشعة وفحوصات':
-        lines.extend(_build_radiology_fields(data))
-        lines.extend(_build_medical_report_status(data))
-        if data.get('translator_name'):
-            lines.append("")
-            lines.append(f"👨‍⚕️ المترجم: {escape_markdown(str(data['translator_name']))}")
-        return "\n".join(lines)
 
-    elif medical_action == 'استشارة أخيرة':
-        lines.extend(_build_final_consult_fields(data))
-        lines.extend(_build_medical_report_status(data))
-        if data.get('translator_name'):
-            lines.append("")
-            lines.append(f"👨‍⚕️ المترجم: {escape_markdown(str(data['translator_name']))}")
-        return "\n".join(lines)
+class ReportTemplate(NamedTuple):
+    """مواصفة بطاقة إجراء: دالة الجسم + ترتيب الفواصل حولها."""
+    body: Callable[[dict], list]
+    divider: bool = True            # خط فاصل قبل حالة التقرير الطبي
+    followup: bool = False          # موعد العودة/سببه العامّان بعد الجسم
+    translator_gap: bool = False    # سطر فارغ قبل المترجم
 
-    elif medical_action == 'جلسة إشعاعي':
-        lines.extend(_build_radiation_therapy_fields(data))
-        lines.append("")
-        lines.append("━━━━━━━━━━━━━━━━━━━━")
-        lines.append("")
-        lines.extend(_build_medical_report_status(data))
-        if data.get('translator_name'):
-            lines.append(f"👨‍⚕️ المترجم: {escape_markdown(str(data['translator_name']))}")
-        return "\n".join(lines)
-
-    elif (
-        medical_action in ('العلاج الكيماوي', 'العلاج الموجه', 'العلاج المناعي', 'جلسات غسيل الكلى')
-        or data.get('current_flow') == 'treatment_combined'
+
+class RenderedReport(str):
+    """نص البطاقة (str عادي لكل المستدعين) + أجزاؤه المقسَّمة مسبقاً."""
+    chunks: tuple
+
+    def __new__(cls, text: str):
+        obj = super().__new__(cls, text)
+        obj.chunks = tuple(_split_telegram_message(text))
+        return obj
+
+
+def _resolve_report_template(data: dict) -> ReportTemplate:
+    medical_action = data.get('medical_action', '') or ''
+    template = _REPORT_TEMPLATES.get(medical_action)
+    if template is not None:
+        return template
+    if (
+        data.get('current_flow') == 'treatment_combined'
         # ✅ نوع إجراء مدمج (اختيار متعدد لجلسات الأورام) — نص مركّب مثل
         # "العلاج الكيماوي + جلسة إشعاعي" لا يطابق أياً من القيم أعلاه
         # تماماً، فنتحقق من احتوائه على أي من التسميات المعروفة كنص فرعي.
         # هذا يغطي أيضاً مسار إعادة النشر بعد التعديل حيث current_flow
         # غير محفوظ في قاعدة البيانات (medical_action وحده متاح هناك).
-        or (medical_action and ' + ' in medical_action and any(
-            lbl in medical_action for lbl in
-            ('العلاج الكيماوي', 'العلاج الموجه', 'العلاج المناعي', 'جلسات غسيل الكلى', 'جلسة إشعاعي')
+        or (' + ' in medical_action and any(
+            lbl in medical_action for lbl in _TREATMENT_SESSION_ACTIONS + ('جلسة إشعاعي',)
         ))
     ):
-        lines.extend(_build_treatment_session_fields(data))
-        lines.append("")
-        lines.append("━━━━━━━━━━━━━━━━━━━━")
-        lines.append("")
-        lines.extend(_build_medical_report_status(data))
-        if data.get('translator_name'):
-            lines.append(f"👨‍⚕️ المترجم: {escape_markdown(str(data['translator_name']))}")
-        return "\n".join(lines)
+        return _TREATMENT_TEMPLATE
+    return _GENERAL_TEMPLATE
 
-    elif medical_action == 'معاملة الزراعة':
-        lines.extend(_build_transplant_fields(data))
-        lines.append("")
-        lines.append("━━━━━━━━━━━━━━━━━━━━")
-        lines.append("")
-        lines.extend(_build_medical_report_status(data))
-        if data.get('translator_name'):
-            lines.append(f"👨‍⚕️ المترجم: {escape_markdown(str(data['translator_name']))}")
-        return "\n".join(lines)
 
-    else:
-        # ✅ معالجة الحقول العامة (new_consult, followup, emergency, etc.)
-        lines.extend(_build_general_fields(data))
+def render_report_card(data: dict) -> RenderedReport:
+    """بناء البطاقة بلا ذاكرة — format_report_message هي الواجهة المعتادة."""
+    lines = ["✏️ **تقرير معدل**" if data.get('is_edit') else "🆕 **تقرير جديد**", ""]
 
-    # ✅ موعد العودة وسبب العودة (للمسارات العامة)
-    if medical_action not in ['تأجيل موعد', 'استشارة مع قرار عملية', 'أشعة وفحوصات', 'استشارة أخيرة', 'جلسة إشعاعي']:
-        lines.extend(_build_followup_fields(data))
+    if data.get('report_date'):
+        date_str = _format_report_date(data.get('report_date'))
+        if date_str:
+            lines.extend((f"📅🕐 التاريخ: {date_str}", ""))
 
-    # ✅ خط فاصل نهائي
-    lines.append("")
-    lines.append("━━━━━━━━━━━━━━━━━━━━")
-    lines.append("")
+    # ✅ المعلومات الأساسية - مع escape_markdown لمنع أخطاء Markdown
+    for key, label in _HEADER_FIELDS:
+        value = data.get(key)
+        if value and value != _UNSET_VALUES.get(key):
+            lines.append(f"{label}: {escape_markdown(str(value))}")
 
-    # ✅ حالة التقرير الطبي أولاً
-    lines.extend(_build_medical_report_status(data))
+    if data.get('medical_action'):
+        lines.extend((f"📌 نوع الإجراء: {escape_markdown(str(data['medical_action']))}", "", _CARD_DIVIDER, ""))
 
-    # ✅ المترجم بعد التقرير الطبي
+    template = _resolve_report_template(data)
+    lines.extend(template.body(data))
+    if template.followup:
+        lines.extend(_build_followup_fields(data))
+    if template.divider:
+        lines.extend(("", _CARD_DIVIDER, ""))
+
+    # ✅ حالة التقرير الطبي أولاً، ثم المترجم
+    lines.extend(_build_medical_report_status(data))
     if data.get('translator_name'):
+        if template.translator_gap:
+            lines.append("")
         lines.append(f"👨‍⚕️ المترجم: {escape_markdown(str(data['translator_name']))}")
 
-    return "\n".join(lines)
+    return RenderedReport("\n".join(lines))
+
+
+_RENDER_KEY_SCALARS = (str, int, float, type(None), date)
+
+
+def _report_render_key(data: dict):
+    """
+    (report_id, كل حقول الإدخال مجمّدة) — None = لا حفظ (ملخص ما قبل الحفظ).
+    القيم غير القابلة للتجزئة (قوائم المرفقات...) تدخل بتمثيلها النصي.
+    """
+    report_id = data.get('report_id')
+    if not report_id or not data.get('updated_at'):
+        return None
+    return report_id, tuple(sorted(
+        (k, v if isinstance(v, _RENDER_KEY_SCALARS) else repr(v)) for k, v in data.items()
+    ))
+
+
+def format_report_message(data: dict) -> str:
+    """
+    ✅ دالة واحدة فقط لبناء نص التقرير (Report Builder)
+    - القالب حسب نوع الإجراء من _REPORT_TEMPLATES
+    - محفوظة لكل (report_id, حقول الإدخال): إعادة النشر/التعديل/نسخ الأدمن
+      بنفس البيانات لا تعيد البناء ولا التقسيم
+    - بلا updated_at (ملخص ما قبل الحفظ) تُبنى في كل مرة
+    """
+    key = _report_render_key(data)
+    if key is None or REPORT_RENDER_CACHE_SIZE <= 0:
+        return render_report_card(data)
+    from services.caching import get_cache
+    cache = get_cache("report_cards", default_ttl=REPORT_RENDER_CACHE_TTL, max_entries=REPORT_RENDER_CACHE_SIZE)
+    return cache.get_or_load(key, lambda: render_report_card(data))
 
 
 def _format_report_date(report_date):
@@ -1637,6 +1575,20 @@ def _build_followup_fields(data: dict) -> list:
     return lines
 
 
+# سجل القوالب: نوع الإجراء → مواصفة البطاقة (انظر render_report_card)
+_GENERAL_TEMPLATE = ReportTemplate(_build_general_fields, followup=True)
+_TREATMENT_TEMPLATE = ReportTemplate(_build_treatment_session_fields)
+_REPORT_TEMPLATES = {
+    'تأجيل موعد': ReportTemplate(_build_appointment_reschedule_fields),
+    'استشارة مع قرار عملية': ReportTemplate(_build_surgery_consult_fields),
+    'أشعة وفحوصات': ReportTemplate(_build_radiology_fields, divider=False, translator_gap=True),
+    'استشارة أخيرة': ReportTemplate(_build_final_consult_fields, divider=False, translator_gap=True),
+    'جلسة إشعاعي': ReportTemplate(_build_radiation_therapy_fields),
+    'معاملة الزراعة': ReportTemplate(_build_transplant_fields),
+    **{action: _TREATMENT_TEMPLATE for action in _TREATMENT_SESSION_ACTIONS},
+}
+
+
 def _format_followup_date(followup_date, followup_time):
     """تنسيق تاريخ العودة"""
     if not followup_date:
@@ -1709,29 +1661,43 @@ async def broadcast_schedule(bot: Bot, photo_source, schedule_data: dict, use_fi
     if upload_time:
         caption += f" ({upload_time})"
 
-    async def _send_photo(chat_id):
-        try:
-            if use_file_id:
-                await bot.send_photo(chat_id=chat_id, photo=photo_source, caption=caption)
-            else:
-                with open(photo_source, 'rb') as f:
-                    await bot.send_photo(chat_id=chat_id, photo=f, caption=caption)
-        except Exception as e:
-            logger.warning(f"broadcast_schedule: فشل الإرسال إلى {chat_id}: {e}")
-
-    # إرسال لجميع المستخدمين المعتمدين والنشطين
     with SessionLocal() as s:
-        active_users = s.query(Translator).filter_by(
-            is_approved=True,
-            is_suspended=False,
-        ).all()
-        for user in active_users:
-            if user.tg_user_id:
-                await _send_photo(user.tg_user_id)
-
-    # إرسال للأدمن
-    for admin_id in ADMIN_IDS:
-        await _send_photo(admin_id)
+        recipients = [
+            u.tg_user_id
+            for u in s.query(Translator).filter_by(is_approved=True, is_suspended=False).all()
+            if u.tg_user_id
+        ]
+    recipients += list(ADMIN_IDS)
+    if not recipients:
+        return
+
+    # ملف محلي يُرفع مرة واحدة فقط: أول إرسال يعيد file_id يُستخدَم للبقية
+    photo = photo_source
+    if not use_file_id:
+        async def _upload(chat_id):
+            with open(photo_source, 'rb') as f:
+                return await bot.send_photo(chat_id=chat_id, photo=f, caption=caption)
+        while recipients:
+            chat_id = recipients.pop(0)
+            try:
+                first = await send_via_scheduler(lambda: _upload(chat_id), chat_id, Priority.DIGEST)
+                photo = first.photo[-1].file_id
+                break
+            except Exception as e:
+                logger.warning(f"broadcast_schedule: فشل الإرسال إلى {chat_id}: {e}")
+        else:
+            return
+
+    results = await fan_out(
+        [
+            (chat_id, lambda chat_id=chat_id: bot.send_photo(chat_id=chat_id, photo=photo, caption=caption))
+            for chat_id in recipients
+        ],
+        priority=Priority.DIGEST,
+    )
+    for chat_id, result in zip(recipients, results):
+        if isinstance(result, Exception):
+            logger.warning(f"broadcast_schedule: فشل الإرسال إلى {chat_id}: {result}")
 
     logger.info(f"broadcast_schedule: اكتمل البث — {day_name} {now}")
 
@@ -2,84 +2,333 @@
 # services/caching.py
 # 🚀 نظام التخزين المؤقت للأداء العالي
 # ================================================
+#
+# محرّك تخزين مؤقت محدود الحجم داخل العملية:
+#   • LRU بحدّ أقصى لعدد العناصر و/أو الحجم التقريبي بالبايت
+#   • TTL بساعة monotonic (لا يتأثر بتغيير ساعة النظام، ولا datetime.now لكل قراءة)
+#   • @cached يعمل مع الدوال المتزامنة وغير المتزامنة
+#   • عدّادات hit/miss/eviction لكل namespace
+#   • single-flight: طلبات متزامنة لنفس المفتاح تنتظر حساباً واحداً
+#   • وسوم (tags) للإبطال الجماعي: invalidate_tag("patients") بعد أي كتابة
+#   • عدّاد جيل لكل وسم: تحميل بدأ قبل إبطال وسومه لا يُخزَّن عند انتهائه
+#     (يُعاد للمستدعي والمنتظرين فقط) — وإلا عاشت القيمة القديمة كامل الـTTL
+#
+# الاستخدام:
+#     from services.caching import cached, invalidate_tag
+#
+#     @cached(ttl=300, namespace="hospitals", tags=("hospitals",))
+#     def get_all_hospitals(): ...
+#
+#     def add_hospital(...):
+#         ...commit...
+#         invalidate_tag("hospitals")
 
 import asyncio
+import functools
+import inspect
 import logging
-from typing import Dict, Any, Optional
-from datetime import datetime, timedelta
-import json
-import hashlib
+import sys
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Hashable, Iterable, Optional
 
 logger = logging.getLogger(__name__)
 
+_MISSING = object()
+
+
+def _estimate_size(value: Any, _depth: int = 0) -> int:
+    """Approximate deep size in bytes — cheap enough to run on every set()."""
+    size = sys.getsizeof(value)
+    if _depth >= 3:
+        return size
+    if isinstance(value, dict):
+        for k, v in value.items():
+            size += _estimate_size(k, _depth + 1) + _estimate_size(v, _depth + 1)
+    elif isinstance(value, (list, tuple, set, frozenset)):
+        for item in value:
+            size += _estimate_size(item, _depth + 1)
+    return size
+
+
+def _freeze(value: Any) -> Hashable:
+    """Turn call arguments into a hashable key without json/md5 round trips."""
+    if isinstance(value, (str, int, float, bool, type(None), bytes)):
+        return value
+    if isinstance(value, (list, tuple)):
+        return (type(value).__name__,) + tuple(_freeze(v) for v in value)
+    if isinstance(value, dict):
+        return ("dict",) + tuple(sorted((k, _freeze(v)) for k, v in value.items()))
+    if isinstance(value, (set, frozenset)):
+        return ("set",) + tuple(sorted(_freeze(v) for v in value))
+    try:
+        hash(value)
+        return value
+    except TypeError:
+        return repr(value)
+
+
+class _Entry:
+    __slots__ = ("value", "expires_at", "size", "tags")
+
+    def __init__(self, value, expires_at, size, tags):
+        self.value = value
+        self.expires_at = expires_at
+        self.size = size
+        self.tags = tags
+
+
 class CacheManager:
     """
     نظام تخزين مؤقت متقدم لتحسين الأداء تحت الضغط العالي
+
+    namespace واحد: LRU محدود بعدد العناصر (max_entries) وبالحجم التقريبي
+    (max_bytes، 0 = بلا حد)، مع TTL لكل عنصر ووسوم للإبطال.
     """
 
-    def __init__(self, default_ttl: int = 300):  # 5 دقائق افتراضياً
-        self.cache: Dict[str, Dict[str, Any]] = {}
+    def __init__(
+        self,
+        default_ttl: int = 300,  # 5 دقائق افتراضياً
+        max_entries: int = 1024,
+        max_bytes: int = 0,
+        name: str = "default",
+    ):
+        self.name = name
         self.default_ttl = default_ttl
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.cache: "OrderedDict[Hashable, _Entry]" = OrderedDict()
+        self._tags: Dict[str, set] = {}
+        self._bytes = 0
+        self._lock = threading.RLock()
+        self._inflight: Dict[Hashable, Any] = {}
+        self._tag_gen: Dict[str, int] = {}   # يزيد مع كل invalidate_tag
+        self._epoch = 0                      # يزيد مع كل clear()
+        self._dropped: set = set()           # مفاتيح حُذفت أثناء تحميلها
         self._cleanup_task: Optional[asyncio.Task] = None
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.invalidations = 0
 
-    def _generate_key(self, *args, **kwargs) -> str:
+    def _generate_key(self, *args, **kwargs) -> Hashable:
         """توليد مفتاح فريد للتخزين المؤقت"""
-        key_data = json.dumps({"args": args, "kwargs": kwargs}, sort_keys=True)
-        return hashlib.md5(key_data.encode()).hexdigest()
-
-    def set(self, key: str, value: Any, ttl: Optional[int] = None) -> None:
-        """تخزين قيمة مع TTL"""
-        expiry = datetime.now() + timedelta(seconds=ttl or self.default_ttl)
-        self.cache[key] = {
-            "value": value,
-            "expiry": expiry,
-            "created": datetime.now()
-        }
-        logger.debug(f"📦 Cached: {key[:16]}... (TTL: {ttl or self.default_ttl}s)")
-
-    def get(self, key: str) -> Optional[Any]:
-        """استرجاع قيمة من الـ cache"""
-        if key not in self.cache:
-            return None
+        if kwargs:
+            return (_freeze(args), _freeze(kwargs))
+        return _freeze(args)
 
-        item = self.cache[key]
-        if datetime.now() > item["expiry"]:
-            # انتهت صلاحية البيانات
-            del self.cache[key]
-            return None
+    # ── Core operations ───────────────────────────────────────────────────
 
-        logger.debug(f"⚡ Cache hit: {key[:16]}...")
-        return item["value"]
+    def _remove(self, key: Hashable) -> None:
+        entry = self.cache.pop(key, None)
+        if entry is None:
+            return
+        self._bytes -= entry.size
+        for tag in entry.tags:
+            keys = self._tags.get(tag)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._tags[tag]
 
-    def delete(self, key: str) -> bool:
-        """حذف عنصر من الـ cache"""
-        if key in self.cache:
-            del self.cache[key]
-            logger.debug(f"🗑️ Cache deleted: {key[:16]}...")
+    def _evict_if_needed(self) -> None:
+        while self.cache and (
+            (self.max_entries and len(self.cache) > self.max_entries)
+            or (self.max_bytes and self._bytes > self.max_bytes)
+        ):
+            oldest = next(iter(self.cache))
+            self._remove(oldest)
+            self.evictions += 1
+
+    def set(self, key: Hashable, value: Any, ttl: Optional[float] = None,
+            tags: Iterable[str] = ()) -> None:
+        """تخزين قيمة مع TTL ووسوم اختيارية"""
+        ttl = self.default_ttl if ttl is None else ttl
+        tags = frozenset(tags)
+        size = _estimate_size(value) if self.max_bytes else 0
+        with self._lock:
+            self._remove(key)
+            self.cache[key] = _Entry(value, time.monotonic() + ttl, size, tags)
+            self._bytes += size
+            for tag in tags:
+                self._tags.setdefault(tag, set()).add(key)
+            self._evict_if_needed()
+
+    def _generation(self, tags: tuple) -> tuple:
+        with self._lock:
+            return (self._epoch,) + tuple(self._tag_gen.get(t, 0) for t in tags)
+
+    def _store_loaded(self, key: Hashable, value: Any, ttl: Optional[float],
+                      tags: tuple, generation: tuple) -> bool:
+        """set() لنتيجة تحميل — إلا إن أُبطلت وسومها أو حُذف مفتاحها أثناءه."""
+        with self._lock:
+            if key in self._dropped or self._generation(tags) != generation:
+                return False
+            self.set(key, value, ttl, tags)
             return True
+
+    def _lookup(self, key: Hashable) -> Any:
+        """Return the live value or _MISSING, updating LRU order and counters."""
+        with self._lock:
+            entry = self.cache.get(key)
+            if entry is None:
+                self.misses += 1
+                return _MISSING
+            if time.monotonic() >= entry.expires_at:
+                # انتهت صلاحية البيانات
+                self._remove(key)
+                self.expirations += 1
+                self.misses += 1
+                return _MISSING
+            self.cache.move_to_end(key)
+            self.hits += 1
+            return entry.value
+
+    def get(self, key: Hashable, default: Any = None) -> Optional[Any]:
+        """استرجاع قيمة من الـ cache"""
+        value = self._lookup(key)
+        return default if value is _MISSING else value
+
+    def delete(self, key: Hashable) -> bool:
+        """حذف عنصر من الـ cache"""
+        with self._lock:
+            if key in self._inflight or ("__async__", key) in self._inflight:
+                self._dropped.add(key)
+            if key in self.cache:
+                self._remove(key)
+                return True
         return False
 
+    def invalidate_tag(self, tag: str) -> int:
+        """حذف كل العناصر الموسومة بـ tag. يُرجع عدد المحذوف."""
+        with self._lock:
+            self._tag_gen[tag] = self._tag_gen.get(tag, 0) + 1
+            keys = list(self._tags.get(tag, ()))
+            for key in keys:
+                self._remove(key)
+            self.invalidations += len(keys)
+        if keys:
+            logger.debug(f"🗑️ Cache[{self.name}] invalidated tag={tag!r}: {len(keys)} items")
+        return len(keys)
+
     def clear(self) -> int:
         """مسح جميع البيانات المخزنة"""
-        count = len(self.cache)
-        self.cache.clear()
-        logger.info(f"🧹 Cache cleared: {count} items removed")
+        with self._lock:
+            count = len(self.cache)
+            self._epoch += 1
+            self.cache.clear()
+            self._tags.clear()
+            self._bytes = 0
+        logger.info(f"🧹 Cache[{self.name}] cleared: {count} items removed")
         return count
 
     def cleanup_expired(self) -> int:
         """تنظيف البيانات المنتهية الصلاحية"""
-        expired_keys = []
-        for key, item in self.cache.items():
-            if datetime.now() > item["expiry"]:
-                expired_keys.append(key)
-
-        for key in expired_keys:
-            del self.cache[key]
+        now = time.monotonic()
+        with self._lock:
+            expired_keys = [k for k, e in self.cache.items() if now >= e.expires_at]
+            for key in expired_keys:
+                self._remove(key)
+            self.expirations += len(expired_keys)
 
         if expired_keys:
             logger.debug(f"🧽 Cleaned {len(expired_keys)} expired cache items")
         return len(expired_keys)
 
+    # ── Single-flight loaders ─────────────────────────────────────────────
+
+    def get_or_load(self, key: Hashable, loader: Callable[[], Any],
+                    ttl: Optional[float] = None, tags: Iterable[str] = ()) -> Any:
+        """Sync read-through: one loader call per key, concurrent callers wait."""
+        value = self._lookup(key)
+        if value is not _MISSING:
+            return value
+
+        tags = tuple(tags)
+        with self._lock:
+            flight = self._inflight.get(key)
+            leader = flight is None
+            if leader:
+                flight = self._inflight[key] = {"event": threading.Event()}
+                generation = self._generation(tags)
+        if not leader:
+            flight["event"].wait()
+            if "error" in flight:
+                raise flight["error"]
+            return flight["value"]
+
+        try:
+            value = loader()
+            self._store_loaded(key, value, ttl, tags, generation)
+            flight["value"] = value
+            return value
+        except BaseException as exc:
+            flight["error"] = exc
+            raise
+        finally:
+            with self._lock:
+                self._inflight.pop(key, None)
+                if ("__async__", key) not in self._inflight:
+                    self._dropped.discard(key)
+            flight["event"].set()
+
+    async def aget_or_load(self, key: Hashable, loader: Callable[[], Any],
+                           ttl: Optional[float] = None, tags: Iterable[str] = ()) -> Any:
+        """Async read-through: one awaited loader per key, concurrent awaiters share it."""
+        value = self._lookup(key)
+        if value is not _MISSING:
+            return value
+
+        akey = ("__async__", key)
+        tags = tuple(tags)
+        with self._lock:
+            future = self._inflight.get(akey)
+            leader = future is None
+            if leader:
+                future = self._inflight[akey] = asyncio.get_running_loop().create_future()
+                generation = self._generation(tags)
+        if not leader:
+            return await asyncio.shield(future)
+
+        try:
+            value = await loader()
+            self._store_loaded(key, value, ttl, tags, generation)
+            future.set_result(value)
+            return value
+        except BaseException as exc:
+            future.set_exception(exc)
+            # الاستثناء يُرفع هنا للقائد؛ المنتظرون يرونه عبر future
+            future.exception()
+            raise
+        finally:
+            with self._lock:
+                self._inflight.pop(akey, None)
+                if key not in self._inflight:
+                    self._dropped.discard(key)
+
+    # ── Stats ─────────────────────────────────────────────────────────────
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "items": len(self.cache),
+                "bytes": self._bytes,
+                "max_entries": self.max_entries,
+                "max_bytes": self.max_bytes,
+                "default_ttl": self.default_ttl,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": (self.hits / lookups) if lookups else 0.0,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+                "invalidations": self.invalidations,
+            }
+
+    # ── Periodic sweep ────────────────────────────────────────────────────
+
     async def start_cleanup_task(self, interval: int = 60):
         """بدء مهمة تنظيف دورية"""
         if self._cleanup_task and not self._cleanup_task.done():
@@ -93,7 +342,8 @@ class CacheManager:
         while True:
             try:
                 await asyncio.sleep(interval)
-                self.cleanup_expired()
+                for ns in list(_namespaces.values()):
+                    ns.cleanup_expired()
             except asyncio.CancelledError:
                 break
             except Exception as e:
@@ -109,38 +359,96 @@ class CacheManager:
                 logger.debug("تم تجاهل استثناء في stop_cleanup_task", exc_info=True)
             logger.info("🛑 Cache cleanup task stopped")
 
+
+# ================================================
+# Namespaces registry
+# ================================================
+
+_namespaces: Dict[str, CacheManager] = {}
+_namespaces_lock = threading.Lock()
+
+
+def get_cache(namespace: str = "default", *, default_ttl: int = 300,
+              max_entries: int = 1024, max_bytes: int = 0) -> CacheManager:
+    """Return (creating on first use) the cache for a namespace."""
+    ns = _namespaces.get(namespace)
+    if ns is None:
+        with _namespaces_lock:
+            ns = _namespaces.get(namespace)
+            if ns is None:
+                ns = CacheManager(default_ttl, max_entries, max_bytes, name=namespace)
+                _namespaces[namespace] = ns
+    return ns
+
+
 # 🚀 إنشاء instance عالمي للـ cache
-cache_manager = CacheManager()
+cache_manager = get_cache("default")
+
+
+def invalidate_tag(*tags: str) -> int:
+    """إبطال الوسوم في كل الـnamespaces — يُستدعى من دوال الكتابة بعد commit."""
+    removed = 0
+    for ns in list(_namespaces.values()):
+        for tag in tags:
+            removed += ns.invalidate_tag(tag)
+    return removed
+
 
 # 🔧 دوال مساعدة للاستخدام السريع
-def cached(ttl: Optional[int] = None):
-    """Decorator لتخزين نتائج الدوال مؤقتاً"""
+def cached(ttl: Optional[int] = None, namespace: str = "default",
+           tags: Iterable[str] = (), max_entries: int = 1024, max_bytes: int = 0):
+    """
+    Decorator لتخزين نتائج الدوال مؤقتاً — متزامنة أو غير متزامنة.
+
+    الدالة المُزيَّنة تحصل على:
+        .cache_invalidate(*args, **kwargs)  حذف نتيجة استدعاء محدد
+        .cache_clear()                      حذف كل نتائج هذه الدالة
+    """
+    tags = tuple(tags)
+    store = get_cache(namespace, default_ttl=ttl or 300,
+                      max_entries=max_entries, max_bytes=max_bytes)
+
     def decorator(func):
-        async def wrapper(*args, **kwargs):
-            key = cache_manager._generate_key(func.__name__, *args, **kwargs)
-            cached_result = cache_manager.get(key)
-            if cached_result is not None:
-                return cached_result
-
-            result = await func(*args, **kwargs)
-            cache_manager.set(key, result, ttl)
-            return result
+        func_tag = f"__func__:{func.__module__}.{func.__qualname__}"
+        entry_tags = tags + (func_tag,)
+
+        def _key(args, kwargs):
+            return (func.__qualname__, store._generate_key(*args, **kwargs))
+
+        if inspect.iscoroutinefunction(func):
+            @functools.wraps(func)
+            async def wrapper(*args, **kwargs):
+                return await store.aget_or_load(
+                    _key(args, kwargs), lambda: func(*args, **kwargs), ttl, entry_tags
+                )
+        else:
+            @functools.wraps(func)
+            def wrapper(*args, **kwargs):
+                return store.get_or_load(
+                    _key(args, kwargs), lambda: func(*args, **kwargs), ttl, entry_tags
+                )
+
+        wrapper.cache_invalidate = lambda *a, **kw: store.delete(_key(a, kw))
+        wrapper.cache_clear = lambda: store.invalidate_tag(func_tag)
         return wrapper
     return decorator
 
+
 # 📊 إحصائيات الـ cache
 def get_cache_stats() -> Dict[str, Any]:
-    """إرجاع إحصائيات الـ cache"""
-    return {
-        "total_items": len(cache_manager.cache),
-        "default_ttl": cache_manager.default_ttl,
-        "cleanup_task_active": cache_manager._cleanup_task is not None and not cache_manager._cleanup_task.done()
-    }
+    """إرجاع إحصائيات الـ cache لكل namespace"""
+    stats = {name: ns.stats() for name, ns in list(_namespaces.items())}
+    stats["cleanup_task_active"] = (
+        cache_manager._cleanup_task is not None and not cache_manager._cleanup_task.done()
+    )
+    return stats
+
 
 # 🧹 تنظيف يدوي
 def clear_cache():
     """مسح جميع البيانات المخزنة مؤقتاً"""
-    return cache_manager.clear()
+    return sum(ns.clear() for ns in list(_namespaces.values()))
+
 
 # 🚀 بدء الـ cache system
 async def start_cache_system():
@@ -148,6 +456,7 @@ async def start_cache_system():
     await cache_manager.start_cleanup_task()
     logger.info("🚀 Cache system started")
 
+
 # 🛑 إيقاف الـ cache system
 async def stop_cache_system():
     """إيقاف نظام التخزين المؤقت"""
@@ -0,0 +1,368 @@
+# ================================================
+# services/chart_rendering.py
+# 📈 Chart rendering service for the PDF builders
+# ================================================
+#
+# كل مولّد PDF كان يبني رسومه بنفسه على الخيط الذي يبني المستند: شكل جديد
+# (plt.subplots) لكل رسم، إعادة تشكيل التسميات العربية في كل مرة، ثم
+# rasterize — رسماً بعد رسم. هنا:
+#   • الرسم يُوصَف بـ"spec" (dict بسيط: kind + بيانات + خيارات) والرسّامون
+#     في _DRAWERS — نفس أنماط الرسوم السابقة حرفياً، بلا pyplot (Figure +
+#     FigureCanvasAgg مباشرة) فلا حالة عامة مشتركة بين الخيوط،
+#   • Figure/Canvas يُعاد استخدامها لكل خيط (clf بدل إنشاء جديد)،
+#   • التسميات العربية المُشكَّلة (arabic_reshaper + bidi) محفوظة بـlru_cache
+#     في كل عملية — أسماء المستشفيات/الأقسام/الإجراءات نفسها تتكرر،
+#   • PNG محفوظ في الذاكرة بمفتاح sha256 للـspec (services/caching "charts")
+#     — نفس البيانات لا تُرسَم مرتين،
+#   • دفعة رسوم (تصدير تحليل فيه عدة أقسام) تُرسَم بالتوازي في
+#     ProcessPoolExecutor (spawn — كما في image_pipeline/executor.py)،
+#     والدفعات الصغيرة (< CHART_POOL_MIN_BATCH) تُرسَم في نفس العملية.
+#
+# الاستدعاء متزامن ويحجز الخيط المستدعي فقط — المولّدات تعمل أصلاً عبر
+# asyncio.to_thread، فلا يُمسّ event loop البوت.
+#
+# Usage:
+#   pngs = render_charts([{"kind": "hbar", "labels": [...], "values": [...]}, ...])
+#   buf = render_chart(spec)          # io.BytesIO | None
+#   chart_render_stats()
+
+import functools
+import hashlib
+import io
+import json
+import logging
+import multiprocessing
+import os
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import List, Optional
+
+logger = logging.getLogger(__name__)
+
+CHART_WORKERS = int(os.getenv("CHART_WORKERS", "2"))
+CHART_POOL_MIN_BATCH = int(os.getenv("CHART_POOL_MIN_BATCH", "2"))
+CHART_CACHE_SIZE = int(os.getenv("CHART_CACHE_SIZE", "256"))
+CHART_CACHE_MAX_BYTES = int(os.getenv("CHART_CACHE_MAX_BYTES", str(32 * 1024 * 1024)))
+CHART_CACHE_TTL = int(os.getenv("CHART_CACHE_TTL", "3600"))
+
+# ألوان ChartRenderer (services/pdf_generation/pdf_charts.py)
+PALETTE = ['#1565C0', '#0288D1', '#2E7D32', '#F57F17', '#C62828', '#6A1B9A', '#00838F', '#E65100']
+ANALYSIS_PIE_PALETTE = ["#1565C0", "#2E7D32", "#B7950B", "#922B21", "#7D3C98", "#117A65", "#D35400", "#1A5276"]
+
+
+# ---------------------------------------------------------------------------
+# Drawing (runs in the workers, or in-process for small batches)
+# ---------------------------------------------------------------------------
+
+@functools.lru_cache(maxsize=4096)
+def shape_label(text: str) -> str:
+    """تسمية عربية مُشكَّلة للعرض (مخزّنة لكل عملية)."""
+    from services.pdf_arabic import ar
+    return ar(text)
+
+
+_local = threading.local()
+
+
+def _figure(figsize, dpi: int):
+    """Figure + Agg canvas لهذا الخيط، يُعاد استخدامها (تُفرَّغ لكل رسم)."""
+    fig = getattr(_local, "figure", None)
+    if fig is None:
+        from matplotlib.figure import Figure
+        from matplotlib.backends.backend_agg import FigureCanvasAgg
+        fig = Figure()
+        FigureCanvasAgg(fig)
+        _local.figure = fig
+    fig.clf()
+    fig.set_dpi(dpi)
+    fig.set_size_inches(*figsize)
+    return fig
+
+
+def _rotate_xticks(ax, **kwargs) -> None:
+    from matplotlib.artist import setp
+    setp(ax.get_xticklabels(), rotation=45, **kwargs)
+
+
+def _draw_hbar(fig, ax, spec: dict) -> None:
+    """أشرطة أفقية مرتّبة مع القيمة بجانب كل شريط (تحليل البيانات/التقرير الشامل)."""
+    labels = [shape_label(k) for k in spec["labels"]]
+    values = spec["values"]
+    bars = ax.barh(labels, values, color=spec.get("color", "#1565C0"), edgecolor="white", height=0.7)
+    for bar, v in zip(bars, values):
+        ax.text(bar.get_width() + 0.2, bar.get_y() + bar.get_height() / 2,
+                str(v), va="center", fontsize=9, color="#333")
+    ax.set_xlim(0, max(values) * 1.2 if values else 1)
+    ax.invert_yaxis()
+    ax.spines["top"].set_visible(False)
+    ax.spines["right"].set_visible(False)
+    ax.tick_params(axis="y", labelsize=8)
+
+
+def _draw_pie(fig, ax, spec: dict) -> None:
+    """دائري بنسب مئوية بيضاء داخل الشرائح (تحليل البيانات)."""
+    values = spec["values"]
+    _, _, autotexts = ax.pie(
+        values, labels=[shape_label(k) for k in spec["labels"]], autopct="%1.0f%%",
+        colors=ANALYSIS_PIE_PALETTE[:len(values)], startangle=140, pctdistance=0.75,
+        textprops={"fontsize": 7},
+    )
+    for at in autotexts:
+        at.set_fontsize(7)
+        at.set_color("white")
+
+
+def _draw_date_line(fig, ax, spec: dict) -> None:
+    """عدد الحالات لكل يوم (التقرير الشامل)."""
+    import matplotlib.dates as mdates
+
+    dates, counts = spec["dates"], spec["counts"]
+    ax.plot(dates, counts, marker="o", color="#1565C0", linewidth=2, markersize=5)
+    ax.fill_between(dates, counts, alpha=0.2, color="#1565C0")
+    ax.grid(True, alpha=0.3, linestyle="--")
+    ax.xaxis.set_major_formatter(mdates.DateFormatter("%d/%m"))
+    _rotate_xticks(ax)
+    ax.set_ylabel(spec.get("ylabel", "عدد الحالات"), fontsize=10)
+
+
+def _draw_bar(fig, ax, spec: dict) -> None:
+    """ChartRenderer.create_bar_chart"""
+    labels, values = spec["labels"], spec["values"]
+    if spec.get("horizontal"):
+        ax.barh(labels, values, color=PALETTE[:len(labels)])
+    else:
+        ax.bar(labels, values, color=PALETTE[:len(labels)])
+    ax.set_title(spec.get("title", ""), fontsize=14, fontweight='bold')
+    ax.set_xlabel(spec.get("xlabel", ""), fontsize=11)
+    ax.set_ylabel(spec.get("ylabel", ""), fontsize=11)
+    _rotate_xticks(ax, ha='right')
+
+
+def _draw_top5_pie(fig, ax, spec: dict) -> None:
+    """ChartRenderer.create_pie_chart — أعلى 5 عناصر والباقي "أخرى"."""
+    labels, values = spec["labels"], spec["values"]
+    if len(labels) > 5:
+        top = sorted(range(len(values)), key=lambda i: values[i], reverse=True)[:5]
+        labels_pie = [labels[i] for i in top] + ["أخرى"]
+        values_pie = [values[i] for i in top] + [sum(values) - sum(values[i] for i in top)]
+    else:
+        labels_pie, values_pie = labels, values
+    ax.pie(values_pie, labels=labels_pie, autopct='%1.1f%%', colors=PALETTE[:len(labels_pie)], startangle=90)
+    ax.set_title(spec.get("title", ""), fontsize=14, fontweight='bold')
+
+
+def _draw_line(fig, ax, spec: dict) -> None:
+    """ChartRenderer.create_line_chart"""
+    x_data, y_data = spec["labels"], spec["values"]
+    ax.plot(x_data, y_data, marker='o', linewidth=2, markersize=6, color='#1565C0')
+    ax.fill_between(range(len(x_data)), y_data, alpha=0.3, color='#0288D1')
+    ax.set_title(spec.get("title", ""), fontsize=14, fontweight='bold')
+    ax.set_xlabel(spec.get("xlabel", ""), fontsize=11)
+    ax.set_ylabel(spec.get("ylabel", ""), fontsize=11)
+    ax.grid(True, alpha=0.3)
+    _rotate_xticks(ax, ha='right')
+
+
+# kind → (drawer, rc overrides)
+_RENDERER_RC = {'font.family': 'DejaVu Sans', 'axes.unicode_minus': False}
+_DRAWERS = {
+    "hbar": (_draw_hbar, None),
+    "pie": (_draw_pie, None),
+    "date_line": (_draw_date_line, None),
+    "bar": (_draw_bar, _RENDERER_RC),
+    "top5_pie": (_draw_top5_pie, _RENDERER_RC),
+    "line": (_draw_line, _RENDERER_RC),
+}
+
+
+def render_png(spec: dict) -> bytes:
+    """يرسم spec واحداً ويعيد PNG (في العامل أو في نفس العملية)."""
+    import matplotlib
+
+    drawer, rc = _DRAWERS[spec["kind"]]
+    dpi = spec.get("dpi", 120)
+    with matplotlib.rc_context(rc or {}):
+        fig = _figure(spec.get("figsize", (10, 4)), dpi)
+        ax = fig.add_subplot()
+        drawer(fig, ax, spec)
+        fig.tight_layout()
+        buf = io.BytesIO()
+        fig.savefig(buf, format="png", dpi=dpi, bbox_inches="tight")
+    fig.clf()
+    return buf.getvalue()
+
+
+def _init_worker() -> None:
+    os.environ.setdefault("MPLBACKEND", "Agg")
+    try:
+        import matplotlib.figure  # noqa: F401
+        from matplotlib.backends import backend_agg  # noqa: F401
+    except Exception:
+        logger.debug("تم تجاهل استثناء في _init_worker", exc_info=True)
+
+
+def _ping() -> bool:
+    return True
+
+
+# ---------------------------------------------------------------------------
+# Parent side
+# ---------------------------------------------------------------------------
+
+def chart_key(spec: dict) -> str:
+    """sha256 للـspec — نفس البيانات والخيارات ⇒ نفس PNG."""
+    payload = json.dumps(spec, sort_keys=True, default=str, ensure_ascii=False)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class ChartRenderService:
+    """Process pool + PNG memo for chart specs."""
+
+    def __init__(self, workers: int = CHART_WORKERS, min_batch: int = CHART_POOL_MIN_BATCH):
+        self.workers = workers
+        self.min_batch = min_batch
+        self._pool: Optional[ProcessPoolExecutor] = None
+        self._pool_lock = threading.Lock()
+        self._stats = {"requested": 0, "rendered": 0, "pooled": 0, "failed": 0, "pool_restarts": 0}
+        self._render_ms = 0.0
+
+    @property
+    def cache(self):
+        from services.caching import get_cache
+        return get_cache("charts", default_ttl=CHART_CACHE_TTL,
+                         max_entries=CHART_CACHE_SIZE, max_bytes=CHART_CACHE_MAX_BYTES)
+
+    # ── Pool lifecycle ────────────────────────────────────────────────────
+
+    def _get_pool(self) -> ProcessPoolExecutor:
+        if self._pool is None:
+            with self._pool_lock:
+                if self._pool is None:
+                    self._pool = ProcessPoolExecutor(
+                        max_workers=self.workers,
+                        mp_context=multiprocessing.get_context("spawn"),
+                        initializer=_init_worker,
+                    )
+                    logger.info(f"[charts] process pool started with {self.workers} workers")
+        return self._pool
+
+    def warm_up(self) -> None:
+        """Start the workers now instead of on the first batch."""
+        if self.workers > 0:
+            for f in [self._get_pool().submit(_ping) for _ in range(self.workers)]:
+                f.result()
+
+    def _reset_pool(self) -> None:
+        with self._pool_lock:
+            if self._pool is not None:
+                self._pool.shutdown(wait=False, cancel_futures=True)
+                self._pool = None
+                self._stats["pool_restarts"] += 1
+
+    def shutdown(self, wait: bool = True) -> None:
+        with self._pool_lock:
+            if self._pool is not None:
+                self._pool.shutdown(wait=wait, cancel_futures=True)
+                self._pool = None
+                logger.info("[charts] process pool stopped")
+
+    # ── Rendering ─────────────────────────────────────────────────────────
+
+    def _render_local(self, spec: dict) -> Optional[bytes]:
+        try:
+            return render_png(spec)
+        except Exception as exc:
+            self._stats["failed"] += 1
+            logger.warning(f"[charts] {spec.get('kind')} chart failed: {exc}")
+            return None
+
+    def _render_batch(self, specs: List[dict]) -> List[Optional[bytes]]:
+        if self.workers <= 0 or len(specs) < self.min_batch:
+            return [self._render_local(s) for s in specs]
+        try:
+            futures = [self._get_pool().submit(render_png, s) for s in specs]
+        except (BrokenProcessPool, RuntimeError, OSError) as exc:
+            logger.warning(f"[charts] pool unavailable ({exc}) — rendering in-process")
+            self._reset_pool()
+            return [self._render_local(s) for s in specs]
+
+        results: List[Optional[bytes]] = []
+        for spec, future in zip(specs, futures):
+            try:
+                results.append(future.result())
+                self._stats["pooled"] += 1
+            except BrokenProcessPool:
+                # عامل مات (OOM/تعطّل أصلي) — الدفعة التالية تحصل على pool جديد
+                self._reset_pool()
+                results.append(self._render_local(spec))
+            except Exception as exc:
+                self._stats["failed"] += 1
+                logger.warning(f"[charts] {spec.get('kind')} chart failed: {exc}")
+                results.append(None)
+        return results
+
+    def render_many(self, specs: List[Optional[dict]]) -> List[Optional[bytes]]:
+        """PNG لكل spec (None للفاشل أو للـspec الفارغ) — المخزّن من الذاكرة، والباقي دفعة واحدة."""
+        self._stats["requested"] += sum(1 for s in specs if s)
+        cache = self.cache
+        keys = [chart_key(s) if s else None for s in specs]
+        found = {k: cache.get(k) for k in set(keys) if k}
+        found[None] = None
+        missing = {k: s for k, s in zip(keys, specs) if k and found[k] is None}
+
+        if missing:
+            t0 = time.perf_counter()
+            for key, png in zip(missing, self._render_batch(list(missing.values()))):
+                found[key] = png
+                if png is not None:
+                    cache.set(key, png)
+                    self._stats["rendered"] += 1
+            self._render_ms += (time.perf_counter() - t0) * 1000
+        return [found[k] for k in keys]
+
+    def stats(self) -> dict:
+        cache = self.cache.stats()
+        return {
+            **self._stats,
+            "workers": self.workers,
+            "render_ms": round(self._render_ms, 1),
+            "cache_items": cache["items"],
+            "cache_bytes": cache["bytes"],
+            "cache_hit_rate": cache["hit_rate"],
+            "labels_cached": shape_label.cache_info().currsize,
+        }
+
+
+_service: Optional[ChartRenderService] = None
+_service_lock = threading.Lock()
+
+
+def get_chart_renderer() -> ChartRenderService:
+    """Process-wide service, created on first use (the pool itself starts lazily too)."""
+    global _service
+    if _service is None:
+        with _service_lock:
+            if _service is None:
+                _service = ChartRenderService()
+    return _service
+
+
+def render_charts(specs: List[Optional[dict]]) -> List[Optional[bytes]]:
+    return get_chart_renderer().render_many(specs)
+
+
+def render_chart(spec: dict) -> Optional[io.BytesIO]:
+    png = render_charts([spec])[0]
+    return io.BytesIO(png) if png is not None else None
+
+
+def chart_render_stats() -> dict:
+    return get_chart_renderer().stats()
+
+
+def shutdown_chart_renderer(wait: bool = True) -> None:
+    """Stop the worker processes. Call on application shutdown."""
+    if _service is not None:
+        _service.shutdown(wait=wait)
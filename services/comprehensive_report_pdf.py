@@ -79,74 +79,26 @@ def _fmt_date(d) -> str:
     return str(d)
 
 
-def _action_bar_chart(action_counts: dict[str, int], font_name: str) -> io.BytesIO | None:
-    try:
-        import matplotlib
-        matplotlib.use("Agg")
-        import matplotlib.pyplot as plt
-        import arabic_reshaper
-        from bidi.algorithm import get_display
-
-        if not action_counts:
-            return None
-
-        items = sorted(action_counts.items(), key=lambda x: -x[1])[:12]
-        labels = [_ar(k) for k, _ in items]
-        values = [v for _, v in items]
-
-        fig, ax = plt.subplots(figsize=(10, max(3, len(items) * 0.5)))
-        bars = ax.barh(labels, values, color="#1565C0", edgecolor="white", height=0.7)
-        for bar, v in zip(bars, values):
-            ax.text(bar.get_width() + 0.2, bar.get_y() + bar.get_height() / 2,
-                    str(v), va="center", fontsize=9, color="#333")
-        ax.set_xlim(0, max(values) * 1.2 if values else 1)
-        ax.invert_yaxis()
-        ax.spines["top"].set_visible(False)
-        ax.spines["right"].set_visible(False)
-        ax.tick_params(axis="y", labelsize=8)
-        plt.tight_layout()
-
-        buf = io.BytesIO()
-        fig.savefig(buf, format="png", dpi=120, bbox_inches="tight")
-        plt.close(fig)
-        buf.seek(0)
-        return buf
-    except Exception as exc:
-        logger.warning(f"[comprehensive_pdf] chart failed: {exc}")
+# الرسوم عبر services/chart_rendering.py — الاثنان يُرسَمان دفعة واحدة.
+
+def _action_bar_chart_spec(action_counts: dict[str, int]) -> dict | None:
+    if not action_counts:
         return None
+    items = sorted(action_counts.items(), key=lambda x: -x[1])[:12]
+    return {
+        "kind": "hbar", "labels": [k for k, _ in items], "values": [v for _, v in items],
+        "figsize": (10, max(3, len(items) * 0.5)), "dpi": 120,
+    }
 
 
-def _date_line_chart(date_counts: dict[date, int], font_name: str) -> io.BytesIO | None:
-    try:
-        import matplotlib
-        matplotlib.use("Agg")
-        import matplotlib.pyplot as plt
-        import matplotlib.dates as mdates
-        from datetime import datetime
-
-        if not date_counts:
-            return None
-
-        dates = sorted(date_counts.keys())
-        counts = [date_counts[d] for d in dates]
-
-        fig, ax = plt.subplots(figsize=(12, 3.5))
-        ax.plot(dates, counts, marker="o", color="#1565C0", linewidth=2, markersize=5)
-        ax.fill_between(dates, counts, alpha=0.2, color="#1565C0")
-        ax.grid(True, alpha=0.3, linestyle="--")
-        ax.xaxis.set_major_formatter(mdates.DateFormatter("%d/%m"))
-        plt.xticks(rotation=45)
-        ax.set_ylabel("عدد الحالات", fontsize=10)
-        plt.tight_layout()
-
-        buf = io.BytesIO()
-        fig.savefig(buf, format="png", dpi=120, bbox_inches="tight")
-        plt.close(fig)
-        buf.seek(0)
-        return buf
-    except Exception as exc:
-        logger.warning(f"[comprehensive_pdf] date chart failed: {exc}")
+def _date_line_chart_spec(date_counts: dict[date, int]) -> dict | None:
+    if not date_counts:
         return None
+    dates = sorted(date_counts.keys())
+    return {
+        "kind": "date_line", "dates": dates, "counts": [date_counts[d] for d in dates],
+        "figsize": (12, 3.5), "dpi": 120,
+    }
 
 
 # ── Main API ──────────────────────────────────────────────────────────────────
@@ -396,24 +348,26 @@ def build_comprehensive_pdf(
     story.append(PageBreak())
     story.append(P("الرسوم البيانية", "section"))
 
+    from services.chart_rendering import render_charts
+    action_spec = _action_bar_chart_spec(action_counts)
+    date_spec = _date_line_chart_spec(date_counts) if len(date_counts) > 1 else None
+    action_png, date_png = render_charts([action_spec, date_spec])
+
     # Action chart
-    chart_buf = _action_bar_chart(action_counts, FN)
-    if chart_buf:
-        img = Image(chart_buf, width=15 * cm, height=max(4 * cm, len(action_counts) * 0.5 * cm))
+    if action_png:
+        img = Image(io.BytesIO(action_png), width=15 * cm, height=max(4 * cm, len(action_counts) * 0.5 * cm))
         img.hAlign = "CENTER"
         story.append(Spacer(1, 0.3 * cm))
         story.append(P("توزيع الإجراءات", "section"))
         story.append(img)
 
     # Date chart
-    if len(date_counts) > 1:
-        date_buf = _date_line_chart(date_counts, FN)
-        if date_buf:
-            img = Image(date_buf, width=15 * cm, height=4 * cm)
-            img.hAlign = "CENTER"
-            story.append(Spacer(1, 0.3 * cm))
-            story.append(P("التوزيع الزمني", "section"))
-            story.append(img)
+    if date_png:
+        img = Image(io.BytesIO(date_png), width=15 * cm, height=4 * cm)
+        img.hAlign = "CENTER"
+        story.append(Spacer(1, 0.3 * cm))
+        story.append(P("التوزيع الزمني", "section"))
+        story.append(img)
 
     # ── Case-by-case detail table ─────────────────────────────────────────────
     # ✅ لا يُعرض هنا كل حالة على حدة — الجداول/الرسوم أعلاه (المستشفيات/
@@ -82,79 +82,38 @@ def _colors():
     }
 
 
-# ── Chart generators (same pattern as comprehensive_report_pdf.py) ─────────────
+# ── Chart generators (services/chart_rendering.py) ─────────────────────────────
+# كل قسم يصف رسمه كـspec؛ build_analysis_pdf يرسم رسوم التصدير كلها دفعة
+# واحدة (بالتوازي في process pool، ومن الذاكرة إن تكررت البيانات).
 
-def _bar_chart(data: dict[str, int], title: str, color: str = "#1565C0") -> io.BytesIO | None:
-    try:
-        import matplotlib
-        matplotlib.use("Agg")
-        import matplotlib.pyplot as plt
-        import arabic_reshaper
-        from bidi.algorithm import get_display
+def _bar_chart_spec(data: dict[str, int], color: str = "#1565C0") -> dict | None:
+    if not data:
+        return None
+    items = sorted(data.items(), key=lambda x: -x[1])[:12]
+    return {
+        "kind": "hbar", "labels": [k for k, _ in items], "values": [v for _, v in items],
+        "color": color, "figsize": (10, max(3, len(items) * 0.5)), "dpi": 120,
+    }
 
-        if not data:
-            return None
-        items = sorted(data.items(), key=lambda x: -x[1])[:12]
-        labels = [_ar(k) for k, _ in items]
-        values = [v for _, v in items]
-
-        fig, ax = plt.subplots(figsize=(10, max(3, len(items) * 0.5)))
-        bars = ax.barh(labels, values, color=color, edgecolor="white", height=0.7)
-        for bar, v in zip(bars, values):
-            ax.text(bar.get_width() + 0.2, bar.get_y() + bar.get_height() / 2,
-                    str(v), va="center", fontsize=9, color="#333")
-        ax.set_xlim(0, max(values) * 1.2 if values else 1)
-        ax.invert_yaxis()
-        ax.spines["top"].set_visible(False)
-        ax.spines["right"].set_visible(False)
-        ax.tick_params(axis="y", labelsize=8)
-        plt.tight_layout()
-
-        buf = io.BytesIO()
-        fig.savefig(buf, format="png", dpi=120, bbox_inches="tight")
-        plt.close(fig)
-        buf.seek(0)
-        return buf
-    except Exception as exc:
-        logger.warning(f"[data_analysis_pdf] bar chart failed: {exc}")
+
+def _pie_chart_spec(data: dict[str, int]) -> dict | None:
+    if not data or sum(data.values()) == 0:
         return None
+    items = sorted(data.items(), key=lambda x: -x[1])[:8]
+    return {
+        "kind": "pie", "labels": [f"{k} ({v})" for k, v in items], "values": [v for _, v in items],
+        "figsize": (5.5, 4.5), "dpi": 120,
+    }
 
 
-def _pie_chart(data: dict[str, int], title: str) -> io.BytesIO | None:
-    try:
-        import matplotlib
-        matplotlib.use("Agg")
-        import matplotlib.pyplot as plt
-        import arabic_reshaper
-        from bidi.algorithm import get_display
-
-        if not data or sum(data.values()) == 0:
-            return None
-        items = sorted(data.items(), key=lambda x: -x[1])[:8]
-        labels = [_ar(f"{k} ({v})") for k, v in items]
-        values = [v for _, v in items]
-        palette = ["#1565C0", "#2E7D32", "#B7950B", "#922B21", "#7D3C98",
-                   "#117A65", "#D35400", "#1A5276"]
-
-        fig, ax = plt.subplots(figsize=(5.5, 4.5))
-        wedges, texts, autotexts = ax.pie(
-            values, labels=labels, autopct="%1.0f%%",
-            colors=palette[:len(values)], startangle=140, pctdistance=0.75,
-            textprops={"fontsize": 7},
-        )
-        for at in autotexts:
-            at.set_fontsize(7)
-            at.set_color("white")
-        plt.tight_layout()
-
-        buf = io.BytesIO()
-        fig.savefig(buf, format="png", dpi=120, bbox_inches="tight")
-        plt.close(fig)
-        buf.seek(0)
-        return buf
-    except Exception as exc:
-        logger.warning(f"[data_analysis_pdf] pie chart failed: {exc}")
+def _section_chart_spec(sec: dict) -> dict | None:
+    if sec.get("type") != "ranked_table" or not sec.get("data"):
         return None
+    if sec.get("chart") == "bar":
+        return _bar_chart_spec(sec["data"])
+    if sec.get("chart") == "pie":
+        return _pie_chart_spec(sec["data"])
+    return None
 
 
 # ── Main API ──────────────────────────────────────────────────────────────────
@@ -332,14 +291,9 @@ def build_analysis_pdf(
         ]))
         story.append(t)
 
-        chart_kind = sec.get("chart")
-        if chart_kind == "bar":
-            buf_chart = _bar_chart(data, title_txt)
-        elif chart_kind == "pie":
-            buf_chart = _pie_chart(data, title_txt)
-        else:
-            buf_chart = None
-        if buf_chart:
+        png = chart_pngs.get(id(sec))
+        if png:
+            buf_chart = io.BytesIO(png)
             img = Image(buf_chart, width=15 * cm, height=max(4 * cm, min(12 * cm, len(data) * 0.5 * cm)))
             img.hAlign = "CENTER"
             story.append(Spacer(1, 0.3 * cm))
@@ -378,6 +332,10 @@ def build_analysis_pdf(
             if line.strip():
                 story.append(P(line, "body"))
 
+    # كل رسوم التصدير دفعة واحدة قبل بناء الأقسام
+    from services.chart_rendering import render_charts
+    chart_pngs = dict(zip(map(id, sections), render_charts([_section_chart_spec(sec) for sec in sections])))
+
     has_content = False
     for sec in sections:
         stype = sec.get("type")
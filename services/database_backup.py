@@ -42,7 +42,9 @@ def create_backup(prefix: str = "auto") -> str:
     backup_path = BACKUP_DIR / backup_name
     
     try:
-        shutil.copy2(DB_PATH, backup_path)
+        # copy2 على قاعدة حيّة (WAL) قد يعطي نسخة ممزقة — لقطة متسقة عبر backup API
+        from services.incremental_backup import online_copy
+        online_copy(str(DB_PATH), str(backup_path))
         logger.info(f"✅ تم إنشاء نسخة احتياطية: {backup_path}")
         return str(backup_path)
     except Exception as e:
@@ -6,10 +6,14 @@
 نظام ترتيب متقدم مع دعم AI
 """
 
+import importlib.util
 import json
 import os
 import re
 import logging
+import threading
+import time
+from collections import OrderedDict
 from typing import List, Dict, Optional
 
 logger = logging.getLogger(__name__)
@@ -45,12 +49,10 @@ except ImportError:
 
     fuzz = FuzzFallback()
 
-# محاولة استيراد OpenAI للترتيب الذكي (اختياري)
-try:
-    from openai import OpenAI
-    OPENAI_AVAILABLE = True
-except ImportError:
-    OPENAI_AVAILABLE = False
+# OpenAI للترتيب الذكي (اختياري) — فحص التوفر فقط؛ استيراد الحزمة نفسها
+# ثقيل ولا يلزم عند تحميل الـhandlers
+OPENAI_AVAILABLE = importlib.util.find_spec("openai") is not None
+if not OPENAI_AVAILABLE:
     logger.info("OpenAI غير متاح - سيتم استخدام الترتيب التقليدي فقط")
 
 # ━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
@@ -301,76 +303,439 @@ DEPARTMENT_TRANSLATIONS = {
 }
 
 # ━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
-# 📚 تحميل قاعدة البيانات
+# 📚 تحميل قاعدة البيانات + الفهرس
 # ━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
+#
+# كان search_doctors يمرّ على كل الأطباء مع كل حرف يكتبه المستخدم في
+# inline query، ويعيد normalize_text و fuzz.ratio لكل مستشفى وقسم وطبيب،
+# ثم _remove_duplicate_doctors (تربيعية). الآن يُبنى فهرس مرة واحدة عند
+# التحميل:
+#   • أسماء/مستشفيات/أقسام مُطبَّعة مسبقاً لكل طبيب
+#   • شجرة مستشفى ← قسم ← أطباء
+#   • postings لثلاثيات الأحرف (trigrams) لتقليص المرشحين قبل الـfuzzy
+#   • نتيجة مرحلة الفلترة (مستشفى/قسم/نوع تخصص + إزالة التكرار) تُحفظ لكل
+#     تركيبة — ضغطات المفاتيح المتتالية في نفس الشاشة لا تعيد حسابها
+# ويُعاد البناء تلقائياً إن تغيّر ملف الأطباء على القرص.
 
-_doctors_cache = None
+_DATA_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "data")
 
-def load_doctors():
-    """
-    تحميل قاعدة بيانات الأطباء من الملف المنظم
-    
-    يحاول تحميل الملف المنظم أولاً (doctors_organized.json)
-    إذا لم يوجد، يحمل الملف القديم (doctors_database.json)
-    """
-    global _doctors_cache
-    
-    if _doctors_cache is not None:
-        return _doctors_cache
-    
-    # محاولة تحميل الملف المنظم أولاً
-    organized_path = 'data/doctors_organized.json'
-    old_path = 'data/doctors_database.json'
-    
+# بالترتيب: أول ملف موجود هو المصدر
+_DOCTOR_SOURCES = ("doctors_organized.json", "doctors_database.json", "doctors.txt")
+
+# أقل فاصل بين فحوص mtime لملف الأطباء (ثوانٍ)
+_RELOAD_CHECK_INTERVAL = float(os.getenv("DOCTORS_RELOAD_CHECK_INTERVAL", "5"))
+
+# تقليص المرشحين بالـtrigrams فقط فوق هذا العدد — تحته الـfuzzy على الكل أرخص
+_PRUNE_MIN_CANDIDATES = 150
+
+_FILTER_MEMO_SIZE = 256
+
+_SURGICAL_KEYWORDS = ('جراحة', 'surgery', 'surgical', 'operation', 'operative')
+_MEDICAL_KEYWORDS = (
+    'باطني', 'medical', 'medicine', 'internal', 'physician',
+    'cardiology', 'gastroenterology', 'neurology', 'nephrology',
+    'pulmonology', 'endocrinology', 'hematology', 'rheumatology',
+    'dermatology', 'psychiatry', 'pediatrics', 'geriatrics',
+    'allergy', 'immunology', 'infectious', 'critical care'
+)
+_HOSPITAL_COMMON_WORDS = {
+    'hospital', 'medical', 'center', 'clinic', 'healthcare', 'health',
+    'care', 'institute', 'institution',
+}
+
+
+def _read_doctors_file(path):
+    """قراءة ملف أطباء إلى قائمة مسطحة (json منظم، json قديم، أو txt)."""
+    if path.endswith("doctors_organized.json"):
+        with open(path, 'r', encoding='utf-8') as f:
+            organized_data = json.load(f)
+
+        # تحويل البنية المنظمة إلى قائمة مسطحة للأطباء
+        doctors_list = []
+        hospitals = organized_data.get('hospitals', {})
+        for hospital_name, departments in hospitals.items():
+            for dept_key, dept_data in departments.items():
+                dept_ar = dept_data.get('department_ar', '')
+                dept_en = dept_data.get('department_en', '')
+                for doctor_name in dept_data.get('doctors', []):
+                    doctors_list.append({
+                        'name': doctor_name,
+                        'hospital': hospital_name,
+                        'department_ar': dept_ar,
+                        'department_en': dept_en,
+                        'department': dept_key  # للحفاظ على التوافق
+                    })
+        return doctors_list
+
+    if path.endswith(".json"):
+        with open(path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+
+    # doctors.txt: الاسم | المستشفى | القسم بالعربي | القسم بالإنجليزي
+    doctors_list = []
+    with open(path, 'r', encoding='utf-8') as f:
+        for line in f:
+            line = line.strip()
+            if not line or line.startswith('#'):
+                continue
+            parts = [p.strip() for p in line.split('|')]
+            if not parts[0]:
+                continue
+            dept_ar = parts[2] if len(parts) > 2 else ''
+            dept_en = parts[3] if len(parts) > 3 else ''
+            doctors_list.append({
+                'name': parts[0],
+                'hospital': parts[1] if len(parts) > 1 else '',
+                'department_ar': dept_ar,
+                'department_en': dept_en,
+                'department': dept_en or dept_ar,
+            })
+    return doctors_list
+
+
+def _trigrams(text):
+    return {text[i:i + 3] for i in range(len(text) - 2)}
+
+
+class _DoctorRecord:
+    """طبيب مع كل الحقول المُطبَّعة التي يحتاجها البحث — تُحسب مرة واحدة."""
+
+    __slots__ = (
+        "doc", "name_norm", "hospital_norm", "dept_norm", "dept_ar_norm",
+        "dept_en_norm", "all_dept_text", "all_dept_words", "dept_words",
+        "dept_ar_words", "dept_en_words", "dept_signature",
+        "is_surgical", "is_medical",
+    )
+
+    def __init__(self, doc):
+        self.doc = doc
+        self.name_norm = normalize_text(doc.get('name', ''))
+        self.hospital_norm = normalize_text(doc.get('hospital', ''))
+        self.dept_norm = normalize_text(doc.get('department', ''))
+        self.dept_ar_norm = normalize_text(doc.get('department_ar', ''))
+        self.dept_en_norm = normalize_text(doc.get('department_en', ''))
+        self.all_dept_text = f"{self.dept_norm} {self.dept_ar_norm} {self.dept_en_norm}".lower()
+        self.all_dept_words = frozenset(self.all_dept_text.split())
+        self.dept_words = frozenset(self.dept_norm.split())
+        self.dept_ar_words = frozenset(self.dept_ar_norm.split())
+        self.dept_en_words = frozenset(self.dept_en_norm.split())
+        self.dept_signature = (self.dept_norm, self.dept_ar_norm, self.dept_en_norm)
+        self.is_surgical = any(k in self.all_dept_text for k in _SURGICAL_KEYWORDS)
+        self.is_medical = (not self.is_surgical) and any(
+            k in self.all_dept_text for k in _MEDICAL_KEYWORDS
+        )
+
+
+class DoctorIndex:
+    """فهرس البحث عن الأطباء — يُبنى مرة عند التحميل ويُستبدل كاملاً عند التغيير."""
+
+    def __init__(self, doctors, source=None, mtime=None):
+        self.doctors = doctors
+        self.source = source
+        self.mtime = mtime
+        self.records = [_DoctorRecord(d) for d in doctors]
+        self._pos = {id(d): i for i, d in enumerate(doctors)}
+
+        # المستشفى المُطبَّع ← معرّفات الأطباء (بترتيب الملف)
+        self.by_hospital = {}
+        # الشجرة: المستشفى ← القسم ← الأطباء
+        self.tree = {}
+        # trigram ← معرّفات الأطباء
+        self.postings = {}
+        for i, rec in enumerate(self.records):
+            self.by_hospital.setdefault(rec.hospital_norm, []).append(i)
+            hospital = rec.doc.get('hospital', '')
+            dept = (rec.doc.get('department', '') or '').strip()
+            self.tree.setdefault(hospital, {}).setdefault(dept, []).append(rec.doc)
+            for gram in _trigrams(rec.name_norm):
+                self.postings.setdefault(gram, []).append(i)
+
+        self._filter_memo = OrderedDict()
+        self._memo_lock = threading.Lock()
+
+    def __len__(self):
+        return len(self.doctors)
+
+    # ── فلترة المستشفى ─────────────────────────────────────────────────────
+
+    def _hospital_matches(self, hospital_normalized, distinctive_words, doc_hospital):
+        """نفس استراتيجيات المطابقة الأربع — تُقيَّم مرة لكل مستشفى مميّز."""
+        # استراتيجية 1: تطابق دقيق 100% (الأفضل)
+        if hospital_normalized == doc_hospital:
+            return True
+        # استراتيجية 2: تطابق جزئي (مثال: "Aster Whitefield" ⊂ "Aster Whitefield Hospital, Bangalore")
+        if hospital_normalized in doc_hospital or doc_hospital in hospital_normalized:
+            return True
+        # استراتيجية 3: تطابق fuzzy عالي جداً (90%+)
+        hospital_match_ratio = fuzz.ratio(hospital_normalized, doc_hospital)
+        if hospital_match_ratio >= 90:
+            return True
+        # استراتيجية 4: يجب أن تتطابق جميع الكلمات المميزة + تطابق عالي للاسم الكامل
+        if distinctive_words:
+            doc_distinctive_words = [
+                w for w in doc_hospital.split()
+                if w not in _HOSPITAL_COMMON_WORDS and len(w) >= 2
+            ]
+            for h_word in distinctive_words:
+                if not any(h_word == d_word or fuzz.ratio(h_word, d_word) >= 90
+                           for d_word in doc_distinctive_words):
+                    return False
+            return hospital_match_ratio >= 80
+        return False
+
+    def _filter_hospital(self, ids, hospital):
+        hospital_normalized = normalize_text(hospital)
+        # الكلمات المميزة (مثل CMI, RV, Whitefield) — ليست عامة مثل "hospital"
+        distinctive_words = [
+            w for w in hospital_normalized.split()
+            if w not in _HOSPITAL_COMMON_WORDS and len(w) >= 2
+        ]
+        matched = {
+            h for h in self.by_hospital
+            if self._hospital_matches(hospital_normalized, distinctive_words, h)
+        }
+        return [i for i in ids if self.records[i].hospital_norm in matched]
+
+    # ── فلترة القسم ────────────────────────────────────────────────────────
+
+    def _dept_matches(self, department, dept_normalized, dept_ar, dept_en,
+                      dept_keywords, is_ent_query, english_terms, rec):
+        if not rec.all_dept_text.strip():
+            return False
+
+        # ✅ استبعاد صريح لـ "dentistry" و "dental" عند البحث عن ENT
+        # ("dentistry" يحتوي على "ent" كجزء من الكلمة)
+        if is_ent_query:
+            doc_dept_lower = rec.dept_en_norm.lower()
+            if 'dentistry' in doc_dept_lower or 'dental' in doc_dept_lower:
+                return False
+
+        # ✅ طريقة 1: تطابق ثنائي اللغة — 70% على الأقل من كلمات القسم المطلوب
+        if dept_ar and dept_en:
+            dept_ar_words = set(dept_ar.split())
+            dept_en_words = set(dept_en.split())
+            ar_match_ratio = len(dept_ar_words & rec.dept_ar_words) / len(dept_ar_words) if dept_ar_words else 0
+            en_match_ratio = len(dept_en_words & rec.dept_en_words) / len(dept_en_words) if dept_en_words else 0
+            dept_match_ratio = len(dept_en_words & rec.dept_words) / len(dept_en_words) if dept_en_words else 0
+            if ar_match_ratio >= 0.7 or en_match_ratio >= 0.7 or dept_match_ratio >= 0.7:
+                return True
+
+        # طريقة 2: تطابق مباشر دقيق (كلمات كاملة فقط)
+        dept_words = set(dept_normalized.split())
+        if dept_words and dept_words.issubset(rec.all_dept_words):
+            return True
+
+        # طريقة 3: البحث بالقاموس (عربي → إنجليزي) - تطابق كلمات كاملة فقط
+        for term in english_terms:
+            term_normalized = normalize_text(term)
+            term_words = set(term_normalized.split())
+            if 'ent' in term_normalized:
+                # "ent" ككلمة كاملة (وليس جزءاً من "dentistry")
+                if (re.search(r'\bent\b', rec.dept_en_norm.lower()) or
+                        re.search(r'\bent\b', rec.all_dept_text) or
+                        'otolaryngology' in rec.dept_en_norm.lower()):
+                    return True
+            if term_words.issubset(rec.dept_en_words) or term_words.issubset(rec.all_dept_words):
+                return True
+
+        # طريقة 4: تطابق جميع الكلمات الرئيسية (كلمات كاملة فقط)
+        if dept_keywords and set(dept_keywords).issubset(rec.all_dept_words):
+            return True
+
+        # طريقة 5: البحث المباشر عن "ENT" في القسم الإنجليزي (ككلمة كاملة)
+        if is_ent_query:
+            doc_dept_en = rec.dept_en_norm.lower()
+            if (re.search(r'\bent\b', doc_dept_en) or
+                    re.search(r'\bent\b', rec.all_dept_text) or
+                    'head & neck' in doc_dept_en or
+                    'head and neck' in doc_dept_en or
+                    'otolaryngology' in doc_dept_en):
+                return True
+
+        # طريقة 6: fuzzy matching (threshold عالي جداً للدقة)
+        for field in rec.dept_signature:
+            if field and len(field) > 3 and fuzz.ratio(dept_normalized, field) > 90:
+                return True
+        return False
+
+    def _filter_department(self, ids, department):
+        dept_normalized = normalize_text(department)
+
+        # ✅ إذا القسم ثنائي اللغة "عربي | إنجليزي"، افصلهما
+        dept_ar, dept_en = None, None
+        if '|' in department:
+            parts = department.split('|')
+            if len(parts) >= 2:
+                dept_ar = normalize_text(parts[0])
+                dept_en = normalize_text(parts[1])
+
+        dept_keywords = [w for w in dept_normalized.split() if len(w) > 2]
+        is_ent_query = (
+            'ent' in dept_normalized or 'اذن' in dept_normalized
+            or 'انف' in dept_normalized or 'حنجرة' in dept_normalized
+        )
+        english_terms = find_department_english_terms(department)
+
+        # المطابقة تعتمد على حقول القسم فقط ⇒ تُقيَّم مرة لكل قسم مميّز
+        verdicts = {}
+        out = []
+        for i in ids:
+            rec = self.records[i]
+            verdict = verdicts.get(rec.dept_signature)
+            if verdict is None:
+                verdict = self._dept_matches(
+                    department, dept_normalized, dept_ar, dept_en,
+                    dept_keywords, is_ent_query, english_terms, rec,
+                )
+                verdicts[rec.dept_signature] = verdict
+            if verdict:
+                out.append(i)
+        return out
+
+    # ── مرحلة الفلترة الكاملة (مع الحفظ) ───────────────────────────────────
+
+    def _dedupe(self, ids):
+        docs = _remove_duplicate_doctors([self.records[i].doc for i in ids])
+        return [self._pos[id(d)] for d in docs]
+
+    def filter_ids(self, hospital=None, department=None, specialty_type=None):
+        """معرّفات الأطباء بعد فلترة المستشفى/القسم/نوع التخصص وإزالة التكرار."""
+        key = (hospital or None, department or None, specialty_type or None)
+        with self._memo_lock:
+            cached_ids = self._filter_memo.get(key)
+            if cached_ids is not None:
+                self._filter_memo.move_to_end(key)
+                return cached_ids
+
+        ids = list(range(len(self.records)))
+
+        if hospital:
+            ids = self._filter_hospital(ids, hospital)
+            logger.info(f"   بعد فلترة المستشفى '{hospital}': {len(ids)} طبيب")
+
+        if department:
+            ids = self._filter_department(ids, department)
+            # ✅ إزالة التكرارات بعد فلترة القسم مباشرة
+            ids = self._dedupe(ids)
+            logger.info(f"   بعد فلترة القسم: {len(ids)} طبيب")
+            # ✅ لا نعرض أطباء من أقسام أخرى إن لم يوجد أحد في هذا القسم
+            if not ids and hospital:
+                logger.warning(f"   ⚠️ لم يُوجد أطباء مطابقين للقسم '{department}' في مستشفى '{hospital}'")
+
+        # ✅ فلترة حسب نوع التخصص (باطني/جراحي) — غير المعروف يُعرض الجميع
+        if specialty_type and ids:
+            specialty_type_lower = specialty_type.lower().strip()
+            if specialty_type_lower == 'surgical':
+                ids = [i for i in ids if self.records[i].is_surgical]
+            elif specialty_type_lower == 'medical':
+                ids = [i for i in ids if self.records[i].is_medical]
+            logger.info(f"   بعد فلترة نوع التخصص ({specialty_type}): {len(ids)} طبيب")
+
+        # ✅ إزالة التكرارات بناءً على تشابه الأسماء
+        ids = tuple(self._dedupe(ids))
+
+        with self._memo_lock:
+            self._filter_memo[key] = ids
+            while len(self._filter_memo) > _FILTER_MEMO_SIZE:
+                self._filter_memo.popitem(last=False)
+        return ids
+
+    # ── مرشحو الاستعلام ────────────────────────────────────────────────────
+
+    def candidates(self, ids, query_normalized, limit):
+        """تقليص المرشحين بالـtrigrams المشتركة مع الاستعلام.
+
+        يُرجِع ids كما هي إن كانت قليلة أصلاً، أو إن كان التقليص سيترك أقل
+        من limit*3 (عدد ما يُرتَّب لاحقاً) — حينها الـfuzzy على الكل أدق.
+        """
+        if len(ids) < _PRUNE_MIN_CANDIDATES or len(query_normalized) < 3:
+            return ids
+        hits = set()
+        for gram in _trigrams(query_normalized):
+            hits.update(self.postings.get(gram, ()))
+        pruned = [i for i in ids if i in hits]
+        if len(pruned) < limit * 3:
+            return ids
+        return pruned
+
+
+_index = DoctorIndex([])
+_index_lock = threading.Lock()
+_index_checked_at = None
+
+
+def _find_doctors_source():
+    for name in _DOCTOR_SOURCES:
+        path = os.path.normpath(os.path.join(_DATA_DIR, name))
+        if os.path.exists(path):
+            return path
+    return None
+
+
+def _build_index(path):
+    if path is None:
+        logger.warning("⚠️ لا يوجد ملف أطباء (لا المنظم ولا القديم ولا doctors.txt)")
+        return DoctorIndex([])
     try:
-        # محاولة تحميل الملف المنظم
-        if os.path.exists(organized_path):
-            with open(organized_path, 'r', encoding='utf-8') as f:
-                organized_data = json.load(f)
-            
-            # تحويل البنية المنظمة إلى قائمة مسطحة للأطباء
-            doctors_list = []
-            hospitals = organized_data.get('hospitals', {})
-            
-            for hospital_name, departments in hospitals.items():
-                for dept_key, dept_data in departments.items():
-                    dept_ar = dept_data.get('department_ar', '')
-                    dept_en = dept_data.get('department_en', '')
-                    doctors = dept_data.get('doctors', [])
-                    
-                    for doctor_name in doctors:
-                        doctors_list.append({
-                            'name': doctor_name,
-                            'hospital': hospital_name,
-                            'department_ar': dept_ar,
-                            'department_en': dept_en,
-                            'department': dept_key  # للحفاظ على التوافق
-                        })
-            
-            _doctors_cache = doctors_list
-            logger.info(f"✅ تم تحميل {len(_doctors_cache)} طبيب من الملف المنظم")
-            return _doctors_cache
-        
-        # إذا لم يوجد الملف المنظم، استخدم الملف القديم
-        elif os.path.exists(old_path):
-            with open(old_path, 'r', encoding='utf-8') as f:
-                _doctors_cache = json.load(f)
-            logger.info(f"✅ تم تحميل {len(_doctors_cache)} طبيب من الملف القديم")
-            return _doctors_cache
-        else:
-            logger.warning("⚠️ لا يوجد ملف أطباء (لا المنظم ولا القديم)")
-            return []
-            
+        mtime = os.path.getmtime(path)
+        started = time.perf_counter()
+        index = DoctorIndex(_read_doctors_file(path), source=path, mtime=mtime)
+        # البحث بلا فلترة هو الأغلى (إزالة التكرار على كل القائمة) — يُحسب هنا مرة
+        index.filter_ids()
+        logger.info(
+            f"✅ تم تحميل {len(index)} طبيب من {os.path.basename(path)} "
+            f"(فهرس في {(time.perf_counter() - started) * 1000:.0f}ms)"
+        )
+        return index
     except Exception as e:
         logger.error(f"❌ خطأ في تحميل قاعدة الأطباء: {e}")
-        return []
+        return DoctorIndex([])
+
+
+def get_doctor_index(force_reload=False):
+    """الفهرس الحالي — يُعاد بناؤه إن تغيّر ملف الأطباء (فحص كل بضع ثوانٍ)."""
+    global _index, _index_checked_at
+
+    def _check_due():
+        return (
+            force_reload
+            or _index_checked_at is None
+            or time.monotonic() - _index_checked_at >= _RELOAD_CHECK_INTERVAL
+        )
+
+    if not _check_due():
+        return _index
+
+    with _index_lock:
+        if not _check_due():
+            return _index
+        _index_checked_at = time.monotonic()
+        path = _find_doctors_source()
+        try:
+            mtime = os.path.getmtime(path) if path else None
+        except OSError:
+            mtime = None
+        if force_reload or path != _index.source or mtime != _index.mtime:
+            if _index.source is not None and not force_reload:
+                logger.info(f"🔄 ملف الأطباء تغيّر — إعادة بناء الفهرس ({path})")
+            _index = _build_index(path)
+        return _index
+
+
+def load_doctors():
+    """
+    تحميل قاعدة بيانات الأطباء (قائمة مسطحة)
+
+    يحاول الملف المنظم أولاً (doctors_organized.json)، ثم القديم
+    (doctors_database.json)، ثم data/doctors.txt — كلها نسبةً لمجلد المشروع
+    لا لمجلد التشغيل الحالي.
+    """
+    return get_doctor_index().doctors
 
 
 def reload_doctors():
     """إعادة تحميل القاعدة"""
-    global _doctors_cache
-    _doctors_cache = None
-    return load_doctors()
+    return get_doctor_index(force_reload=True).doctors
 
 
 # ━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
@@ -582,6 +947,16 @@ def find_department_english_terms(arabic_dept):
     return english_terms
 
 
+def _score_names(query_normalized, names):
+    """WRatio للاستعلام مقابل كل الأسماء دفعة واحدة."""
+    if RAPIDFUZZ_AVAILABLE:
+        import numpy as np  # cdist يعيد مصفوفة numpy على أي حال — لا حاجة له قبل أول بحث
+        return process.cdist(
+            [query_normalized], names, scorer=fuzz.WRatio, dtype=np.float64, workers=1
+        )[0].tolist()
+    return [fuzz.WRatio(query_normalized, n) for n in names]
+
+
 def search_doctors(query, hospital=None, department=None, specialty_type=None, limit=10):
     """
     البحث عن أطباء مع فلترة
@@ -597,310 +972,58 @@ def search_doctors(query, hospital=None, department=None, specialty_type=None, l
         قائمة بالأطباء المقترحين
     """
     
-    doctors = load_doctors()
+    index = get_doctor_index()
     
-    if not doctors:
+    if not len(index):
         logger.warning("⚠️ لا توجد أطباء في القاعدة")
         return []
     
-    logger.info(f"🔍 البحث - Query: '{query}' | Hospital: '{hospital}' | Dept: '{department}'")
+    logger.debug(f"🔍 البحث - Query: '{query}' | Hospital: '{hospital}' | Dept: '{department}'")
     
-    # فلترة حسب المستشفى والقسم
-    filtered = doctors
-    
-    if hospital:
-        hospital_normalized = normalize_text(hospital)
-        
-        # فلترة دقيقة للمستشفى - تطابق دقيق لجميع المستشفيات
-        filtered_by_hospital = []
-        
-        # استخراج الكلمات المميزة من اسم المستشفى (مثل CMI, RV, Whitefield, Old Airport Road)
-        hospital_words = hospital_normalized.split()
-        # تحديد الكلمات المميزة (ليست كلمات عامة مثل "hospital", "medical", "center")
-        common_words = {'hospital', 'medical', 'center', 'clinic', 'healthcare', 'health', 'care', 'institute', 'institution'}
-        distinctive_words = [w for w in hospital_words if w not in common_words and len(w) >= 2]
-        
-        for d in filtered:
-            doc_hospital = normalize_text(d.get('hospital', ''))
-            
-            # استراتيجية 1: تطابق دقيق 100% (الأفضل)
-            if hospital_normalized == doc_hospital:
-                filtered_by_hospital.append(d)
-                continue
-            
-            # استراتيجية 2: تطابق جزئي - إذا كان اسم المستشفى المطلوب موجود داخل اسم المستشفى في قاعدة البيانات (أو العكس)
-            # مثال: "Aster Whitefield" يجب أن يطابق "Aster Whitefield Hospital, Bangalore"
-            if hospital_normalized in doc_hospital or doc_hospital in hospital_normalized:
-                filtered_by_hospital.append(d)
-                continue
-            
-            # استراتيجية 3: تطابق fuzzy عالي جداً (90%+)
-            hospital_match_ratio = fuzz.ratio(hospital_normalized, doc_hospital)
-            if hospital_match_ratio >= 90:
-                filtered_by_hospital.append(d)
-                continue
-            
-            # استراتيجية 4: تطابق الكلمات المميزة - يجب أن تتطابق جميع الكلمات المميزة
-            if len(distinctive_words) > 0:
-                doc_hospital_words = doc_hospital.split()
-                doc_distinctive_words = [w for w in doc_hospital_words if w not in common_words and len(w) >= 2]
-                
-                # يجب أن تتطابق جميع الكلمات المميزة من المستشفى المطلوب
-                all_distinctive_match = True
-                for h_word in distinctive_words:
-                    found_match = False
-                    for d_word in doc_distinctive_words:
-                        # تطابق دقيق أو fuzzy عالي جداً (90%+)
-                        if h_word == d_word or fuzz.ratio(h_word, d_word) >= 90:
-                            found_match = True
-                            break
-                    if not found_match:
-                        all_distinctive_match = False
-                        break
-                
-                # إذا تطابقت جميع الكلمات المميزة، تحقق من تطابق عالي للاسم الكامل
-                if all_distinctive_match:
-                    if hospital_match_ratio >= 80:
-                        filtered_by_hospital.append(d)
-            else:
-                # إذا لم توجد كلمات مميزة، استخدم تطابق fuzzy عالي (90%+)
-                if hospital_match_ratio >= 90:
-                    filtered_by_hospital.append(d)
-        
-        filtered = filtered_by_hospital
-        logger.info(f"   بعد فلترة المستشفى '{hospital}': {len(filtered)} طبيب")
-    
-    # حفظ نتيجة فلترة المستشفى للـ fallback
-    hospital_filtered = filtered.copy()
-    
-    if department:
-        dept_normalized = normalize_text(department)
-        
-        # ✅ إذا القسم ثنائي اللغة "عربي | إنجليزي"، افصلهما
-        dept_ar, dept_en = None, None
-        if '|' in department:
-            parts = department.split('|')
-            if len(parts) >= 2:
-                dept_ar = normalize_text(parts[0])
-                dept_en = normalize_text(parts[1])
-        
-        # استخراج كلمات رئيسية
-        dept_keywords = [w for w in dept_normalized.split() if len(w) > 2]
-        
-        # فلترة دقيقة جداً
-        filtered_by_dept = []
-        for d in filtered:
-            # البحث في 3 حقول: department, department_ar, department_en
-            doc_dept = normalize_text(d.get('department', ''))
-            doc_dept_ar = normalize_text(d.get('department_ar', ''))
-            doc_dept_en = normalize_text(d.get('department_en', ''))
-            
-            # دمج كل الحقول للبحث
-            all_dept_text = f"{doc_dept} {doc_dept_ar} {doc_dept_en}".lower()
-            
-            if not all_dept_text.strip():
-                continue
-            
-            # ✅ استبعاد صريح لـ "dentistry" و "dental" عند البحث عن ENT
-            # هذا مهم جداً لأن "dentistry" يحتوي على "ent" كجزء من الكلمة
-            if 'ent' in dept_normalized or 'اذن' in dept_normalized or 'انف' in dept_normalized or 'حنجرة' in dept_normalized:
-                doc_dept_lower = doc_dept_en.lower()
-                if 'dentistry' in doc_dept_lower or 'dental' in doc_dept_lower:
-                    # هذا قسم طب الأسنان - لا نطابقه مع ENT
-                    logger.debug(f"      ❌ تم استبعاد {d.get('name', '')} - قسم طب الأسنان (Dentistry/Dental)")
-                    continue
-            
-            match_found = False
-            
-            # ✅ طريقة 1: تطابق ثنائي اللغة (دقيق جداً - أولوية قصوى)
-            if dept_ar and dept_en:
-                # تطابق دقيق: يجب أن يكون القسم مطابق تماماً أو يحتوي على الكلمات الرئيسية
-                dept_ar_words = set(dept_ar.split())
-                dept_en_words = set(dept_en.split())
-                
-                doc_dept_ar_words = set(doc_dept_ar.split())
-                doc_dept_en_words = set(doc_dept_en.split())
-                doc_dept_words = set(doc_dept.split())
-                
-                # تطابق دقيق: يجب أن تكون الكلمات الرئيسية موجودة
-                # على الأقل 70% من كلمات القسم المطلوب يجب أن تكون موجودة
-                ar_match_ratio = len(dept_ar_words & doc_dept_ar_words) / len(dept_ar_words) if dept_ar_words else 0
-                en_match_ratio = len(dept_en_words & doc_dept_en_words) / len(dept_en_words) if dept_en_words else 0
-                dept_match_ratio = len(dept_en_words & doc_dept_words) / len(dept_en_words) if dept_en_words else 0
-                
-                # تطابق دقيق: يجب أن يكون هناك تطابق قوي (70% على الأقل)
-                if ar_match_ratio >= 0.7 or en_match_ratio >= 0.7 or dept_match_ratio >= 0.7:
-                    match_found = True
-                    logger.info(f"      ✅ تطابق ثنائي دقيق: {d.get('name', '')} (AR: {ar_match_ratio:.2f}, EN: {en_match_ratio:.2f})")
-            
-            # طريقة 2: تطابق مباشر دقيق (كلمات كاملة فقط)
-            if not match_found:
-                # تقسيم القسم المطلوب إلى كلمات
-                dept_words = set(dept_normalized.split())
-                # تقسيم قسم الطبيب إلى كلمات
-                doc_words = set(all_dept_text.split())
-                
-                # تطابق: يجب أن تكون جميع الكلمات الرئيسية موجودة (كلمات كاملة)
-                if dept_words and dept_words.issubset(doc_words):
-                    match_found = True
-                    logger.info(f"      ✅ تطابق كلمات كاملة: {d.get('name', '')}")
-            
-            # طريقة 3: البحث بالقاموس (عربي → إنجليزي) - تطابق كلمات كاملة فقط
-            if not match_found:
-                english_terms = find_department_english_terms(department)
-                if english_terms:
-                    for term in english_terms:
-                        term_normalized = normalize_text(term)
-                        term_words = set(term_normalized.split())
-                        
-                        # تطابق كلمات كاملة فقط
-                        doc_dept_en_words = set(doc_dept_en.split())
-                        all_dept_words = set(all_dept_text.split())
-                        
-                        # تطابق محسّن: إذا كانت الكلمة "ent" موجودة في أي مكان
-                        if 'ent' in term_normalized:
-                            # البحث عن "ent" ككلمة كاملة (وليس جزءاً من كلمة أخرى مثل "dentistry")
-                            # (التحقق من dentistry تم بالفعل في بداية الحلقة)
-                            ent_pattern = r'\bent\b'
-                            if (re.search(ent_pattern, doc_dept_en.lower(), re.IGNORECASE) or 
-                                re.search(ent_pattern, all_dept_text.lower(), re.IGNORECASE) or
-                                'otolaryngology' in doc_dept_en.lower()):
-                                match_found = True
-                                logger.info(f"      ✅ تطابق قاموس (ENT): {d.get('name', '')}")
-                                break
-                        
-                        if term_words.issubset(doc_dept_en_words) or term_words.issubset(all_dept_words):
-                            match_found = True
-                            logger.info(f"      ✅ تطابق قاموس: {d.get('name', '')}")
-                            break
-            
-            # طريقة 4: تطابق جميع الكلمات الرئيسية (كلمات كاملة فقط)
-            if not match_found and dept_keywords:
-                # تقسيم نص القسم إلى كلمات
-                all_dept_words = set(all_dept_text.split())
-                dept_keywords_set = set(dept_keywords)
-                
-                # يجب أن تكون جميع الكلمات الرئيسية موجودة ككلمات كاملة
-                if dept_keywords_set.issubset(all_dept_words):
-                    match_found = True
-                    logger.info(f"      ✅ تطابق كلمات رئيسية: {d.get('name', '')}")
-            
-            # طريقة 5: البحث المباشر عن "ENT" في القسم الإنجليزي (ككلمة كاملة)
-            if not match_found:
-                # إذا كان القسم المطلوب يحتوي على "ENT" أو "الأذن والأنف والحنجرة"
-                if 'ent' in dept_normalized or 'اذن' in dept_normalized or 'انف' in dept_normalized or 'حنجرة' in dept_normalized:
-                    # (التحقق من dentistry تم بالفعل في بداية الحلقة)
-                    # البحث عن "ENT" ككلمة كاملة (وليس جزءاً من كلمة أخرى مثل "dentistry")
-                    ent_pattern = r'\bent\b'
-                    if (re.search(ent_pattern, doc_dept_en.lower(), re.IGNORECASE) or 
-                        re.search(ent_pattern, all_dept_text.lower(), re.IGNORECASE) or
-                        'head & neck' in doc_dept_en.lower() or 
-                        'head and neck' in doc_dept_en.lower() or
-                        'otolaryngology' in doc_dept_en.lower()):
-                        match_found = True
-                        logger.info(f"      ✅ تطابق ENT مباشر: {d.get('name', '')} (dept_en: {doc_dept_en[:50]})")
-            
-            # طريقة 6: fuzzy matching (دقيق جداً - threshold عالي)
-            if not match_found:
-                for field in [doc_dept, doc_dept_ar, doc_dept_en]:
-                    if field and len(field) > 3:  # تجاهل الحقول القصيرة جداً
-                        similarity = fuzz.ratio(dept_normalized, field)
-                        if similarity > 90:  # threshold عالي جداً للدقة
-                            match_found = True
-                            logger.info(f"      ✅ تطابق fuzzy: {d.get('name', '')} (similarity: {similarity})")
-                            break
-            
-            if match_found:
-                filtered_by_dept.append(d)
-        
-        # ✅ إزالة التكرارات بعد فلترة القسم مباشرة
-        filtered_by_dept = _remove_duplicate_doctors(filtered_by_dept)
-        
-        filtered = filtered_by_dept
-        logger.info(f"   بعد فلترة القسم: {len(filtered)} طبيب")
-        
-        # ✅ التحقق من دقة الفلترة - عرض أسماء الأطباء المفلترين
-        if filtered:
-            logger.info(f"   📋 الأطباء المفلترين:")
-            for doc in filtered[:5]:  # عرض أول 5 فقط
-                logger.info(f"      - {doc.get('name', '')} | {doc.get('department_ar', '')} | {doc.get('department_en', '')}")
-        
-        # ✅ إذا لم نجد أطباء للقسم المحدد، لا نعرض كل أطباء المستشفى
-        # بدلاً من ذلك، نعرض رسالة توضيحية
-        if len(filtered) == 0 and hospital:
-            logger.warning(f"   ⚠️ لم يُوجد أطباء مطابقين للقسم '{department}' في مستشفى '{hospital}'")
-            # لا نعرض أطباء من أقسام أخرى - نترك filtered فارغاً
-            # سيتم عرض رسالة "لا توجد أطباء" في unified_inline_query
-    
-    # ✅ فلترة حسب نوع التخصص (باطني/جراحي)
-    if specialty_type and filtered:
-        specialty_type_lower = specialty_type.lower().strip()
-        filtered_by_specialty = []
-        
-        for d in filtered:
-            doc_dept = normalize_text(d.get('department', ''))
-            doc_dept_ar = normalize_text(d.get('department_ar', ''))
-            doc_dept_en = normalize_text(d.get('department_en', ''))
-            
-            all_dept_text = f"{doc_dept} {doc_dept_ar} {doc_dept_en}".lower()
-            
-            is_surgical = any(keyword in all_dept_text for keyword in [
-                'جراحة', 'surgery', 'surgical', 'operation', 'operative'
-            ])
-            
-            # تحديد الباطني: يجب أن لا يكون جراحي أولاً
-            is_medical = False
-            if not is_surgical:
-                # كلمات تشير إلى الباطني
-                medical_keywords = [
-                    'باطني', 'medical', 'medicine', 'internal', 'physician', 
-                    'cardiology', 'gastroenterology', 'neurology', 'nephrology', 
-                    'pulmonology', 'endocrinology', 'hematology', 'rheumatology', 
-                    'dermatology', 'psychiatry', 'pediatrics', 'geriatrics',
-                    'allergy', 'immunology', 'infectious', 'critical care'
-                ]
-                is_medical = any(keyword in all_dept_text for keyword in medical_keywords)
-            
-            # تطبيق الفلترة
-            if specialty_type_lower == 'surgical' and is_surgical:
-                filtered_by_specialty.append(d)
-            elif specialty_type_lower == 'medical' and is_medical:
-                filtered_by_specialty.append(d)
-            elif specialty_type_lower not in ['medical', 'surgical']:
-                # إذا كان النوع غير معروف، نعرض الجميع
-                filtered_by_specialty.append(d)
-        
-        filtered = filtered_by_specialty
-        logger.info(f"   بعد فلترة نوع التخصص ({specialty_type}): {len(filtered)} طبيب")
-    
-    # ✅ إزالة التكرارات بناءً على تشابه الأسماء
-    filtered = _remove_duplicate_doctors(filtered)
+    # فلترة حسب المستشفى والقسم ونوع التخصص (محفوظة لكل تركيبة)
+    ids = index.filter_ids(hospital, department, specialty_type)
+    records = index.records
     
     # إذا لا يوجد query، أرجع كل المفلترين مرتبين أبجدياً
     if not query or len(query.strip()) == 0:
         # ✅ ترتيب أبجدي حسب الاسم
-        filtered_sorted = sorted(filtered, key=lambda x: normalize_text(x.get('name', '')))
-        logger.info(f"   → إرجاع {min(len(filtered_sorted), limit)} طبيب مرتب أبجدياً")
-        return filtered_sorted[:limit]
+        ordered = sorted(ids, key=lambda i: records[i].name_norm)
+        return [records[i].doc for i in ordered[:limit]]
+    
+    if not ids:
+        logger.debug("   ⚠️ لا توجد عناصر للبحث")
+        return []
     
     # البحث الذكي مع نظام ترتيب متقدم
     query_normalized = normalize_text(query)
+    query_words = query_normalized.split()
+    hospital_normalized = normalize_text(hospital) if hospital else None
+    dept_normalized = normalize_text(department) if department else None
+    if department:
+        dept_ar_normalized = normalize_text(department.split('|')[0] if '|' in department else department)
+        dept_en_normalized = normalize_text(department.split('|')[1] if '|' in department and len(department.split('|')) > 1 else '')
+    
+    # تقليص المرشحين ثم تقييم WRatio لهم دفعة واحدة
+    candidates = index.candidates(ids, query_normalized, limit)
+    scores = _score_names(query_normalized, [records[i].name_norm for i in candidates])
     
-    # إنشاء قائمة للبحث مع حساب نقاط متقدمة
-    search_items = []
-    for doc in filtered:
-        name = doc.get('name', '')
-        name_normalized = normalize_text(name)
-        doc_hospital = normalize_text(doc.get('hospital', ''))
-        doc_dept_ar = normalize_text(doc.get('department_ar', ''))
-        doc_dept_en = normalize_text(doc.get('department_en', ''))
+    # أفضل limit*3 فوق الحد الأدنى (30) — الترتيب المتقدم يُطبَّق عليها فقط
+    ranked = sorted(
+        (pos for pos, s in enumerate(scores) if s >= 30),
+        key=lambda pos: -scores[pos],
+    )[:limit * 3]
+    
+    logger.debug(f"   → وُجد {len(ranked)} تطابق أولي من {len(candidates)} مرشح")
+    
+    results = []
+    for pos in ranked:
+        rec = records[candidates[pos]]
+        name_normalized = rec.name_norm
+        fuzz_score = scores[pos]
         
         # حساب نقاط متقدمة
-        advanced_score = 0
-        
-        # 1. تطابق الاسم (0-100 نقطة)
-        name_score = fuzz.WRatio(query_normalized, name_normalized)
-        advanced_score += name_score * 0.5  # 50% من النقاط
+        # 1. تطابق الاسم (0-100 نقطة) — 50% من النقاط
+        advanced_score = fuzz_score * 0.5
         
         # 2. تطابق البداية (إضافي +20 نقطة)
         if name_normalized.startswith(query_normalized):
@@ -911,110 +1034,59 @@ def search_doctors(query, hospital=None, department=None, specialty_type=None, l
             advanced_score += 30
         
         # 4. تطابق المستشفى (إضافي +15 نقطة إذا كان محدد)
-        if hospital:
-            hospital_normalized = normalize_text(hospital)
-            hospital_match = fuzz.ratio(hospital_normalized, doc_hospital)
-            if hospital_match > 80:
-                advanced_score += 15
+        if hospital and fuzz.ratio(hospital_normalized, rec.hospital_norm) > 80:
+            advanced_score += 15
         
-        # 5. تطابق القسم (إضافي +20 نقطة إذا كان محدد)
+        # 5. تطابق القسم (إضافي +20 نقطة لكل لغة إذا كان محدد)
         if department:
-            dept_normalized = normalize_text(department)
-            dept_ar_normalized = normalize_text(department.split('|')[0] if '|' in department else department)
-            dept_en_normalized = normalize_text(department.split('|')[1] if '|' in department and len(department.split('|')) > 1 else '')
-            
-            # تطابق القسم العربي
-            if dept_ar_normalized and doc_dept_ar:
-                dept_ar_match = fuzz.ratio(dept_ar_normalized, doc_dept_ar)
-                if dept_ar_match > 70:
+            if dept_ar_normalized and rec.dept_ar_norm:
+                if fuzz.ratio(dept_ar_normalized, rec.dept_ar_norm) > 70:
                     advanced_score += 20
-            
-            # تطابق القسم الإنجليزي
-            if dept_en_normalized and doc_dept_en:
-                dept_en_match = fuzz.ratio(dept_en_normalized, doc_dept_en)
-                if dept_en_match > 70:
+            if dept_en_normalized and rec.dept_en_norm:
+                if fuzz.ratio(dept_en_normalized, rec.dept_en_norm) > 70:
                     advanced_score += 20
         
         # 6. تطابق كلمات متعددة (إضافي +10 نقطة)
-        query_words = query_normalized.split()
         if len(query_words) > 1:
-            matched_words = sum(1 for word in query_words if word in name_normalized)
-            if matched_words == len(query_words):
+            if all(word in name_normalized for word in query_words):
                 advanced_score += 10
         
-        search_items.append({
-            'doctor': doc,
-            'search_text': name_normalized,
-            'display_name': name,
-            'advanced_score': advanced_score,
-            'name_score': name_score
-        })
-    
-    # البحث باستخدام RapidFuzz
-    if not search_items:
-        logger.warning("   ⚠️ لا توجد عناصر للبحث")
-        return []
-    
-    # استخدام RapidFuzz للحصول على تطابقات أولية
-    matches = process.extract(
-        query_normalized,
-        [item['search_text'] for item in search_items],
-        scorer=fuzz.WRatio,
-        limit=min(len(search_items), limit * 3),  # أخذ أكثر من limit للترتيب المتقدم
-        score_cutoff=30  # حد أدنى للتطابق
-    )
-    
-    logger.info(f"   → وُجد {len(matches)} تطابق أولي")
-    
-    # استخراج النتائج مع النقاط المتقدمة
-    results = []
-    for match_text, fuzz_score, idx in matches:
-        item = search_items[idx]
-        doctor = item['doctor']
-        
+        doctor = rec.doc
         # دمج النقاط: 40% RapidFuzz + 60% Advanced Score
-        final_score = (fuzz_score * 0.4) + (item['advanced_score'] * 0.6)
-        
-        results.append({
+        results.append((rec, {
             'name': doctor.get('name', ''),
             'hospital': doctor.get('hospital', ''),
             'department': doctor.get('department', ''),
             'department_ar': doctor.get('department_ar', ''),
             'department_en': doctor.get('department_en', ''),
-            'score': final_score,
+            'score': (fuzz_score * 0.4) + (advanced_score * 0.6),
             'fuzz_score': fuzz_score,
-            'advanced_score': item['advanced_score']
-        })
+            'advanced_score': advanced_score
+        }))
     
     # ✅ ترتيب متقدم: حسب النقاط النهائية، ثم تطابق القسم، ثم المستشفى، ثم أبجدياً
-    def sort_key(x):
+    def sort_key(item):
+        rec, x = item
         score = -x['score']  # سالب للترتيب التنازلي
         
-        # أولوية إضافية للتطابق الدقيق
         dept_bonus = 0
         if department:
-            dept_normalized = normalize_text(department)
-            doc_dept = normalize_text(x.get('department', ''))
-            if dept_normalized in doc_dept or doc_dept in dept_normalized:
-                dept_bonus = -50  # إضافة أولوية (سالبة لأننا نرتب تنازلياً)
+            if dept_normalized in rec.dept_norm or rec.dept_norm in dept_normalized:
+                dept_bonus = -50
         
         hospital_bonus = 0
         if hospital:
-            hospital_normalized = normalize_text(hospital)
-            doc_hospital = normalize_text(x.get('hospital', ''))
-            if hospital_normalized in doc_hospital or doc_hospital in hospital_normalized:
+            if hospital_normalized in rec.hospital_norm or rec.hospital_norm in hospital_normalized:
                 hospital_bonus = -30
         
         # ترتيب أبجدي كحل أخير
-        name_sort = normalize_text(x.get('name', ''))
-        
-        return (score + dept_bonus + hospital_bonus, name_sort)
-    
-    results_sorted = sorted(results, key=sort_key)
+        return (score + dept_bonus + hospital_bonus, rec.name_norm)
     
-    logger.info(f"   → تم ترتيب {len(results_sorted)} نتيجة")
+    results.sort(key=sort_key)
+    rec_of = {id(result): rec for rec, result in results}
+    results_sorted = [result for _, result in results]
     
-    # ✅ تحسين الترتيب باستخدام AI (إذا كان متاحاً)
+    # ✅ تحسين الترتيب (ترتيب محلي إضافي لأول 10)
     if OPENAI_AVAILABLE and len(results_sorted) > 3:
         try:
             results_sorted = _ai_enhanced_ranking(
@@ -1023,53 +1095,37 @@ def search_doctors(query, hospital=None, department=None, specialty_type=None, l
                 hospital, 
                 department
             )
-            logger.info("   ✅ تم تحسين الترتيب باستخدام AI")
         except Exception as e:
             logger.warning(f"   ⚠️ فشل تحسين AI الترتيب: {e}")
     
     # ✅ تحقق نهائي صارم: التأكد من أن جميع النتائج من المستشفى والقسم المحددين فقط
     if hospital or department:
         final_results = []
-        hospital_normalized = normalize_text(hospital) if hospital else None
-        dept_normalized = normalize_text(department) if department else None
-        
         for result in results_sorted:
-            doc_hospital = normalize_text(result.get('hospital', ''))
-            doc_dept_ar = normalize_text(result.get('department_ar', ''))
-            doc_dept_en = normalize_text(result.get('department_en', ''))
-            doc_dept = normalize_text(result.get('department', ''))
-            
-            # التحقق من المستشفى (إذا كان محدداً)
+            rec = rec_of[id(result)]
             hospital_match = True
             if hospital_normalized:
-                hospital_match_ratio = fuzz.ratio(hospital_normalized, doc_hospital)
+                doc_hospital = rec.hospital_norm
                 # قبول التطابق الدقيق، التطابق الجزئي، أو fuzzy عالي
                 hospital_match = (
-                    hospital_normalized == doc_hospital or 
-                    hospital_normalized in doc_hospital or 
+                    hospital_normalized == doc_hospital or
+                    hospital_normalized in doc_hospital or
                     doc_hospital in hospital_normalized or
-                    hospital_match_ratio >= 90
+                    fuzz.ratio(hospital_normalized, doc_hospital) >= 90
                 )
             
-            # التحقق من القسم (إذا كان محدداً)
             dept_match = True
             if dept_normalized:
-                all_dept_text = f"{doc_dept} {doc_dept_ar} {doc_dept_en}".lower()
-                # تطابق دقيق للقسم
+                all_dept_text = rec.all_dept_text
                 dept_match = (
                     dept_normalized in all_dept_text or
                     all_dept_text in dept_normalized or
                     fuzz.ratio(dept_normalized, all_dept_text) >= 90
                 )
             
-            # إضافة النتيجة فقط إذا تطابقت مع المستشفى والقسم المحددين
             if hospital_match and dept_match:
                 final_results.append(result)
-            else:
-                logger.debug(f"   ❌ تم استبعاد {result.get('name', '')} - لا يطابق الفلترة الصارمة (hospital_match={hospital_match}, dept_match={dept_match})")
-        
         results_sorted = final_results
-        logger.info(f"   ✅ بعد التحقق النهائي الصارم: {len(results_sorted)} طبيب")
     
     # إرجاع أفضل النتائج فقط
     return results_sorted[:limit]
@@ -1179,25 +1235,20 @@ def get_departments_for_hospital(hospital):
     Returns:
         قائمة بأسماء الأقسام الفريدة
     """
-    doctors = load_doctors()
+    index = get_doctor_index()
     
-    if not doctors or not hospital:
+    if not len(index) or not hospital:
         return []
     
     hospital_normalized = normalize_text(hospital)
     
-    # فلترة الأطباء لهذا المستشفى
-    hospital_doctors = [
-        d for d in doctors
-        if hospital_normalized in normalize_text(d.get('hospital', ''))
-    ]
-    
-    # استخراج الأقسام الفريدة
+    # المستشفيات المطابقة من الشجرة ثم أقسامها الفريدة
     departments = set()
-    for doc in hospital_doctors:
-        dept = doc.get('department', '').strip()
-        if dept and dept not in ['Unknown', 'Not specified', 'General']:
-            departments.add(dept)
+    for doc_hospital, depts in index.tree.items():
+        if hospital_normalized in normalize_text(doc_hospital):
+            for dept in depts:
+                if dept and dept not in ['Unknown', 'Not specified', 'General']:
+                    departments.add(dept)
     
     return sorted(list(departments))
 
@@ -18,6 +18,14 @@
 # يُكتب كل خطأ فوراً سطراً في ملف اليوم، فيبقى التقرير صحيحاً مهما أُعيد
 # تشغيل البوت.
 #
+# ── ملف مفتوح ─────────────────────────────────────────────────────────────────
+#
+# المعالِج يعمل خلف services/log_pipeline.py (خيط الكاتب الخلفي)، ويُبقي ملف
+# اليوم مفتوحاً بدل فتح/إلحاق/إغلاق لكل خطأ. كل سطر يُفرَّغ إلى القرص فور
+# كتابته — لا تخزين ينتظر سجلاً لاحقاً، فلا يضيع خطأ وحيد ولا آخر دفعة قبل
+# انهيار. الكلفة (write واحد) على خيط الكاتب لا على حلقة الأحداث. تغيّر
+# اليوم يُغلق الملف ويفتح ملف اليوم الجديد.
+#
 # ── الخصوصية ──────────────────────────────────────────────────────────────────
 #
 # **لا يُخزَّن نص ما كتبه المستخدم إطلاقاً** (قد يحوي اسم مريض أو تشخيصاً).
@@ -29,7 +37,6 @@ from __future__ import annotations
 import json
 import logging
 import os
-import threading
 import traceback
 from datetime import date, datetime, timedelta
 from pathlib import Path
@@ -37,7 +44,6 @@ from pathlib import Path
 logger = logging.getLogger(__name__)
 
 LOGS_DIR = Path("logs")
-_LOCK = threading.Lock()
 
 
 def _today_local() -> date:
@@ -112,6 +118,47 @@ def _redact(record: logging.LogRecord) -> dict:
 class _DigestHandler(logging.Handler):
     """يكتب كل ERROR فأعلى سطراً في ملف اليوم. best-effort بالكامل."""
 
+    def __init__(self):
+        super().__init__()
+        self._fh = None
+        self._day: date | None = None
+
+    def _stream_for(self, day: date):
+        if self._fh is None or self._day != day:
+            self._close_stream()
+            LOGS_DIR.mkdir(parents=True, exist_ok=True)
+            self._fh = open(_day_file(day), "a", encoding="utf-8")
+            self._day = day
+        return self._fh
+
+    def _close_stream(self) -> None:
+        if self._fh is not None:
+            try:
+                self._fh.close()
+            finally:
+                self._fh = None
+                self._day = None
+
+    def flush(self) -> None:
+        self.acquire()
+        try:
+            if self._fh is not None:
+                self._fh.flush()
+        except Exception:
+            pass
+        finally:
+            self.release()
+
+    def close(self) -> None:
+        self.acquire()
+        try:
+            self._close_stream()
+        except Exception:
+            pass
+        finally:
+            self.release()
+        super().close()
+
     def emit(self, record: logging.LogRecord) -> None:
         try:
             if record.levelno < logging.ERROR:
@@ -140,30 +187,38 @@ class _DigestHandler(logging.Handler):
             if any(s.lower() in text.lower() for s in _IGNORE_SUBSTRINGS):
                 return
             entry = _redact(record)
-            LOGS_DIR.mkdir(parents=True, exist_ok=True)
             line = json.dumps(entry, ensure_ascii=False)
-            with _LOCK:
-                with open(_day_file(_today_local()), "a", encoding="utf-8") as f:
-                    f.write(line + "\n")
+            # emit يعمل تحت قفل المعالِج (Handler.handle) — نفس قفل flush/close.
+            # التفريغ فوري: لا مؤقّت يضمن تفريغاً لاحقاً إن لم يأتِ سجل آخر
+            stream = self._stream_for(_today_local())
+            stream.write(line + "\n")
+            stream.flush()
         except Exception:
             # معالِج تسجيل لا يجوز أن يُسقط التطبيق مهما حدث
             pass
 
 
+_handler: _DigestHandler | None = None
+
+
 def install() -> None:
-    """يركّب المراقب على الجذر مرة واحدة."""
-    root = logging.getLogger()
-    if any(isinstance(h, _DigestHandler) for h in root.handlers):
+    """يركّب المراقب على الجذر (أو خلف طابور السجلات إن كان مفعّلاً) مرة واحدة."""
+    global _handler
+    from services.log_pipeline import attach_handler, has_handler
+
+    if has_handler(_DigestHandler):
         return
-    h = _DigestHandler()
-    h.setLevel(logging.ERROR)
-    root.addHandler(h)
+    _handler = _DigestHandler()
+    _handler.setLevel(logging.ERROR)
+    attach_handler(_handler)
     logger.info("[error_digest] installed — capturing ERROR+ to logs/errors-YYYY-MM-DD.jsonl")
 
 
 # ── التقرير ───────────────────────────────────────────────────────────────────
 
 def read_day(day: date) -> list[dict]:
+    if _handler is not None:
+        _handler.flush()            # احتياط — emit يفرّغ كل سطر أصلاً
     p = _day_file(day)
     if not p.exists():
         return []
@@ -3,13 +3,17 @@
 # 📅 نظام تنبيهات مواعيد العودة
 # =============================
 
+import logging
+
 from db.session import SessionLocal
 from db.models import Report, Patient
 from config.settings import ADMIN_IDS
+from services.send_scheduler import Priority, send_to_admins
 from telegram import Bot
-from telegram.constants import ParseMode
 from datetime import date, timedelta
 
+logger = logging.getLogger(__name__)
+
 
 async def check_and_send_followup_reminders(bot: Bot):
     """
@@ -26,7 +30,7 @@ async def check_and_send_followup_reminders(bot: Bot):
         ).all()
         
         if not reports_tomorrow:
-            print("لا توجد مواعيد عودة غدا")
+            logger.info("لا توجد مواعيد عودة غدا")
             return
         
         # تنسيق الرسالة
@@ -58,16 +62,11 @@ async def check_and_send_followup_reminders(bot: Bot):
         message += "⏰ **يرجى الاستعداد والتحضير للمواعيد**"
         
         # إرسال التنبيه للأدمن
-        for admin_id in ADMIN_IDS:
-            try:
-                await bot.send_message(
-                    chat_id=admin_id,
-                    text=message,
-                    parse_mode=ParseMode.MARKDOWN
-                )
-                print(f"تم ارسال تنبيه المواعيد الى الادمن {admin_id}")
-            except Exception as e:
-                print(f"فشل ارسال التنبيه الى الادمن {admin_id}: {e}")
+        results = await send_to_admins(bot, message, Priority.DIGEST)
+        for admin_id, result in zip(ADMIN_IDS, results):
+            if isinstance(result, Exception):
+                logger.error(f"فشل ارسال التنبيه الى الادمن {admin_id}: {result}")
+        logger.info(f"تم ارسال تنبيه المواعيد الى {sum(not isinstance(r, Exception) for r in results)}/{len(results)} ادمن")
 
 
 async def send_daily_followup_summary(bot: Bot):
@@ -120,33 +119,8 @@ async def send_daily_followup_summary(bot: Bot):
         message += "━━━━━━━━━━━━━━━━"
         
         # إرسال للأدمن فقط
-        for admin_id in ADMIN_IDS:
-            try:
-                await bot.send_message(
-                    chat_id=admin_id,
-                    text=message,
-                    parse_mode=ParseMode.MARKDOWN
-                )
-                print(f"تم ارسال ملخص المواعيد الى الادمن {admin_id}")
-            except Exception as e:
-                print(f"فشل ارسال الملخص الى الادمن {admin_id}: {e}")
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
+        results = await send_to_admins(bot, message, Priority.DIGEST)
+        for admin_id, result in zip(ADMIN_IDS, results):
+            if isinstance(result, Exception):
+                logger.error(f"فشل ارسال الملخص الى الادمن {admin_id}: {result}")
+        logger.info(f"تم ارسال ملخص المواعيد الى {sum(not isinstance(r, Exception) for r in results)}/{len(results)} ادمن")
@@ -9,6 +9,8 @@ import os
 import logging
 from typing import List, Dict, Optional
 
+from services.caching import cached, invalidate_tag
+
 logger = logging.getLogger(__name__)
 
 # Cache
@@ -96,11 +98,21 @@ def _load_data():
     return _HOSPITALS_DATA
 
 
+# القوائم تُقرأ مع كل شاشة اختيار مستشفى؛ الكتابات أدناه تُبطل وسم "hospitals".
+# المستشفيات التي تُنشأ ضمنياً عند حفظ تقرير تظهر بعد انتهاء الـTTL.
+_HOSPITALS_TTL = 300
+
+
 def get_all_hospitals() -> List[str]:
     """
     الحصول على جميع أسماء المستشفيات
     Returns list of hospital names
     """
+    return list(_load_hospital_names())
+
+
+@cached(ttl=_HOSPITALS_TTL, namespace="hospitals", tags=("hospitals",))
+def _load_hospital_names() -> tuple:
     # ✅ مصدر الحقيقة: قاعدة البيانات (Hospital table)
     try:
         from db.session import SessionLocal
@@ -118,13 +130,13 @@ def get_all_hospitals() -> List[str]:
                         continue
                     seen.add(k)
                     out.append(n)
-                return _apply_custom_order(out)
+                return tuple(_apply_custom_order(out))
     except Exception as e:
         logger.warning(f"⚠️ Could not load hospitals from DB in hospitals_service: {e}")
 
     # fallback قديم: JSON
     _load_data()
-    return _apply_custom_order(_HOSPITALS_LIST.copy())
+    return tuple(_apply_custom_order(_HOSPITALS_LIST.copy()))
 
 
 def get_hospitals_with_details() -> List[Dict]:
@@ -133,6 +145,11 @@ def get_hospitals_with_details() -> List[Dict]:
     Returns list of hospital dicts with id, name, departments, doctor_count.
     DB is authoritative for name; JSON provides supplementary fields (departments, doctor_count).
     """
+    return [dict(h) for h in _load_hospitals_with_details()]
+
+
+@cached(ttl=_HOSPITALS_TTL, namespace="hospitals", tags=("hospitals",))
+def _load_hospitals_with_details() -> List[Dict]:
     # DB-first: build a name-keyed index from Hospital table
     db_names = []
     try:
@@ -226,6 +243,7 @@ def add_hospital(hospital_name: str, city=None) -> bool:
             if not s.query(Hospital).filter(Hospital.name == name_clean).first():
                 s.add(Hospital(name=name_clean, city=city_clean))
                 s.commit()
+                invalidate_tag("hospitals")
                 logger.info("Added hospital to DB: %s (city=%s)", name_clean, city_clean)
         return True
     except Exception as e:
@@ -248,6 +266,7 @@ def delete_hospital(hospital_name: str) -> bool:
             if row:
                 s.delete(row)
                 s.commit()
+                invalidate_tag("hospitals")
                 logger.info("Deleted hospital from DB: %s", name_clean)
                 return True
             logger.warning("Hospital not found for delete: %s", name_clean)
@@ -273,6 +292,7 @@ def update_hospital(old_name: str, new_name: str) -> bool:
             if row:
                 row.name = new_clean
                 s.commit()
+                invalidate_tag("hospitals")
                 logger.info("Updated hospital in DB: %s -> %s", old_clean, new_clean)
                 return True
             logger.warning("Hospital not found for update: %s", old_clean)
@@ -283,10 +303,11 @@ def update_hospital(old_name: str, new_name: str) -> bool:
 
 
 def reload_hospitals():
-    """إعادة تحميل البيانات — لا يوجد cache مستقل، DB تُقرأ مباشرة دائماً."""
+    """إعادة تحميل البيانات — يُفرغ JSON المحمّل وقوائم DB المخزنة مؤقتاً."""
     global _HOSPITALS_DATA, _HOSPITALS_LIST
     _HOSPITALS_DATA = None
     _HOSPITALS_LIST = []
+    invalidate_tag("hospitals")
 
 
 def get_hospitals_count() -> int:
@@ -0,0 +1,644 @@
+# ================================================
+# services/incremental_backup.py
+# 🔹 Incremental online backups (SQLite backup API + content-addressed chunks)
+# ================================================
+#
+# النسخ السابقة كانت تنسخ الملف كاملاً في كل مرة (copy2 على قاعدة حيّة
+# قد يعطي نسخة ممزقة، أو نسخة كاملة جديدة كل 10 دقائق). هنا:
+#
+#   1. لقطة متسقة عبر sqlite3.Connection.backup بخطوات صغيرة
+#      (BACKUP_PAGES_PER_STEP صفحة ثم BACKUP_STEP_SLEEP) فلا يتعطل الكتّاب.
+#      اتصال المصدر يمسك معاملة قراءة طوال النسخ: في WAL هذا يثبّت لقطة
+#      واحدة (point-in-time) ولا يمنع الكتابة، ولا تعيد الكتابات المتزامنة
+#      النسخ من البداية.
+#   2. اللقطة تُقسَّم إلى قطع من BACKUP_CHUNK_PAGES صفحة، وكل قطعة تُخزَّن
+#      باسم بصمتها (sha256) — القطع التي لم تتغير موجودة أصلاً فلا تُكتب.
+#      كل تشغيل يكتب القطع المتغيرة فقط + manifest صغير (JSON).
+#   3. الاستعادة لأي لحظة: أحدث manifest عند/قبل الوقت المطلوب، تُجمَّع
+#      قطعه في ملف مؤقت، يُتحقق من البصمات و integrity_check، ثم يُستبدل.
+#   4. القطع مضغوطة (zstd إن توفّرت zstandard، وإلا lzma من المكتبة
+#      القياسية) والبصمة على المحتوى الخام — نفس الصفحات في أي نسخة تُخزَّن
+#      مرة واحدة. حجم الأرشيف ينمو بقدر البيانات المتغيرة لا بعدد النسخ.
+#   5. الاحتفاظ بطبقات grandfather-father-son: آخر BACKUP_KEEP_LAST نسخة
+#      كما هي، ثم أحدث نسخة في كل ساعة من آخر
+#      BACKUP_KEEP_HOURLY ساعة، وكل يوم من آخر BACKUP_KEEP_DAILY يوماً، وكل
+#      شهر من آخر BACKUP_KEEP_MONTHLY شهراً (+ الأحدث دائماً). بعد الحذف
+#      تُجمع القطع التي لم تعد أي نسخة تشير إليها (gc_chunks).
+#
+# التخزين عبر backend بسيط (has/put/get/delete للقطع، put/get/list/delete
+# للـmanifests). LocalDirectoryBackend يعمل بلا شبكة إطلاقاً:
+#   <root>/chunks/ab/abcdef….zst|.xz    <root>/manifests/<snapshot_id>.json
+#
+# القياسات لكل نسخة (في الـmanifest و backup_metrics()):
+#   bytes_written, chunks_written/chunks_total, duration_ms, snapshot_ms,
+#   lock_wait_ms (خطوات عادت BUSY/LOCKED + الانتظار بعدها)
+#
+# Usage:
+#   from services.incremental_backup import backup, restore
+#   manifest = backup(label="quick")
+#   restore("/tmp/restored.db", at=datetime(2026, 3, 10, 14, 0))
+#   python scripts/backup_archive.py list|verify|restore|prune|stats
+#
+# ⚠️ backup و prune/gc_chunks يأخذان قفلاً حصرياً على الأرشيف
+# (backend.lock(): flock على <root>/.lock — يشمل prune من
+# scripts/backup_archive.py في عملية أخرى). بدونه قد يحذف GC قطعاً كتبتها
+# نسخة جارية (أو تخطّتها لأن has_chunk كان True) قبل أن يوجد الـmanifest
+# الذي يشير إليها.
+
+import hashlib
+import json
+import logging
+import lzma
+import os
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime
+from typing import Iterable, Iterator, List, Optional, Union
+
+logger = logging.getLogger(__name__)
+
+try:
+    import zstandard
+except ImportError:   # lzma من المكتبة القياسية يكفي (أبطأ قليلاً)
+    zstandard = None
+
+try:
+    import fcntl
+except ImportError:   # Windows: القفل داخل العملية فقط
+    fcntl = None
+
+try:
+    from db.session import DATABASE_PATH
+except Exception:
+    DATABASE_PATH = os.getenv("DATABASE_PATH", "db/medical_reports.db")
+
+INCREMENTAL_BACKUP_DIR = os.getenv(
+    "INCREMENTAL_BACKUP_DIR",
+    os.path.join(os.path.dirname(os.path.abspath(DATABASE_PATH)), "backups", "incremental"),
+)
+BACKUP_PAGES_PER_STEP = int(os.getenv("BACKUP_PAGES_PER_STEP", "256"))
+BACKUP_STEP_SLEEP = float(os.getenv("BACKUP_STEP_SLEEP", "0.005"))
+BACKUP_CHUNK_PAGES = int(os.getenv("BACKUP_CHUNK_PAGES", "256"))   # 1 MiB بصفحات 4 KiB
+BACKUP_KEEP_LAST = int(os.getenv("BACKUP_KEEP_LAST", "6"))      # آخر ساعة بنسخ كل 10 دقائق
+BACKUP_KEEP_HOURLY = int(os.getenv("BACKUP_KEEP_HOURLY", "48"))
+BACKUP_KEEP_DAILY = int(os.getenv("BACKUP_KEEP_DAILY", "30"))
+BACKUP_KEEP_MONTHLY = int(os.getenv("BACKUP_KEEP_MONTHLY", "12"))
+
+_BUSY_CODES = (sqlite3.SQLITE_BUSY, sqlite3.SQLITE_LOCKED)
+_RAW_SUFFIX = ""          # قطع غير مضغوطة (كُتبت قبل دعم الضغط)
+
+
+def _compress(data: bytes):
+    """(suffix, payload) — zstd إن توفّر، وإلا lzma."""
+    if zstandard is not None:
+        return ".zst", zstandard.ZstdCompressor(level=10).compress(data)
+    return ".xz", lzma.compress(data, preset=6)
+
+
+def _decompress(suffix: str, payload: bytes) -> bytes:
+    if suffix == ".zst":
+        if zstandard is None:
+            raise RuntimeError("backup chunk is zstd-compressed but zstandard is not installed")
+        return zstandard.ZstdDecompressor().decompress(payload)
+    if suffix == ".xz":
+        return lzma.decompress(payload)
+    return payload
+
+
+# ================================================
+# Storage backend
+# ================================================
+
+_thread_locks_guard = threading.Lock()
+_thread_locks = {}        # root → threading.Lock (flock وحده لا يكفي بلا fcntl)
+
+
+def _thread_lock_for(root: str) -> threading.Lock:
+    key = os.path.realpath(root)
+    with _thread_locks_guard:
+        return _thread_locks.setdefault(key, threading.Lock())
+
+
+class LocalDirectoryBackend:
+    """Chunks and manifests in a plain directory — works fully offline."""
+
+    def __init__(self, root: str = INCREMENTAL_BACKUP_DIR):
+        self.root = root
+        self.chunk_dir = os.path.join(root, "chunks")
+        self.manifest_dir = os.path.join(root, "manifests")
+        os.makedirs(self.chunk_dir, exist_ok=True)
+        os.makedirs(self.manifest_dir, exist_ok=True)
+
+    @contextmanager
+    def lock(self):
+        """قفل حصري على الأرشيف (بين الخيوط والعمليات) — ينتظر حتى يتحرر."""
+        with _thread_lock_for(self.root), open(os.path.join(self.root, ".lock"), "a+b") as fh:
+            if fcntl is not None:
+                fcntl.flock(fh.fileno(), fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                if fcntl is not None:
+                    fcntl.flock(fh.fileno(), fcntl.LOCK_UN)
+
+    def _chunk_path(self, digest: str, suffix: str = _RAW_SUFFIX) -> str:
+        return os.path.join(self.chunk_dir, digest[:2], digest + suffix)
+
+    def _find_chunk(self, digest: str) -> Optional[str]:
+        for suffix in (".zst", ".xz", _RAW_SUFFIX):
+            path = self._chunk_path(digest, suffix)
+            if os.path.exists(path):
+                return path
+        return None
+
+    @staticmethod
+    def _atomic_write(path: str, data: bytes) -> None:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp = f"{path}.tmp-{os.getpid()}-{threading.get_ident()}"
+        with open(tmp, "wb") as f:
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, path)
+
+    # ── chunks (digest = sha256 للمحتوى الخام، التخزين مضغوط) ──
+    def has_chunk(self, digest: str) -> bool:
+        return self._find_chunk(digest) is not None
+
+    def put_chunk(self, digest: str, data: bytes) -> int:
+        """يخزّن القطعة مضغوطة؛ يعيد عدد البايتات المكتوبة فعلاً."""
+        suffix, payload = _compress(data)
+        self._atomic_write(self._chunk_path(digest, suffix), payload)
+        return len(payload)
+
+    def get_chunk(self, digest: str) -> bytes:
+        path = self._find_chunk(digest)
+        if path is None:
+            raise FileNotFoundError(f"backup chunk {digest} is missing")
+        with open(path, "rb") as f:
+            payload = f.read()
+        suffix = path[len(self._chunk_path(digest)):]
+        try:
+            return _decompress(suffix, payload)
+        except RuntimeError:
+            raise
+        except Exception as e:
+            raise ValueError(f"corrupt backup chunk {digest}: {e}") from e
+
+    def delete_chunk(self, digest: str) -> None:
+        for suffix in (".zst", ".xz", _RAW_SUFFIX):
+            try:
+                os.remove(self._chunk_path(digest, suffix))
+            except FileNotFoundError:
+                pass
+
+    def iter_chunks(self) -> Iterator[str]:
+        for prefix in os.listdir(self.chunk_dir):
+            sub = os.path.join(self.chunk_dir, prefix)
+            if os.path.isdir(sub):
+                for name in os.listdir(sub):
+                    if ".tmp-" not in name:
+                        yield name.split(".", 1)[0]
+
+    def stored_bytes(self) -> int:
+        total = 0
+        for dirpath, _, files in os.walk(self.root):
+            total += sum(os.path.getsize(os.path.join(dirpath, f)) for f in files)
+        return total
+
+    # ── manifests ──
+    def put_manifest(self, manifest: dict) -> None:
+        path = os.path.join(self.manifest_dir, f"{manifest['id']}.json")
+        self._atomic_write(path, json.dumps(manifest, ensure_ascii=False).encode("utf-8"))
+
+    def get_manifest(self, snapshot_id: str) -> dict:
+        with open(os.path.join(self.manifest_dir, f"{snapshot_id}.json"), encoding="utf-8") as f:
+            return json.load(f)
+
+    def list_manifests(self) -> List[str]:
+        """Snapshot ids, oldest first (ids sort chronologically)."""
+        return sorted(n[:-5] for n in os.listdir(self.manifest_dir) if n.endswith(".json"))
+
+    def delete_manifest(self, snapshot_id: str) -> None:
+        try:
+            os.remove(os.path.join(self.manifest_dir, f"{snapshot_id}.json"))
+        except FileNotFoundError:
+            pass
+
+
+_default_backend: Optional[LocalDirectoryBackend] = None
+_metrics_lock = threading.Lock()
+_metrics = {"backups": 0, "failed": 0, "bytes_written": 0, "last": None}
+
+
+def get_backend() -> LocalDirectoryBackend:
+    global _default_backend
+    if _default_backend is None:
+        _default_backend = LocalDirectoryBackend()
+    return _default_backend
+
+
+# ================================================
+# Online snapshot
+# ================================================
+
+def online_copy(
+    src_path: str,
+    dst_path: str,
+    pages: int = BACKUP_PAGES_PER_STEP,
+    sleep: float = BACKUP_STEP_SLEEP,
+) -> dict:
+    """
+    نسخة متسقة من قاعدة حيّة إلى dst_path عبر backup API بخطوات صغيرة.
+
+    Returns:
+        {"pages", "steps", "lock_wait_ms", "snapshot_ms"}
+    """
+    t0 = time.perf_counter()
+    src = sqlite3.connect(f"file:{src_path}?mode=ro", uri=True, timeout=60)
+    dst = sqlite3.connect(dst_path)
+    progress = {"steps": 0, "lock_wait": 0.0, "pages": 0, "last": time.perf_counter(), "busy": False}
+
+    def _on_step(status, remaining, total):
+        now = time.perf_counter()
+        busy = status in _BUSY_CODES
+        if busy or progress["busy"]:
+            progress["lock_wait"] += now - progress["last"]
+        progress.update(steps=progress["steps"] + 1, pages=total, last=now, busy=busy)
+
+    try:
+        # معاملة قراءة مفتوحة = لقطة WAL ثابتة طوال الخطوات
+        src.execute("BEGIN")
+        src.execute("SELECT COUNT(*) FROM sqlite_master").fetchone()
+        src.backup(dst, pages=max(1, pages), progress=_on_step, sleep=sleep)
+        src.execute("COMMIT")
+    finally:
+        dst.close()
+        src.close()
+
+    return {
+        "pages": progress["pages"],
+        "steps": progress["steps"],
+        "lock_wait_ms": round(progress["lock_wait"] * 1000, 2),
+        "snapshot_ms": round((time.perf_counter() - t0) * 1000, 2),
+    }
+
+
+def _snapshot_id(now: datetime) -> str:
+    return now.strftime("%Y%m%dT%H%M%S_%fZ")
+
+
+def backup(
+    db_path: Optional[str] = None,
+    backend: Optional[LocalDirectoryBackend] = None,
+    label: str = "auto",
+    retention: bool = True,
+) -> dict:
+    """
+    نسخة احتياطية تزايدية: لقطة متسقة ثم تخزين القطع المتغيرة فقط (مضغوطة).
+    retention=True ⇒ تطبيق طبقات الاحتفاظ وجمع القطع اليتيمة بعدها.
+
+    Returns:
+        الـmanifest (يتضمن "metrics")
+    """
+    db_path = db_path or DATABASE_PATH
+    backend = backend or get_backend()
+    t0 = time.perf_counter()
+    now = datetime.utcnow()
+    staging = os.path.join(backend.root, f".staging-{os.getpid()}-{threading.get_ident()}.db")
+
+    try:
+        snap = online_copy(db_path, staging)
+        with sqlite3.connect(staging) as conn:
+            page_size = conn.execute("PRAGMA page_size").fetchone()[0]
+        # القطع → manifest → الاحتفاظ تحت قفل الأرشيف: لا GC بين كتابة قطعة
+        # (أو الاعتماد على قطعة موجودة) وظهور الـmanifest الذي يشير إليها
+        with backend.lock():
+            manifest = _store_snapshot(staging, db_path, backend, label, now, page_size, snap, t0)
+    except Exception:
+        with _metrics_lock:
+            _metrics["failed"] += 1
+        raise
+    finally:
+        for suffix in ("", "-journal", "-wal", "-shm"):
+            try:
+                os.remove(staging + suffix)
+            except FileNotFoundError:
+                pass
+
+    if retention:
+        prune(backend)
+    return manifest
+
+
+def _store_snapshot(staging, db_path, backend, label, now, page_size, snap, t0) -> dict:
+    """القطع المتغيرة ثم الـmanifest — يُستدعى والقفل مأخوذ."""
+    chunk_bytes = page_size * max(1, BACKUP_CHUNK_PAGES)
+    chunks, written, bytes_written, raw_new = [], 0, 0, 0
+    whole = hashlib.sha256()
+    with open(staging, "rb") as f:
+        while True:
+            data = f.read(chunk_bytes)
+            if not data:
+                break
+            whole.update(data)
+            digest = hashlib.sha256(data).hexdigest()
+            if not backend.has_chunk(digest):
+                bytes_written += backend.put_chunk(digest, data)
+                raw_new += len(data)
+                written += 1
+            chunks.append(digest)
+    size = os.path.getsize(staging)
+
+    metrics = {
+        "bytes_written": bytes_written,
+        "bytes_new_raw": raw_new,
+        "chunks_written": written,
+        "chunks_total": len(chunks),
+        "size": size,
+        "duration_ms": round((time.perf_counter() - t0) * 1000, 2),
+        **snap,
+    }
+    manifest = {
+        "id": _snapshot_id(now),
+        "label": label,
+        "created_at": now.isoformat(),
+        "source": os.path.abspath(db_path),
+        "page_size": page_size,
+        "chunk_bytes": chunk_bytes,
+        "size": size,
+        "sha256": whole.hexdigest(),
+        "chunks": chunks,
+        "metrics": metrics,
+    }
+    backend.put_manifest(manifest)
+
+    with _metrics_lock:
+        _metrics["backups"] += 1
+        _metrics["bytes_written"] += bytes_written
+        _metrics["last"] = {"id": manifest["id"], **metrics}
+
+    logger.info(
+        f"✅ نسخة تزايدية {manifest['id']}: {written}/{len(chunks)} قطعة جديدة، "
+        f"{bytes_written / 1024:.1f} KB مكتوبة من {size / 1024:.1f} KB، "
+        f"{metrics['duration_ms']:.0f}ms (انتظار أقفال {metrics['lock_wait_ms']:.0f}ms)"
+    )
+    return manifest
+
+
+# ================================================
+# Restore / inspection
+# ================================================
+
+def list_snapshots(backend: Optional[LocalDirectoryBackend] = None) -> List[dict]:
+    """ملخص كل النسخ (الأحدث أولاً) بدون قائمة القطع."""
+    backend = backend or get_backend()
+    out = []
+    for snapshot_id in reversed(backend.list_manifests()):
+        m = backend.get_manifest(snapshot_id)
+        out.append({
+            "id": m["id"],
+            "label": m["label"],
+            "created_at": m["created_at"],
+            "size": m["size"],
+            "bytes_written": m["metrics"]["bytes_written"],
+        })
+    return out
+
+
+def find_snapshot(
+    at: Union[None, str, datetime] = None,
+    backend: Optional[LocalDirectoryBackend] = None,
+) -> Optional[dict]:
+    """
+    الـmanifest المطلوب: at=None ⇒ الأحدث، str ⇒ id بعينه،
+    datetime (UTC) ⇒ أحدث نسخة عند/قبل تلك اللحظة.
+    """
+    backend = backend or get_backend()
+    ids = backend.list_manifests()
+    if not ids:
+        return None
+    if isinstance(at, str):
+        return backend.get_manifest(at) if at in ids else None
+    if at is None:
+        return backend.get_manifest(ids[-1])
+    cutoff = _snapshot_id(at)
+    eligible = [i for i in ids if i <= cutoff]
+    return backend.get_manifest(eligible[-1]) if eligible else None
+
+
+def iter_snapshot(manifest: dict, backend: Optional[LocalDirectoryBackend] = None) -> Iterator[bytes]:
+    """
+    قطع النسخة بالترتيب بعد فك الضغط — تدفّق بلا ملف وسيط.
+
+    Raises:
+        ValueError: قطعة لا تطابق بصمتها، أو الملف كاملاً لا يطابق sha256
+    """
+    backend = backend or get_backend()
+    whole = hashlib.sha256()
+    for digest in manifest["chunks"]:
+        data = backend.get_chunk(digest)
+        if hashlib.sha256(data).hexdigest() != digest:
+            raise ValueError(f"corrupt backup chunk {digest}")
+        whole.update(data)
+        yield data
+    if whole.hexdigest() != manifest["sha256"]:
+        raise ValueError(f"snapshot {manifest['id']} does not match its checksum")
+
+
+def verify(
+    at: Union[None, str, datetime] = None,
+    backend: Optional[LocalDirectoryBackend] = None,
+    deep: bool = False,
+) -> dict:
+    """
+    التحقق من نسخة: كل القطع موجودة وتطابق بصماتها (تدفّق، بلا كتابة).
+    deep=True ⇒ إعادة بناء مؤقتة + PRAGMA integrity_check أيضاً.
+
+    Returns:
+        {"id", "ok", "error", "bytes"}
+    """
+    backend = backend or get_backend()
+    manifest = find_snapshot(at, backend)
+    if manifest is None:
+        raise FileNotFoundError(f"no backup snapshot for {at!r}")
+
+    result = {"id": manifest["id"], "ok": True, "error": None, "bytes": 0}
+    tmp = os.path.join(backend.root, f".verify-{os.getpid()}-{threading.get_ident()}.db") if deep else None
+    try:
+        out = open(tmp, "wb") if deep else None
+        try:
+            for data in iter_snapshot(manifest, backend):
+                result["bytes"] += len(data)
+                if out:
+                    out.write(data)
+        finally:
+            if out:
+                out.close()
+        if deep:
+            with sqlite3.connect(tmp) as conn:
+                check = conn.execute("PRAGMA integrity_check").fetchone()[0]
+            if str(check).lower() != "ok":
+                raise ValueError(f"integrity_check: {check}")
+    except (ValueError, FileNotFoundError, RuntimeError, sqlite3.DatabaseError) as e:
+        result.update(ok=False, error=str(e))
+    finally:
+        if tmp and os.path.exists(tmp):
+            os.remove(tmp)
+    return result
+
+
+def restore(
+    target_path: str,
+    at: Union[None, str, datetime] = None,
+    backend: Optional[LocalDirectoryBackend] = None,
+) -> dict:
+    """
+    إعادة بناء قاعدة البيانات من نسخة (point-in-time) في target_path.
+
+    الملف الحالي (إن وجد) يُنقل إلى <target>.before_restore_<ts> أولاً.
+    Raises:
+        FileNotFoundError: لا توجد نسخة مطابقة
+        ValueError: قطعة تالفة أو integrity_check فشل
+    """
+    backend = backend or get_backend()
+    manifest = find_snapshot(at, backend)
+    if manifest is None:
+        raise FileNotFoundError(f"no backup snapshot for {at!r}")
+
+    tmp = f"{target_path}.restore-{os.getpid()}"
+    try:
+        with open(tmp, "wb") as out:
+            for data in iter_snapshot(manifest, backend):
+                out.write(data)
+            out.flush()
+            os.fsync(out.fileno())
+        with sqlite3.connect(tmp) as conn:
+            result = conn.execute("PRAGMA integrity_check").fetchone()[0]
+        if str(result).lower() != "ok":
+            raise ValueError(f"snapshot {manifest['id']} failed integrity_check: {result}")
+
+        if os.path.exists(target_path):
+            keep = f"{target_path}.before_restore_{datetime.now().strftime('%Y%m%d_%H%M%S')}"
+            os.replace(target_path, keep)
+            logger.info(f"💾 قاعدة البيانات الحالية محفوظة في: {keep}")
+        for suffix in ("-wal", "-shm"):
+            try:
+                os.remove(target_path + suffix)
+            except FileNotFoundError:
+                pass
+        os.replace(tmp, target_path)
+    finally:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+
+    logger.info(f"✅ تمت الاستعادة من النسخة {manifest['id']} ({manifest['created_at']} UTC)")
+    return manifest
+
+
+def retention_keep(
+    snapshot_ids: Iterable[str],
+    hourly: int = BACKUP_KEEP_HOURLY,
+    daily: int = BACKUP_KEEP_DAILY,
+    monthly: int = BACKUP_KEEP_MONTHLY,
+    last: int = BACKUP_KEEP_LAST,
+) -> set:
+    """
+    grandfather-father-son: آخر `last` نسخة، ثم أحدث نسخة في كل ساعة/يوم/شهر
+    من آخر N ساعة/يوم/شهر (بالنسبة لأحدث نسخة موجودة، لا للساعة الحالية).
+    الأحدث تبقى دائماً.
+    """
+    ids = sorted(snapshot_ids)
+    if not ids:
+        return set()
+    keep = set(ids[-max(1, last):])
+    # id = YYYYmmddTHHMMSS_… ⇒ البادئات تعطي مفاتيح الساعة/اليوم/الشهر مباشرة
+    for width, count in ((11, hourly), (8, daily), (6, monthly)):
+        if count <= 0:
+            continue
+        newest_per_bucket = {}
+        for snapshot_id in ids:
+            newest_per_bucket[snapshot_id[:width]] = snapshot_id
+        for bucket in sorted(newest_per_bucket, reverse=True)[:count]:
+            keep.add(newest_per_bucket[bucket])
+    return keep
+
+
+def gc_chunks(backend: Optional[LocalDirectoryBackend] = None) -> int:
+    """حذف القطع التي لا تشير إليها أي نسخة متبقية (تحت قفل الأرشيف)."""
+    backend = backend or get_backend()
+    with backend.lock():
+        return _gc_chunks_locked(backend)
+
+
+def _gc_chunks_locked(backend: LocalDirectoryBackend) -> int:
+    referenced = set()
+    for snapshot_id in backend.list_manifests():
+        referenced.update(backend.get_manifest(snapshot_id)["chunks"])
+    orphans = [d for d in set(backend.iter_chunks()) if d not in referenced]
+    for digest in orphans:
+        backend.delete_chunk(digest)
+    return len(orphans)
+
+
+def prune(
+    backend: Optional[LocalDirectoryBackend] = None,
+    hourly: int = BACKUP_KEEP_HOURLY,
+    daily: int = BACKUP_KEEP_DAILY,
+    monthly: int = BACKUP_KEEP_MONTHLY,
+    last: int = BACKUP_KEEP_LAST,
+) -> dict:
+    """تطبيق طبقات الاحتفاظ ثم جمع القطع اليتيمة (ينتظر أي نسخة جارية)."""
+    backend = backend or get_backend()
+    with backend.lock():
+        ids = backend.list_manifests()
+        keep = retention_keep(ids, hourly, daily, monthly, last)
+        removed = [i for i in ids if i not in keep]
+        for snapshot_id in removed:
+            backend.delete_manifest(snapshot_id)
+        chunks = _gc_chunks_locked(backend) if removed else 0
+    if removed:
+        logger.info(f"🗑️ احتفاظ GFS: حُذفت {len(removed)} نسخة و {chunks} قطعة يتيمة")
+    return {"manifests": len(removed), "chunks": chunks}
+
+
+def archive_stats(backend: Optional[LocalDirectoryBackend] = None) -> dict:
+    """الحجم المنطقي لكل النسخ مقابل الحجم المخزَّن فعلاً."""
+    backend = backend or get_backend()
+    ids = backend.list_manifests()
+    logical = sum(backend.get_manifest(i)["size"] for i in ids)
+    stored = backend.stored_bytes()
+    return {
+        "snapshots": len(ids),
+        "chunks": len(set(backend.iter_chunks())),
+        "logical_bytes": logical,
+        "stored_bytes": stored,
+        "ratio": round(logical / stored, 2) if stored else None,
+        "oldest": ids[0] if ids else None,
+        "newest": ids[-1] if ids else None,
+    }
+
+
+def backup_metrics() -> dict:
+    """عدادات تراكمية + قياسات آخر نسخة."""
+    with _metrics_lock:
+        return {**_metrics, "last": dict(_metrics["last"]) if _metrics["last"] else None}
+
+
+__all__ = [
+    "LocalDirectoryBackend",
+    "online_copy",
+    "backup",
+    "restore",
+    "find_snapshot",
+    "list_snapshots",
+    "iter_snapshot",
+    "verify",
+    "retention_keep",
+    "gc_chunks",
+    "prune",
+    "archive_stats",
+    "backup_metrics",
+]
@@ -0,0 +1,185 @@
+# ================================================
+# services/log_pipeline.py
+# 📋 Non-blocking logging: QueueHandler → كاتب خلفي واحد + أخذ عينات للمسارات الساخنة
+# ================================================
+#
+# كل logger.info(...) على حلقة الأحداث كان يمرّ مباشرة بمعالِجات الجذر:
+# تنسيق + كتابة على stdout (pm2) + ملف الأخطاء اليومي، كلها تحت أقفالها،
+# داخل الـhandler نفسه. مسار نشر تقرير واحد ≈ 12 سطراً، والبحث المباشر عن
+# مريض يكتب كتلة من 7 أسطر مع كل حرف.
+#
+# هنا:
+#   • الجذر يحمل معالِجاً واحداً (QueueHandler) يضع السجل في طابور ويعود؛
+#     المعالِجات الأصلية (بفلاترها ومستوياتها كما هي) تنتقل إلى QueueListener
+#     بخيط كتابة خلفي واحد،
+#   • الرسالة تُدمج مع معاملاتها فوراً (لا تتغير لاحقاً) لكن exc_info يبقى
+#     كما هو — فلتر الشبكة في app.py ومراقب الأخطاء يحتاجان نوع الاستثناء،
+#   • طابور محدود (LOG_QUEUE_SIZE): عند الامتلاء تُسقط سجلات ما دون WARNING
+#     وتُعدّ، أما WARNING فأعلى فتنتظر مكاناً — لا يضيع خطأ أبداً،
+#   • log_sampled(): سطر واحد لكل مفتاح كل LOG_SAMPLE_INTERVAL ثانية مع عدد
+#     المكرر المحجوب — للرسائل التي تتكرر مع كل تحديث.
+#
+#     from services.log_pipeline import log_sampled
+#     log_sampled(logger, "patient_search", "🔍 بحث مباشر: %d نتيجة", len(rows))
+
+import atexit
+import logging
+import logging.handlers
+import os
+import queue
+import threading
+import time
+from typing import Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+LOG_QUEUE_SIZE = int(os.getenv("LOG_QUEUE_SIZE", "10000"))
+LOG_SAMPLE_INTERVAL = float(os.getenv("LOG_SAMPLE_INTERVAL", "60"))
+
+
+class _EagerQueueHandler(logging.handlers.QueueHandler):
+    """QueueHandler لا ينسّق ولا يحجب: المعالِجات خلف المستمع تنسّق بنفسها."""
+
+    def __init__(self, q: "queue.Queue"):
+        super().__init__(q)
+        self.dropped = 0
+        self.enqueued = 0
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # الطابور داخل نفس العملية — لا حاجة لتسلسل السجل؛ يكفي تثبيت النص
+        # الآن (المعاملات قد تكون كائنات تتغير قبل أن يصلها الكاتب)
+        record.message = record.getMessage()
+        record.msg = record.message
+        record.args = None
+        return record
+
+    def enqueue(self, record: logging.LogRecord) -> None:
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            if record.levelno < logging.WARNING:
+                self.dropped += 1
+                return
+            self.queue.put(record)
+        self.enqueued += 1
+
+
+class LogPipeline:
+    def __init__(self, target: logging.Logger, queue_size: int = LOG_QUEUE_SIZE):
+        self.target = target
+        self.queue: "queue.Queue" = queue.Queue(maxsize=max(0, queue_size))
+        self.handler = _EagerQueueHandler(self.queue)
+        self.handlers: List[logging.Handler] = []
+        self.listener: Optional[logging.handlers.QueueListener] = None
+
+    def start(self) -> None:
+        # نفس المعالِجات بفلاترها (حجب التوكن، اختصار أخطاء الشبكة) ومستوياتها
+        self.handlers = list(self.target.handlers)
+        for h in self.handlers:
+            self.target.removeHandler(h)
+        self.listener = logging.handlers.QueueListener(
+            self.queue, *self.handlers, respect_handler_level=True
+        )
+        self.listener.start()
+        self.target.addHandler(self.handler)
+
+    def add_handler(self, handler: logging.Handler) -> None:
+        """معالِج يُركَّب بعد التشغيل ينضم للكاتب الخلفي لا للجذر."""
+        if self.listener is None or handler in self.handlers:
+            return
+        self.handlers.append(handler)
+        self.listener.handlers = tuple(self.handlers)
+
+    def stop(self) -> None:
+        """يفرغ الطابور ويعيد المعالِجات الأصلية إلى مكانها."""
+        if self.listener is None:
+            return
+        self.target.removeHandler(self.handler)
+        self.listener.stop()
+        self.listener = None
+        for h in self.handlers:
+            self.target.addHandler(h)
+            try:
+                h.flush()
+            except Exception:
+                pass
+
+    def stats(self) -> dict:
+        return {
+            "queue_depth": self.queue.qsize(),
+            "enqueued": self.handler.enqueued,
+            "dropped": self.handler.dropped,
+            "handlers": len(self.handlers),
+        }
+
+
+_pipeline: Optional[LogPipeline] = None
+
+
+def install_log_pipeline() -> LogPipeline:
+    """ينقل معالِجات الجذر خلف طابور مرة واحدة (يُستدعى بعد تركيبها كلها)."""
+    global _pipeline
+    if _pipeline is None:
+        _pipeline = LogPipeline(logging.getLogger())
+        _pipeline.start()
+        atexit.register(stop_log_pipeline)
+        logger.info("[log_pipeline] root handlers moved behind QueueListener (%d)", len(_pipeline.handlers))
+    return _pipeline
+
+
+def attach_handler(handler: logging.Handler) -> None:
+    """يركّب معالِجاً على الجذر، أو على الكاتب الخلفي إن كان الطابور مفعّلاً."""
+    if _pipeline is not None and _pipeline.listener is not None:
+        _pipeline.add_handler(handler)
+    else:
+        logging.getLogger().addHandler(handler)
+
+
+def has_handler(kind: type) -> bool:
+    handlers = list(logging.getLogger().handlers)
+    if _pipeline is not None:
+        handlers += _pipeline.handlers
+    return any(isinstance(h, kind) for h in handlers)
+
+
+def stop_log_pipeline() -> None:
+    global _pipeline
+    if _pipeline is not None:
+        _pipeline.stop()
+        _pipeline = None
+
+
+def log_pipeline_stats() -> dict:
+    if _pipeline is None:
+        return {"queue_depth": 0, "enqueued": 0, "dropped": 0, "handlers": 0}
+    return _pipeline.stats()
+
+
+# ── أخذ عينات للرسائل المتكررة ────────────────────────────────────────────────
+
+_sample_lock = threading.Lock()
+_samples: Dict[str, List[float]] = {}   # key → [آخر إصدار, عدد المحجوب]
+
+
+def log_sampled(log: logging.Logger, key: str, msg: str, *args,
+                level: int = logging.INFO, interval: Optional[float] = None) -> bool:
+    """
+    سطر واحد لكل key كل `interval` ثانية؛ البقية تُعدّ وتُذكر في السطر التالي.
+    يعيد True إن أُصدر السطر. فحص المستوى أولاً — لا كلفة إن كان معطّلاً.
+    """
+    if not log.isEnabledFor(level):
+        return False
+    interval = LOG_SAMPLE_INTERVAL if interval is None else interval
+    now = time.monotonic()
+    with _sample_lock:
+        state = _samples.get(key)
+        if state is not None and now - state[0] < interval:
+            state[1] += 1
+            return False
+        suppressed = int(state[1]) if state is not None else 0
+        _samples[key] = [now, 0]
+    if suppressed:
+        msg = f"{msg} (+%d مكررة خلال %.0fs)"
+        args = (*args, suppressed, interval)
+    log.log(level, msg, *args, stacklevel=2)
+    return True
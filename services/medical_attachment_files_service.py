@@ -30,27 +30,30 @@ def add_medical_attachment_file(
     if not report_id or not file_id:
         return False
     try:
-        with SessionLocal() as session:
-            row = MedicalAttachmentFile(
-                report_id=report_id,
-                file_id=file_id,
-                file_type=file_type,
-                file_name=file_name,
-                uploaded_by=uploaded_by,
-                uploaded_by_tg_id=uploaded_by_tg_id,
-                source=source,
-                upload_order=upload_order,
-                created_at=datetime.utcnow(),
-            )
-            session.add(row)
-            session.commit()
-            logger.info(f"✅ medical_attachment_files: تم حفظ ملف للتقرير #{report_id} (type={file_type})")
-            return True
+        from db.write_queue import write
+        write(
+            _add_medical_attachment_file_tx,
+            report_id=report_id,
+            file_id=file_id,
+            file_type=file_type,
+            file_name=file_name,
+            uploaded_by=uploaded_by,
+            uploaded_by_tg_id=uploaded_by_tg_id,
+            source=source,
+            upload_order=upload_order,
+        )
+        logger.info(f"✅ medical_attachment_files: تم حفظ ملف للتقرير #{report_id} (type={file_type})")
+        return True
     except Exception as e:
         logger.error(f"❌ medical_attachment_files: فشل حفظ ملف للتقرير #{report_id}: {e}", exc_info=True)
         return False
 
 
+def _add_medical_attachment_file_tx(session, **fields) -> None:
+    """إدراج السجل داخل معاملة الكاتب الموحَّد (db/write_queue.py) — بلا commit."""
+    session.add(MedicalAttachmentFile(created_at=datetime.utcnow(), **fields))
+
+
 def get_medical_attachment_files(report_id: int) -> list[dict]:
     """جلب كل الملفات الطبية لتقرير معين، مرتبة حسب ترتيب الرفع."""
     if not report_id:
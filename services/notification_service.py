@@ -6,11 +6,10 @@
 import logging
 from datetime import datetime, timedelta, date
 from sqlalchemy import or_
-from telegram import Bot
-from telegram.constants import ParseMode
 from db.session import SessionLocal
 from db.models import Report
 from config.settings import BOT_TOKEN, ADMIN_IDS, TIMEZONE
+from services.send_scheduler import Priority, send_to_admins
 import pytz
 
 logger = logging.getLogger(__name__)
@@ -56,16 +55,10 @@ async def send_daily_appointments_reminder(application):
                 message += "لا توجد مواعيد أو عودات مسجلة ليوم غد في التقارير.\n"
                 message += "──────────────────"
                 
-                bot = application.bot
-                for admin_id in ADMIN_IDS:
-                    try:
-                        await bot.send_message(
-                            chat_id=admin_id,
-                            text=message,
-                            parse_mode=ParseMode.MARKDOWN
-                        )
-                    except Exception as e:
-                        logger.error(f"❌ Failed to send 'No appointments' to admin {admin_id}: {e}")
+                results = await send_to_admins(application.bot, message, Priority.DIGEST)
+                for admin_id, result in zip(ADMIN_IDS, results):
+                    if isinstance(result, Exception):
+                        logger.error(f"❌ Failed to send 'No appointments' to admin {admin_id}: {result}")
                 return
 
             # Group appointments by patient or type if needed, or just list them
@@ -102,20 +95,13 @@ async def send_daily_appointments_reminder(application):
                 message += "──────────────────\n"
 
             # Send to all admins
-            bot = application.bot
+            results = await send_to_admins(application.bot, message, Priority.DIGEST)
             success_count = 0
-            for admin_id in ADMIN_IDS:
-                try:
-                    await bot.send_message(
-                        chat_id=admin_id,
-                        text=message,
-                        parse_mode=ParseMode.MARKDOWN
-                    )
+            for admin_id, result in zip(ADMIN_IDS, results):
+                if isinstance(result, Exception):
+                    logger.error(f"❌ Failed to send reminder to admin {admin_id}: {result}")
+                else:
                     success_count += 1
-                except Exception as e:
-                    logger.error(f"❌ Failed to send reminder to admin {admin_id}: {e}")
-            
-            logger.info(f"✅ Daily reminder sent successfully to {success_count} admins.")
 
             logger.info(f"✅ Daily reminder sent to {success_count}/{len(ADMIN_IDS)} admins.")
 
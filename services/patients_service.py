@@ -8,13 +8,24 @@ import os
 import logging
 from typing import List, Dict, Optional
 
+from services.caching import cached, invalidate_tag
+
 logger = logging.getLogger(__name__)
 
+# دوال الكتابة هنا تُبطل وسم "patients" فور الـcommit. صفوف Patient تُكتب
+# أيضاً من مسارات حفظ التقارير والاستيراد مباشرة، لذا TTL قصير يغطيها.
+_PATIENTS_TTL = 60
+
 
 def get_patients_from_database(limit: int = None) -> List[Dict]:
     """
     الحصول على المرضى من قاعدة البيانات
     """
+    return [dict(p) for p in _load_patients_from_database(limit)]
+
+
+@cached(ttl=_PATIENTS_TTL, namespace="patients", tags=("patients",))
+def _load_patients_from_database(limit: int = None) -> List[Dict]:
     try:
         from db.session import SessionLocal
         from db.models import Patient
@@ -189,6 +200,7 @@ def add_patient(
             )
             session.add(new_patient)
             session.commit()
+            invalidate_tag("patients")
 
             logger.info(
                 f"Added new patient: {name}  type={patient_type or 'general'}"
@@ -228,6 +240,7 @@ def clear_pending_arrival_by_names(names: List[str]) -> int:
             for row in rows:
                 row.pending_arrival = False
             session.commit()
+            invalidate_tag("patients")
             return len(rows)
     except Exception as e:
         logger.error(f"Error clearing pending_arrival: {e}")
@@ -343,6 +356,7 @@ def update_patient(patient_id: int, new_name: str) -> bool:
                 old_name = patient.full_name
                 patient.full_name = new_name
                 session.commit()
+                invalidate_tag("patients")
                 logger.info(f"Updated patient from '{old_name}' to '{new_name}'")
                 return True
             else:
@@ -382,6 +396,7 @@ def delete_patient(patient_id: int) -> bool:
                     session.delete(comp)
                 session.delete(patient)
                 session.commit()
+                invalidate_tag("patients")
 
                 try:
                     from modules.residency.models import delete_stub_person_by_name
@@ -518,6 +533,7 @@ def sync_file_to_database() -> int:
     return count
 
 
+@cached(ttl=_PATIENTS_TTL, namespace="patients", tags=("patients",))
 def get_patients_count() -> int:
     """
     عدد المرضى **النشطين** (مستبعِداً المرافقين والمسافرين المؤرشفين —
@@ -564,6 +580,7 @@ def set_patient_archived(patient_id: int, archived: bool) -> Optional[str]:
             name = patient.full_name
             patient.archived_at = _dt.utcnow() if archived else None
             session.commit()
+            invalidate_tag("patients")
             logger.info(
                 f"[archive] {'أُرشِف' if archived else 'أُعيد'} المريض "
                 f"id={patient_id} name={name!r}"
@@ -630,6 +647,7 @@ def get_patients_paginated_by_archive(
         return [], 0, 0
 
 
+@cached(ttl=_PATIENTS_TTL, namespace="patients", tags=("patients",))
 def get_archived_patients_count() -> int:
     """عدد المرضى المؤرشفين (المسافرين) — لعرضه على زر الأرشيف."""
     try:
@@ -820,6 +838,7 @@ def purge_companion_flow_family(patient_id: int) -> tuple:
                 session.delete(root)
 
             session.commit()
+            invalidate_tag("patients")
 
         logger.info(
             f"[pcdel] purged {impact['name']!r}: {len(impact['companions'])} companion(s), "
@@ -3,13 +3,14 @@
 # 📈 رسم الرسوم البيانية الاحترافية
 # ================================================
 
+# الرسم الفعلي في services/chart_rendering.py (Figure مُعاد استخدامها،
+# PNG محفوظ بمفتاح البيانات، process pool للدفعات) — هنا واجهة PDFBuilder فقط.
+
 import logging
 import io
 from typing import Dict, List, Any, Optional
-import matplotlib
-matplotlib.use('Agg')
-import matplotlib.pyplot as plt
-from matplotlib import rcParams
+
+from services.chart_rendering import PALETTE, render_chart
 
 logger = logging.getLogger(__name__)
 
@@ -18,20 +19,12 @@ class ChartRenderer:
     """رسم الرسوم البيانية الاحترافية والموحدة"""
     
     # إعدادات Matplotlib الموحدة
-    COLORS = [
-        '#1565C0',  # أزرق
-        '#0288D1',  # أزرق فاتح
-        '#2E7D32',  # أخضر
-        '#F57F17',  # برتقالي
-        '#C62828',  # أحمر
-        '#6A1B9A',  # بنفسجي
-        '#00838F',  # تركواز
-        '#E65100',  # برتقالي داكن
-    ]
+    COLORS = PALETTE
     
     @staticmethod
     def setup_arabic_matplotlib():
         """إعداد Matplotlib للعربية"""
+        from matplotlib import rcParams
         rcParams['font.family'] = 'DejaVu Sans'
         rcParams['axes.unicode_minus'] = False
     
@@ -44,7 +37,7 @@ class ChartRenderer:
         xlabel: str = "",
         ylabel: str = "",
         horizontal: bool = False,
-    ) -> io.BytesIO:
+    ) -> Optional[io.BytesIO]:
         """
         إنشاء رسم بياني عمودي/أفقي
         
@@ -57,36 +50,18 @@ class ChartRenderer:
             horizontal: هل الرسم أفقي؟
             
         Returns:
-            BytesIO object
+            BytesIO object (None إن فشل الرسم)
         """
         
         logger.info(f"📊 إنشاء رسم بياني عمودي: {title}")
         
-        cls.setup_arabic_matplotlib()
-        
-        fig, ax = plt.subplots(figsize=(8, 5), dpi=100)
-        
-        if horizontal:
-            ax.barh(labels, values, color=cls.COLORS[:len(labels)])
-        else:
-            ax.bar(labels, values, color=cls.COLORS[:len(labels)])
-        
-        ax.set_title(title, fontsize=14, fontweight='bold')
-        ax.set_xlabel(xlabel, fontsize=11)
-        ax.set_ylabel(ylabel, fontsize=11)
-        
-        # تدوير التسميات إذا لزم الأمر
-        plt.xticks(rotation=45, ha='right')
-        
-        plt.tight_layout()
-        
-        # حفظ إلى BytesIO
-        buffer = io.BytesIO()
-        fig.savefig(buffer, format='png', dpi=100, bbox_inches='tight')
-        buffer.seek(0)
-        plt.close(fig)
-        
-        logger.info(f"✅ تم إنشاء الرسم البياني بنجاح")
+        buffer = render_chart({
+            "kind": "bar", "labels": list(labels), "values": list(values), "title": title,
+            "xlabel": xlabel, "ylabel": ylabel, "horizontal": horizontal,
+            "figsize": (8, 5), "dpi": 100,
+        })
+        if buffer is not None:
+            logger.info(f"✅ تم إنشاء الرسم البياني بنجاح")
         return buffer
     
     @classmethod
@@ -95,7 +70,7 @@ class ChartRenderer:
         labels: List[str],
         values: List[float],
         title: str = "",
-    ) -> io.BytesIO:
+    ) -> Optional[io.BytesIO]:
         """
         إنشاء رسم دائري
         
@@ -105,48 +80,17 @@ class ChartRenderer:
             title: عنوان الرسم
             
         Returns:
-            BytesIO object
+            BytesIO object (None إن فشل الرسم)
         """
         
         logger.info(f"📊 إنشاء رسم دائري: {title}")
         
-        cls.setup_arabic_matplotlib()
-        
-        fig, ax = plt.subplots(figsize=(8, 5), dpi=100)
-        
-        # عرض أعلى 5 عناصر فقط (الباقي "أخرى")
-        if len(labels) > 5:
-            top_5_indices = sorted(range(len(values)), key=lambda i: values[i], reverse=True)[:5]
-            labels_pie = [labels[i] for i in top_5_indices]
-            values_pie = [values[i] for i in top_5_indices]
-            
-            # أضف "أخرى"
-            other_value = sum(values) - sum(values_pie)
-            labels_pie.append("أخرى")
-            values_pie.append(other_value)
-        else:
-            labels_pie = labels
-            values_pie = values
-        
-        ax.pie(
-            values_pie,
-            labels=labels_pie,
-            autopct='%1.1f%%',
-            colors=cls.COLORS[:len(labels_pie)],
-            startangle=90,
-        )
-        
-        ax.set_title(title, fontsize=14, fontweight='bold')
-        
-        plt.tight_layout()
-        
-        # حفظ إلى BytesIO
-        buffer = io.BytesIO()
-        fig.savefig(buffer, format='png', dpi=100, bbox_inches='tight')
-        buffer.seek(0)
-        plt.close(fig)
-        
-        logger.info(f"✅ تم إنشاء الرسم الدائري بنجاح")
+        buffer = render_chart({
+            "kind": "top5_pie", "labels": list(labels), "values": list(values), "title": title,
+            "figsize": (8, 5), "dpi": 100,
+        })
+        if buffer is not None:
+            logger.info(f"✅ تم إنشاء الرسم الدائري بنجاح")
         return buffer
     
     @classmethod
@@ -157,7 +101,7 @@ class ChartRenderer:
         title: str = "",
         xlabel: str = "",
         ylabel: str = "",
-    ) -> io.BytesIO:
+    ) -> Optional[io.BytesIO]:
         """
         إنشاء رسم خطي
         
@@ -169,35 +113,15 @@ class ChartRenderer:
             ylabel: تسمية المحور العمودي
             
         Returns:
-            BytesIO object
+            BytesIO object (None إن فشل الرسم)
         """
         
         logger.info(f"📊 إنشاء رسم خطي: {title}")
         
-        cls.setup_arabic_matplotlib()
-        
-        fig, ax = plt.subplots(figsize=(10, 5), dpi=100)
-        
-        ax.plot(x_data, y_data, marker='o', linewidth=2, markersize=6, color='#1565C0')
-        ax.fill_between(range(len(x_data)), y_data, alpha=0.3, color='#0288D1')
-        
-        ax.set_title(title, fontsize=14, fontweight='bold')
-        ax.set_xlabel(xlabel, fontsize=11)
-        ax.set_ylabel(ylabel, fontsize=11)
-        
-        # شبكة
-        ax.grid(True, alpha=0.3)
-        
-        # تدوير التسميات
-        plt.xticks(rotation=45, ha='right')
-        
-        plt.tight_layout()
-        
-        # حفظ إلى BytesIO
-        buffer = io.BytesIO()
-        fig.savefig(buffer, format='png', dpi=100, bbox_inches='tight')
-        buffer.seek(0)
-        plt.close(fig)
-        
-        logger.info(f"✅ تم إنشاء الرسم الخطي بنجاح")
+        buffer = render_chart({
+            "kind": "line", "labels": list(x_data), "values": list(y_data), "title": title,
+            "xlabel": xlabel, "ylabel": ylabel, "figsize": (10, 5), "dpi": 100,
+        })
+        if buffer is not None:
+            logger.info(f"✅ تم إنشاء الرسم الخطي بنجاح")
         return buffer
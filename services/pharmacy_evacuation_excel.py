@@ -15,10 +15,17 @@
 # حرف LRM بين كل رقمين على حدة (وليس مرة واحدة فقط) — فلا يوجد رقمان
 # متتاليان بلا حرف غير مرئي بينهما، فيستحيل على أي نمط \d{2,} أن يلتقط
 # التاريخ كوحدة واحدة مهما كان الفاصل الظاهري.
+#
+# ✅ openpyxl بوضع write-only: الصفوف تُكتب بالترتيب وتُدفَع للملف فوراً،
+# فالمسير يُستهلك كتدفّق (iter_evacuation_ledger_rows) والذاكرة ثابتة مهما
+# طال النطاق (مسير سنة كاملة). لهذا: أبعاد الأعمدة تُضبط قبل أول صف،
+# والدمج يُسجَّل كنطاقات (merged_cells) بدل ws.merge_cells.
 
 import io
 import logging
+from copy import copy
 from datetime import date, datetime
+from typing import Iterable
 
 logger = logging.getLogger(__name__)
 
@@ -43,14 +50,42 @@ def _safe_date_text(dt) -> str:
     return str(dt or "")
 
 
-def build_evacuation_excel(rows: list[dict], start_date: date, end_date: date) -> io.BytesIO:
+def _footer_col_ranges(col_widths: list[float]) -> list[tuple[int, int]]:
+    """أربع مجموعات أعمدة للتوقيعات حسب العرض التراكمي — انظر التعليق في build_evacuation_excel."""
+    n = len(col_widths)
+    cum = []
+    running = 0.0
+    for w in col_widths:
+        running += w
+        cum.append(running)
+    quarter = cum[-1] / 4
+    boundaries = []
+    prev = 0
+    for k in (1, 2, 3):
+        target = k * quarter
+        search_range = range(prev, n - (3 - k))
+        best_idx = min(search_range, key=lambda idx: abs(cum[idx] - target))
+        boundaries.append(best_idx)
+        prev = best_idx + 1
+    col_ranges = []
+    start = 1
+    for b in boundaries:
+        col_ranges.append((start, b + 1))
+        start = b + 2
+    col_ranges.append((start, n))
+    return col_ranges
+
+
+def build_evacuation_excel(rows: Iterable[dict], start_date: date, end_date: date) -> io.BytesIO:
+    """rows: قائمة أو تدفّق (iter_evacuation_ledger_rows) — يُقرأ مرة واحدة بالترتيب."""
     from openpyxl import Workbook
+    from openpyxl.cell import WriteOnlyCell
     from openpyxl.styles import Font, PatternFill, Alignment, Border, Side
     from openpyxl.utils import get_column_letter
+    from openpyxl.worksheet.cell_range import CellRange
 
-    wb = Workbook()
-    ws = wb.active
-    ws.title = "مسير الإخلاء"
+    wb = Workbook(write_only=True)
+    ws = wb.create_sheet("مسير الإخلاء")
     ws.sheet_view.rightToLeft = True
 
     # ✅ مخطَّط رمادي/بيج مطابق لنسخة PDF (كان هذا الملف أزرق بالكامل ولم
@@ -76,31 +111,59 @@ def build_evacuation_excel(rows: list[dict], start_date: date, end_date: date) -
         top=Side(style="thin", color="CCCCCC"), bottom=Side(style="thin", color="CCCCCC"),
     )
 
+    # تعيين font/fill/... يحسب hash الأنماط ويبحث عنها في جداول الـworkbook
+    # لكل خلية — هو أغلى ما في التصدير. كل تركيبة أنماط تُحسب مرة واحدة ثم
+    # تُنسخ مؤشراتها (StyleArray) لبقية الخلايا.
+    style_arrays = {}
+
+    def _cell(value=None, font=None, fill=None, border=None, alignment=None, number_format=None):
+        cell = WriteOnlyCell(ws, value=value)
+        key = (id(font), id(fill), id(border), id(alignment), number_format)
+        cached = style_arrays.get(key)
+        if cached is not None:
+            cell._style = copy(cached)
+            return cell
+        if font is not None:
+            cell.font = font
+        if fill is not None:
+            cell.fill = fill
+        if border is not None:
+            cell.border = border
+        if alignment is not None:
+            cell.alignment = alignment
+        if number_format is not None:
+            cell.number_format = number_format
+        style_arrays[key] = copy(cell._style)
+        return cell
+
+    def _merge(row, c_start, c_end):
+        ws.merged_cells.add(CellRange(min_row=row, min_col=c_start, max_row=row, max_col=c_end))
+
     headers = ["م", "المبلغ", "الاسم", "رقم الفاتورة", "بند الصرف", "البيان", "التاريخ"]
-    last_col = get_column_letter(len(headers))
     n = len(headers)
     col_widths = [6, 24, 22, 13.26953125, 7.1796875, 26, 14]
+    # write-only: أبعاد الأعمدة تُكتب مع رأس الورقة — قبل أول صف
+    for i, width in enumerate(col_widths, 1):
+        ws.column_dimensions[get_column_letter(i)].width = width
 
     # ── بسم الله الرحمن الرحيم — خط أكبر، ورُفعت لأعلى بمساحة أوسع ────────────
     ws.row_dimensions[1].height = 10  # هامش علوي فارغ فوق البسملة
-    ws["A1"] = "؛"
-    ws.merge_cells(f"A2:{last_col}2")
-    ws["A2"] = "بسم الله الرحمن الرحيم"
-    ws["A2"].font = bismillah_font
-    ws["A2"].alignment = center_align
+    ws.append(["؛"])
+    _merge(2, 1, n)
     ws.row_dimensions[2].height = 30
+    ws.append([_cell("بسم الله الرحمن الرحيم", font=bismillah_font, alignment=center_align)])
 
     # فراغ فاصل واضح قبل العنوان
     ws.row_dimensions[3].height = 10
+    ws.append([])
 
     # ── العنوان الرئيسي ───────────────────────────────────────────────────────
-    ws.merge_cells(f"A4:{last_col}4")
-    ws["A4"] = "مسير إخلاء الأدوية والمستلزمات الطبية"
-    ws["A4"].font = title_font
-    ws["A4"].alignment = center_align
+    _merge(4, 1, n)
     ws.row_dimensions[4].height = 26
+    ws.append([_cell("مسير إخلاء الأدوية والمستلزمات الطبية", font=title_font, alignment=center_align)])
 
     ws.row_dimensions[5].height = 8
+    ws.append([])
 
     # ── الحقول الثلاثة — كل حقل في مجموعة أعمدة مستقلة (وليس نصاً واحداً
     # طويلاً قد يُقتَطع)، مع مساحة فارغة واضحة (خانة) بجانب كل تسمية،
@@ -126,65 +189,60 @@ def build_evacuation_excel(rows: list[dict], start_date: date, end_date: date) -
         ("رقم القيد:", "____________"),
         ("تاريخ تسليم المسير:", f"20__{_LRM}م / __ / __"),
     ]
+    band_cells = []
     for (label, blank), (c_start, c_end) in zip(band_fields, group_ranges):
         if c_end > c_start:
-            ws.merge_cells(start_row=band_row, start_column=c_start, end_row=band_row, end_column=c_end)
-        cell = ws.cell(row=band_row, column=c_start, value=f"{label}  {blank}")
-        cell.font = band_font
-        cell.alignment = center_align
-        cell.border = band_border
-        for col in range(c_start, c_end + 1):
-            ws.cell(row=band_row, column=col).fill = band_fill
-            if col != c_start:
-                ws.cell(row=band_row, column=col).border = band_border
+            _merge(band_row, c_start, c_end)
+        band_cells.append(_cell(f"{label}  {blank}", font=band_font, fill=band_fill,
+                                border=band_border, alignment=center_align))
+        for _ in range(c_start + 1, c_end + 1):
+            band_cells.append(_cell(fill=band_fill, border=band_border))
+    ws.append(band_cells)
 
     ws.row_dimensions[7].height = 10
+    ws.append([])
+    ws.append([])
+    ws.append([])
 
     header_row_idx = 10
-    for col, header in enumerate(headers, 1):
-        cell = ws.cell(row=header_row_idx, column=col, value=header)
-        cell.font = header_font
-        cell.fill = header_fill
-        cell.alignment = center_align
-        cell.border = thin_border
+    ws.append([
+        _cell(header, font=header_font, fill=header_fill, border=thin_border, alignment=center_align)
+        for header in headers
+    ])
 
     total_amount = 0.0
+    count = 0
     for i, r in enumerate(rows, start=1):
-        row_idx = header_row_idx + i
         date_str = _safe_date_text(r["date"])
         # ✅ بلا كسور عشرية (لا داعي لـ".00" في نهاية المبلغ).
         values = [i, f'{r["amount"]:,.0f}', r["name"], r["invoice_number"], r["expense_item"], r["statement"], date_str]
         total_amount += r["amount"]
+        count = i
+        row_cells = []
         for col, val in enumerate(values, 1):
-            cell = ws.cell(row=row_idx, column=col, value=val)
-            cell.font = normal_font
-            cell.border = thin_border
-            cell.alignment = center_align  # ✅ كل الأعمدة موسَّطة لمظهر أفضل وأكثر اتساقاً
+            number_format = None
             if col == len(headers):  # عمود التاريخ — نصّ صرف دائماً، لا يُعاد تفسيره كرقم
-                cell.number_format = _TEXT_FORMAT
+                number_format = _TEXT_FORMAT
             elif col == 2:  # عمود المبلغ (بلا أثر مرئي لأن القيمة نص — القيمة الفعلية بلا كسور أصلاً)
-                cell.number_format = "[$₹-439]#,##0"
+                number_format = "[$₹-439]#,##0"
+            # ✅ كل الأعمدة موسَّطة لمظهر أفضل وأكثر اتساقاً
+            row_cells.append(_cell(val, font=normal_font, border=thin_border,
+                                   alignment=center_align, number_format=number_format))
+        ws.append(row_cells)
 
     # ✅ قيمة الإجمالي تظهر تحت عمود "المبلغ" (العمود 2) تحديداً فقط —
     # لا تمتد عبر الجدول كاملاً. عمود "م" (1) يُترك فارغاً بنفس التظليل،
     # والتسمية "إجمالي المبلغ" تمتد من "الاسم" حتى "التاريخ" (الأعمدة 3-7).
-    total_row_idx = header_row_idx + len(rows) + 1
-
-    empty_cell = ws.cell(row=total_row_idx, column=1, value="")
-    empty_cell.fill = total_fill
-
-    amount_cell = ws.cell(row=total_row_idx, column=2, value=f"{total_amount:,.0f}")  # ✅ بلا كسور عشرية
-    amount_cell.font = total_font
-    amount_cell.fill = total_fill
-    amount_cell.alignment = center_align
-
-    ws.merge_cells(f"C{total_row_idx}:{last_col}{total_row_idx}")
-    label_cell = ws.cell(row=total_row_idx, column=3, value="إجمالي المبلغ")
-    label_cell.font = total_font
-    label_cell.fill = total_fill
-    label_cell.alignment = center_align
-    for col in range(4, len(headers) + 1):
-        ws.cell(row=total_row_idx, column=col).fill = total_fill
+    total_row_idx = header_row_idx + count + 1
+    _merge(total_row_idx, 3, n)
+    ws.append(
+        [
+            _cell("", fill=total_fill),
+            _cell(f"{total_amount:,.0f}", font=total_font, fill=total_fill, alignment=center_align),  # ✅ بلا كسور عشرية
+            _cell("إجمالي المبلغ", font=total_font, fill=total_fill, alignment=center_align),
+        ]
+        + [_cell(fill=total_fill) for _ in range(4, n + 1)]
+    )
 
     # ── صف تذييل التوقيعات (فارغ دائماً) ──────────────────────────────────────
     # ✅ العمود 1 (A) يظهر أقصى يمين الشاشة تلقائياً بفضل rightToLeft=True —
@@ -199,26 +257,9 @@ def build_evacuation_excel(rows: list[dict], start_date: date, end_date: date) -
     # ربع من إجمالي العرض) يضمن أن كل توقيع يحصل على مساحة كافية دائماً.
     footer_row_idx = total_row_idx + 3
     footer_labels_rtl = ["مستلم العهدة", "المراجعة", "المسؤول المالي", "مسؤول العمليات"]
-    cum = []
-    running = 0.0
-    for w in col_widths:
-        running += w
-        cum.append(running)
-    quarter = cum[-1] / 4
-    boundaries = []
-    prev = 0
-    for k in (1, 2, 3):
-        target = k * quarter
-        search_range = range(prev, n - (3 - k))
-        best_idx = min(search_range, key=lambda idx: abs(cum[idx] - target))
-        boundaries.append(best_idx)
-        prev = best_idx + 1
-    col_ranges = []
-    start = 1
-    for b in boundaries:
-        col_ranges.append((start, b + 1))
-        start = b + 2
-    col_ranges.append((start, n))
+    col_ranges = _footer_col_ranges(col_widths)
+    ws.append([])
+    ws.append([])
 
     # ✅ خط تسليم متقطّع كصفّ مستقل بذاته (وليس سطر ثانٍ عبر "\n" داخل نفس
     # الخلية) — الاعتماد على wrap_text + ارتفاع صف يدوي لعرض سطرين داخل
@@ -226,24 +267,19 @@ def build_evacuation_excel(rows: list[dict], start_date: date, end_date: date) -
     # السطر الأول فقط ويقتطع الثاني). كل صف هنا سطر واحد بسيط بارتفاعه
     # الطبيعي، فلا يعتمد على أي حساب التفاف إطلاقاً.
     dash_counts = {"مستلم العهدة": 23, "المراجعة": 20, "المسؤول المالي": 24, "مسؤول العمليات": 24}
+    label_cells, dash_cells = [None] * n, [None] * n
     for label, (c_start, c_end) in zip(footer_labels_rtl, col_ranges):
-        ws.merge_cells(start_row=footer_row_idx, start_column=c_start, end_row=footer_row_idx, end_column=c_end)
-        label_cell = ws.cell(row=footer_row_idx, column=c_start, value=label)
-        label_cell.font = footer_font
-        label_cell.alignment = center_align
-
-        ws.merge_cells(start_row=footer_row_idx + 1, start_column=c_start, end_row=footer_row_idx + 1, end_column=c_end)
-        dash_cell = ws.cell(row=footer_row_idx + 1, column=c_start, value="-" * dash_counts[label])
-        dash_cell.font = footer_font
-        dash_cell.alignment = center_align
+        _merge(footer_row_idx, c_start, c_end)
+        _merge(footer_row_idx + 1, c_start, c_end)
+        label_cells[c_start - 1] = _cell(label, font=footer_font, alignment=center_align)
+        dash_cells[c_start - 1] = _cell("-" * dash_counts[label], font=footer_font, alignment=center_align)
     ws.row_dimensions[footer_row_idx].height = 18
     ws.row_dimensions[footer_row_idx + 1].height = 18
-
-    for i, width in enumerate(col_widths, 1):
-        ws.column_dimensions[get_column_letter(i)].width = width
+    ws.append(label_cells)
+    ws.append(dash_cells)
 
     output = io.BytesIO()
     wb.save(output)
     output.seek(0)
-    logger.info(f"[pharmacy_evacuation_excel] built  rows={len(rows)}  size={output.getbuffer().nbytes:,}")
+    logger.info(f"[pharmacy_evacuation_excel] built  rows={count}  size={output.getbuffer().nbytes:,}")
     return output
@@ -8,12 +8,19 @@
     تماماً من المسير (وليس عرضاً جزئياً).
 
 نفس نمط asyncio.to_thread + SessionLocal المُثبت في reports_repository.py.
+
+المسير استعلام SQL واحد: UNION ALL لسجلات صرف الأدوية والمستلزمات، مربوطاً
+(JOIN) بسجلها المالي عبر (source_type, source_record_id) — لا قوائم
+IN (...) بكل المعرّفات (كانت تتقاطع بين النوعين وتتجاوز حد متغيرات SQLite
+في المسيرات الطويلة). الصفوف تُقرأ كتدفّق أعمدة (iter_evacuation_ledger_rows)
+فيكتبها Excel مباشرة دون تحميل المسير كاملاً في الذاكرة.
 """
 
 import asyncio
 import json
 import logging
 from datetime import date, datetime, time
+from typing import Iterator
 
 logger = logging.getLogger(__name__)
 
@@ -68,97 +75,166 @@ async def get_evacuation_ledger_rows(
     )
 
 
-def _get_evacuation_ledger_rows_sync(
+async def get_evacuation_ledger_summary(
     start_date: date, end_date: date, manifest_type: str | None = None,
-    requester_id: int | None = None, is_admin: bool = False,
+    *, requester_id: int | None = None, is_admin: bool = False,
     specialist_name: str | None = None,
-) -> list[dict]:
-    from db.session import SessionLocal
+) -> tuple[int, float]:
+    """(عدد السجلات، إجمالي المبلغ) لنفس المسير — COUNT/SUM في SQL بلا جلب الصفوف."""
+    return await asyncio.to_thread(
+        _get_evacuation_ledger_summary_sync, start_date, end_date, manifest_type,
+        requester_id, is_admin, specialist_name,
+    )
+
+
+def _ledger_select(columns_fn, start_date, end_date, manifest_type, requester_id, is_admin, specialist_name):
+    """
+    SELECT ... FROM (صرف الأدوية UNION ALL صرف المستلزمات) JOIN البيانات المالية.
+
+    columns_fn(src, fin) يعيد الأعمدة المطلوبة؛ يُعاد (stmt, src) للفرز. لكل سجل صرف أحدث سجل مالي
+    غير محذوف ومطابق لنوع المسير فقط (NOT EXISTS لسجل أحدث) — نفس نتيجة
+    القاموس القديم الذي كان يُبقي آخر سجل لكل (source_type, source_record_id).
+    """
+    from sqlalchemy import and_, literal, or_, select, union_all
+    from sqlalchemy.orm import aliased
     from db.models import MedicationRecord, SuppliesRecord, PharmacyFinancialRecord
 
     start_dt = datetime.combine(start_date, time.min)
     end_dt = datetime.combine(end_date, time.max)
     isolate = bool(requester_id) and not is_admin
 
-    rows: list[dict] = []
-    try:
-        with SessionLocal() as s:
-            med_query = s.query(MedicationRecord).filter(
-                MedicationRecord.dispense_source == _PHARMACY_SOURCE,
-                MedicationRecord.created_at >= start_dt,
-                MedicationRecord.created_at <= end_dt,
-            )
-            sup_query = s.query(SuppliesRecord).filter(
-                SuppliesRecord.dispense_source == _PHARMACY_SOURCE,
-                SuppliesRecord.created_at >= start_dt,
-                SuppliesRecord.created_at <= end_dt,
-            )
-            if isolate:
-                med_query = med_query.filter(MedicationRecord.created_by == requester_id)
-                sup_query = sup_query.filter(SuppliesRecord.created_by == requester_id)
-            if specialist_name:
-                med_query = med_query.filter(MedicationRecord.specialist_name == specialist_name)
-                sup_query = sup_query.filter(SuppliesRecord.specialist_name == specialist_name)
-            med_rows = med_query.all()
-            sup_rows = sup_query.all()
-
-            source_records = [("medication", r) for r in med_rows] + [("supplies", r) for r in sup_rows]
-            if not source_records:
-                return []
-
-            keys = {(stype, r.id) for stype, r in source_records}
-            financial_query = s.query(PharmacyFinancialRecord).filter(
-                PharmacyFinancialRecord.source_type.in_({k[0] for k in keys}),
-                PharmacyFinancialRecord.source_record_id.in_({k[1] for k in keys}),
-                # ✅ الفواتير المحذوفة (حذف ناعم) لا تظهر في المسير إطلاقاً.
-                # is_deleted قد تكون NULL في السجلات الأقدم من إضافة العمود.
-                (PharmacyFinancialRecord.is_deleted.is_(None))
-                | (PharmacyFinancialRecord.is_deleted == False),  # noqa: E712
-            )
-            if manifest_type:
-                # ✅ السجلات القديمة (قبل إضافة هذا التصنيف) لها manifest_type
-                # فارغ في القاعدة — تُعامَل كـ"A" في كل مكان آخر بالكود، لذا
-                # فلترة A تشمل أيضاً NULL حتى تبقى ظاهرة في المسير كسابقاً.
-                if manifest_type == "A":
-                    financial_query = financial_query.filter(
-                        (PharmacyFinancialRecord.manifest_type == "A")
-                        | (PharmacyFinancialRecord.manifest_type.is_(None))
-                    )
-                else:
-                    financial_query = financial_query.filter(PharmacyFinancialRecord.manifest_type == manifest_type)
-            financial_rows = financial_query.all()
-            financial_by_key = {(f.source_type, f.source_record_id): f for f in financial_rows}
-
-            for source_type, r in source_records:
-                fin = financial_by_key.get((source_type, r.id))
-                if fin is None:
-                    # لا بيانات مالية مكتملة (أو لا تطابق فلتر نوع المسير) -> استبعاد تام من المسير
-                    continue
-                statement = _format_dispense_statement(r.item_count, source_type)
-                rows.append({
-                    "amount": fin.net_amount or 0.0,
-                    "name": r.patient_name or "—",
-                    "invoice_number": fin.invoice_number or "—",
-                    "expense_item": fin.expense_item or "—",
-                    "statement": statement,
-                    # ⚠️ مصدر الحقيقة الوحيد للتاريخ هو سجل الصرف الأصلي (r =
-                    # MedicationRecord/SuppliesRecord.created_at) — أبداً
-                    # fin.created_at/fin.updated_at (التقرير المالي) ولا
-                    # datetime.now()/utcnow(). التقرير المالي يُثري سجل الصرف
-                    # ببيانات مالية فقط (فاتورة/مبلغ) ولا يُنشئ حدثاً طبياً
-                    # جديداً ولا يُغيّر تاريخه أبداً، حتى لو أُدخل أو عُدِّل
-                    # بعد يوم الصرف الفعلي بأيام. لا تُغيّر هذا السطر لاستخدام fin.*.
-                    "date": r.created_at.date() if r.created_at else start_date,
-                    "manifest_type": fin.manifest_type or "A",
-                    "_sort_dt": r.created_at or start_dt,
-                })
-
-        rows.sort(key=lambda r: r["_sort_dt"])
-        for r in rows:
-            r.pop("_sort_dt", None)
+    def _source(model, source_type):
+        conds = [
+            model.dispense_source == _PHARMACY_SOURCE,
+            model.created_at >= start_dt,
+            model.created_at <= end_dt,
+        ]
+        if isolate:
+            conds.append(model.created_by == requester_id)
+        if specialist_name:
+            conds.append(model.specialist_name == specialist_name)
+        return select(
+            literal(source_type).label("source_type"),
+            model.id.label("source_id"),
+            model.patient_name,
+            model.item_count,
+            model.created_at,
+        ).where(*conds)
+
+    src = union_all(
+        _source(MedicationRecord, "medication"),
+        _source(SuppliesRecord, "supplies"),
+    ).subquery("src")
+
+    def _financial_conds(fin):
+        # ✅ الفواتير المحذوفة (حذف ناعم) لا تظهر في المسير إطلاقاً.
+        # is_deleted قد تكون NULL في السجلات الأقدم من إضافة العمود.
+        conds = [or_(fin.is_deleted.is_(None), fin.is_deleted == False)]  # noqa: E712
+        if manifest_type == "A":
+            # ✅ السجلات القديمة (قبل إضافة هذا التصنيف) لها manifest_type
+            # فارغ في القاعدة — تُعامَل كـ"A" في كل مكان آخر بالكود، لذا
+            # فلترة A تشمل أيضاً NULL حتى تبقى ظاهرة في المسير كسابقاً.
+            conds.append(or_(fin.manifest_type == "A", fin.manifest_type.is_(None)))
+        elif manifest_type:
+            conds.append(fin.manifest_type == manifest_type)
+        return conds
+
+    fin = PharmacyFinancialRecord
+    newer = aliased(PharmacyFinancialRecord)
+    has_newer = (
+        select(newer.id)
+        .where(
+            newer.source_type == fin.source_type,
+            newer.source_record_id == fin.source_record_id,
+            newer.id > fin.id,
+            *_financial_conds(newer),
+        )
+        .exists()
+    )
+    # لا بيانات مالية مكتملة (أو لا تطابق فلتر نوع المسير) -> استبعاد تام من المسير
+    stmt = (
+        select(*columns_fn(src, fin))
+        .select_from(src)
+        .join(fin, and_(fin.source_type == src.c.source_type, fin.source_record_id == src.c.source_id))
+        .where(*_financial_conds(fin), ~has_newer)
+    )
+    return stmt, src
+
 
+def iter_evacuation_ledger_rows(
+    start_date: date, end_date: date, manifest_type: str | None = None,
+    requester_id: int | None = None, is_admin: bool = False,
+    specialist_name: str | None = None, *, batch_size: int = 1000,
+) -> Iterator[dict]:
+    """
+    صفوف المسير بالترتيب الزمني كتدفّق (نفس مفاتيح get_evacuation_ledger_rows).
+    يفتح جلسته بنفسه ويغلقها عند انتهاء التدفق — يُستهلك في خيط واحد
+    (مثل asyncio.to_thread(build_evacuation_excel, iter_evacuation_ledger_rows(...))).
+    الأخطاء تُرفع للمستهلك: ملف ناقص بصمت أسوأ من رسالة فشل.
+    """
+    from db.session import SessionLocal
+
+    stmt, src = _ledger_select(
+        lambda src, fin: (
+            src.c.source_type, src.c.patient_name, src.c.item_count, src.c.created_at,
+            fin.net_amount, fin.invoice_number, fin.expense_item, fin.manifest_type,
+        ),
+        start_date, end_date, manifest_type, requester_id, is_admin, specialist_name,
+    )
+    # نفس ترتيب الفرز القديم (الثابت): التاريخ، ثم الأدوية قبل المستلزمات، ثم المعرّف
+    stmt = stmt.order_by(src.c.created_at, src.c.source_type, src.c.source_id)
+
+    with SessionLocal() as s:
+        result = s.execute(stmt.execution_options(yield_per=batch_size))
+        for (source_type, patient_name, item_count, created_at,
+             net_amount, invoice_number, expense_item, row_manifest_type) in result:
+            yield {
+                "amount": net_amount or 0.0,
+                "name": patient_name or "—",
+                "invoice_number": invoice_number or "—",
+                "expense_item": expense_item or "—",
+                "statement": _format_dispense_statement(item_count, source_type),
+                # ⚠️ مصدر الحقيقة الوحيد للتاريخ هو سجل الصرف الأصلي (created_at
+                # من MedicationRecord/SuppliesRecord) — أبداً تاريخ التقرير
+                # المالي ولا datetime.now()/utcnow(). التقرير المالي يُثري سجل
+                # الصرف ببيانات مالية فقط (فاتورة/مبلغ) ولا يُنشئ حدثاً طبياً
+                # جديداً ولا يُغيّر تاريخه أبداً، حتى لو أُدخل أو عُدِّل بعد يوم
+                # الصرف الفعلي بأيام. لا تُغيّر هذا السطر لاستخدام أعمدة fin.
+                "date": created_at.date() if created_at else start_date,
+                "manifest_type": row_manifest_type or "A",
+            }
+
+
+def _get_evacuation_ledger_rows_sync(
+    start_date: date, end_date: date, manifest_type: str | None = None,
+    requester_id: int | None = None, is_admin: bool = False,
+    specialist_name: str | None = None,
+) -> list[dict]:
+    try:
+        return list(iter_evacuation_ledger_rows(
+            start_date, end_date, manifest_type, requester_id, is_admin, specialist_name,
+        ))
     except Exception as exc:
         logger.error(f"[pharmacy_evacuation] ledger query failed: {exc}", exc_info=True)
         return []
 
-    return rows
+
+def _get_evacuation_ledger_summary_sync(
+    start_date: date, end_date: date, manifest_type: str | None = None,
+    requester_id: int | None = None, is_admin: bool = False,
+    specialist_name: str | None = None,
+) -> tuple[int, float]:
+    from sqlalchemy import func
+    from db.session import SessionLocal
+
+    stmt, _ = _ledger_select(
+        lambda src, fin: (func.count(), func.coalesce(func.sum(func.coalesce(fin.net_amount, 0.0)), 0.0)),
+        start_date, end_date, manifest_type, requester_id, is_admin, specialist_name,
+    )
+    try:
+        with SessionLocal() as s:
+            count, total = s.execute(stmt).one()
+        return int(count or 0), float(total or 0.0)
+    except Exception as exc:
+        logger.error(f"[pharmacy_evacuation] ledger summary failed: {exc}", exc_info=True)
+        return 0, 0.0
@@ -0,0 +1,266 @@
+# services/report_analytics.py
+# Aggregate queries for the admin data-analysis wizard (and the option counts
+# of the cascading filter screens).
+#
+# The wizard used to fetch every matching report as a dict — long Text fields
+# included — and count in Python (compute_stats / aggregate_by_* /
+# aggregate_cross). Here every section is a GROUP BY / COUNT(DISTINCT) query
+# over the same filtered scope, selecting only the columns it groups on.
+# The hospital name falls back to hospitals.name through an outer join instead
+# of loading the whole Hospital table per call.
+#
+# Functions:
+#   - analyze(analysis_type, start, end, hospitals=, departments=, doctors=, actions=) → dict
+#   - get_options_in_scope(dimension, start, end, hospitals=, departments=, doctors=) → list[dict]
+#
+# Labels for empty values follow services/reports_repository.aggregate_*:
+# hospital/doctor/action → "غير محدد", department → "—".
+
+from __future__ import annotations
+
+import logging
+from datetime import date, datetime
+from typing import Optional
+
+from sqlalchemy import case, distinct, func, or_
+
+from db.async_session import run_db
+from db.models import Hospital, Report
+
+logger = logging.getLogger(__name__)
+
+UNKNOWN = "غير محدد"
+
+# اسم المستشفى الفعلي: الحقل على التقرير، وإلا hospitals.name عبر hospital_id
+HOSPITAL_NAME = func.coalesce(
+    func.nullif(func.trim(Report.hospital_name), ""),
+    func.nullif(func.trim(Hospital.name), ""),
+)
+
+DIMENSIONS = {
+    "hospital": HOSPITAL_NAME,
+    "department": func.nullif(func.trim(Report.department), ""),
+    "doctor": func.nullif(func.trim(Report.doctor_name), ""),
+    "action": func.nullif(func.trim(Report.medical_action), ""),
+}
+
+_DEFAULT_LABEL = {"hospital": UNKNOWN, "department": "—", "doctor": UNKNOWN, "action": UNKNOWN}
+
+
+def _label(dimension: str, default: Optional[str] = None):
+    return func.coalesce(DIMENSIONS[dimension], default or _DEFAULT_LABEL[dimension])
+
+
+def hospital_filter(hospitals: list[str]):
+    """hospital_name على التقرير أو اسم المستشفى المرتبط بـhospital_id (يتطلب outerjoin Hospital)."""
+    return or_(Report.hospital_name.in_(hospitals), Hospital.name.in_(hospitals))
+
+
+def scoped_query(
+    s,
+    columns,
+    start: date,
+    end: date,
+    hospitals: Optional[list[str]] = None,
+    departments: Optional[list[str]] = None,
+    doctors: Optional[list[str]] = None,
+    actions: Optional[list[str]] = None,
+):
+    """SELECT columns FROM reports LEFT JOIN hospitals WHERE <الفترة + الفلاتر>"""
+    q = (
+        s.query(*columns)
+        .select_from(Report)
+        .outerjoin(Hospital, Hospital.id == Report.hospital_id)
+        .filter(Report.report_date >= start, Report.report_date <= end)
+    )
+    if hospitals:
+        q = q.filter(hospital_filter(hospitals))
+    if departments:
+        q = q.filter(Report.department.in_(departments))
+    if doctors:
+        q = q.filter(Report.doctor_name.in_(doctors))
+    if actions:
+        q = q.filter(Report.medical_action.in_(actions))
+    return q
+
+
+# ── Sections ──────────────────────────────────────────────────────────────────
+
+def _summary(s, scope: dict) -> dict:
+    """Same keys as reports_repository.compute_stats, plus unique_doctors."""
+    row = scoped_query(
+        s,
+        (
+            func.count(Report.id),
+            func.count(distinct(Report.patient_id)),
+            func.count(distinct(HOSPITAL_NAME)),
+            func.count(distinct(func.nullif(Report.department, ""))),
+            func.count(distinct(func.nullif(Report.medical_action, ""))),
+            func.count(distinct(func.nullif(Report.translator_name, ""))),
+            func.count(distinct(func.nullif(Report.doctor_name, ""))),
+            func.min(Report.report_date),
+            func.max(Report.report_date),
+        ),
+        **scope,
+    ).one()
+    return {
+        "total": row[0],
+        "unique_patients": row[1],
+        "unique_hospitals": row[2],
+        "unique_depts": row[3],
+        "unique_actions": row[4],
+        "unique_translators": row[5],
+        "unique_doctors": row[6],
+        "first_date": row[7].date() if isinstance(row[7], datetime) else row[7],
+        "last_date": row[8].date() if isinstance(row[8], datetime) else row[8],
+    }
+
+
+def _counts_by(s, scope: dict, dimension: str) -> dict[str, int]:
+    """{label: عدد الحالات} تنازلياً — مثل aggregate_by_*"""
+    label = _label(dimension)
+    n = func.count(Report.id)
+    rows = scoped_query(s, (label, n), **scope).group_by(label).order_by(n.desc()).all()
+    return {name: count for name, count in rows}
+
+
+def _cross(s, scope: dict, dim1: str, dim2: str) -> dict[str, dict[str, int]]:
+    """{v1: {v2: count}} — مثل aggregate_cross، المستوى الأول مرتب حسب المجموع"""
+    l1, l2 = _label(dim1, UNKNOWN), _label(dim2, UNKNOWN)
+    rows = scoped_query(s, (l1, l2, func.count(Report.id)), **scope).group_by(l1, l2).all()
+    agg: dict[str, dict[str, int]] = {}
+    for v1, v2, count in rows:
+        agg.setdefault(v1, {})[v2] = count
+    return {
+        v1: dict(sorted(inner.items(), key=lambda x: -x[1]))
+        for v1, inner in sorted(agg.items(), key=lambda x: -sum(x[1].values()))
+    }
+
+
+def _patients_by(s, scope: dict, dimension: str) -> dict[str, int]:
+    """{label: عدد المرضى الفريدين}"""
+    label = _label(dimension, UNKNOWN)
+    n = func.count(distinct(Report.patient_id))
+    rows = (
+        scoped_query(s, (label, n), **scope)
+        .filter(Report.patient_id.isnot(None))
+        .group_by(label)
+        .order_by(n.desc())
+        .all()
+    )
+    return {name: count for name, count in rows}
+
+
+def _patient_counts(s, scope: dict, start: date) -> dict[str, int]:
+    """المرضى ضمن النطاق، ومنهم "الجدد": أول تقرير لهم على الإطلاق يقع ضمن الفترة."""
+    in_scope = (
+        scoped_query(s, (Report.patient_id,), **scope)
+        .filter(Report.patient_id.isnot(None))
+        .distinct()
+        .subquery()
+    )
+    first_seen = (
+        s.query(Report.patient_id, func.min(Report.report_date).label("first_date"))
+        .filter(Report.patient_id.in_(s.query(in_scope.c.patient_id)))
+        .group_by(Report.patient_id)
+        .subquery()
+    )
+    start_dt = datetime.combine(start, datetime.min.time())
+    total, new = s.query(
+        func.count(),
+        func.coalesce(func.sum(case((first_seen.c.first_date >= start_dt, 1), else_=0)), 0),
+    ).select_from(first_seen).one()
+    return {"total": total, "new": new, "returning": total - new}
+
+
+def _analyze_sync(analysis_type: str, start: date, end: date, **filters) -> dict:
+    from db.session import ReadSessionLocal
+
+    scope = {"start": start, "end": end, **filters}
+    with ReadSessionLocal() as s:
+        result = {"stats": _summary(s, scope)}
+        if not result["stats"]["total"]:
+            return result
+
+        if analysis_type in ("hospitals", "system"):
+            result["hospitals"] = _counts_by(s, scope, "hospital")
+        if analysis_type in ("departments", "system"):
+            result["departments"] = _counts_by(s, scope, "department")
+        if analysis_type in ("doctors", "system"):
+            result["doctors"] = _counts_by(s, scope, "doctor")
+        if analysis_type in ("actions", "system"):
+            result["actions"] = _counts_by(s, scope, "action")
+
+        if analysis_type == "departments":
+            result["cross"] = {"department_action": _cross(s, scope, "department", "action")}
+        elif analysis_type == "doctors":
+            result["cross"] = {"doctor_action": _cross(s, scope, "doctor", "action")}
+        elif analysis_type == "actions":
+            result["cross"] = {
+                "action_hospital": _cross(s, scope, "action", "hospital"),
+                "action_doctor": _cross(s, scope, "action", "doctor"),
+            }
+        elif analysis_type == "patients":
+            result["patients"] = _patient_counts(s, scope, start)
+            result["patients_by_hospital"] = _patients_by(s, scope, "hospital")
+            result["patients_by_department"] = _patients_by(s, scope, "department")
+    return result
+
+
+async def analyze(
+    analysis_type: str,
+    start: date,
+    end: date,
+    hospitals: Optional[list[str]] = None,
+    departments: Optional[list[str]] = None,
+    doctors: Optional[list[str]] = None,
+    actions: Optional[list[str]] = None,
+) -> dict:
+    """
+    كل أقسام نوع التحليل المطلوب في جلسة قراءة واحدة.
+
+    {"stats": {...}} دائماً؛ والباقي حسب النوع: hospitals / departments /
+    doctors / actions ({label: count})، cross ({name: {v1: {v2: count}}})،
+    patients ({total, new, returning}) و patients_by_hospital / _department.
+    """
+    return await run_db(
+        _analyze_sync, analysis_type, start, end,
+        hospitals=hospitals, departments=departments, doctors=doctors, actions=actions,
+    )
+
+
+# ── Cascading filter options ──────────────────────────────────────────────────
+
+def _options_in_scope_sync(dimension: str, start: date, end: date, **filters) -> list[dict]:
+    from db.session import ReadSessionLocal
+
+    value = DIMENSIONS[dimension]
+    n = func.count(Report.id)
+    try:
+        with ReadSessionLocal() as s:
+            rows = (
+                scoped_query(s, (value, n), start, end, **filters)
+                .filter(value.isnot(None))
+                .group_by(value)
+                .order_by(n.desc())
+                .all()
+            )
+    except Exception as exc:
+        logger.error(f"[analytics] options_in_scope({dimension}) failed: {exc}", exc_info=True)
+        return []
+    return [{"name": name, "count": count} for name, count in rows]
+
+
+async def get_options_in_scope(
+    dimension: str,
+    start: date,
+    end: date,
+    hospitals: Optional[list[str]] = None,
+    departments: Optional[list[str]] = None,
+    doctors: Optional[list[str]] = None,
+) -> list[dict]:
+    """الخيارات التي لها حالات ضمن الفترة + الفلاتر السابقة، مع العدد. [{"name", "count"}]"""
+    return await run_db(
+        _options_in_scope_sync, dimension, start, end,
+        hospitals=hospitals, departments=departments, doctors=doctors,
+    )
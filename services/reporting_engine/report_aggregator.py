@@ -5,8 +5,6 @@
 
 import logging
 from typing import Dict, List, Any
-from collections import defaultdict
-from datetime import datetime
 
 logger = logging.getLogger(__name__)
 
@@ -27,45 +25,27 @@ class ReportAggregator:
         """
         logger.info(f"📊 تجميع البيانات: {report_type}")
         
-        reports = raw_data.get("reports", [])
+        # العدّ نفسه تم في SQL (ReportDataCollector) — هنا فقط إعادة التشكيل
+        counts = raw_data.get("counts", {})
         
         aggregated = {
-            "total_records": len(reports),
-            "hospitals": self._aggregate_by_field(reports, "hospital_name"),
-            "departments": self._aggregate_by_field(reports, "department"),
-            "medical_actions": self._aggregate_by_field(reports, "medical_action"),
-            "doctors": self._aggregate_by_field(reports, "doctor_name"),
-            "translators": self._aggregate_by_field(reports, "translator_name"),
-            "by_date": self._aggregate_by_date(reports),
-            "raw_reports": raw_data.get("raw_reports", []),
+            "total_records": raw_data.get("total_records", 0),
+            "hospitals": self._sorted_counts(counts.get("hospitals")),
+            "departments": self._sorted_counts(counts.get("departments")),
+            "medical_actions": self._sorted_counts(counts.get("medical_actions")),
+            "doctors": self._sorted_counts(counts.get("doctors")),
+            "translators": self._sorted_counts(counts.get("translators")),
+            "by_date": dict(sorted((raw_data.get("by_date") or {}).items())),
+            "distinct": raw_data.get("distinct", {}),
         }
         
         logger.info(f"✅ تم تجميع البيانات بنجاح")
         return aggregated
     
     @staticmethod
-    def _aggregate_by_field(reports: List[Any], field: str) -> Dict[str, int]:
-        """تجميع السجلات حسب حقل معين"""
-        aggregation = defaultdict(int)
-        
-        for report in reports:
-            value = getattr(report, field, None)
-            if value:
-                aggregation[value] += 1
-        
-        return dict(sorted(aggregation.items(), key=lambda x: x[1], reverse=True))
-    
-    @staticmethod
-    def _aggregate_by_date(reports: List[Any]) -> Dict[str, int]:
-        """تجميع السجلات حسب التاريخ"""
-        date_aggregation = defaultdict(int)
-        
-        for report in reports:
-            if report.report_date:
-                date_key = report.report_date.strftime("%Y-%m-%d")
-                date_aggregation[date_key] += 1
-        
-        return dict(sorted(date_aggregation.items()))
+    def _sorted_counts(counts: Dict[str, int] | None) -> Dict[str, int]:
+        """ترتيب التوزيع تنازلياً حسب العدد"""
+        return dict(sorted((counts or {}).items(), key=lambda x: x[1], reverse=True))
     
     def prepare_charts_data(self, aggregated: Dict[str, Any]) -> Dict[str, Any]:
         """
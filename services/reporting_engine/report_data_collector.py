@@ -4,8 +4,8 @@
 # ================================================
 
 import logging
-from typing import List, Dict, Any
-from sqlalchemy import func
+from typing import List, Dict, Any, Iterator
+from sqlalchemy import func, distinct
 
 from db.session import SessionLocal
 from db.models import Report, Patient, Hospital, Department, Doctor
@@ -14,9 +14,50 @@ from shared.report_constants import ReportType
 
 logger = logging.getLogger(__name__)
 
+# الأعمدة التي تُعدّ لأقسام التوزيع (المفتاح = اسم القسم في aggregated)
+COUNT_FIELDS = {
+    "hospitals": Report.hospital_name,
+    "departments": Report.department,
+    "medical_actions": Report.medical_action,
+    "doctors": Report.doctor_name,
+    "translators": Report.translator_name,
+}
+
+# أعمدة الجداول التفصيلية — صفوف خفيفة بدل كائن Report كامل (~100 عمود)
+DETAIL_COLUMNS = (
+    Report.id,
+    Report.patient_name,
+    Report.patient_id,
+    Report.hospital_name,
+    Report.hospital_id,
+    Report.department,
+    Report.department_id,
+    Report.doctor_name,
+    Report.doctor_id,
+    Report.translator_name,
+    Report.translator_id,
+    Report.medical_action,
+    Report.report_date,
+    Report.visit_date,
+    Report.complaint_text,
+    Report.doctor_decision,
+    Report.diagnosis,
+    Report.treatment_plan,
+    Report.notes,
+)
+
+DETAIL_BATCH_SIZE = 1000
+
 
 class ReportDataCollector:
-    """جمع البيانات الخام من قاعدة البيانات"""
+    """
+    جمع البيانات من قاعدة البيانات
+
+    العدّ والتوزيعات والتسلسل الزمني تُحسب في SQL (GROUP BY على نفس سلسلة
+    الفلاتر) — لا تُحمَّل صفوف التقارير إلى الذاكرة. الجداول التفصيلية تُقرأ
+    عبر iter_detail_rows() على دفعات (yield_per)، فالذاكرة ثابتة مهما طال
+    نطاق التقرير.
+    """
     
     def __init__(self):
         self.session = None
@@ -42,35 +83,42 @@ class ReportDataCollector:
             **kwargs: معاملات إضافية
             
         Returns:
-            dict with raw data
+            dict with aggregated counts (total_records, counts, by_date, distinct)
         """
         logger.info(f"🔍 جمع البيانات للتقرير: {report_type.value}")
         
         db = self._get_session()
         
         try:
-            # بناء الاستعلام الأساسي
-            query = db.query(Report)
-            
-            # تطبيق الفلاتر
-            query = filters.apply(query)
-            
-            # جلب البيانات
-            reports = query.all()
-            
-            logger.info(f"✅ تم جمع {len(reports)} تقرير")
+            # الاستعلام الأساسي بعد الفلاتر — كل التجميعات تُبنى عليه
+            base = filters.apply(db.query(Report))
+
+            data = self._collect_counts(base)
+            logger.info(f"✅ تم جمع {data['total_records']} تقرير")
             
-            # تجميع البيانات حسب نوع التقرير
+            # معرّفات إضافية حسب نوع التقرير
             if report_type == ReportType.GLOBAL:
-                return self._collect_global_data(reports)
+                data.update(self._distinct_ids(
+                    base, patient_ids=Report.patient_id, hospital_ids=Report.hospital_id,
+                    department_ids=Report.department_id, medical_actions=Report.medical_action,
+                ))
             elif report_type == ReportType.PATIENT:
-                return self._collect_patient_data(reports, kwargs.get("patient_id"))
+                data["patient_id"] = kwargs.get("patient_id")
+                data.update(self._distinct_ids(
+                    base, hospital_ids=Report.hospital_id,
+                    department_ids=Report.department_id, medical_actions=Report.medical_action,
+                ))
             elif report_type == ReportType.HOSPITAL:
-                return self._collect_hospital_data(reports, kwargs.get("hospital_id"))
+                data["hospital_id"] = kwargs.get("hospital_id")
+                data.update(self._distinct_ids(
+                    base, patient_ids=Report.patient_id, department_ids=Report.department_id,
+                ))
             elif report_type == ReportType.TRANSLATOR:
-                return self._collect_translator_data(reports, kwargs.get("translator_id"))
-            else:
-                return self._collect_generic_data(reports)
+                data["translator_id"] = kwargs.get("translator_id")
+                data.update(self._distinct_ids(
+                    base, patient_ids=Report.patient_id, hospital_ids=Report.hospital_id,
+                ))
+            return data
         
         except Exception as e:
             logger.error(f"❌ خطأ في جمع البيانات: {e}")
@@ -81,86 +129,88 @@ class ReportDataCollector:
                 self.session.close()
                 self.session = None
     
-    def _collect_global_data(self, reports: List[Report]) -> Dict[str, Any]:
-        """جمع البيانات لتقرير عام/شامل"""
-        logger.info("📊 جمع بيانات التقرير الشامل")
-        
-        return {
-            "reports": reports,
-            "raw_reports": [self._serialize_report(r) for r in reports],
-            "patient_ids": list(set(r.patient_id for r in reports if r.patient_id)),
-            "hospital_ids": list(set(r.hospital_id for r in reports if r.hospital_id)),
-            "department_ids": list(set(r.department_id for r in reports if r.department_id)),
-            "medical_actions": list(set(r.medical_action for r in reports if r.medical_action)),
-        }
-    
-    def _collect_patient_data(self, reports: List[Report], patient_id: int) -> Dict[str, Any]:
-        """جمع البيانات لتقرير مريض"""
-        logger.info(f"👤 جمع بيانات تقرير المريض: {patient_id}")
-        
-        return {
-            "reports": reports,
-            "raw_reports": [self._serialize_report(r) for r in reports],
-            "patient_id": patient_id,
-            "hospital_ids": list(set(r.hospital_id for r in reports if r.hospital_id)),
-            "department_ids": list(set(r.department_id for r in reports if r.department_id)),
-            "medical_actions": list(set(r.medical_action for r in reports if r.medical_action)),
-        }
-    
-    def _collect_hospital_data(self, reports: List[Report], hospital_id: int) -> Dict[str, Any]:
-        """جمع البيانات لتقرير مستشفى"""
-        logger.info(f"🏥 جمع بيانات تقرير المستشفى: {hospital_id}")
-        
+    @staticmethod
+    def _collect_counts(base) -> Dict[str, Any]:
+        """الإجمالي + التوزيعات + التوزيع اليومي، كلها GROUP BY في قاعدة البيانات"""
+        totals = base.with_entities(
+            func.count(Report.id),
+            func.count(distinct(Report.patient_id)),
+            func.count(distinct(func.nullif(Report.doctor_name, ""))),
+            func.count(distinct(func.nullif(Report.translator_name, ""))),
+        ).one()
+
+        counts = {}
+        for key, column in COUNT_FIELDS.items():
+            n = func.count(Report.id)
+            rows = (
+                base.with_entities(column, n)
+                .filter(column.isnot(None), column != "")
+                .group_by(column)
+                .order_by(n.desc(), column)
+                .all()
+            )
+            counts[key] = {value: count for value, count in rows}
+
+        day = func.date(Report.report_date)
+        by_date = {}
+        for value, count in (
+            base.with_entities(day, func.count(Report.id))
+            .filter(Report.report_date.isnot(None))
+            .group_by(day)
+            .order_by(day)
+            .all()
+        ):
+            # SQLite تُرجع نصاً 'YYYY-MM-DD'، PostgreSQL تُرجع date
+            by_date[value if isinstance(value, str) else value.isoformat()] = count
+
         return {
-            "reports": reports,
-            "raw_reports": [self._serialize_report(r) for r in reports],
-            "hospital_id": hospital_id,
-            "patient_ids": list(set(r.patient_id for r in reports if r.patient_id)),
-            "department_ids": list(set(r.department_id for r in reports if r.department_id)),
+            "total_records": totals[0],
+            "counts": counts,
+            "by_date": by_date,
+            "distinct": {
+                "patients": totals[1],
+                "doctors": totals[2],
+                "translators": totals[3],
+            },
         }
     
-    def _collect_translator_data(self, reports: List[Report], translator_id: int) -> Dict[str, Any]:
-        """جمع البيانات لتقرير مترجم"""
-        logger.info(f"👨‍💼 جمع بيانات تقرير المترجم: {translator_id}")
-        
-        return {
-            "reports": reports,
-            "raw_reports": [self._serialize_report(r) for r in reports],
-            "translator_id": translator_id,
-            "patient_ids": list(set(r.patient_id for r in reports if r.patient_id)),
-            "hospital_ids": list(set(r.hospital_id for r in reports if r.hospital_id)),
-        }
+    @staticmethod
+    def _distinct_ids(base, **columns) -> Dict[str, list]:
+        """SELECT DISTINCT لكل عمود — بدل set() على كل التقارير"""
+        out = {}
+        for key, column in columns.items():
+            rows = base.with_entities(column).filter(column.isnot(None)).distinct().all()
+            out[key] = [value for (value,) in rows if value]
+        return out
     
-    def _collect_generic_data(self, reports: List[Report]) -> Dict[str, Any]:
-        """جمع بيانات عامة"""
-        logger.info("📋 جمع بيانات عامة")
-        
-        return {
-            "reports": reports,
-            "raw_reports": [self._serialize_report(r) for r in reports],
-        }
+    def iter_detail_rows(
+        self,
+        filters: CompositeFilter,
+        batch_size: int = DETAIL_BATCH_SIZE,
+    ) -> Iterator[Dict[str, Any]]:
+        """
+        صفوف الجدول التفصيلي كقواميس، تُقرأ من قاعدة البيانات على دفعات.
+
+        مولِّد: الجلسة تبقى مفتوحة حتى نهاية التكرار (أو إغلاقه).
+        """
+        db = SessionLocal()
+        try:
+            query = (
+                filters.apply(db.query(Report))
+                .with_entities(*DETAIL_COLUMNS)
+                .order_by(Report.report_date, Report.id)
+                .yield_per(batch_size)
+            )
+            for row in query:
+                yield self._serialize_row(row)
+        finally:
+            db.close()
     
     @staticmethod
-    def _serialize_report(report: Report) -> Dict[str, Any]:
-        """تحويل تقرير إلى قاموس"""
-        return {
-            "id": report.id,
-            "patient_name": report.patient_name,
-            "patient_id": report.patient_id,
-            "hospital_name": report.hospital_name,
-            "hospital_id": report.hospital_id,
-            "department": report.department,
-            "department_id": report.department_id,
-            "doctor_name": report.doctor_name,
-            "doctor_id": report.doctor_id,
-            "translator_name": report.translator_name,
-            "translator_id": report.translator_id,
-            "medical_action": report.medical_action,
-            "report_date": report.report_date.isoformat() if report.report_date else None,
-            "visit_date": report.visit_date.isoformat() if report.visit_date else None,
-            "complaint_text": report.complaint_text,
-            "doctor_decision": report.doctor_decision,
-            "diagnosis": report.diagnosis,
-            "treatment_plan": report.treatment_plan,
-            "notes": report.notes,
-        }
+    def _serialize_row(row) -> Dict[str, Any]:
+        """تحويل صف (tuple بأعمدة DETAIL_COLUMNS) إلى قاموس"""
+        data = row._asdict()
+        for key in ("report_date", "visit_date"):
+            value = data.get(key)
+            data[key] = value.isoformat() if value else None
+        return data
@@ -67,7 +67,7 @@ class ReportEngine:
             logger.info("📊 المرحلة 1: جمع البيانات")
             raw_data = self.data_collector.collect(report_type, filters, **kwargs)
             
-            if not raw_data or not raw_data.get("reports"):
+            if not raw_data or not raw_data.get("total_records"):
                 logger.warning("⚠️ لا توجد بيانات للتقرير")
                 return self._create_empty_report(report_type, title, subtitle, filters)
             
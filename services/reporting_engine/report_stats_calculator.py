@@ -40,16 +40,16 @@ class ReportStatsCalculator:
         hospitals = aggregated.get("hospitals", {})
         departments = aggregated.get("departments", {})
         medical_actions = aggregated.get("medical_actions", {})
-        reports = aggregated.get("raw_reports", [])
+        distinct = aggregated.get("distinct", {})
         
         return {
             "total_records": aggregated.get("total_records", 0),
             "total_hospitals": len(hospitals),
             "total_departments": len(departments),
             "total_medical_actions": len(medical_actions),
-            "total_unique_patients": len(set(r.get("patient_id") for r in reports if r.get("patient_id"))),
-            "total_unique_doctors": len(set(r.get("doctor_name") for r in reports if r.get("doctor_name"))),
-            "total_unique_translators": len(set(r.get("translator_name") for r in reports if r.get("translator_name"))),
+            "total_unique_patients": distinct.get("patients", 0),
+            "total_unique_doctors": distinct.get("doctors", 0),
+            "total_unique_translators": distinct.get("translators", 0),
         }
     
     @staticmethod
@@ -102,6 +102,7 @@ def _get_patients_sync(query_text: str) -> list[dict]:
     """Search patients by name fragment."""
     from db.session import SessionLocal
     from db.models import Patient
+    from db.patient_search import patients_in_order, search_patient_ids
     from sqlalchemy import func
 
     results = []
@@ -110,17 +111,22 @@ def _get_patients_sync(query_text: str) -> list[dict]:
     try:
         with SessionLocal() as s:
             try:
-                patients = (
-                    s.query(Patient)
-                    .filter(func.lower(Patient.full_name).contains(q) | func.lower(Patient.name).contains(q))
-                    .order_by(Patient.full_name)
-                    .limit(50)
-                    .all()
-                )
+                # فهرس FTS5 أولاً؛ None ⇒ الجدول غير متاح فنعود لـLIKE
+                ids = search_patient_ids(s, q, limit=50) if q else None
+                if ids is not None:
+                    patients = patients_in_order(s, ids)
+                else:
+                    patients = (
+                        s.query(Patient)
+                        .filter(func.lower(Patient.full_name).contains(q))
+                        .order_by(Patient.full_name)
+                        .limit(50)
+                        .all()
+                    )
                 for p in patients:
                     results.append({
                         "id": p.id,
-                        "name": p.full_name or p.name or "—",
+                        "name": p.full_name or "—",
                         "file_number": getattr(p, "file_number", "") or "",
                     })
             except Exception:
@@ -162,13 +168,20 @@ def _get_reports_sync(
     """Fetch reports with optional filtering."""
     from db.session import SessionLocal
     from db.models import Report, Hospital
+    from services.report_analytics import hospital_filter
 
     results = []
     try:
         with SessionLocal() as s:
-            q = s.query(Report).filter(
-                Report.report_date >= start,
-                Report.report_date <= end,
+            # اسم المستشفى المرتبط بـhospital_id عبر outer join — للعرض عندما
+            # يكون hospital_name فارغاً على التقرير، ولفلتر المستشفيات
+            q = (
+                s.query(Report, Hospital.name)
+                .outerjoin(Hospital, Hospital.id == Report.hospital_id)
+                .filter(
+                    Report.report_date >= start,
+                    Report.report_date <= end,
+                )
             )
 
             if patient_id:
@@ -183,28 +196,14 @@ def _get_reports_sync(
             if doctors:
                 q = q.filter(Report.doctor_name.in_(doctors))
 
-            # Build a hospital_id -> name mapping (used both for display fallback
-            # below and for resolving the "hospitals" filter, since hospital_name
-            # is sometimes empty on the report row itself).
-            hospital_rows = s.query(Hospital).all()
-            hospital_map = {h.id: h.name for h in hospital_rows if h.id and h.name}
-
             if hospitals:
-                hospitals_set = set(hospitals)
-                matching_ids = [hid for hid, hname in hospital_map.items() if hname in hospitals_set]
-                from sqlalchemy import or_
-                cond = Report.hospital_name.in_(hospitals)
-                if matching_ids:
-                    cond = or_(cond, Report.hospital_id.in_(matching_ids))
-                q = q.filter(cond)
+                q = q.filter(hospital_filter(hospitals))
 
             rows = q.order_by(Report.report_date.asc()).all()
 
-            for r in rows:
-                # Get hospital name - try report field first, then lookup table
-                hospital_name = r.hospital_name or ""
-                if not hospital_name and r.hospital_id:
-                    hospital_name = hospital_map.get(r.hospital_id, "")
+            for r, linked_hospital_name in rows:
+                # Get hospital name - try report field first, then the linked hospital
+                hospital_name = r.hospital_name or linked_hospital_name or ""
 
                 results.append({
                     "id":              r.id,
@@ -234,81 +233,21 @@ def _get_reports_sync(
 
 # ── Sync implementations: scoped "available options" queries ───────────────────
 
-def _get_hospitals_in_scope_sync(start: date, end: date) -> list[dict]:
-    """المستشفيات التي لها حالات فعلياً ضمن الفترة، مع العدد لكل واحدة.
-
-    يعتمد على hospital_name المُقيَّم مباشرة على التقرير (المصدر المستخدم في
-    كل مكان آخر بالمشروع)، مع استكمال الاسم عبر hospital_id → Hospital.name
-    عندما يكون hospital_name فارغاً على صف التقرير نفسه (نفس منطق fallback
-    المستخدم أصلاً في _get_reports_sync لعرض اسم المستشفى).
-    """
-    from db.session import SessionLocal
-    from db.models import Report, Hospital
-    from collections import defaultdict
-
-    counts: dict[str, int] = defaultdict(int)
-    try:
-        with SessionLocal() as s:
-            hospital_map = {h.id: h.name for h in s.query(Hospital).all() if h.id and h.name}
-
-            rows = (
-                s.query(Report.hospital_name, Report.hospital_id)
-                .filter(Report.report_date >= start, Report.report_date <= end)
-                .all()
-            )
-            for hname, hid in rows:
-                name = (hname or "").strip()
-                if not name and hid:
-                    name = hospital_map.get(hid, "")
-                if name:
-                    counts[name] += 1
-    except Exception as exc:
-        logger.error(f"[reports_repo] get_hospitals_in_scope failed: {exc}", exc_info=True)
-        return []
+# نفس استعلام GROUP BY في services/report_analytics (مع outer join على
+# hospitals لاستكمال اسم المستشفى الفارغ على صف التقرير).
 
-    return [
-        {"name": name, "count": cnt}
-        for name, cnt in sorted(counts.items(), key=lambda x: -x[1])
-    ]
+def _get_hospitals_in_scope_sync(start: date, end: date) -> list[dict]:
+    """المستشفيات التي لها حالات فعلياً ضمن الفترة، مع العدد لكل واحدة."""
+    from services.report_analytics import _options_in_scope_sync
+    return _options_in_scope_sync("hospital", start, end)
 
 
 def _get_departments_in_scope_sync(
     start: date, end: date, hospitals: Optional[list[str]] = None
 ) -> list[dict]:
     """الأقسام ضمن الفترة + المستشفيات المختارة (إن وُجدت)، مع العدد."""
-    from db.session import SessionLocal
-    from db.models import Report, Hospital
-    from collections import defaultdict
-
-    counts: dict[str, int] = defaultdict(int)
-    try:
-        with SessionLocal() as s:
-            q = s.query(Report.department).filter(
-                Report.report_date >= start,
-                Report.report_date <= end,
-                Report.department.isnot(None),
-                Report.department != "",
-            )
-            if hospitals:
-                hospital_map = {h.id: h.name for h in s.query(Hospital).all() if h.id and h.name}
-                matching_ids = [hid for hid, hname in hospital_map.items() if hname in set(hospitals)]
-                from sqlalchemy import or_
-                cond = Report.hospital_name.in_(hospitals)
-                if matching_ids:
-                    cond = or_(cond, Report.hospital_id.in_(matching_ids))
-                q = q.filter(cond)
-
-            for (dept,) in q.all():
-                if dept:
-                    counts[dept.strip()] += 1
-    except Exception as exc:
-        logger.error(f"[reports_repo] get_departments_in_scope failed: {exc}", exc_info=True)
-        return []
-
-    return [
-        {"name": name, "count": cnt}
-        for name, cnt in sorted(counts.items(), key=lambda x: -x[1])
-    ]
+    from services.report_analytics import _options_in_scope_sync
+    return _options_in_scope_sync("department", start, end, hospitals=hospitals)
 
 
 def _get_doctors_in_scope_sync(
@@ -317,41 +256,8 @@ def _get_doctors_in_scope_sync(
     departments: Optional[list[str]] = None,
 ) -> list[dict]:
     """الأطباء ضمن الفترة + المستشفيات + الأقسام المختارة (إن وُجدت)، مع العدد."""
-    from db.session import SessionLocal
-    from db.models import Report, Hospital
-    from collections import defaultdict
-
-    counts: dict[str, int] = defaultdict(int)
-    try:
-        with SessionLocal() as s:
-            q = s.query(Report.doctor_name).filter(
-                Report.report_date >= start,
-                Report.report_date <= end,
-                Report.doctor_name.isnot(None),
-                Report.doctor_name != "",
-            )
-            if hospitals:
-                hospital_map = {h.id: h.name for h in s.query(Hospital).all() if h.id and h.name}
-                matching_ids = [hid for hid, hname in hospital_map.items() if hname in set(hospitals)]
-                from sqlalchemy import or_
-                cond = Report.hospital_name.in_(hospitals)
-                if matching_ids:
-                    cond = or_(cond, Report.hospital_id.in_(matching_ids))
-                q = q.filter(cond)
-            if departments:
-                q = q.filter(Report.department.in_(departments))
-
-            for (doc,) in q.all():
-                if doc:
-                    counts[doc.strip()] += 1
-    except Exception as exc:
-        logger.error(f"[reports_repo] get_doctors_in_scope failed: {exc}", exc_info=True)
-        return []
-
-    return [
-        {"name": name, "count": cnt}
-        for name, cnt in sorted(counts.items(), key=lambda x: -x[1])
-    ]
+    from services.report_analytics import _options_in_scope_sync
+    return _options_in_scope_sync("doctor", start, end, hospitals=hospitals, departments=departments)
 
 
 def _get_actions_in_scope_sync(
@@ -361,43 +267,10 @@ def _get_actions_in_scope_sync(
     doctors: Optional[list[str]] = None,
 ) -> list[dict]:
     """أنواع الإجراءات ضمن الفترة + كل الفلاتر السابقة (إن وُجدت)، مع العدد."""
-    from db.session import SessionLocal
-    from db.models import Report, Hospital
-    from collections import defaultdict
-
-    counts: dict[str, int] = defaultdict(int)
-    try:
-        with SessionLocal() as s:
-            q = s.query(Report.medical_action).filter(
-                Report.report_date >= start,
-                Report.report_date <= end,
-                Report.medical_action.isnot(None),
-                Report.medical_action != "",
-            )
-            if hospitals:
-                hospital_map = {h.id: h.name for h in s.query(Hospital).all() if h.id and h.name}
-                matching_ids = [hid for hid, hname in hospital_map.items() if hname in set(hospitals)]
-                from sqlalchemy import or_
-                cond = Report.hospital_name.in_(hospitals)
-                if matching_ids:
-                    cond = or_(cond, Report.hospital_id.in_(matching_ids))
-                q = q.filter(cond)
-            if departments:
-                q = q.filter(Report.department.in_(departments))
-            if doctors:
-                q = q.filter(Report.doctor_name.in_(doctors))
-
-            for (action,) in q.all():
-                if action:
-                    counts[action.strip()] += 1
-    except Exception as exc:
-        logger.error(f"[reports_repo] get_actions_in_scope failed: {exc}", exc_info=True)
-        return []
-
-    return [
-        {"name": name, "count": cnt}
-        for name, cnt in sorted(counts.items(), key=lambda x: -x[1])
-    ]
+    from services.report_analytics import _options_in_scope_sync
+    return _options_in_scope_sync(
+        "action", start, end, hospitals=hospitals, departments=departments, doctors=doctors
+    )
 
 
 def _get_patient_departments_sync(patient_id: int) -> list[dict]:
@@ -4,56 +4,92 @@
 # ================================================
 
 import logging
-from datetime import datetime, date, time
+from datetime import datetime, date
 from db.session import SessionLocal
 from db.models import (
     DailyReportTracking, TranslatorNotification,
     Translator, Report
 )
+from sqlalchemy import func, insert, update
 from telegram import Bot
 from shared.text_safety import escape_markdown_v1
 from config.settings import BOT_TOKEN
+from services.send_scheduler import Priority, fan_out
 import asyncio
 
 logger = logging.getLogger(__name__)
 
+
+def _tracking_rows(s, target_date, *filters):
+    """
+    سجلات تتبع اليوم مع المترجم وعدد تقاريره النشطة — استعلام واحد بدل
+    استعلامَين لكل سجل. المترجم = أول مستخدم بنفس translator_name.
+
+    Rows: id, translator_name, expected_reports, actual_reports, user_id, tg_user_id, reports
+    """
+    first_user = (
+        s.query(Translator.full_name.label("name"), func.min(Translator.id).label("id"))
+        .group_by(Translator.full_name)
+        .subquery()
+    )
+    counts = (
+        s.query(Report.translator_id.label("tid"), func.count(Report.id).label("n"))
+        .filter(Report.status == "active", Report.ist_day == target_date.isoformat())
+        .group_by(Report.translator_id)
+        .subquery()
+    )
+    return (
+        s.query(
+            DailyReportTracking.id,
+            DailyReportTracking.translator_name,
+            DailyReportTracking.expected_reports,
+            DailyReportTracking.actual_reports,
+            Translator.id.label("user_id"),
+            Translator.tg_user_id,
+            func.coalesce(counts.c.n, 0).label("reports"),
+        )
+        .outerjoin(first_user, first_user.c.name == DailyReportTracking.translator_name)
+        .outerjoin(Translator, Translator.id == first_user.c.id)
+        .outerjoin(counts, counts.c.tid == Translator.id)
+        .filter(DailyReportTracking.date == target_date, *filters)
+        .order_by(DailyReportTracking.id)
+        .all()
+    )
+
+
 class ScheduleTracker:
     """نظام تتبع التقارير اليومية للمترجمين"""
     
-    def __init__(self):
-        self.bot = Bot(token=BOT_TOKEN)
+    def __init__(self, bot=None):
+        self._bot = bot
+    
+    @property
+    def bot(self):
+        # يُنشأ عند أول إرسال — استيراد الوحدة لا يتطلب BOT_TOKEN
+        if self._bot is None:
+            self._bot = Bot(token=BOT_TOKEN)
+        return self._bot
     
     async def update_daily_reports_count(self):
         """تحديث عدد التقارير الفعلية للمترجمين"""
         today = date.today()
         
         with SessionLocal() as s:
-            # جلب جميع سجلات التتبع لليوم
-            tracking_records = s.query(DailyReportTracking).filter_by(date=today).all()
-            
-            for record in tracking_records:
-                # البحث عن المترجم
-                translator = s.query(Translator).filter_by(full_name=record.translator_name).first()
-                
-                if translator:
-                    # عد التقارير التي رفعها المترجم اليوم
-                    today_reports = s.query(Report).filter(
-                        Report.translator_id == translator.id,
-                        Report.report_date >= datetime.combine(today, time.min),
-                        Report.report_date <= datetime.combine(today, time.max)
-                    ).count()
-                    
-                    # تحديث العدد الفعلي
-                    record.actual_reports = today_reports
-                    
-                    # تحديث حالة الإنجاز
-                    if today_reports >= record.expected_reports:
-                        record.is_completed = True
-                    else:
-                        record.is_completed = False
-                    
-                    record.updated_at = datetime.now()
+            # سجلات تتبع اليوم مع عدد تقارير كل مترجم — استعلام واحد
+            rows = _tracking_rows(s, today)
             
+            # تحديث العدد الفعلي وحالة الإنجاز دفعة واحدة (المترجم غير الموجود يُتخطّى)
+            updates = [
+                {
+                    "id": row.id,
+                    "actual_reports": row.reports,
+                    "is_completed": row.reports >= (row.expected_reports or 0),
+                }
+                for row in rows
+                if row.user_id is not None
+            ]
+            if updates:
+                s.execute(update(DailyReportTracking), updates)
             s.commit()
     
     async def check_and_send_reminders(self):
@@ -71,103 +107,87 @@ class ScheduleTracker:
     
     async def _send_afternoon_reminders(self, target_date):
         """إرسال تذكيرات بعد الظهر"""
-        with SessionLocal() as s:
-            # البحث عن المترجمين الذين لم يكملوا تقاريرهم ولم يتم إرسال تذكير لهم
-            incomplete_records = s.query(DailyReportTracking).filter(
-                DailyReportTracking.date == target_date,
-                DailyReportTracking.is_completed == False,
-                DailyReportTracking.reminder_sent == False
-            ).all()
-            
-            for record in incomplete_records:
-                # البحث عن المترجم
-                translator = s.query(Translator).filter_by(full_name=record.translator_name).first()
-                
-                if translator:
-                    # ✅ اسم المترجم نص حر (يُدخله الأدمن عند الإنشاء) — تهريب
-                    # Markdown قبل حشره في رسالة parse_mode='Markdown' يمنع
-                    # BadRequest عند وجود محرف `_ * `` [` غير متزاوج.
-                    safe_name = escape_markdown_v1(record.translator_name or "")
-                    # إرسال التذكير
-                    message = (
-                        f"🔔 **تذكير بعد الظهر**\n\n"
-                        f"مرحباً {safe_name}\n\n"
-                        f"📅 التاريخ: {target_date.strftime('%Y-%m-%d')}\n"
-                        f"📝 التقارير المطلوبة: {record.expected_reports}\n"
-                        f"📊 التقارير المرفوعة: {record.actual_reports}\n\n"
-                        f"⚠️ يرجى رفع التقارير المتبقية قبل الساعة 6:00 مساءً"
-                    )
-                    
-                    try:
-                        await self.bot.send_message(
-                            chat_id=translator.tg_user_id,
-                            text=message,
-                            parse_mode='Markdown'
-                        )
-                        
-                        # تسجيل التذكير
-                        notification = TranslatorNotification(
-                            translator_name=record.translator_name,
-                            notification_type="reminder",
-                            message=message,
-                            is_sent=True,
-                            sent_at=datetime.now()
-                        )
-                        s.add(notification)
-                        
-                        # تحديث سجل التتبع
-                        record.reminder_sent = True
-                        
-                    except Exception as e:
-                        logger.error(f"❌ فشل إرسال تذكير لـ {record.translator_name}: {e}")
-            
-            s.commit()
+        # المترجمون الذين لم يكملوا تقاريرهم ولم يتم إرسال تذكير لهم
+        await self._send_reminders(
+            target_date,
+            "reminder",
+            "🔔 **تذكير بعد الظهر**",
+            "⚠️ يرجى رفع التقارير المتبقية قبل الساعة 6:00 مساءً",
+            DailyReportTracking.reminder_sent == False,  # noqa: E712
+        )
     
     async def _send_final_reminders(self, target_date):
         """إرسال تذكيرات نهائية"""
+        # المترجمون الذين لم يكملوا تقاريرهم
+        await self._send_reminders(
+            target_date,
+            "final_reminder",
+            "🚨 **تذكير نهائي**",
+            "⚠️ هذا تذكير نهائي لرفع التقارير المتبقية",
+        )
+    
+    async def _send_reminders(self, target_date, notification_type, title, footer, *filters):
+        """
+        قراءة واحدة للسجلات غير المكتملة، إرسال متوازٍ عبر send_scheduler، ثم
+        كتابة الإشعارات وعلامة reminder_sent دفعة واحدة.
+        """
         with SessionLocal() as s:
-            # البحث عن المترجمين الذين لم يكملوا تقاريرهم
-            incomplete_records = s.query(DailyReportTracking).filter(
-                DailyReportTracking.date == target_date,
-                DailyReportTracking.is_completed == False
-            ).all()
-            
-            for record in incomplete_records:
-                # البحث عن المترجم
-                translator = s.query(Translator).filter_by(full_name=record.translator_name).first()
-                
-                if translator:
-                    safe_name = escape_markdown_v1(record.translator_name or "")
-                    # إرسال التذكير النهائي
-                    message = (
-                        f"🚨 **تذكير نهائي**\n\n"
-                        f"مرحباً {safe_name}\n\n"
-                        f"📅 التاريخ: {target_date.strftime('%Y-%m-%d')}\n"
-                        f"📝 التقارير المطلوبة: {record.expected_reports}\n"
-                        f"📊 التقارير المرفوعة: {record.actual_reports}\n\n"
-                        f"⚠️ هذا تذكير نهائي لرفع التقارير المتبقية"
-                    )
-                    
-                    try:
-                        await self.bot.send_message(
-                            chat_id=translator.tg_user_id,
-                            text=message,
-                            parse_mode='Markdown'
-                        )
-                        
-                        # تسجيل التذكير
-                        notification = TranslatorNotification(
-                            translator_name=record.translator_name,
-                            notification_type="final_reminder",
-                            message=message,
-                            is_sent=True,
-                            sent_at=datetime.now()
-                        )
-                        s.add(notification)
-                        
-                    except Exception as e:
-                        logger.error(f"❌ فشل إرسال تذكير نهائي لـ {record.translator_name}: {e}")
-            
+            rows = [
+                row for row in _tracking_rows(s, target_date, DailyReportTracking.is_completed == False, *filters)  # noqa: E712
+                if row.tg_user_id
+            ]
+        if not rows:
+            return
+        
+        messages = []
+        for row in rows:
+            # ✅ اسم المترجم نص حر (يُدخله الأدمن عند الإنشاء) — تهريب
+            # Markdown قبل حشره في رسالة parse_mode='Markdown' يمنع
+            # BadRequest عند وجود محرف `_ * `` [` غير متزاوج.
+            safe_name = escape_markdown_v1(row.translator_name or "")
+            messages.append(
+                f"{title}\n\n"
+                f"مرحباً {safe_name}\n\n"
+                f"📅 التاريخ: {target_date.strftime('%Y-%m-%d')}\n"
+                f"📝 التقارير المطلوبة: {row.expected_reports}\n"
+                f"📊 التقارير المرفوعة: {row.actual_reports}\n\n"
+                f"{footer}"
+            )
+        
+        results = await fan_out(
+            [
+                (row.tg_user_id, lambda row=row, message=message: self.bot.send_message(
+                    chat_id=row.tg_user_id, text=message, parse_mode='Markdown'
+                ))
+                for row, message in zip(rows, messages)
+            ],
+            priority=Priority.NORMAL,
+        )
+        
+        sent_at = datetime.now()
+        notifications, reminded = [], []
+        for row, message, result in zip(rows, messages, results):
+            if isinstance(result, Exception):
+                logger.error(f"❌ فشل إرسال {notification_type} لـ {row.translator_name}: {result}")
+                continue
+            notifications.append({
+                "translator_id": row.user_id,
+                "translator_name": row.translator_name,
+                "notification_type": notification_type,
+                "notification_text": message,
+                "created_at": sent_at,
+            })
+            reminded.append(row.id)
+        if not notifications:
+            return
+        
+        with SessionLocal() as s:
+            # تسجيل التذكيرات
+            s.execute(insert(TranslatorNotification), notifications)
+            # تحديث سجلات التتبع
+            s.query(DailyReportTracking).filter(DailyReportTracking.id.in_(reminded)).update(
+                {DailyReportTracking.reminder_sent: True}, synchronize_session=False
+            )
             s.commit()
     
     async def send_daily_summary_to_admin(self):
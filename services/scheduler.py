@@ -129,15 +129,17 @@ async def _pending_reports_daily_job(app):
         print(f"Error in pending reports daily job: {e}")
 
 async def _sqlite_quick_backup_job():
-    """مهمة النسخ الاحتياطي السريع كل 10 دقائق (نسخة محلية فقط — لا يوجد استخدام لـGCS في هذا النشر)"""
+    """مهمة النسخ الاحتياطي السريع كل 10 دقائق — تزايدية: تُكتب القطع المتغيرة فقط"""
     try:
-        # النسخة المحلية الآمنة (SQLite backup API + integrity_check)
-        from services.render_backup import create_local_backup
-        backup_path = await asyncio.to_thread(create_local_backup, "quick")
-        if backup_path:
-            print(f"Local quick backup completed: {backup_path}")
-        else:
-            print("Local quick backup failed")
+        # لقطة متسقة عبر SQLite backup API + قطع مُعنوَنة بالمحتوى (services/incremental_backup.py)
+        from services.incremental_backup import backup
+        manifest = await asyncio.to_thread(backup, None, None, "quick")
+        metrics = manifest["metrics"]
+        print(
+            f"Incremental quick backup completed: {manifest['id']} "
+            f"({metrics['chunks_written']}/{metrics['chunks_total']} chunks, "
+            f"{metrics['bytes_written'] / 1024:.1f} KB written)"
+        )
     except Exception as e:
         print(f"Error in quick backup: {e}")
 
@@ -161,6 +163,14 @@ async def _sqlite_daily_backup_job():
         else:
             print("Local daily backup failed")
 
+        # تحقق يومي من أحدث نسخة في الأرشيف التزايدي (تدفّق القطع + البصمات)
+        from services.incremental_backup import verify
+        try:
+            result = await asyncio.to_thread(verify)
+            print(f"Backup archive verify {result['id']}: {'ok' if result['ok'] else result['error']}")
+        except FileNotFoundError:
+            print("Backup archive is empty — nothing to verify")
+
         # في أول يوم من الشهر: أنشئ أرشيف الشهر السابق
         now = datetime.utcnow()
         if now.day == 1:
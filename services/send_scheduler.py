@@ -0,0 +1,381 @@
+# ================================================
+# services/send_scheduler.py
+# 🔹 Outbound Telegram send scheduler (rate-limit aware)
+# ================================================
+#
+# البث للمجموعة والأدمن والمستخدمين كان `await` واحداً تلو الآخر، بلا أي
+# وعي بحدود Telegram (≈30 رسالة/ث إجمالاً، ≈1/ث للمحادثة الخاصة، ≈20/د
+# للمجموعة). نشر تقرير لـN مستلم = N رحلة ذهاب وعودة متتالية، وأي
+# RetryAfter يُبتلَع كفشل.
+#
+# هنا مسار إرسال مركزي واحد:
+#   • دلو توكنات عام + دلو لكل محادثة (خاص/مجموعة بمعدلات مختلفة)
+#   • إرسال متزامن عبر المحادثات (حتى SEND_MAX_CONCURRENCY طلباً معاً)،
+#     ومتسلسل داخل المحادثة الواحدة — أجزاء الرسالة الطويلة تصل بترتيبها
+#   • RetryAfter ⇒ المحادثة تُجمَّد المدة المطلوبة والطلب يُعاد لرأس طابورها
+#   • أولويات: بطاقات التقارير قبل الرسائل العادية قبل الملخصات والبث الجماعي
+#   • مقاييس: مُرسَل/فاشل/أُعيد، عمق الطابور، p50/p95 من الإدراج للتسليم
+#
+#     from services.send_scheduler import send, fan_out, Priority
+#
+#     msg = await send(lambda: bot.send_message(chat_id, text), chat_id,
+#                      priority=Priority.REPORT)
+#     results = await fan_out([(cid, lambda cid=cid: bot.send_message(cid, text))
+#                              for cid in ADMIN_IDS], priority=Priority.DIGEST)
+#     results = await send_to_admins(bot, text, Priority.DIGEST)   # نفس النص لكل الأدمن
+#
+# `call` دالة بلا وسائط تُرجع awaitable جديداً في كل استدعاء (تُعاد عند
+# RetryAfter) — لا تمرّر coroutine جاهزة.
+
+import asyncio
+import heapq
+import itertools
+import logging
+import os
+import time
+from collections import deque
+from datetime import timedelta
+from enum import IntEnum
+from typing import Any, Awaitable, Callable, Iterable, Optional, TypeVar
+
+from telegram.constants import ParseMode
+from telegram.error import BadRequest, RetryAfter
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+# حدود Telegram الموثّقة مع هامش أمان
+SEND_GLOBAL_RATE = float(os.getenv("SEND_GLOBAL_RATE", "25"))          # رسالة/ث لكل البوت
+SEND_PRIVATE_RATE = float(os.getenv("SEND_PRIVATE_RATE", "1"))         # رسالة/ث لكل محادثة خاصة
+SEND_PRIVATE_BURST = float(os.getenv("SEND_PRIVATE_BURST", "3"))
+SEND_GROUP_RATE = float(os.getenv("SEND_GROUP_RATE", str(20 / 60)))    # 20 رسالة/د لكل مجموعة
+SEND_GROUP_BURST = float(os.getenv("SEND_GROUP_BURST", "10"))
+SEND_MAX_CONCURRENCY = int(os.getenv("SEND_MAX_CONCURRENCY", "16"))
+SEND_MAX_RETRIES = int(os.getenv("SEND_MAX_RETRIES", "3"))
+
+
+class Priority(IntEnum):
+    REPORT = 0   # بطاقة التقرير ومرفقاته
+    NORMAL = 1   # نسخ الأدمن/المستخدم، تنبيهات فردية
+    DIGEST = 2   # ملخصات يومية، بث جماعي (جدول اليوم، حالات أولية)
+
+
+class TokenBucket:
+    """Classic token bucket; `delay()` says how long until one token is available."""
+
+    __slots__ = ("rate", "capacity", "tokens", "updated", "blocked_until")
+
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = max(1.0, capacity)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self.blocked_until = 0.0
+
+    def _refill(self, now: float) -> None:
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def delay(self, now: Optional[float] = None) -> float:
+        now = time.monotonic() if now is None else now
+        self._refill(now)
+        wait = 0.0 if self.tokens >= 1 else (1 - self.tokens) / self.rate
+        return max(wait, self.blocked_until - now)
+
+    def take(self) -> None:
+        self.tokens -= 1
+
+    def block(self, seconds: float) -> None:
+        """RetryAfter: nothing leaves this bucket for `seconds`."""
+        self.blocked_until = max(self.blocked_until, time.monotonic() + seconds)
+        self.tokens = 0
+
+
+class _Job:
+    __slots__ = ("call", "chat_id", "priority", "future", "queued_at", "attempts", "seq", "started")
+
+    def __init__(self, call, chat_id, priority, future, seq):
+        self.call = call
+        self.chat_id = chat_id
+        self.priority = int(priority)
+        self.future = future
+        self.queued_at = time.perf_counter()
+        self.attempts = 0
+        self.seq = seq
+        self.started = False
+
+
+def _chat_key(chat_id):
+    """"-100123" و -100123 نفس المحادثة — مفتاح واحد للطابور والدلو."""
+    try:
+        return int(chat_id)
+    except (TypeError, ValueError):
+        return chat_id
+
+
+def retry_after_seconds(exc: RetryAfter) -> float:
+    """مدة RetryAfter بالثواني (PTB يعيدها رقماً أو timedelta حسب الإصدار)."""
+    value = exc.retry_after
+    if isinstance(value, timedelta):
+        return value.total_seconds()
+    return float(value)
+
+
+class SendScheduler:
+    """Per-loop dispatcher: per-chat FIFO queues, priority across chats."""
+
+    def __init__(
+        self,
+        global_rate: float = SEND_GLOBAL_RATE,
+        max_concurrency: int = SEND_MAX_CONCURRENCY,
+        max_retries: int = SEND_MAX_RETRIES,
+    ):
+        self.global_bucket = TokenBucket(global_rate, global_rate)
+        self.max_retries = max_retries
+        self._slots = asyncio.Semaphore(max(1, max_concurrency))
+        self._chat_buckets: dict = {}
+        self._chat_queues: dict = {}
+        self._busy: set = set()            # محادثات لها طلب قيد التنفيذ
+        self._ready: list = []             # heap: (priority, seq, chat_id)
+        self._seq = itertools.count()
+        self._wakeup = asyncio.Event()
+        self._dispatcher: Optional[asyncio.Task] = None
+        self._tasks: set = set()
+
+        self._stats = {"submitted": 0, "sent": 0, "failed": 0, "retried": 0, "max_queue_depth": 0}
+        self._latency_samples: deque = deque(maxlen=1000)
+
+    # ── Submission ────────────────────────────────────────────────────────
+
+    def submit(
+        self,
+        call: Callable[[], Awaitable[T]],
+        chat_id,
+        priority: Priority = Priority.NORMAL,
+    ) -> "asyncio.Future[T]":
+        chat_id = _chat_key(chat_id)
+        future = asyncio.get_running_loop().create_future()
+        job = _Job(call, chat_id, priority, future, next(self._seq))
+        queue = self._chat_queues.setdefault(chat_id, deque())
+        queue.append(job)
+        if len(queue) == 1 and chat_id not in self._busy:
+            self._mark_ready(chat_id)
+
+        self._stats["submitted"] += 1
+        depth = self.queue_depth()
+        if depth > self._stats["max_queue_depth"]:
+            self._stats["max_queue_depth"] = depth
+        self._ensure_dispatcher()
+        return future
+
+    async def send(self, call: Callable[[], Awaitable[T]], chat_id,
+                   priority: Priority = Priority.NORMAL) -> T:
+        return await self.submit(call, chat_id, priority)
+
+    async def fan_out(self, items, priority: Priority = Priority.NORMAL) -> list:
+        """[(chat_id, call), ...] → results in the same order (exceptions returned, not raised)."""
+        futures = [self.submit(call, chat_id, priority) for chat_id, call in items]
+        return await asyncio.gather(*futures, return_exceptions=True)
+
+    # ── Dispatch ──────────────────────────────────────────────────────────
+
+    def _mark_ready(self, chat_id) -> None:
+        queue = self._chat_queues.get(chat_id)
+        if not queue:
+            return
+        head = queue[0]
+        heapq.heappush(self._ready, (head.priority, head.seq, chat_id))
+        self._wakeup.set()
+
+    def _bucket_for(self, chat_id) -> TokenBucket:
+        bucket = self._chat_buckets.get(chat_id)
+        if bucket is None:
+            # معرّفات المجموعات سالبة في Telegram
+            is_group = isinstance(chat_id, int) and chat_id < 0
+            bucket = (
+                TokenBucket(SEND_GROUP_RATE, SEND_GROUP_BURST) if is_group
+                else TokenBucket(SEND_PRIVATE_RATE, SEND_PRIVATE_BURST)
+            )
+            self._chat_buckets[chat_id] = bucket
+        return bucket
+
+    def _ensure_dispatcher(self) -> None:
+        if self._dispatcher is None or self._dispatcher.done():
+            self._dispatcher = asyncio.get_running_loop().create_task(self._dispatch_loop())
+
+    async def _dispatch_loop(self) -> None:
+        loop = asyncio.get_running_loop()
+        while True:
+            if not self._ready:
+                self._wakeup.clear()
+                await self._wakeup.wait()
+                continue
+
+            _, _, chat_id = heapq.heappop(self._ready)
+            chat_wait = self._bucket_for(chat_id).delay()
+            if chat_wait > 0:
+                # المحادثة ليست جاهزة بعد — لا تحجز غيرها خلفها
+                loop.call_later(chat_wait, self._mark_ready, chat_id)
+                continue
+
+            global_wait = self.global_bucket.delay()
+            if global_wait > 0:
+                self._mark_ready(chat_id)
+                await asyncio.sleep(global_wait)
+                continue
+
+            await self._slots.acquire()
+            job = self._chat_queues[chat_id].popleft()
+            self.global_bucket.take()
+            self._bucket_for(chat_id).take()
+            self._busy.add(chat_id)
+            job.started = False
+            task = loop.create_task(self._run(job))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+            task.add_done_callback(lambda t, job=job: self._on_task_done(job, t))
+
+    async def _run(self, job: _Job) -> None:
+        chat_id = job.chat_id
+        job.started = True
+        try:
+            job.attempts += 1
+            result = await job.call()
+        except RetryAfter as exc:
+            seconds = retry_after_seconds(exc)
+            self._bucket_for(chat_id).block(seconds)
+            if job.attempts <= self.max_retries:
+                self._stats["retried"] += 1
+                logger.warning(f"[send] RetryAfter {seconds:.0f}s for chat {chat_id} — requeued")
+                self._chat_queues[chat_id].appendleft(job)
+            else:
+                self._finish(job, exc=exc)
+        except Exception as exc:
+            self._finish(job, exc=exc)
+        except BaseException:
+            # CancelledError (إيقاف البوت) وما شابه: المنتظر يُلغى بدل أن يبقى معلّقاً
+            self._stats["failed"] += 1
+            if not job.future.done():
+                job.future.cancel()
+            raise
+        else:
+            self._finish(job, result=result)
+        finally:
+            self._release(chat_id)
+
+    def _on_task_done(self, job: _Job, task: "asyncio.Task") -> None:
+        # مهمة أُلغيت قبل أن تبدأ لا تدخل _run: لا finally ولا إلغاء للمنتظر —
+        # نحرّر مقعدها ومحادثتها هنا
+        if job.started or not task.cancelled():
+            return
+        self._stats["failed"] += 1
+        if not job.future.done():
+            job.future.cancel()
+        self._release(job.chat_id)
+
+    def _release(self, chat_id) -> None:
+        self._slots.release()
+        self._busy.discard(chat_id)
+        queue = self._chat_queues.get(chat_id)
+        if queue:
+            self._mark_ready(chat_id)
+        elif queue is not None:
+            del self._chat_queues[chat_id]
+
+    def _finish(self, job: _Job, result: Any = None, exc: Optional[BaseException] = None) -> None:
+        self._latency_samples.append(time.perf_counter() - job.queued_at)
+        if exc is None:
+            self._stats["sent"] += 1
+            if not job.future.done():
+                job.future.set_result(result)
+        else:
+            self._stats["failed"] += 1
+            if not job.future.done():
+                job.future.set_exception(exc)
+
+    # ── Metrics ───────────────────────────────────────────────────────────
+
+    def queue_depth(self) -> int:
+        return sum(len(q) for q in self._chat_queues.values())
+
+    def stats(self) -> dict:
+        from db.async_session import _percentile
+
+        samples = list(self._latency_samples)
+        return {
+            **self._stats,
+            "queue_depth": self.queue_depth(),
+            "in_flight": len(self._busy),
+            "latency_p50_ms": _percentile(samples, 50) * 1000,
+            "latency_p95_ms": _percentile(samples, 95) * 1000,
+        }
+
+
+_scheduler: Optional[SendScheduler] = None
+_scheduler_loop = None
+
+
+def get_send_scheduler() -> SendScheduler:
+    """Scheduler bound to the running loop (recreated if the loop changes — tests, scripts)."""
+    global _scheduler, _scheduler_loop
+    loop = asyncio.get_running_loop()
+    if _scheduler is None or _scheduler_loop is not loop:
+        _scheduler = SendScheduler()
+        _scheduler_loop = loop
+    return _scheduler
+
+
+async def send(call: Callable[[], Awaitable[T]], chat_id,
+               priority: Priority = Priority.NORMAL) -> T:
+    """Send one request through the scheduler and wait for its result."""
+    return await get_send_scheduler().send(call, chat_id, priority)
+
+
+async def fan_out(items, priority: Priority = Priority.NORMAL) -> list:
+    """Send to many chats concurrently; returns results/exceptions in order."""
+    return await get_send_scheduler().fan_out(items, priority)
+
+
+async def send_to_admins(bot, text: str, priority: Priority = Priority.NORMAL, *,
+                         parse_mode: Optional[str] = ParseMode.MARKDOWN,
+                         chunks: Optional[Iterable[str]] = None,
+                         admin_ids: Optional[Iterable] = None) -> list:
+    """
+    نفس النص لكل الأدمن معاً — آخر رسالة أو الاستثناء لكل أدمن، بترتيب ADMIN_IDS.
+
+    النص الطويل يُرسَل أجزاءً بترتيبها (chunks، أو text.chunks لبطاقة
+    التقرير المقسَّمة مسبقاً). جزء يرفضه Telegram كـMarkdown (BadRequest)
+    يُعاد بلا تنسيق.
+    """
+    if admin_ids is None:
+        from config.settings import ADMIN_IDS
+        admin_ids = ADMIN_IDS
+    parts = list(chunks or getattr(text, "chunks", None) or [text])
+    scheduler = get_send_scheduler()
+
+    async def _one(admin_id):
+        last = None
+        for part in parts:
+            try:
+                last = await scheduler.send(
+                    lambda part=part: bot.send_message(chat_id=admin_id, text=part, parse_mode=parse_mode),
+                    admin_id, priority,
+                )
+            except BadRequest as exc:
+                if parse_mode is None:
+                    raise
+                logger.warning(f"[send] admin {admin_id}: {parse_mode} rejected ({exc}) — sending plain")
+                last = await scheduler.send(
+                    lambda part=part: bot.send_message(chat_id=admin_id, text=part),
+                    admin_id, priority,
+                )
+        return last
+
+    return await asyncio.gather(*[_one(admin_id) for admin_id in admin_ids], return_exceptions=True)
+
+
+def send_scheduler_stats() -> dict:
+    if _scheduler is None:
+        return {"submitted": 0, "sent": 0, "failed": 0, "retried": 0, "queue_depth": 0}
+    return _scheduler.stats()
@@ -108,13 +108,9 @@ class SQLiteBackupService:
             blob = self.bucket.blob(blob_path)
             blob.upload_from_filename(upload_source)
             
-            # Also save as "latest" for easy recovery
-            latest_blob = self.bucket.blob(f"backups/latest_{backup_type}.db")
-            latest_blob.upload_from_filename(upload_source)
-            
-            # Save as persistent database (for automatic restore on redeploy)
-            persistent_blob = self.bucket.blob("persistent/medical_reports.db")
-            persistent_blob.upload_from_filename(upload_source)
+            # "latest" و persistent: نسخ داخل GCS (server-side) بدل رفع الملف 3 مرات
+            self.bucket.copy_blob(blob, self.bucket, f"backups/latest_{backup_type}.db")
+            self.bucket.copy_blob(blob, self.bucket, "persistent/medical_reports.db")
             
             logger.info(f"✅ Backup completed successfully!")
             logger.info(f"   📁 File: gs://{BUCKET_NAME}/{blob_path}")
@@ -22,6 +22,7 @@ import sqlite3
 from datetime import datetime, date, timedelta
 from sqlalchemy import text
 from db.session import DATABASE_PATH
+from db.report_rollup import EFF_HOUR_IST_FOR_LATE_SQL, NO_NAME, ROLLUP_TABLE, rollup_ready
 
 logger = logging.getLogger(__name__)
 
@@ -63,38 +64,9 @@ def normalize_action_name(s) -> str:
     t = _TRAILING_PUNCT.sub("", t)
     return t.strip()
 
-# ساعة 0–23 بالـ IST لاحتساب «بعد 8 مساءً» في SQLite (نفس ترتيب المنطق في Python)
-_EFF_HOUR_IST_FOR_LATE_SQL = """(
-    CASE
-        WHEN r.report_date IS NOT NULL AND (
-             CAST(strftime('%H', r.report_date) AS INTEGER) != 0
-             OR CAST(strftime('%M', r.report_date) AS INTEGER) != 0
-        )
-        THEN CAST(strftime('%H', r.report_date) AS INTEGER)
-        WHEN r.visit_time IS NOT NULL AND length(trim(r.visit_time)) >= 3
-             AND instr(trim(r.visit_time), ':') > 0
-        THEN (
-            CASE
-                WHEN (
-                    lower(trim(r.visit_time)) LIKE '%pm%'
-                    OR trim(r.visit_time) LIKE '%مساء%'
-                )
-                AND CAST(substr(trim(r.visit_time), 1, instr(trim(r.visit_time), ':') - 1) AS INTEGER) < 12
-                THEN CAST(substr(trim(r.visit_time), 1, instr(trim(r.visit_time), ':') - 1) AS INTEGER) + 12
-
-                WHEN (
-                    lower(trim(r.visit_time)) LIKE '%am%'
-                    OR trim(r.visit_time) LIKE '%صباح%'
-                )
-                AND CAST(substr(trim(r.visit_time), 1, instr(trim(r.visit_time), ':') - 1) AS INTEGER) = 12
-                THEN 0
-
-                ELSE CAST(substr(trim(r.visit_time), 1, instr(trim(r.visit_time), ':') - 1) AS INTEGER)
-            END
-        )
-        ELSE CAST(strftime('%H', datetime(r.created_at, '+5 hours', '+30 minutes')) AS INTEGER)
-    END
-)"""
+# ساعة 0–23 بالـ IST لاحتساب «بعد 8 مساءً» — التعريف في db/report_rollup.py
+# (يستخدمه الـtrigger أيضاً)
+_EFF_HOUR_IST_FOR_LATE_SQL = EFF_HOUR_IST_FOR_LATE_SQL
 
 
 def _effective_ist_hour_for_late(visit_time, report_date, created_at):
@@ -165,157 +137,17 @@ def _run_translator_query(session, start_date_str: str, end_date_str: str):
     الاستعلام المركزي الوحيد - يُستدعى داخلياً فقط.
     لا يجب استدعاؤه مباشرة من خارج هذا الملف.
 
+    يُجاب من جدول report_daily_rollup (db/report_rollup.py) إن وُجد، وإلا
+    بالمسح الخام لجدول reports — نفس التعريف ونفس النتيجة.
+
     Returns:
         list[dict] - قائمة بإحصائيات كل مترجم
     """
     try:
-        # ═══ الاستعلام الرسمي الوحيد ═══
-        # ✅ استخدام TranslatorDirectory كمرجع أساسي لتوحيد الأسماء
-        # ✅ تحويل created_at من UTC إلى التوقيت المحلي (UTC+5:30) قبل مقارنة الساعة
-        # ✅ استخدام COALESCE(report_date, created_at) لضمان عدم فقدان تقارير بدون report_date
-        # ✅ التجميع بالاسم (لتوحيد المترجمين الذين لهم أكثر من translator_id)
-        # ✅ WHERE مزدوج: report_date OR created_at بتوقيت IST
-        # لأن التقارير القديمة (قبل إصلاح التوقيت) قد تكون report_date بـ UTC
-        sql = text(f"""
-            SELECT
-                MIN(r.translator_id) as translator_id,
-                COALESCE(td.name, r.translator_name, 'مترجم #' || r.translator_id) as translator_name,
-                COUNT(*) as total_reports,
-                COUNT(
-                    DISTINCT DATE(
-                        CASE
-                            WHEN r.created_at IS NOT NULL
-                            THEN datetime(r.created_at, '+5 hours', '+30 minutes')
-                            ELSE r.report_date
-                        END
-                    )
-                ) as attendance_days,
-                SUM(
-                    CASE WHEN {_EFF_HOUR_IST_FOR_LATE_SQL} >= 20
-                    THEN 1 ELSE 0 END
-                ) as late_reports,
-                SUM(CASE WHEN r.has_paper_report = 1 THEN 1 ELSE 0 END) as paper_yes,
-                SUM(CASE WHEN r.has_paper_report = 0 THEN 1 ELSE 0 END) as paper_no,
-                SUM(CASE WHEN r.has_paper_report = 2 THEN 1 ELSE 0 END) as paper_pending
-            FROM reports r
-            LEFT JOIN translators td ON r.translator_id = td.translator_id
-            WHERE (
-                (COALESCE(r.report_date, r.created_at) >= :start AND COALESCE(r.report_date, r.created_at) < :end)
-                OR (DATE(datetime(r.created_at, '+5 hours', '+30 minutes')) >= :start AND DATE(datetime(r.created_at, '+5 hours', '+30 minutes')) < :end)
-            )
-            AND r.status = 'active'
-            AND r.translator_id IS NOT NULL
-            GROUP BY COALESCE(td.name, r.translator_name)
-            ORDER BY total_reports DESC
-        """)
-
-        rows = session.execute(sql, {"start": start_date_str, "end": end_date_str}).fetchall()
-
-        # ═══ LOG: عدد المترجمين والتقارير ═══
-        logger.info(f"📊 stats_service: range=[{start_date_str} → {end_date_str}], translators={len(rows)}")
-        for row in rows:
-            logger.info(f"   ├ tid={row[0]}, name={row[1]}, reports={row[2]}, days={row[3]}, late={row[4]}, paper_yes={row[5]}, paper_no={row[6]}, paper_pending={row[7]}")
-
-        # ═══ شرط التاريخ الموحّد (يلتقط التقارير القديمة المحفوظة بـ UTC أيضاً) ═══
-        _DATE_FILTER = """(
-            (COALESCE(r.report_date, r.created_at) >= :start AND COALESCE(r.report_date, r.created_at) < :end)
-            OR (DATE(datetime(r.created_at, '+5 hours', '+30 minutes')) >= :start AND DATE(datetime(r.created_at, '+5 hours', '+30 minutes')) < :end)
-        )"""
-
-        # ═══ LOG: إجمالي التقارير بدون تجميع ═══
-        count_sql = text(f"""
-            SELECT COUNT(*) FROM reports r
-            WHERE {_DATE_FILTER}
-            AND r.status = 'active'
-        """)
-        total_all = session.execute(count_sql, {"start": start_date_str, "end": end_date_str}).scalar()
-
-        count_with_tid = text(f"""
-            SELECT COUNT(*) FROM reports r
-            WHERE {_DATE_FILTER}
-            AND r.status = 'active'
-            AND r.translator_id IS NOT NULL
-        """)
-        total_with_tid = session.execute(count_with_tid, {"start": start_date_str, "end": end_date_str}).scalar()
-
-        count_no_tid = text(f"""
-            SELECT COUNT(*) FROM reports r
-            WHERE {_DATE_FILTER}
-            AND r.status = 'active'
-            AND r.translator_id IS NULL
-        """)
-        total_no_tid = session.execute(count_no_tid, {"start": start_date_str, "end": end_date_str}).scalar()
-
-        logger.info(f"📊 stats_service: total_all={total_all}, with_tid={total_with_tid}, without_tid={total_no_tid}")
-
-        # ═══ استعلام تفصيل الإجراءات (مجمّع بالاسم) ═══
-        action_sql = text(f"""
-            SELECT
-                COALESCE(td.name, r.translator_name) as tname,
-                COALESCE(r.medical_action, 'أخرى') as action_type,
-                COUNT(*) as action_count
-            FROM reports r
-            LEFT JOIN translators td ON r.translator_id = td.translator_id
-            WHERE {_DATE_FILTER}
-            AND r.status = 'active'
-            AND r.translator_id IS NOT NULL
-            GROUP BY tname, action_type
-        """)
-
-        action_rows = session.execute(action_sql, {"start": start_date_str, "end": end_date_str}).fetchall()
-
-        # تجميع الإجراءات حسب الاسم (مع تطبيع المفاتيح لمنع التكرار بسبب مسافات/خطوط زخرفية)
-        action_map = {}
-        for row in action_rows:
-            tname = row[0]
-            action_type = normalize_action_name(row[1]) or "أخرى"
-            count = row[2]
-            if tname not in action_map:
-                action_map[tname] = {}
-            action_map[tname][action_type] = action_map[tname].get(action_type, 0) + count
-
-        # بناء النتيجة النهائية
-        results = []
-        for row in rows:
-            tid = row[0]
-            name = row[1]
-            total = row[2]
-            attendance_days = row[3]  # الأيام التي رفع فيها تقارير فعلاً
-            late = row[4] or 0
-            paper_yes = int(row[5] or 0)
-            paper_no = int(row[6] or 0)
-            paper_pending = int(row[7] or 0)
-            work_days = attendance_days
-
-            # بناء action_breakdown مع ضمان وجود كل الأنواع الـ 13
-            # ✅ البحث بالاسم (لتوحيد المترجمين ذوي الأكثر من ID)
-            # ✅ توحيد المفاتيح: strip + دمج المسافات المتعددة لمنع تكرار مثل
-            #    "تأجيل موعد" و"تأجيل موعد " (نفس النص لكن بفراغ لاحق)
-            raw_actions = action_map.get(name, {})
-            action_breakdown = {a: 0 for a in ALL_ACTION_TYPES}
-            for action_name, count in raw_actions.items():
-                action_name_clean = normalize_action_name(action_name)
-                if not action_name_clean:
-                    continue
-                # += بدلاً من = لتجميع أي متغيرات متطابقة بعد التطبيع
-                action_breakdown[action_name_clean] = action_breakdown.get(action_name_clean, 0) + count
-
-            results.append({
-                "translator_id": tid,
-                "translator_name": name,
-                "total_reports": total,
-                "work_days": work_days,
-                "attendance_days": attendance_days,
-                "late_reports": late,
-                "paper_yes": paper_yes,
-                "paper_no": paper_no,
-                "paper_pending": paper_pending,
-                "action_breakdown": action_breakdown,
-                "start_date": start_date_str,
-                "end_date": end_date_str,
-            })
-
-        return results
+        use_rollup = _is_day(start_date_str) and _is_day(end_date_str) and rollup_ready(session)
+        fetch = _fetch_from_rollup if use_rollup else _fetch_from_reports
+        rows, action_rows = fetch(session, start_date_str, end_date_str)
+        return _build_results(rows, action_rows, start_date_str, end_date_str)
 
     except Exception as e:
         error_text = str(e).lower()
@@ -327,6 +159,217 @@ def _run_translator_query(session, start_date_str: str, end_date_str: str):
         return _run_translator_query_resilient(start_date_str, end_date_str)
 
 
+# ═══ شرط الفترة الموحّد (يلتقط التقارير القديمة المحفوظة بـ UTC أيضاً) ═══
+# التقرير في الفترة إن وقع COALESCE(report_date, created_at) فيها، أو يوم رفعه
+# بتوقيت IST (reports.ist_day). مكتوب كفروع OR يخدم كلاً منها فهرس:
+# report_date، created_at، و (status, ist_day, translator_id).
+# "+r.status" يمنع المخطِّط من اختيار فهرس status وحده ومسح كل التقارير النشطة.
+ACTIVE_IN_RANGE_SQL = """(
+    (r.report_date >= :start AND r.report_date < :end)
+    OR (r.report_date IS NULL AND r.created_at >= :start AND r.created_at < :end)
+    OR (r.status = 'active' AND r.ist_day >= :start AND r.ist_day < :end)
+)
+AND +r.status = 'active'"""
+
+
+def _fetch_from_reports(session, start_date_str: str, end_date_str: str):
+    """المسح الخام: (صفوف المترجمين، صفوف الإجراءات) — المرجع الذي يطابقه الـrollup."""
+    # ═══ الاستعلام الرسمي الوحيد ═══
+    # ✅ استخدام TranslatorDirectory كمرجع أساسي لتوحيد الأسماء
+    # ✅ تحويل created_at من UTC إلى التوقيت المحلي (UTC+5:30) قبل مقارنة الساعة
+    # ✅ استخدام COALESCE(report_date, created_at) لضمان عدم فقدان تقارير بدون report_date
+    # ✅ التجميع بالاسم (لتوحيد المترجمين الذين لهم أكثر من translator_id)
+    # ✅ WHERE مزدوج: report_date OR created_at بتوقيت IST
+    # لأن التقارير القديمة (قبل إصلاح التوقيت) قد تكون report_date بـ UTC
+    sql = text(f"""
+        SELECT
+            MIN(r.translator_id) as translator_id,
+            COALESCE(td.name, r.translator_name, 'مترجم #' || r.translator_id) as translator_name,
+            COUNT(*) as total_reports,
+            COUNT(DISTINCT r.ist_day) as attendance_days,
+            SUM(
+                CASE WHEN {_EFF_HOUR_IST_FOR_LATE_SQL} >= 20
+                THEN 1 ELSE 0 END
+            ) as late_reports,
+            SUM(CASE WHEN r.has_paper_report = 1 THEN 1 ELSE 0 END) as paper_yes,
+            SUM(CASE WHEN r.has_paper_report = 0 THEN 1 ELSE 0 END) as paper_no,
+            SUM(CASE WHEN r.has_paper_report = 2 THEN 1 ELSE 0 END) as paper_pending
+        FROM reports r
+        LEFT JOIN translators td ON r.translator_id = td.translator_id
+        WHERE {ACTIVE_IN_RANGE_SQL}
+        AND r.translator_id IS NOT NULL
+        GROUP BY COALESCE(td.name, r.translator_name)
+        ORDER BY total_reports DESC
+    """)
+
+    rows = session.execute(sql, {"start": start_date_str, "end": end_date_str}).fetchall()
+
+    # ═══ LOG: عدد المترجمين والتقارير ═══
+    logger.info(f"📊 stats_service: range=[{start_date_str} → {end_date_str}], translators={len(rows)}")
+    # سطر لكل مترجم — تفصيل تشخيصي فقط (DEBUG)، الملخص أعلاه يكفي في INFO
+    if logger.isEnabledFor(logging.DEBUG):
+        for row in rows:
+            logger.debug("   ├ tid=%s, name=%s, reports=%s, days=%s, late=%s, paper_yes=%s, paper_no=%s, paper_pending=%s",
+                         *row[:8])
+
+    # ═══ LOG: إجمالي التقارير بدون تجميع ═══
+    count_sql = text(f"""
+        SELECT COUNT(*) FROM reports r
+        WHERE {ACTIVE_IN_RANGE_SQL}
+    """)
+    total_all = session.execute(count_sql, {"start": start_date_str, "end": end_date_str}).scalar()
+
+    count_with_tid = text(f"""
+        SELECT COUNT(*) FROM reports r
+        WHERE {ACTIVE_IN_RANGE_SQL}
+        AND r.translator_id IS NOT NULL
+    """)
+    total_with_tid = session.execute(count_with_tid, {"start": start_date_str, "end": end_date_str}).scalar()
+
+    count_no_tid = text(f"""
+        SELECT COUNT(*) FROM reports r
+        WHERE {ACTIVE_IN_RANGE_SQL}
+        AND r.translator_id IS NULL
+    """)
+    total_no_tid = session.execute(count_no_tid, {"start": start_date_str, "end": end_date_str}).scalar()
+
+    logger.info(f"📊 stats_service: total_all={total_all}, with_tid={total_with_tid}, without_tid={total_no_tid}")
+
+    # ═══ استعلام تفصيل الإجراءات (مجمّع بالاسم) ═══
+    action_sql = text(f"""
+        SELECT
+            COALESCE(td.name, r.translator_name) as tname,
+            COALESCE(r.medical_action, 'أخرى') as action_type,
+            COUNT(*) as action_count
+        FROM reports r
+        LEFT JOIN translators td ON r.translator_id = td.translator_id
+        WHERE {ACTIVE_IN_RANGE_SQL}
+        AND r.translator_id IS NOT NULL
+        GROUP BY tname, action_type
+    """)
+
+    action_rows = session.execute(action_sql, {"start": start_date_str, "end": end_date_str}).fetchall()
+
+    return rows, action_rows
+
+
+def _is_day(value: str) -> bool:
+    """الـrollup بدقة اليوم — حدود فيها وقت تمر على المسح الخام."""
+    return bool(_re.fullmatch(r"\d{4}-\d{2}-\d{2}", value or ""))
+
+
+# يوم الحضور في الـrollup: يوم الرفع IST، أو يوم التقرير إن غاب created_at
+_ROLLUP_RANGE = """(
+    (m.event_day >= :start AND m.event_day < :end)
+    OR (m.ist_day >= :start AND m.ist_day < :end)
+)"""
+
+
+def _fetch_from_rollup(session, start_date_str: str, end_date_str: str):
+    """نفس صفوف _fetch_from_reports لكن من report_daily_rollup (بالفهارس، بلا مسح)."""
+    params = {"start": start_date_str, "end": end_date_str, "no_name": NO_NAME}
+    rows = session.execute(text(f"""
+        SELECT
+            MIN(m.translator_id) as translator_id,
+            COALESCE(td.name, NULLIF(m.translator_name, :no_name), 'مترجم #' || m.translator_id) as translator_name,
+            SUM(m.report_count) as total_reports,
+            COUNT(DISTINCT COALESCE(NULLIF(m.ist_day, ''), m.event_day)) as attendance_days,
+            SUM(m.late_count) as late_reports,
+            SUM(m.paper_yes) as paper_yes,
+            SUM(m.paper_no) as paper_no,
+            SUM(m.paper_pending) as paper_pending
+        FROM {ROLLUP_TABLE} m
+        LEFT JOIN translators td ON m.translator_id = td.translator_id
+        WHERE {_ROLLUP_RANGE}
+        AND m.report_count > 0
+        AND m.translator_id != 0
+        GROUP BY COALESCE(td.name, NULLIF(m.translator_name, :no_name))
+        ORDER BY total_reports DESC
+    """), params).fetchall()
+
+    totals = session.execute(text(f"""
+        SELECT
+            COALESCE(SUM(m.report_count), 0),
+            COALESCE(SUM(CASE WHEN m.translator_id != 0 THEN m.report_count ELSE 0 END), 0)
+        FROM {ROLLUP_TABLE} m
+        WHERE {_ROLLUP_RANGE}
+    """), params).one()
+    logger.info(
+        f"📊 stats_service (rollup): range=[{start_date_str} → {end_date_str}], translators={len(rows)}, "
+        f"total_all={totals[0]}, with_tid={totals[1]}, without_tid={totals[0] - totals[1]}"
+    )
+
+    action_rows = session.execute(text(f"""
+        SELECT
+            COALESCE(td.name, NULLIF(m.translator_name, :no_name)) as tname,
+            m.medical_action as action_type,
+            SUM(m.report_count) as action_count
+        FROM {ROLLUP_TABLE} m
+        LEFT JOIN translators td ON m.translator_id = td.translator_id
+        WHERE {_ROLLUP_RANGE}
+        AND m.report_count > 0
+        AND m.translator_id != 0
+        GROUP BY tname, action_type
+    """), params).fetchall()
+    return rows, action_rows
+
+
+def _build_results(rows, action_rows, start_date_str: str, end_date_str: str):
+    """صفوف المترجمين + صفوف الإجراءات → list[dict] بالصيغة الرسمية."""
+    # تجميع الإجراءات حسب الاسم (مع تطبيع المفاتيح لمنع التكرار بسبب مسافات/خطوط زخرفية)
+    action_map = {}
+    for row in action_rows:
+        tname = row[0]
+        action_type = normalize_action_name(row[1]) or "أخرى"
+        count = row[2]
+        if tname not in action_map:
+            action_map[tname] = {}
+        action_map[tname][action_type] = action_map[tname].get(action_type, 0) + count
+
+    # بناء النتيجة النهائية
+    results = []
+    for row in rows:
+        tid = row[0]
+        name = row[1]
+        total = row[2]
+        attendance_days = row[3]  # الأيام التي رفع فيها تقارير فعلاً
+        late = row[4] or 0
+        paper_yes = int(row[5] or 0)
+        paper_no = int(row[6] or 0)
+        paper_pending = int(row[7] or 0)
+        work_days = attendance_days
+
+        # بناء action_breakdown مع ضمان وجود كل الأنواع الـ 13
+        # ✅ البحث بالاسم (لتوحيد المترجمين ذوي الأكثر من ID)
+        # ✅ توحيد المفاتيح: strip + دمج المسافات المتعددة لمنع تكرار مثل
+        #    "تأجيل موعد" و"تأجيل موعد " (نفس النص لكن بفراغ لاحق)
+        raw_actions = action_map.get(name, {})
+        action_breakdown = {a: 0 for a in ALL_ACTION_TYPES}
+        for action_name, count in raw_actions.items():
+            action_name_clean = normalize_action_name(action_name)
+            if not action_name_clean:
+                continue
+            # += بدلاً من = لتجميع أي متغيرات متطابقة بعد التطبيع
+            action_breakdown[action_name_clean] = action_breakdown.get(action_name_clean, 0) + count
+
+        results.append({
+            "translator_id": tid,
+            "translator_name": name,
+            "total_reports": total,
+            "work_days": work_days,
+            "attendance_days": attendance_days,
+            "late_reports": late,
+            "paper_yes": paper_yes,
+            "paper_no": paper_no,
+            "paper_pending": paper_pending,
+            "action_breakdown": action_breakdown,
+            "start_date": start_date_str,
+            "end_date": end_date_str,
+        })
+
+    return results
+
+
 def _run_translator_query_resilient(start_date_str: str, end_date_str: str):
     """
     Fallback resilient aggregation for partially corrupted SQLite DB.
@@ -3,13 +3,21 @@
 """
 🔔 تنبيهات المترجمين
 Translator Reminders System
+
+حالة اليوم لكل المترجمين تُقرأ باستعلام واحد مجمّع (عدد التقارير + سجل
+التتبع)، والتنبيهات تُرسَل بالتوازي عبر services/send_scheduler، وسجلات
+التتبع تُكتب دفعة واحدة — عدد ثابت من رحلات قاعدة البيانات مهما كبر عدد
+المترجمين.
 """
 
 import logging
-from datetime import datetime, time, timedelta
-from typing import List
+from datetime import date, datetime, time, timedelta
+from typing import List, Optional
+from sqlalchemy import func, insert
 from db.session import SessionLocal
+from db.async_session import run_db
 from db.models import Translator, Report, DailyReportTracking
+from services.send_scheduler import Priority, fan_out
 
 logger = logging.getLogger(__name__)
 
@@ -19,49 +27,95 @@ REMINDER_TIME_2 = time(16, 0)  # 4:00 PM
 REMINDER_TIME_3 = time(18, 0)  # 6:00 PM
 REPORT_DEADLINE = time(20, 0)  # 8:00 PM
 
-async def check_and_send_reminders(bot):
+
+def translators_day_status(db, day: date) -> List[dict]:
     """
-    فحص المترجمين وإرسال تنبيهات لمن لم ينزل تقاريره
-    
-    Args:
-        bot: Telegram bot instance
+    كل المترجمين النشطين مع عدد تقاريرهم النشطة في اليوم وسجل تتبعهم — استعلام واحد.
+
+    Returns:
+        [{"id", "full_name", "tg_user_id", "reports", "tracking_id", "reminder_sent"}]
     """
-    try:
-        current_time = datetime.now().time()
-        today = datetime.now().date()
-        
-        db = SessionLocal()
-        try:
-            # جلب جميع المترجمين النشطين
-            translators = db.query(Translator).filter_by(is_active=True).all()
-            
-            for translator in translators:
-                # فحص إذا أنزل تقرير اليوم
-                today_reports = db.query(Report).filter(
-                    Report.translator_id == translator.id,
-                    Report.report_date == today
-                ).count()
-                
-                # فحص سجل التتبع
-                tracking = db.query(DailyReportTracking).filter_by(
-                    translator_id=translator.id,
-                    date=today
-                ).first()
-                
-                # تحديد إذا يحتاج تنبيه
-                needs_reminder = False
-                reminder_message = ""
-                
-                if today_reports == 0:
-                    # لم ينزل أي تقرير
-                    if current_time >= REMINDER_TIME_1 and current_time < REMINDER_TIME_2:
-                        # تنبيه أول (2 PM)
-                        if not tracking or not tracking.reminder_sent:
-                            needs_reminder = True
-                            reminder_message = f"""
+    counts = (
+        db.query(Report.translator_id.label("tid"), func.count(Report.id).label("n"))
+        .filter(Report.status == "active", Report.ist_day == day.isoformat())
+        .group_by(Report.translator_id)
+        .subquery()
+    )
+    tracking = (
+        db.query(
+            DailyReportTracking.translator_id.label("tid"),
+            func.min(DailyReportTracking.id).label("tracking_id"),
+            func.max(DailyReportTracking.reminder_sent).label("reminder_sent"),
+        )
+        .filter(DailyReportTracking.date == day)
+        .group_by(DailyReportTracking.translator_id)
+        .subquery()
+    )
+    rows = (
+        db.query(
+            Translator.id,
+            Translator.full_name,
+            Translator.tg_user_id,
+            func.coalesce(counts.c.n, 0),
+            tracking.c.tracking_id,
+            tracking.c.reminder_sent,
+        )
+        .outerjoin(counts, counts.c.tid == Translator.id)
+        .outerjoin(tracking, tracking.c.tid == Translator.id)
+        .filter(Translator.is_active == True)  # noqa: E712
+        .order_by(Translator.id)
+        .all()
+    )
+    return [
+        {
+            "id": tid,
+            "full_name": name,
+            "tg_user_id": tg_user_id,
+            "reports": n,
+            "tracking_id": tracking_id,
+            "reminder_sent": bool(reminder_sent),
+        }
+        for tid, name, tg_user_id, n, tracking_id, reminder_sent in rows
+    ]
+
+
+def _day_status_sync(day: date) -> List[dict]:
+    with SessionLocal() as db:
+        return translators_day_status(db, day)
+
+
+def _mark_reminded_sync(day: date, translators: List[dict]) -> None:
+    """upsert جماعي لسجلات التتبع: UPDATE واحد للموجودة و INSERT واحد للناقصة."""
+    existing = [t["tracking_id"] for t in translators if t["tracking_id"]]
+    missing = [
+        {"translator_id": t["id"], "translator_name": t["full_name"], "date": day, "reminder_sent": True}
+        for t in translators
+        if not t["tracking_id"]
+    ]
+    with SessionLocal() as db:
+        if existing:
+            db.query(DailyReportTracking).filter(DailyReportTracking.id.in_(existing)).update(
+                {DailyReportTracking.reminder_sent: True}, synchronize_session=False
+            )
+        if missing:
+            db.execute(insert(DailyReportTracking), missing)
+        db.commit()
+
+
+def _reminder_message(translator: dict, today: date, now: datetime) -> Optional[str]:
+    """نص التنبيه حسب الوقت، أو None إن لم يكن هناك تنبيه مستحق."""
+    current_time = now.time()
+    if translator["reports"]:
+        return None
+
+    if current_time >= REMINDER_TIME_1 and current_time < REMINDER_TIME_2:
+        # تنبيه أول (2 PM) — مرة واحدة فقط
+        if translator["reminder_sent"]:
+            return None
+        return f"""
 ⏰ تنبيه أول
 
-مرحباً {translator.full_name}،
+مرحباً {translator['full_name']}،
 
 لم يتم رفع تقارير اليوم بعد ({today.strftime('%Y-%m-%d')})
 
@@ -72,30 +126,28 @@ async def check_and_send_reminders(bot):
 
 📝 للرفع: /admin → 📝 إضافة تقرير
 """
-                    
-                    elif current_time >= REMINDER_TIME_2 and current_time < REMINDER_TIME_3:
-                        # تنبيه ثاني (4 PM)
-                        needs_reminder = True
-                        reminder_message = f"""
+
+    if current_time >= REMINDER_TIME_2 and current_time < REMINDER_TIME_3:
+        # تنبيه ثاني (4 PM)
+        return f"""
 ⚠️ تنبيه ثاني
 
-{translator.full_name}،
+{translator['full_name']}،
 
 لا يزال لم يتم رفع تقارير اليوم!
 
 ⏰ الوقت: {current_time.strftime('%H:%M')}
-⏳ باقي {(datetime.combine(today, REPORT_DEADLINE) - datetime.now()).seconds // 3600} ساعات على الموعد النهائي
+⏳ باقي {(datetime.combine(today, REPORT_DEADLINE) - now).seconds // 3600} ساعات على الموعد النهائي
 
 ⚠️ يرجى الإسراع في رفع التقارير.
 """
-                    
-                    elif current_time >= REMINDER_TIME_3 and current_time < REPORT_DEADLINE:
-                        # تنبيه أخير (6 PM)
-                        needs_reminder = True
-                        reminder_message = f"""
+
+    if current_time >= REMINDER_TIME_3 and current_time < REPORT_DEADLINE:
+        # تنبيه أخير (6 PM)
+        return f"""
 🔴 تنبيه أخير
 
-{translator.full_name}،
+{translator['full_name']}،
 
 لم يتم رفع تقارير اليوم حتى الآن!
 
@@ -104,74 +156,82 @@ async def check_and_send_reminders(bot):
 
 ⚠️ يرجى الرفع فوراً لتجنب التأخير.
 """
-                
-                # إرسال التنبيه
-                if needs_reminder and translator.tg_user_id:
-                    try:
-                        await bot.send_message(
-                            chat_id=translator.tg_user_id,
-                            text=reminder_message
-                        )
-                        
-                        # تحديث سجل التتبع
-                        if not tracking:
-                            tracking = DailyReportTracking(
-                                translator_id=translator.id,
-                                date=today,
-                                reminder_sent=True
-                            )
-                            db.add(tracking)
-                        else:
-                            tracking.reminder_sent = True
-                        
-                        db.commit()
-                        logger.info(f"✅ تم إرسال تنبيه لـ {translator.full_name}")
-                        
-                    except Exception as e:
-                        logger.error(f"❌ خطأ في إرسال تنبيه: {e}")
-                
-        finally:
-            db.close()
-            
+    return None
+
+
+async def check_and_send_reminders(bot, now: Optional[datetime] = None):
+    """
+    فحص المترجمين وإرسال تنبيهات لمن لم ينزل تقاريره
+
+    Args:
+        bot: Telegram bot instance
+        now: الوقت الحالي (افتراضياً datetime.now())
+    """
+    try:
+        now = now or datetime.now()
+        today = now.date()
+
+        translators = await run_db(_day_status_sync, today)
+
+        due = []
+        for translator in translators:
+            message = _reminder_message(translator, today, now)
+            if message and translator["tg_user_id"]:
+                due.append((translator, message))
+        if not due:
+            return
+
+        results = await fan_out(
+            [
+                (t["tg_user_id"], lambda t=t, message=message: bot.send_message(
+                    chat_id=t["tg_user_id"], text=message
+                ))
+                for t, message in due
+            ],
+            priority=Priority.NORMAL,
+        )
+
+        reminded = []
+        for (translator, _), result in zip(due, results):
+            if isinstance(result, Exception):
+                logger.error(f"❌ خطأ في إرسال تنبيه لـ {translator['full_name']}: {result}")
+            else:
+                reminded.append(translator)
+
+        # تحديث سجلات التتبع
+        if reminded:
+            await run_db(_mark_reminded_sync, today, reminded)
+        logger.info(f"✅ تم إرسال {len(reminded)}/{len(due)} تنبيه للمترجمين")
+
     except Exception as e:
         logger.error(f"❌ خطأ في نظام التنبيهات: {e}")
 
 
-async def send_late_warning_to_admin(bot, admin_ids: List[int]):
+async def send_late_warning_to_admin(bot, admin_ids: List[int], now: Optional[datetime] = None):
     """
     إرسال تنبيه للأدمن بالمترجمين المتأخرين
-    
+
     Args:
         bot: Telegram bot instance
         admin_ids: قائمة IDs الأدمن
+        now: الوقت الحالي (افتراضياً datetime.now())
     """
     try:
-        today = datetime.now().date()
-        current_time = datetime.now().time()
-        
+        now = now or datetime.now()
+        today = now.date()
+        current_time = now.time()
+
         # فحص بعد الموعد النهائي فقط
         if current_time < REPORT_DEADLINE:
             return
-        
-        db = SessionLocal()
-        try:
-            # جلب المترجمين الذين لم ينزلوا تقارير
-            late_translators = []
-            
-            translators = db.query(Translator).filter_by(is_active=True).all()
-            
-            for translator in translators:
-                today_reports = db.query(Report).filter(
-                    Report.translator_id == translator.id,
-                    Report.report_date == today
-                ).count()
-                
-                if today_reports == 0:
-                    late_translators.append(translator.full_name)
-            
-            # إرسال تقرير للأدمن
-            if late_translators:
-                message = f"""
+
+        # جلب المترجمين الذين لم ينزلوا تقارير
+        translators = await run_db(_day_status_sync, today)
+        late_translators = [t["full_name"] for t in translators if not t["reports"]]
+
+        # إرسال تقرير للأدمن
+        if late_translators:
+            message = f"""
 🔴 تقرير المترجمين المتأخرين
 
 📅 التاريخ: {today.strftime('%Y-%m-%d')}
@@ -180,26 +240,25 @@ async def send_late_warning_to_admin(bot, admin_ids: List[int]):
 ⚠️ المترجمون الذين لم ينزلوا تقارير اليوم:
 
 """
-                for i, name in enumerate(late_translators, 1):
-                    message += f"{i}. {name}\n"
-                
-                message += f"\n📊 الإجمالي: {len(late_translators)} مترجم\n"
-                message += "\n⚠️ يرجى المتابعة معهم."
-                
-                for admin_id in admin_ids:
-                    try:
-                        await bot.send_message(
-                            chat_id=admin_id,
-                            text=message
-                        )
-                    except Exception:
-                        logger.debug("تم تجاهل استثناء في send_late_warning_to_admin", exc_info=True)
-                
-                logger.info(f"✅ تم إرسال تقرير التأخير للأدمن: {len(late_translators)} متأخر")
-        
-        finally:
-            db.close()
-            
+            for i, name in enumerate(late_translators, 1):
+                message += f"{i}. {name}\n"
+
+            message += f"\n📊 الإجمالي: {len(late_translators)} مترجم\n"
+            message += "\n⚠️ يرجى المتابعة معهم."
+
+            results = await fan_out(
+                [
+                    (admin_id, lambda admin_id=admin_id: bot.send_message(chat_id=admin_id, text=message))
+                    for admin_id in admin_ids
+                ],
+                priority=Priority.DIGEST,
+            )
+            for result in results:
+                if isinstance(result, Exception):
+                    logger.debug(f"تم تجاهل استثناء في send_late_warning_to_admin: {result}")
+
+            logger.info(f"✅ تم إرسال تقرير التأخير للأدمن: {len(late_translators)} متأخر")
+
     except Exception as e:
         logger.error(f"❌ خطأ في تنبيه الأدمن: {e}")
 
@@ -207,68 +266,33 @@ async def send_late_warning_to_admin(bot, admin_ids: List[int]):
 def get_translator_status() -> dict:
     """
     الحصول على حالة جميع المترجمين اليوم
-    
+
     Returns:
         dict: إحصائيات المترجمين
     """
     try:
         today = datetime.now().date()
-        db = SessionLocal()
-        
-        try:
-            translators = db.query(Translator).filter_by(is_active=True).all()
-            
-            stats = {
-                'total': len(translators),
-                'submitted': 0,
-                'pending': 0,
-                'late': []
-            }
-            
-            for translator in translators:
-                reports_count = db.query(Report).filter(
-                    Report.translator_id == translator.id,
-                    Report.report_date == today
-                ).count()
-                
-                if reports_count > 0:
-                    stats['submitted'] += 1
-                else:
-                    stats['pending'] += 1
-                    stats['late'].append({
-                        'name': translator.full_name,
-                        'telegram_id': translator.tg_user_id
-                    })
-            
-            return stats
-            
-        finally:
-            db.close()
-            
+        translators = _day_status_sync(today)
+
+        stats = {
+            'total': len(translators),
+            'submitted': 0,
+            'pending': 0,
+            'late': []
+        }
+
+        for translator in translators:
+            if translator["reports"] > 0:
+                stats['submitted'] += 1
+            else:
+                stats['pending'] += 1
+                stats['late'].append({
+                    'name': translator["full_name"],
+                    'telegram_id': translator["tg_user_id"]
+                })
+
+        return stats
+
     except Exception as e:
         logger.error(f"خطأ في get_translator_status: {e}")
         return {'total': 0, 'submitted': 0, 'pending': 0, 'late': []}
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
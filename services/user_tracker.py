@@ -3,37 +3,61 @@
 """
 👤 نظام تتبع نشاط المستخدمين - User Activity Tracker
 دمج مع نظام قاعدة البيانات الرئيسي
+
+⚡ التسجيل لا يلمس قاعدة البيانات: كل حدث يُجمَّع في الذاكرة (عدّاد + آخر
+ظهور لكل مستخدم)، ويُكتب المجمَّع كل USER_ACTIVITY_FLUSH_INTERVAL ثانية
+كعبارة واحدة INSERT ... ON CONFLICT DO UPDATE عبر الكاتب الموحَّد — مئة
+حدث لعشرة مستخدمين = معاملة واحدة بعشرة صفوف، لا مئة SELECT + UPDATE.
+القراءات (get_all_users_activity / get_inactive_users / get_user_stats)
+تدمج ما لم يُكتب بعد، فتبقى دقيقة دون انتظار الدفعة التالية.
+
+المصدر: save_report_to_database (flows/shared.py) بعد حفظ كل تقرير — فالعدّاد
+وآخر تاريخ يعنيان التقارير فعلاً؛ ويُفرَّغ المعلّق عند الإيقاف قبل إيقاف
+الكاتب الموحَّد (app.py).
+
+⚠️ الجدول user_activity_summary وليس user_activity: ذلك الاسم مأخوذ في
+db/models.py لسجل أحداث بأعمدة مختلفة (id/activity_type/details)، وكان
+تعريفه هنا مرة ثانية على نفس الـMetaData يُفشل استيراد هذه الوحدة كلياً.
 """
 
+import atexit
 import os
 import logging
-from datetime import datetime, timedelta
-from typing import List, Tuple, Optional
+import threading
+from datetime import datetime, timedelta, timezone
+from typing import Dict, List, Tuple, Optional
 from sqlalchemy import Column, Integer, String, DateTime, Text
 from sqlalchemy.orm import Session
 from db.session import Base, SessionLocal
 
 logger = logging.getLogger(__name__)
 
+USER_ACTIVITY_FLUSH_INTERVAL = float(os.getenv("USER_ACTIVITY_FLUSH_INTERVAL", "2"))
+
+
+def _utcnow() -> datetime:
+    """UTC بلا tzinfo — مثل القيم المخزَّنة في أعمدة DateTime (SQLite) فتبقى المقارنة ممكنة."""
+    return datetime.now(timezone.utc).replace(tzinfo=None)
+
 # ====================================================
 # 📊 نموذج تتبع نشاط المستخدم
 # ====================================================
 
-class UserActivity(Base):
+class UserActivitySummary(Base):
     """
-    جدول تتبع نشاط المستخدمين
+    جدول تتبع نشاط المستخدمين (صف واحد لكل مستخدم)
     """
-    __tablename__ = "user_activity"
+    __tablename__ = "user_activity_summary"
     
     user_id = Column(Integer, primary_key=True, index=True)
     username = Column(String(150))
     full_name = Column(String(200))
     last_report_date = Column(DateTime)
     total_reports = Column(Integer, default=0)
-    last_activity = Column(DateTime, default=datetime.utcnow)
+    last_activity = Column(DateTime, default=_utcnow)
     notes = Column(Text)  # ملاحظات إضافية
-    created_at = Column(DateTime, default=datetime.utcnow)
-    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    created_at = Column(DateTime, default=_utcnow)
+    updated_at = Column(DateTime, default=_utcnow, onupdate=_utcnow)
 
 
 # ====================================================
@@ -46,55 +70,190 @@ def init_user_activity_table():
     """
     try:
         from db.session import engine
-        UserActivity.__table__.create(bind=engine, checkfirst=True)
-        logger.info("✅ جدول user_activity جاهز")
+        UserActivitySummary.__table__.create(bind=engine, checkfirst=True)
+        logger.info("✅ جدول user_activity_summary جاهز")
         return True
     except Exception as e:
-        logger.error(f"❌ خطأ في إنشاء جدول user_activity: {e}")
+        logger.error(f"❌ خطأ في إنشاء جدول user_activity_summary: {e}")
         return False
 
 
+class _Delta:
+    __slots__ = ("count", "last_at", "username", "full_name")
+
+    def __init__(self):
+        self.count = 0
+        self.last_at: Optional[datetime] = None
+        self.username = None
+        self.full_name = None
+
+    def add(self, count: int, at: datetime, username=None, full_name=None) -> None:
+        self.count += count
+        if self.last_at is None or at > self.last_at:
+            self.last_at = at
+        if username:
+            self.username = username
+        if full_name:
+            self.full_name = full_name
+
+    def merge(self, newer: "_Delta") -> None:
+        self.add(newer.count, newer.last_at, newer.username, newer.full_name)
+
+
+class ActivityAccumulator:
+    """
+    عدّادات النشاط المعلّقة لكل مستخدم + دافع خلفي دوري.
+
+    record() يأخذ قفلاً قصيراً فقط. _flush_lock يُمسَك طوال الكتابة وأثناء
+    أي قراءة مدموجة: القارئ يرى إما الدفعة قبل كتابتها (في الذاكرة) أو بعدها
+    (في القاعدة) — أبداً في الاثنين معاً أو في لا شيء منهما.
+    """
+
+    def __init__(self, interval: float = USER_ACTIVITY_FLUSH_INTERVAL):
+        self.interval = interval
+        self._pending: Dict[int, _Delta] = {}
+        self._lock = threading.Lock()
+        self._flush_lock = threading.RLock()
+        self._wake = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self.events = 0
+        self.flushes = 0
+        self.rows_written = 0
+
+    def record(self, user_id: int, username=None, full_name=None, at: Optional[datetime] = None) -> None:
+        at = at or _utcnow()
+        with self._lock:
+            delta = self._pending.get(user_id)
+            if delta is None:
+                delta = self._pending[user_id] = _Delta()
+            delta.add(1, at, username, full_name)
+            self.events += 1
+        self._ensure_flusher()
+
+    def pending(self) -> Dict[int, _Delta]:
+        """نسخة من المعلّق — تُستدعى تحت _flush_lock لتكون القراءة دقيقة."""
+        with self._lock:
+            out = {}
+            for uid, d in self._pending.items():
+                out[uid] = _Delta()
+                out[uid].merge(d)
+            return out
+
+    def flush(self) -> int:
+        """يكتب كل المعلّق كعبارة upsert واحدة (متزامن). يُعيد عدد الصفوف."""
+        from db.write_queue import write
+
+        with self._flush_lock:
+            with self._lock:
+                batch, self._pending = self._pending, {}
+            if not batch:
+                return 0
+            try:
+                write(_upsert_activity_tx, batch)
+            except Exception:
+                # لا يضيع شيء: تُعاد الدفعة أمام ما تراكم بعدها وتُكتب في المرة التالية
+                with self._lock:
+                    for uid, newer in self._pending.items():
+                        if uid in batch:
+                            batch[uid].merge(newer)
+                        else:
+                            batch[uid] = newer
+                    self._pending = batch
+                raise
+            self.flushes += 1
+            self.rows_written += len(batch)
+            return len(batch)
+
+    def stats(self) -> dict:
+        with self._lock:
+            pending_users = len(self._pending)
+        return {"events": self.events, "flushes": self.flushes,
+                "rows_written": self.rows_written, "pending_users": pending_users}
+
+    def _ensure_flusher(self) -> None:
+        if self._thread is not None and self._thread.is_alive():
+            return
+        with self._lock:
+            if self._thread is not None and self._thread.is_alive():
+                return
+            self._thread = threading.Thread(target=self._flush_loop, name="user-activity", daemon=True)
+            self._thread.start()
+
+    def _flush_loop(self) -> None:
+        while not self._wake.wait(self.interval):
+            try:
+                self.flush()
+            except Exception as e:
+                logger.error(f"❌ خطأ في كتابة نشاط المستخدمين: {e}")
+
+
+_accumulator = ActivityAccumulator()
+
+
 def update_user_activity(user_id: int, username: str = None, full_name: str = None):
     """
     تحديث نشاط المستخدم
+
+    ⚡ لا يفتح جلسة ولا يضيف طلب كتابة: يزيد عدّاد المستخدم في الذاكرة فقط،
+    وتُكتب العدّادات المتراكمة لكل المستخدمين معاً في الدفعة الدورية التالية.
     """
     try:
-        with SessionLocal() as session:
-            # البحث عن المستخدم
-            user_activity = session.query(UserActivity).filter_by(user_id=user_id).first()
-            
-            if user_activity:
-                # تحديث المستخدم الموجود
-                user_activity.last_report_date = datetime.utcnow()
-                user_activity.last_activity = datetime.utcnow()
-                user_activity.total_reports += 1
-                user_activity.updated_at = datetime.utcnow()
-                
-                if username:
-                    user_activity.username = username
-                if full_name:
-                    user_activity.full_name = full_name
-            else:
-                # إنشاء مستخدم جديد
-                user_activity = UserActivity(
-                    user_id=user_id,
-                    username=username,
-                    full_name=full_name,
-                    last_report_date=datetime.utcnow(),
-                    last_activity=datetime.utcnow(),
-                    total_reports=1
-                )
-                session.add(user_activity)
-            
-            session.commit()
-            logger.info(f"✅ تم تحديث نشاط المستخدم: {user_id}")
-            return True
-            
+        _accumulator.record(user_id, username, full_name)
+        return True
     except Exception as e:
         logger.error(f"❌ خطأ في تحديث نشاط المستخدم: {e}")
         return False
 
 
+def flush_user_activity() -> int:
+    """كتابة فورية لكل النشاط المعلّق (الإيقاف، السكربتات، الاختبارات)."""
+    return _accumulator.flush()
+
+
+def user_activity_stats() -> dict:
+    return _accumulator.stats()
+
+
+def _flush_at_exit() -> None:
+    try:
+        _accumulator.flush()
+    except Exception as e:
+        logger.error(f"❌ تعذّرت كتابة نشاط المستخدمين عند الإيقاف: {e}")
+
+
+atexit.register(_flush_at_exit)
+
+
+def _upsert_activity_tx(session: Session, batch: Dict[int, _Delta]):
+    """الدفعة كلها عبارة واحدة داخل معاملة الكاتب الموحَّد — بلا commit."""
+    from sqlalchemy import func
+    from sqlalchemy.dialects.sqlite import insert
+
+    table = UserActivitySummary.__table__
+    stmt = insert(table)
+    excluded = stmt.excluded
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[table.c.user_id],
+        set_={
+            "total_reports": func.coalesce(table.c.total_reports, 0) + excluded.total_reports,
+            "last_report_date": excluded.last_report_date,
+            "last_activity": excluded.last_activity,
+            "updated_at": excluded.updated_at,
+            "username": func.coalesce(excluded.username, table.c.username),
+            "full_name": func.coalesce(excluded.full_name, table.c.full_name),
+        },
+    )
+    session.execute(stmt, [
+        {
+            "user_id": uid, "username": d.username, "full_name": d.full_name,
+            "total_reports": d.count, "last_report_date": d.last_at, "last_activity": d.last_at,
+            "created_at": d.last_at, "updated_at": d.last_at,
+        }
+        for uid, d in batch.items()
+    ])
+    logger.debug(f"✅ تم تحديث نشاط {len(batch)} مستخدم")
+
+
 def get_inactive_users(days_inactive: int = 1) -> List[Tuple[int, str, str]]:
     """
     الحصول على المستخدمين غير النشطين
@@ -106,44 +265,73 @@ def get_inactive_users(days_inactive: int = 1) -> List[Tuple[int, str, str]]:
         قائمة tuples: (user_id, username, last_report_date)
     """
     try:
-        cutoff_date = datetime.utcnow() - timedelta(days=days_inactive)
+        cutoff_date = _utcnow() - timedelta(days=days_inactive)
         
-        with SessionLocal() as session:
+        with _accumulator._flush_lock, SessionLocal() as session:
             inactive_users = session.query(
-                UserActivity.user_id,
-                UserActivity.username,
-                UserActivity.last_report_date
+                UserActivitySummary.user_id,
+                UserActivitySummary.username,
+                UserActivitySummary.last_report_date
             ).filter(
-                UserActivity.last_report_date < cutoff_date
+                UserActivitySummary.last_report_date < cutoff_date
             ).all()
-            
-            return inactive_users
+            pending = _accumulator.pending()
+
+        # نشاط لم يُكتب بعد يُخرج صاحبه من القائمة
+        return [
+            (user_id, username, last_report_date)
+            for user_id, username, last_report_date in inactive_users
+            if user_id not in pending or pending[user_id].last_at < cutoff_date
+        ]
             
     except Exception as e:
         logger.error(f"❌ خطأ في الحصول على المستخدمين غير النشطين: {e}")
         return []
 
 
+def _activity_dict(user) -> dict:
+    return {
+        'user_id': user.user_id,
+        'username': user.username,
+        'full_name': user.full_name,
+        'total_reports': user.total_reports or 0,
+        'last_report_date': user.last_report_date,
+        'last_activity': user.last_activity,
+    }
+
+
+def _merge_pending(entry: dict, delta: _Delta) -> dict:
+    entry['total_reports'] = (entry.get('total_reports') or 0) + delta.count
+    entry['last_report_date'] = delta.last_at
+    entry['last_activity'] = delta.last_at
+    if delta.username:
+        entry['username'] = delta.username
+    if delta.full_name:
+        entry['full_name'] = delta.full_name
+    return entry
+
+
 def get_user_stats(user_id: int) -> Optional[dict]:
     """
     الحصول على إحصائيات مستخدم محدد
     """
     try:
-        with SessionLocal() as session:
-            user = session.query(UserActivity).filter_by(user_id=user_id).first()
-            
-            if not user:
-                return None
-            
-            return {
-                'user_id': user.user_id,
-                'username': user.username,
-                'full_name': user.full_name,
-                'total_reports': user.total_reports,
-                'last_report_date': user.last_report_date,
-                'last_activity': user.last_activity,
-                'days_since_last_report': (datetime.utcnow() - user.last_report_date).days if user.last_report_date else None
-            }
+        with _accumulator._flush_lock, SessionLocal() as session:
+            user = session.query(UserActivitySummary).filter_by(user_id=user_id).first()
+            delta = _accumulator.pending().get(user_id)
+
+        if not user and delta is None:
+            return None
+
+        stats = _activity_dict(user) if user else {
+            'user_id': user_id, 'username': None, 'full_name': None,
+            'total_reports': 0, 'last_report_date': None, 'last_activity': None,
+        }
+        if delta is not None:
+            _merge_pending(stats, delta)
+        last = stats['last_report_date']
+        stats['days_since_last_report'] = (_utcnow() - last).days if last else None
+        return stats
             
     except Exception as e:
         logger.error(f"❌ خطأ في الحصول على إحصائيات المستخدم: {e}")
@@ -152,24 +340,25 @@ def get_user_stats(user_id: int) -> Optional[dict]:
 
 def get_all_users_activity() -> List[dict]:
     """
-    الحصول على نشاط جميع المستخدمين
+    الحصول على نشاط جميع المستخدمين (مع النشاط الذي لم يُكتب بعد)
     """
     try:
-        with SessionLocal() as session:
-            users = session.query(UserActivity).all()
-            
-            result = []
-            for user in users:
-                result.append({
-                    'user_id': user.user_id,
-                    'username': user.username,
-                    'full_name': user.full_name,
-                    'total_reports': user.total_reports,
-                    'last_report_date': user.last_report_date,
-                    'last_activity': user.last_activity
-                })
-            
-            return result
+        with _accumulator._flush_lock, SessionLocal() as session:
+            users = session.query(UserActivitySummary).all()
+            result = [_activity_dict(user) for user in users]
+            pending = _accumulator.pending()
+
+        for entry in result:
+            delta = pending.pop(entry['user_id'], None)
+            if delta is not None:
+                _merge_pending(entry, delta)
+        # مستخدمون جدد لم يُكتب أول نشاط لهم بعد
+        for user_id, delta in pending.items():
+            result.append(_merge_pending(
+                {'user_id': user_id, 'username': None, 'full_name': None, 'total_reports': 0},
+                delta,
+            ))
+        return result
             
     except Exception as e:
         logger.error(f"❌ خطأ في الحصول على نشاط جميع المستخدمين: {e}")
@@ -194,13 +383,13 @@ def sync_with_translators():
             synced_count = 0
             for translator in translators:
                 # التحقق من وجود user_activity
-                user_activity = session.query(UserActivity).filter_by(
+                user_activity = session.query(UserActivitySummary).filter_by(
                     user_id=translator.tg_user_id
                 ).first()
                 
                 if not user_activity:
                     # إنشاء سجل جديد
-                    user_activity = UserActivity(
+                    user_activity = UserActivitySummary(
                         user_id=translator.tg_user_id,
                         username=translator.full_name,
                         full_name=translator.full_name,
@@ -234,6 +423,7 @@ if __name__ == "__main__":
     
     # اختبار تحديث نشاط
     update_user_activity(12345, "test_user", "Test User")
+    flush_user_activity()
     print("✅ تم تحديث النشاط")
     
     # الحصول على إحصائيات
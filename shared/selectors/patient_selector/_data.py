@@ -238,7 +238,8 @@ def search(
     services_scope: bool = False,
 ) -> list[PatientRecord]:
     """
-    Search for patients whose full_name contains query (case-insensitive).
+    Search for patients whose full_name contains query (case-insensitive,
+    Arabic letter variants folded), best matches first — see db/patient_search.py.
     Falls back to fetch_all() when query is blank.
 
     include_pharmacy / include_companions / only_companion_flow / city — نفس دلالة fetch_all().
@@ -259,18 +260,25 @@ def search(
         from db.session import SessionLocal
         from db.models import Patient as _Patient
 
+        from db.patient_search import patients_in_order, search_patient_ids
+
         with SessionLocal() as s:
-            rows = (
-                s.query(_Patient)
-                .filter(
-                    _Patient.full_name.isnot(None),
-                    _Patient.full_name != "",
-                    _Patient.full_name.ilike(f"%{query}%"),
+            # فهرس FTS5 (مرتّب بالصلة)؛ None ⇒ غير متاح فنعود لـILIKE
+            ids = search_patient_ids(s, query, limit=_DB_LIMIT)
+            if ids is not None:
+                rows = patients_in_order(s, ids)
+            else:
+                rows = (
+                    s.query(_Patient)
+                    .filter(
+                        _Patient.full_name.isnot(None),
+                        _Patient.full_name != "",
+                        _Patient.full_name.ilike(f"%{query}%"),
+                    )
+                    .order_by(_Patient.full_name)
+                    .limit(_DB_LIMIT)
+                    .all()
                 )
-                .order_by(_Patient.full_name)
-                .limit(_DB_LIMIT)
-                .all()
-            )
             records = [
                 PatientRecord(id=p.id, name=(p.full_name or "").strip())
                 for p in rows
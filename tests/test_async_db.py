@@ -0,0 +1,56 @@
+# tests/test_async_db.py
+# db/async_session.py: الاستعلامات المتزامنة تُنفَّذ خارج حلقة الأحداث.
+# No Telegram, no real DB required.
+
+import asyncio
+import os
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+import pytest
+
+from db.async_session import LoopLagMonitor, db_executor_stats, run_db
+
+
+def test_run_db_runs_on_db_thread_and_returns_value():
+    def _work(a, b=0):
+        return threading.current_thread().name, a + b
+
+    name, total = asyncio.run(run_db(_work, 2, b=3))
+    assert total == 5
+    assert name.startswith("db"), name
+
+
+def test_run_db_propagates_exceptions_and_counts_failures():
+    def _boom():
+        raise ValueError("boom")
+
+    before = db_executor_stats()["failed"]
+    with pytest.raises(ValueError):
+        asyncio.run(run_db(_boom))
+    assert db_executor_stats()["failed"] == before + 1
+
+
+def test_blocking_query_does_not_stall_loop():
+    """استعلام بطيء عبر run_db لا يظهر في تأخّر الحلقة؛ نفسه مباشرة يظهر."""
+
+    def _slow():
+        time.sleep(0.2)
+
+    async def _measure(offload: bool) -> float:
+        monitor = LoopLagMonitor(interval=0.01)
+        monitor.start()
+        await asyncio.sleep(0.02)
+        if offload:
+            await run_db(_slow)
+        else:
+            _slow()
+        await asyncio.sleep(0.02)
+        await monitor.stop()
+        return monitor.stats()["lag_max_ms"]
+
+    assert asyncio.run(_measure(offload=False)) >= 150
+    assert asyncio.run(_measure(offload=True)) < 100
@@ -0,0 +1,125 @@
+# tests/test_attachment_cache.py
+# image_pipeline/cache.py: إعادة النشر لا تُعيد التحميل ولا المعالجة، والإخلاء LRU بالحجم.
+# No Telegram, no DB required. Skipped when OpenCV is not installed.
+
+import asyncio
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+import pytest
+
+cv2 = pytest.importorskip("cv2")
+np = pytest.importorskip("numpy")
+
+from image_pipeline.cache import AttachmentCache, run_pipeline_cached_async
+from image_pipeline.config import PipelineConfig
+
+
+def _page(value: int) -> bytes:
+    img = np.full((120, 90, 3), value, dtype=np.uint8)
+    return cv2.imencode(".png", img)[1].tobytes()
+
+
+@pytest.fixture
+def cfg():
+    cfg = PipelineConfig()
+    cfg.debug.enabled = False
+    cfg.detector.enabled = False
+    return cfg
+
+
+def test_republish_is_served_from_cache(tmp_path, cfg, monkeypatch):
+    import image_pipeline.executor as executor_mod
+    from image_pipeline.config import ExecutorConfig
+
+    executor = executor_mod.PipelineExecutor(ExecutorConfig(workers=1, warm_up_model=False))
+    monkeypatch.setattr(executor_mod, "_executor", executor)
+    cache = AttachmentCache(root=str(tmp_path), max_bytes=10 * 1024 * 1024)
+    raw = {0: _page(200), 1: _page(90), 2: _page(30)}
+    fetched = []
+
+    async def fetch(idx):
+        fetched.append(idx)
+        return raw[idx]
+
+    try:
+        first = asyncio.run(run_pipeline_cached_async(["u1", "u2"], fetch, cfg, cache=cache))
+        assert fetched == [0, 1]
+
+        # نفس الصور بنفس الترتيب ⇒ PDF من الكاش، بلا تحميل
+        fetched.clear()
+        again = asyncio.run(run_pipeline_cached_async(["u1", "u2"], fetch, cfg, cache=cache))
+        assert fetched == [] and again.getvalue() == first.getvalue()
+
+        # صورة جديدة ⇒ تُحمَّل هي فقط، الصفحتان القديمتان من الكاش
+        fetched.clear()
+        asyncio.run(run_pipeline_cached_async(["u1", "u2", "u3"], fetch, cfg, cache=cache))
+        assert fetched == [2]
+    finally:
+        executor.shutdown()
+
+    stats = cache.stats()
+    assert stats["pdf_hits"] == 1 and stats["page_hits"] == 2
+
+
+def test_fallback_pages_are_not_cached(tmp_path, cfg, monkeypatch):
+    from concurrent.futures import ThreadPoolExecutor
+
+    import image_pipeline.executor as executor_mod
+    from image_pipeline.config import ExecutorConfig
+
+    executor = executor_mod.PipelineExecutor(ExecutorConfig(workers=1, warm_up_model=False))
+    pool = ThreadPoolExecutor(max_workers=2)
+    monkeypatch.setattr(executor, "_get_pool", lambda c: pool)
+    monkeypatch.setattr(executor_mod, "_executor", executor)
+    failing = {1}
+
+    def _fake_process(raw, c, job_id, idx):
+        # الصفحة 1 تفشل مرحلتها في المحاولة الأولى ⇒ الأصل كبديل
+        return raw, idx not in failing
+
+    monkeypatch.setattr(executor_mod, "_process_page_to_jpeg", _fake_process)
+    cache = AttachmentCache(root=str(tmp_path), max_bytes=10 * 1024 * 1024)
+    raw = {0: _page(200), 1: _page(90)}
+    fetched = []
+
+    async def fetch(idx):
+        fetched.append(idx)
+        return raw[idx]
+
+    try:
+        asyncio.run(run_pipeline_cached_async(["u1", "u2"], fetch, cfg, cache=cache))
+        assert fetched == [0, 1]
+
+        # لا PDF في الكاش، والصفحة المُحسَّنة فقط محفوظة ⇒ تُعاد محاولة الصفحة 1 وحدها
+        failing.clear()
+        fetched.clear()
+        asyncio.run(run_pipeline_cached_async(["u1", "u2"], fetch, cfg, cache=cache))
+        assert fetched == [1]
+
+        fetched.clear()
+        asyncio.run(run_pipeline_cached_async(["u1", "u2"], fetch, cfg, cache=cache))
+        assert fetched == []
+    finally:
+        pool.shutdown()
+    assert cache.stats()["pdf_hits"] == 1
+
+
+def test_lru_eviction_by_size(tmp_path):
+    cache = AttachmentCache(root=str(tmp_path), max_bytes=250)
+    a, b, c = (cache.page_path(u, "cfg") for u in ("a", "b", "c"))
+    cache.put(a, b"x" * 100)
+    cache.put(b, b"y" * 100)
+    assert cache.get(a, "page") is not None        # a أحدث استخداماً من b الآن
+    cache.put(c, b"z" * 100)
+
+    assert cache.get(b, "page") is None
+    assert cache.get(a, "page") == b"x" * 100
+    assert not os.path.exists(b)
+    assert cache.stats()["evictions"] == 1
+
+    # فهرس جديد من القرص (إعادة تشغيل) يرى نفس المحتوى
+    reopened = AttachmentCache(root=str(tmp_path), max_bytes=250)
+    assert reopened.get(c, "page") == b"z" * 100
@@ -0,0 +1,115 @@
+# tests/test_attachment_downloads.py
+# services/attachment_pdf.py: تحميل محدود التزامن مع إعادة محاولة، وكل صفحة
+# تُعالَج فور وصولها مع توقيت لكل مرحلة. Fake bot — no Telegram, no DB.
+
+import asyncio
+import io
+import os
+import sys
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+import pytest
+from telegram.error import BadRequest, TimedOut
+
+import services.attachment_pdf as ap
+
+
+def _jpeg(value: int) -> bytes:
+    from PIL import Image
+    buf = io.BytesIO()
+    Image.new("RGB", (60, 80), (value, value, value)).save(buf, format="JPEG")
+    return buf.getvalue()
+
+
+class _FakeBot:
+    """get_file/download_to_memory مع تأخير لكل ملف وأخطاء مبرمجة."""
+
+    def __init__(self, delays=None, errors=None):
+        self.delays = delays or {}
+        self.errors = {k: list(v) for k, v in (errors or {}).items()}
+        self.calls = []
+        self.active = 0
+        self.peak = 0
+        self.done = []
+
+    async def get_file(self, file_id):
+        self.calls.append(file_id)
+        if self.errors.get(file_id):
+            raise self.errors[file_id].pop(0)
+        bot = self
+
+        class _File:
+            async def download_to_memory(self, buf):
+                bot.active += 1
+                bot.peak = max(bot.peak, bot.active)
+                try:
+                    await asyncio.sleep(bot.delays.get(file_id, 0.01))
+                    buf.write(_jpeg(int(file_id[1:]) * 20))
+                finally:
+                    bot.active -= 1
+                bot.done.append(file_id)
+
+        return _File()
+
+
+def test_downloads_are_bounded_retried_and_fetched_once(monkeypatch):
+    monkeypatch.setattr(ap, "ATTACHMENT_DOWNLOAD_CONCURRENCY", 2)
+    monkeypatch.setattr(ap, "ATTACHMENT_RETRY_BACKOFF", 0)
+    bot = _FakeBot(errors={
+        "p1": [TimedOut()],                          # عابر ⇒ يُعاد
+        "p2": [BadRequest("wrong file_id")],         # دائم ⇒ لا يُعاد
+    })
+    file_ids = ["p0", "p1", "p2", "p3", "p4", "p5"]
+
+    async def _run():
+        stage = ap.TelegramDownloadStage(bot, file_ids)
+        first = await stage.fetch_all()
+        again = await stage.fetch(0)                 # نفس الـtask، بلا تحميل جديد
+        return stage, first, again
+
+    stage, raws, again = asyncio.run(_run())
+    assert bot.peak == 2
+    assert raws[2] is None and all(raws[i] for i in (0, 1, 3, 4, 5))
+    assert again == raws[0]
+    assert bot.calls.count("p1") == 2 and bot.calls.count("p2") == 1 and bot.calls.count("p0") == 1
+    assert stage.retries == 1 and stage.failed == 1 and stage.download_s > 0
+
+    # فشل كل التحميلات ⇒ None بلا استثناء
+    dead = _FakeBot(errors={"p0": [BadRequest("gone")]})
+    assert asyncio.run(ap.photos_to_pdf(dead, ["p0"], label="test")) is None
+
+
+def test_pages_are_enhanced_as_they_arrive_with_stage_timings(monkeypatch):
+    pytest.importorskip("cv2")
+    import image_pipeline.executor as executor_mod
+    from image_pipeline.config import ExecutorConfig
+
+    bot = _FakeBot(delays={"p0": 0.01, "p1": 0.3})
+    events = []
+
+    def _fake_process(raw, cfg, job_id, idx):
+        events.append((f"enhanced {idx}", list(bot.done)))
+        return raw, True
+
+    executor = executor_mod.PipelineExecutor(ExecutorConfig(workers=1, warm_up_model=False))
+    pool = ThreadPoolExecutor(max_workers=2)
+    monkeypatch.setattr(executor, "_get_pool", lambda cfg: pool)
+    monkeypatch.setattr(executor_mod, "_executor", executor)
+    monkeypatch.setattr(executor_mod, "_process_page_to_jpeg", _fake_process)
+    ap._recent_jobs.clear()
+
+    try:
+        pdf = asyncio.run(ap.photos_to_pdf(bot, ["p0", "p1"], label="test"))
+    finally:
+        pool.shutdown()
+
+    assert pdf is not None and pdf.getvalue().startswith(b"%PDF")
+    # الصفحة 0 عولجت قبل انتهاء تحميل الصفحة 1
+    assert events[0] == ("enhanced 0", ["p0"])
+    stats = ap.attachment_job_stats()
+    assert stats["jobs"] == 1 and stats["failed_jobs"] == 0
+    assert stats["download_s"]["p50"] >= 0.3
+    assert stats["total_s"]["p50"] >= stats["download_s"]["p50"]
+    assert ap._recent_jobs[-1]["mode"] == "pipeline" and ap._recent_jobs[-1]["pdf_s"] > 0
@@ -0,0 +1,169 @@
+# tests/test_attachment_jobs.py
+# services/attachment_jobs.py: طابور مهام دائم في SQLite — idempotency، إعادة
+# بتراجع تكمل من آخر مرحلة، الاستئناف بعد إعادة التشغيل، والـhandler يعود فوراً.
+# Uses a throwaway SQLite file (tmp_path) and a fake bot — no Telegram.
+
+import asyncio
+import os
+import sys
+from types import SimpleNamespace
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+import db.session as _db_session
+import services.attachment_jobs as aj
+import services.medical_attachment_files_service as maf
+import services.pending_reports_service as prs
+import services.send_scheduler as send_scheduler
+from db.models import AttachmentPublishJob, Base, MedicalAttachmentFile, Report
+
+
+@pytest.fixture
+def session_factory(tmp_path, monkeypatch):
+    # ملف لا :memory: — خيط الكاتب الموحَّد وخيط الاختبار باتصالين منفصلين
+    engine = create_engine(
+        f"sqlite:///{tmp_path / 'jobs.db'}",
+        connect_args={"check_same_thread": False},
+    )
+    Base.metadata.create_all(bind=engine)
+    factory = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+    for module in (_db_session, prs, maf):
+        monkeypatch.setattr(module, "SessionLocal", factory)
+    monkeypatch.setattr(aj, "ATTACHMENT_JOB_RETRY_BASE", 0)
+
+    async def _direct_send(call, chat_id, priority=None):
+        return await call()
+
+    monkeypatch.setattr(send_scheduler, "send", _direct_send)
+    return factory
+
+
+class _Bot:
+    def __init__(self):
+        self.edits = []
+        self.sent = []
+
+    async def edit_message_text(self, chat_id, message_id, text, reply_markup=None, parse_mode=None):
+        self.edits.append(text)
+
+    async def send_video(self, chat_id, video, caption=None):
+        self.sent.append((chat_id, video, caption))
+        return SimpleNamespace(document=None, photo=None, video=SimpleNamespace(file_id=f"sent-{video}"))
+
+
+def _job(factory, job_id):
+    with factory() as s:
+        job = s.get(AttachmentPublishJob, job_id)
+        return job.status, job.attempts
+
+
+def test_dedup_retry_resumes_from_last_step_and_restart_recovery(session_factory):
+    sends, failures = [], []
+
+    async def _run(bot, job):
+        if not job.step_done("send"):
+            sends.append(job.payload["n"])
+            await job.mark_step("send", sent_at=job.attempts)
+        if job.payload["n"] == 1 and job.attempts == 1:
+            raise ConnectionError("network blip")            # بعد الإرسال ⇒ لا يُعاد الإرسال
+        if job.payload["n"] == 2:
+            raise aj.PermanentJobError("no group")
+        await job.progress("done")
+
+    async def _failed(bot, job, error):
+        failures.append((job.id, str(error)))
+
+    aj.register_job_handler("test", _run, on_failed=_failed)
+    queue = aj.AttachmentJobQueue(workers=1)
+    queue.bot = bot = _Bot()
+
+    async def _scenario():
+        first, outcome = await queue.submit("test", "k1", {"n": 1}, chat_id=5, message_id=9)
+        again, outcome_again = await queue.submit("test", "k1", {"n": 1})
+        assert outcome == "created" and outcome_again == "queued" and again == first
+
+        assert await queue.run_once()                         # محاولة 1 تفشل بعد الإرسال
+        assert _job(session_factory, first) == ("queued", 1)
+        assert await queue.run_once()                         # محاولة 2 تكمل بلا إرسال ثانٍ
+        assert _job(session_factory, first) == ("done", 2)
+        assert sends == [1] and bot.edits[-1] == "done"
+        assert await queue.submit("test", "k1", {"n": 1}) == (first, "done")   # زر قديم يُضغط مجدداً
+
+        bad, _ = await queue.submit("test", "k2", {"n": 2})
+        assert await queue.run_once()
+        assert _job(session_factory, bad) == ("failed", 1) and failures == [(bad, "no group")]
+        assert await queue.retry(bad) and _job(session_factory, bad)[0] == "queued"
+        assert not await queue.retry(first)                   # مكتملة ⇒ لا إعادة
+
+        # مهمة كانت تعمل لحظة توقف البوت ⇒ تعود للطابور ويكملها العمّال
+        stuck, _ = await queue.submit("test", "k3", {"n": 3}, wake=False)
+        with session_factory() as s:
+            s.query(AttachmentPublishJob).filter_by(id=stuck).update({"status": "running"})
+            s.query(AttachmentPublishJob).filter_by(id=bad).update({"status": "done"})
+            s.commit()
+        await queue.start(bot)
+        for _ in range(200):
+            if queue.stats()["done"] == 2:
+                break
+            await asyncio.sleep(0.01)
+        await queue.stop()
+        assert _job(session_factory, stuck)[0] == "done" and sends == [1, 2, 3]
+
+    asyncio.run(_scenario())
+    assert queue.stats()["done"] == 2 and queue.stats()["retried"] == 1
+
+
+def test_publish_handler_acknowledges_and_job_publishes(session_factory, monkeypatch):
+    import bot.handlers.user.user_medical_attachments as uma
+
+    monkeypatch.setattr(uma, "SessionLocal", session_factory)
+    monkeypatch.setattr(uma, "MEDICAL_REPORTS_GROUP_ID", -100500)
+    queue = aj.AttachmentJobQueue(workers=1)
+    monkeypatch.setattr(aj, "job_queue", queue)
+    aj.register_job_handler("ma_publish", uma._run_publish_job, on_failed=uma._publish_job_failed)
+    with session_factory() as s:
+        s.add(Report(id=11, patient_name="مريض", medical_action="متابعة", has_paper_report=0))
+        s.commit()
+
+    acks = []
+    query = SimpleNamespace(
+        from_user=SimpleNamespace(id=77, full_name="مترجم"),
+        message=SimpleNamespace(chat_id=77, message_id=3),
+        edit_message_text=lambda text, **kw: asyncio.sleep(0, acks.append(text)),
+    )
+    attachments = [{"file_id": "vid-1", "type": "video", "file_name": None, "file_unique_id": None}]
+    context = SimpleNamespace(user_data={"ma_state": {
+        "report_id": 11, "attachments": attachments,
+        "report_info": {"id": 11, "patient_name": "مريض", "medical_action": "متابعة"},
+    }})
+    bot = _Bot()
+    queue.bot = bot
+
+    async def _scenario():
+        await uma._publish_attachments(query, context)
+        assert "ma_state" not in context.user_data and bot.sent == []     # لا عمل داخل الـcallback
+        context.user_data["ma_state"] = {"attachments": attachments, "report_info": {"id": 11}}
+        await uma._publish_attachments(query, context)                      # ضغطة مزدوجة
+        assert await queue.run_once() and not await queue.run_once()
+
+        context.user_data["ma_state"] = {"attachments": attachments, "report_info": {"id": 11}}
+        await uma._publish_attachments(query, context)                      # بعد الاكتمال مباشرة
+        assert not await queue.run_once()
+        # إعادة نشر نفس الملفات عمداً بعد انقضاء النافذة ⇒ تُنشر من جديد
+        monkeypatch.setattr(aj, "ATTACHMENT_JOB_DEDUPE_WINDOW", 0)
+        context.user_data["ma_state"] = {"attachments": attachments, "report_info": {"id": 11}}
+        await uma._publish_attachments(query, context)
+        assert await queue.run_once()
+
+    asyncio.run(_scenario())
+    assert acks[0].startswith("⏳") and acks[1].startswith("ℹ️")
+    assert acks[2].startswith("✅") and acks[3].startswith("⏳")
+    assert [(chat, video) for chat, video, _ in bot.sent] == [(-100500, "vid-1")] * 2
+    assert bot.edits[-1].startswith("✅ **تم النشر بنجاح**")
+    with session_factory() as s:
+        assert s.get(Report, 11).has_paper_report == 1
+        assert [f.file_id for f in s.query(MedicalAttachmentFile).all()] == ["sent-vid-1"] * 2
@@ -0,0 +1,122 @@
+# tests/test_caching.py
+# services/caching.py: LRU/TTL، single-flight، وإبطال الوسوم (حتى أثناء التحميل).
+# No Telegram, no real DB required.
+
+import asyncio
+import os
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from services.caching import CacheManager, cached, get_cache, invalidate_tag
+
+
+def test_lru_evicts_least_recently_used():
+    c = CacheManager(default_ttl=60, max_entries=2)
+    c.set("a", 1)
+    c.set("b", 2)
+    assert c.get("a") == 1          # "a" أصبح الأحدث استخداماً
+    c.set("c", 3)
+    assert c.get("b") is None
+    assert c.get("a") == 1 and c.get("c") == 3
+    assert c.stats()["evictions"] == 1
+
+
+def test_max_bytes_and_ttl():
+    c = CacheManager(default_ttl=60, max_entries=0, max_bytes=2000)
+    for i in range(50):
+        c.set(i, "x" * 100)
+    assert c.stats()["bytes"] <= 2000
+    assert c.get(49) is not None
+
+    c.set("short", 1, ttl=0.01)
+    time.sleep(0.02)
+    assert c.get("short") is None
+    assert c.stats()["expirations"] == 1
+
+
+def test_sync_decorator_single_flight_and_tag_invalidation():
+    calls = []
+    gate = threading.Event()
+
+    @cached(ttl=60, namespace="test_sync", tags=("things",))
+    def load(x):
+        calls.append(x)
+        gate.wait(1)
+        return [x]
+
+    threads = [threading.Thread(target=load, args=(1,)) for _ in range(8)]
+    for t in threads:
+        t.start()
+    time.sleep(0.05)
+    gate.set()
+    for t in threads:
+        t.join()
+    assert calls == [1]
+
+    assert load(1) == [1] and calls == [1]
+    assert invalidate_tag("things") == 1
+    load(1)
+    assert calls == [1, 1]
+    stats = get_cache("test_sync").stats()
+    assert stats["hits"] >= 1 and stats["invalidations"] == 1
+
+
+def test_async_decorator_single_flight():
+    calls = []
+
+    @cached(ttl=60, namespace="test_async")
+    async def load(x):
+        calls.append(x)
+        await asyncio.sleep(0.01)
+        return x * 2
+
+    async def _run():
+        return await asyncio.gather(*(load(3) for _ in range(10)))
+
+    assert asyncio.run(_run()) == [6] * 10
+    assert calls == [3]
+    load.cache_clear()
+    assert asyncio.run(load(3)) == 6
+    assert calls == [3, 3]
+
+
+def test_invalidation_during_load_is_not_overwritten():
+    c = CacheManager(default_ttl=60)
+    version = [1]
+
+    def _load_racing_write():
+        seen = version[0]
+        version[0] += 1                 # كتابة تُثبَّت وتُبطل الوسم أثناء التحميل
+        c.invalidate_tag("rows")
+        return seen
+
+    assert c.get_or_load("k", _load_racing_write, tags=("rows",)) == 1   # المستدعي يأخذ القيمة
+    assert c.get("k") is None                                           # لكنها لا تُخزَّن
+    assert c.get_or_load("k", lambda: version[0], tags=("rows",)) == 2
+    assert c.get("k") == 2
+
+    def _load_then_delete():
+        c.delete("d")
+        return "old"
+
+    assert c.get_or_load("d", _load_then_delete) == "old" and c.get("d") is None
+    assert c.get_or_load("d", lambda: "new") == "new" and c.get("d") == "new"
+
+    async def _async_race():
+        gate = asyncio.Event()
+
+        async def _slow():
+            await gate.wait()
+            return "stale"
+
+        waiters = [asyncio.ensure_future(c.aget_or_load("a", _slow, tags=("rows",))) for _ in range(3)]
+        await asyncio.sleep(0)
+        c.invalidate_tag("rows")
+        gate.set()
+        return await asyncio.gather(*waiters)
+
+    results = asyncio.run(_async_race())
+    assert results == ["stale"] * 3 and c.get("a") is None
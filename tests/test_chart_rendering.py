@@ -0,0 +1,71 @@
+# tests/test_chart_rendering.py
+# services/chart_rendering.py: PNG محفوظ بمفتاح البيانات، دفعة واحدة بلا تكرار،
+# ورسم فعلي في process pool. No Telegram, no DB required.
+
+import os
+import sys
+from datetime import date, timedelta
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+import pytest
+
+import services.chart_rendering as cr
+
+PNG_MAGIC = b"\x89PNG\r\n\x1a\n"
+
+
+def test_batch_is_memoized_by_data_hash_and_failures_are_not_cached(monkeypatch):
+    drawn = []
+
+    def _fake_render(spec):
+        drawn.append(spec["kind"])
+        if spec["kind"] == "broken":
+            raise ValueError("bad data")
+        return PNG_MAGIC + repr(spec["values"]).encode()
+
+    monkeypatch.setattr(cr, "render_png", _fake_render)
+    svc = cr.ChartRenderService(workers=0)
+    svc.cache.clear()
+
+    bar = {"kind": "hbar", "labels": ["أ", "ب"], "values": [3, 1]}
+    same_bar = {"values": [3, 1], "labels": ["أ", "ب"], "kind": "hbar"}      # ترتيب مفاتيح آخر
+    assert cr.chart_key(bar) == cr.chart_key(same_bar)
+    assert cr.chart_key(bar) != cr.chart_key({**bar, "values": [3, 2]})
+
+    out = svc.render_many([bar, None, same_bar, {"kind": "broken", "values": []}])
+    assert out[0] == out[2] == PNG_MAGIC + b"[3, 1]"
+    assert out[1] is None and out[3] is None
+    assert drawn == ["hbar", "broken"]                      # المكرر رُسم مرة واحدة
+
+    drawn.clear()
+    out = svc.render_many([bar, {"kind": "broken", "values": []}])
+    assert out[0] == PNG_MAGIC + b"[3, 1]" and drawn == ["broken"]
+    stats = svc.stats()
+    assert stats["rendered"] == 1 and stats["failed"] == 2
+
+
+def test_pool_renders_real_charts_in_parallel():
+    pytest.importorskip("matplotlib")
+    svc = cr.ChartRenderService(workers=2, min_batch=2)
+    svc.cache.clear()
+    days = [date(2026, 3, 1) + timedelta(days=i) for i in range(5)]
+    specs = [
+        {"kind": "hbar", "labels": ["مستشفى أبولو", "Fortis"], "values": [7, 2], "figsize": (10, 3)},
+        {"kind": "pie", "labels": ["استشارة (4)", "عملية (1)"], "values": [4, 1], "figsize": (5.5, 4.5)},
+        {"kind": "date_line", "dates": days, "counts": [1, 3, 2, 5, 4], "figsize": (12, 3.5)},
+        {"kind": "top5_pie", "labels": list("abcdefg"), "values": [1, 2, 3, 4, 5, 6, 7], "dpi": 100},
+    ]
+    try:
+        pngs = svc.render_many(specs)
+    finally:
+        svc.shutdown()
+    assert all(p and p.startswith(PNG_MAGIC) for p in pngs)
+    assert svc.stats()["pooled"] == 4
+
+    # في نفس العملية: Figure واحدة مُعاد استخدامها والتسميات المُشكَّلة محفوظة
+    first = cr.render_png(specs[0])
+    fig = cr._local.figure
+    hits = cr.shape_label.cache_info().hits
+    assert cr.render_png(specs[0]) == first and cr._local.figure is fig
+    assert cr.shape_label.cache_info().hits >= hits + 2
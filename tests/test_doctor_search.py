@@ -0,0 +1,55 @@
+# tests/test_doctor_search.py
+# services/doctors_smart_search.py: الفهرس، الفلترة، وإعادة التحميل عند تغيّر الملف.
+# No Telegram, no DB required.
+
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+import pytest
+
+import services.doctors_smart_search as dss
+
+_ROWS = [
+    "Dr. Ravi Kumar | Sakra World Hospital, Bangalore | أمراض القلب | Cardiology",
+    "Dr. Anil Reddy | Sakra World Hospital, Bangalore | جراحة العظام | Orthopedics",
+    "Dr. Meena Rao | Apollo Hospital, Bannerghatta Bangalore | أمراض القلب | Cardiology",
+]
+
+
+@pytest.fixture
+def doctors_dir(tmp_path, monkeypatch):
+    (tmp_path / "doctors.txt").write_text("# test\n" + "\n".join(_ROWS) + "\n", encoding="utf-8")
+    monkeypatch.setattr(dss, "_DATA_DIR", str(tmp_path))
+    monkeypatch.setattr(dss, "_RELOAD_CHECK_INTERVAL", 0)
+    dss.reload_doctors()
+    yield tmp_path
+    monkeypatch.undo()
+    dss.reload_doctors()
+
+
+def test_index_filters_by_hospital_and_department(doctors_dir):
+    index = dss.get_doctor_index()
+    assert len(index) == 3
+    assert set(index.tree) == {"Sakra World Hospital, Bangalore", "Apollo Hospital, Bannerghatta Bangalore"}
+
+    names = [d["name"] for d in dss.search_doctors("", hospital="Sakra", department="أمراض القلب | Cardiology")]
+    assert names == ["Dr. Ravi Kumar"]
+
+    top = dss.search_doctors("meena", limit=1)
+    assert top[0]["name"] == "Dr. Meena Rao"
+
+    assert dss.get_departments_for_hospital("Sakra") == ["Cardiology", "Orthopedics"]
+
+
+def test_index_reloads_when_file_changes(doctors_dir):
+    assert len(dss.load_doctors()) == 3
+    path = doctors_dir / "doctors.txt"
+    path.write_text(path.read_text(encoding="utf-8")
+                    + "Dr. Sara Iyer | Apollo Hospital, Bannerghatta Bangalore | أعصاب | Neurology\n",
+                    encoding="utf-8")
+    os.utime(path, (time.time() + 5, time.time() + 5))
+    assert len(dss.load_doctors()) == 4
+    assert dss.search_doctors("sara iyer", limit=1)[0]["name"] == "Dr. Sara Iyer"
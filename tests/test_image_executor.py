@@ -0,0 +1,71 @@
+# tests/test_image_executor.py
+# image_pipeline/executor.py: صفحات متوازية في process pool ورفض المهام عند الامتلاء.
+# No Telegram, no DB required. Skipped when OpenCV is not installed.
+
+import asyncio
+import gc
+import inspect
+import os
+import sys
+import warnings
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+import pytest
+
+cv2 = pytest.importorskip("cv2")
+np = pytest.importorskip("numpy")
+
+from image_pipeline.config import ExecutorConfig, PipelineConfig
+from image_pipeline.executor import PipelineBusy, PipelineExecutor
+
+
+def _page(value: int) -> bytes:
+    img = np.full((120, 90, 3), value, dtype=np.uint8)
+    return cv2.imencode(".png", img)[1].tobytes()
+
+
+@pytest.fixture
+def cfg():
+    cfg = PipelineConfig()
+    cfg.debug.enabled = False
+    cfg.detector.enabled = False
+    return cfg
+
+
+def test_pool_builds_pdf_and_skips_undecodable_pages(cfg):
+    executor = PipelineExecutor(ExecutorConfig(workers=1, warm_up_model=False))
+    try:
+        pdf = asyncio.run(executor.run([_page(200), b"not an image", _page(90)], cfg))
+        assert pdf.read(5) == b"%PDF-"
+        stats = executor.stats()
+        assert stats["jobs"] == 1 and stats["pages"] == 2
+    finally:
+        executor.shutdown()
+
+
+def test_full_queue_rejects_immediately(cfg):
+    executor = PipelineExecutor(ExecutorConfig(workers=1, max_running_jobs=1, max_queued_jobs=0))
+
+    async def _scenario():
+        slots = executor._get_slots()
+        await slots.acquire()          # one job "running"
+        try:
+            with pytest.raises(PipelineBusy):
+                await executor.run([_page(200)], cfg)
+            # مصادر المهمة المرفوضة تُغلق/تُلغى — لا "coroutine was never awaited"
+            download = asyncio.sleep(0, result=_page(90))
+            pending = asyncio.ensure_future(asyncio.sleep(3600))
+            with pytest.raises(PipelineBusy):
+                await executor.process_page_sources([download, pending], cfg)
+            assert inspect.getcoroutinestate(download) == inspect.CORO_CLOSED
+            await asyncio.sleep(0)
+            assert pending.cancelled()
+        finally:
+            slots.release()
+
+    with warnings.catch_warnings():
+        warnings.simplefilter("error", RuntimeWarning)
+        asyncio.run(_scenario())
+        gc.collect()
+    assert executor.stats()["rejected"] == 2
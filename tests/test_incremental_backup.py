@@ -0,0 +1,203 @@
+# tests/test_incremental_backup.py
+# النسخ التزايدي (services/incremental_backup.py): كل تشغيل يكتب القطع
+# المتغيرة فقط، الاستعادة لأي لحظة، وكتابات متزامنة لا تعيد النسخ ولا تمزقه،
+# و prune ينتظر أي نسخة جارية (قفل الأرشيف).
+# Uses temporary files only — no production DB touched.
+
+import os
+import sqlite3
+import sys
+import threading
+import time
+from datetime import datetime
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+import pytest
+
+import services.incremental_backup as ib
+
+
+def _make_db(path, rows=2000):
+    conn = sqlite3.connect(path)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("CREATE TABLE reports (id INTEGER PRIMARY KEY, body TEXT)")
+    conn.executemany("INSERT INTO reports (body) VALUES (?)", [(f"report {i} " + "x" * 400,) for i in range(rows)])
+    conn.commit()
+    return conn
+
+
+def _count(path, where="1=1"):
+    with sqlite3.connect(path) as conn:
+        return conn.execute(f"SELECT COUNT(*) FROM reports WHERE {where}").fetchone()[0]
+
+
+def test_second_backup_writes_only_changed_chunks_and_restores_in_time(tmp_path, monkeypatch):
+    monkeypatch.setattr(ib, "BACKUP_CHUNK_PAGES", 4)
+    db = str(tmp_path / "live.db")
+    backend = ib.LocalDirectoryBackend(str(tmp_path / "store"))
+    conn = _make_db(db)
+
+    first = ib.backup(db, backend, label="t", retention=False)
+    assert first["metrics"]["chunks_written"] == first["metrics"]["chunks_total"] > 10
+
+    time.sleep(0.01)
+    conn.execute("UPDATE reports SET body = 'edited' WHERE id = 1500")
+    conn.commit()
+    second = ib.backup(db, backend, label="t", retention=False)
+    m = second["metrics"]
+    assert 0 < m["chunks_written"] <= 3
+    assert m["bytes_written"] < first["metrics"]["bytes_written"] / 5
+    assert {"duration_ms", "lock_wait_ms", "snapshot_ms", "steps"} <= m.keys()
+
+    target = str(tmp_path / "restored.db")
+    ib.restore(target, at=first["id"], backend=backend)
+    assert _count(target, "body = 'edited'") == 0 and _count(target) == 2000
+
+    ib.restore(target, backend=backend)
+    assert _count(target, "body = 'edited'") == 1
+    assert any(name.startswith("restored.db.before_restore_") for name in os.listdir(tmp_path))
+
+    # لا نسخة قبل الأولى
+    with pytest.raises(FileNotFoundError):
+        ib.restore(target, at=datetime(2000, 1, 1), backend=backend)
+
+
+def test_concurrent_writes_prune_and_corruption(tmp_path, monkeypatch):
+    monkeypatch.setattr(ib, "BACKUP_CHUNK_PAGES", 4)
+    db = str(tmp_path / "live.db")
+    backend = ib.LocalDirectoryBackend(str(tmp_path / "store"))
+    conn = _make_db(db)
+
+    # كاتب متزامن وخطوة بصفحة واحدة: اللقطة متسقة ولا تُعاد من البداية
+    real_copy = ib.online_copy
+    monkeypatch.setattr(ib, "online_copy", lambda src, dst: real_copy(src, dst, pages=1, sleep=0.001))
+    stop = threading.Event()
+
+    def _writer():
+        w = sqlite3.connect(db, timeout=30)
+        while not stop.is_set():
+            w.execute("INSERT INTO reports (body) VALUES ('during backup')")
+            w.commit()
+        w.close()
+
+    thread = threading.Thread(target=_writer)
+    thread.start()
+    try:
+        manifest = ib.backup(db, backend, retention=False)
+    finally:
+        stop.set()
+        thread.join()
+
+    m = manifest["metrics"]
+    assert m["steps"] <= m["pages"] + 1                    # لا إعادة بدء
+    assert _count(db, "body = 'during backup'") > 0
+    target = str(tmp_path / "restored.db")
+    ib.restore(target, at=manifest["id"], backend=backend)
+    snapshot_rows = _count(target)
+    assert snapshot_rows >= 2000
+
+    for i in range(3):
+        conn.execute("INSERT INTO reports (body) VALUES (?)", (f"later {i} " + "y" * 4000,))
+        conn.commit()
+        time.sleep(0.01)
+        ib.backup(db, backend, retention=False)
+    # كل النسخ في الساعة نفسها ⇒ تبقى الأحدث فقط
+    result = ib.prune(backend, hourly=2, daily=0, monthly=0, last=1)
+    assert result["manifests"] == 3 and result["chunks"] > 0
+    assert backend.list_manifests() == [ib.find_snapshot(backend=backend)["id"]]
+    referenced = {d for i in backend.list_manifests() for d in backend.get_manifest(i)["chunks"]}
+    assert set(backend.iter_chunks()) == referenced
+
+    latest = ib.find_snapshot(backend=backend)
+    with open(backend._find_chunk(latest["chunks"][-1]), "r+b") as f:
+        f.write(b"garbage")
+    assert not ib.verify(backend=backend)["ok"]
+    with pytest.raises(ValueError):
+        ib.restore(target, backend=backend)
+    assert _count(target) == snapshot_rows                 # الملف السابق لم يُمس
+
+
+def test_prune_waits_for_inflight_backup(tmp_path, monkeypatch):
+    monkeypatch.setattr(ib, "BACKUP_CHUNK_PAGES", 4)
+    db = str(tmp_path / "live.db")
+    root = str(tmp_path / "store")
+    backend = ib.LocalDirectoryBackend(root)
+    conn = _make_db(db)
+    ib.backup(db, backend, retention=False)
+    conn.execute("UPDATE reports SET body = 'changed' WHERE id > 1000")
+    conn.commit()
+
+    # نسخة جارية تتوقف بعد كتابة أول قطعة جديدة — قبل أن يوجد الـmanifest
+    written, resume = threading.Event(), threading.Event()
+    real_put = backend.put_chunk
+
+    def _slow_put(digest, data):
+        n = real_put(digest, data)
+        written.set()
+        resume.wait(5)
+        return n
+
+    monkeypatch.setattr(backend, "put_chunk", _slow_put)
+    result = {}
+    running = threading.Thread(target=lambda: result.update(m=ib.backup(db, backend, retention=False)))
+    running.start()
+    assert written.wait(5)
+    # prune من "عملية أخرى" (backend مستقل لنفس المجلد، كما في scripts/backup_archive.py)
+    pruner = threading.Thread(target=lambda: result.update(p=ib.prune(ib.LocalDirectoryBackend(root), 0, 0, 0, 1)))
+    pruner.start()
+    pruner.join(0.3)
+    assert pruner.is_alive()                               # ينتظر القفل
+    resume.set()
+    running.join()
+    pruner.join()
+
+    assert result["p"]["manifests"] == 1 and backend.list_manifests() == [result["m"]["id"]]
+    assert ib.verify(backend=backend, deep=True)["ok"]
+
+
+def test_gfs_retention_keeps_newest_per_hour_day_month():
+    ids = [
+        "20260105T100000_000000Z",                                # شهر أقدم
+        "20260301T080000_000000Z", "20260301T230000_000000Z",     # يوم 1
+        "20260302T090000_000000Z",                                # يوم 2
+        "20260303T140000_000000Z", "20260303T141000_000000Z",     # نفس الساعة
+        "20260303T150000_000000Z", "20260303T152000_000000Z",
+    ]
+    keep = ib.retention_keep(ids, hourly=2, daily=2, monthly=2, last=1)
+    assert keep == {
+        "20260303T152000_000000Z",      # الأحدث + آخر ساعة + آخر يوم + آخر شهر
+        "20260303T141000_000000Z",      # الساعة السابقة
+        "20260302T090000_000000Z",      # اليوم السابق
+        "20260105T100000_000000Z",      # الشهر السابق
+    }
+    assert ib.retention_keep(ids, hourly=0, daily=0, monthly=0, last=1) == {ids[-1]}
+    assert ib.retention_keep(ids, hourly=0, daily=0, monthly=0, last=3) == set(ids[-3:])
+
+
+def test_archive_compresses_dedups_and_grows_with_changes(tmp_path, monkeypatch):
+    monkeypatch.setattr(ib, "BACKUP_CHUNK_PAGES", 32)
+    db = str(tmp_path / "live.db")
+    backend = ib.LocalDirectoryBackend(str(tmp_path / "store"))
+    conn = _make_db(db, rows=4000)
+
+    first = ib.backup(db, backend, retention=False)
+    assert first["metrics"]["bytes_written"] < first["size"] / 3         # مضغوط
+    after_first = ib.archive_stats(backend)["stored_bytes"]
+
+    for i in range(5):
+        conn.execute("UPDATE reports SET body = ? WHERE id = ?", (f"edit {i}", 100 + 500 * i))
+        conn.commit()
+        time.sleep(0.01)
+        assert ib.backup(db, backend, retention=False)["metrics"]["chunks_written"] <= 2
+
+    stats = ib.archive_stats(backend)
+    assert stats["snapshots"] == 6
+    # خمس نسخ إضافية كلّفت أقل من نسخة مضغوطة كاملة واحدة (+ manifests)
+    assert stats["stored_bytes"] - after_first < after_first
+    assert stats["ratio"] > 10
+
+    report = ib.verify(at=first["id"], backend=backend, deep=True)
+    assert report == {"id": first["id"], "ok": True, "error": None, "bytes": first["size"]}
+    streamed = sum(len(c) for c in ib.iter_snapshot(ib.find_snapshot(backend=backend), backend))
+    assert streamed == first["size"]
@@ -0,0 +1,125 @@
+# tests/test_log_pipeline.py
+# services/log_pipeline.py: المعالِجات خلف QueueListener بفلاترها ومستوياتها،
+# الرسالة تُثبَّت عند الاستدعاء وexc_info يبقى، الإسقاط عند الامتلاء، وأخذ العينات.
+# services/error_digest.py: ملف اليوم يبقى مفتوحاً وكل خطأ على القرص فور تسجيله.
+
+import json
+import logging
+import os
+import sys
+import threading
+from datetime import date
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+import services.error_digest as error_digest
+import services.log_pipeline as lp
+
+
+class _Capture(logging.Handler):
+    def __init__(self, level=logging.NOTSET):
+        super().__init__(level)
+        self.records = []
+        self.threads = set()
+
+    def emit(self, record):
+        self.records.append((record.levelname, record.getMessage(),
+                             record.exc_info[0].__name__ if record.exc_info else None))
+        self.threads.add(threading.current_thread().name)
+
+
+def test_handlers_move_behind_queue_and_are_restored():
+    log = logging.getLogger("tests.log_pipeline")
+    log.propagate = False
+    log.setLevel(logging.DEBUG)
+    everything, errors = _Capture(), _Capture(logging.ERROR)
+    redact = logging.Filter()
+    redact.filter = lambda r: (setattr(r, "msg", r.getMessage().replace("secret", "***")), True)[1]
+    everything.addFilter(redact)
+    log.addHandler(everything)
+    log.addHandler(errors)
+
+    pipeline = lp.LogPipeline(log)
+    pipeline.start()
+    assert log.handlers == [pipeline.handler]
+    items = ["a"]
+    log.info("items=%s secret", items)
+    items.append("b")                                   # بعد الاستدعاء ⇒ لا أثر
+    try:
+        raise ValueError("boom")
+    except ValueError:
+        log.exception("failed %d", 3)
+    late = _Capture()
+    pipeline.add_handler(late)
+    log.warning("late")
+    pipeline.stop()
+
+    assert everything.records == [
+        ("INFO", "items=['a'] ***", None),
+        ("ERROR", "failed 3", "ValueError"),
+        ("WARNING", "late", None),
+    ]
+    assert errors.records == [("ERROR", "failed 3", "ValueError")]
+    assert late.records[-1] == ("WARNING", "late", None)
+    assert everything.threads and threading.current_thread().name not in everything.threads
+    assert log.handlers == [everything, errors, late]
+    assert pipeline.stats()["enqueued"] == 3
+
+    # طابور ممتلئ (بلا مستمع) ⇒ ما دون WARNING يُسقط ويُعدّ
+    full = lp.LogPipeline(logging.getLogger("tests.log_pipeline.full"), queue_size=1)
+    for _ in range(3):
+        full.handler.handle(logging.LogRecord("x", logging.INFO, __file__, 1, "m", None, None))
+    assert full.stats() == {"queue_depth": 1, "enqueued": 1, "dropped": 2, "handlers": 0}
+    for h in list(log.handlers):
+        log.removeHandler(h)
+
+
+def test_sampling_and_open_digest_file(tmp_path, monkeypatch):
+    log = logging.getLogger("tests.log_pipeline.sampled")
+    log.propagate = False
+    log.setLevel(logging.INFO)
+    cap = _Capture()
+    log.addHandler(cap)
+    clock = [100.0]
+    monkeypatch.setattr(lp.time, "monotonic", lambda: clock[0])
+    try:
+        assert lp.log_sampled(log, "k", "hits %d", 1, interval=10)
+        assert not lp.log_sampled(log, "k", "hits %d", 2, interval=10)
+        assert not lp.log_sampled(log, "k", "hits %d", 3, interval=10)
+        assert lp.log_sampled(log, "other", "other", interval=10)
+        clock[0] += 11
+        assert lp.log_sampled(log, "k", "hits %d", 4, interval=10)
+        assert not lp.log_sampled(log, "k", "debug", level=logging.DEBUG)
+    finally:
+        log.removeHandler(cap)
+    assert [m for _, m, _ in cap.records] == ["hits 1", "other", "hits 4 (+2 مكررة خلال 10s)"]
+
+    monkeypatch.setattr(error_digest, "LOGS_DIR", tmp_path)
+    day = [date(2026, 8, 20)]
+    monkeypatch.setattr(error_digest, "_today_local", lambda: day[0])
+    handler = error_digest._DigestHandler()
+    handler.setLevel(logging.ERROR)
+    monkeypatch.setattr(error_digest, "_handler", handler)
+
+    def _err(msg):
+        handler.handle(logging.LogRecord("svc", logging.ERROR, __file__, 7, msg, None, None))
+
+    def _on_disk(d):
+        # قراءة الملف مباشرة، بلا flush الذي يسبق read_day
+        return [json.loads(line)["msg"] for line in error_digest._day_file(d).read_text(encoding="utf-8").splitlines()]
+
+    _err("first")
+    stream = handler._fh
+    assert _on_disk(day[0]) == ["first"]      # خطأ وحيد لا ينتظر سجلاً لاحقاً
+    _err("second")
+    _err("httpx timed out")                  # ضجيج شبكة ⇒ لا يُكتب
+    assert handler._fh is stream and not stream.closed
+    assert _on_disk(day[0]) == ["first", "second"]
+    assert [e["msg"] for e in error_digest.read_day(day[0])] == ["first", "second"]
+
+    day[0] = date(2026, 8, 21)
+    _err("next day")
+    assert stream.closed and handler._fh is not stream
+    handler.close()
+    assert [e["msg"] for e in error_digest.read_day(date(2026, 8, 21))] == ["next day"]
+    assert len(error_digest.read_day(date(2026, 8, 20))) == 2
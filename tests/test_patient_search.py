@@ -0,0 +1,70 @@
+# tests/test_patient_search.py
+# فهرس أسماء المرضى FTS5 (db/patient_search.py): التطبيع، الترتيب، والـtriggers.
+# Uses an in-memory SQLite database — no production DB touched.
+
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+
+import db.session as _db_session
+from db.models import Base, Patient
+from db.patient_search import ensure_patient_search_index, search_patient_ids
+
+
+@pytest.fixture
+def session_factory(monkeypatch):
+    engine = create_engine(
+        "sqlite:///:memory:",
+        connect_args={"check_same_thread": False},
+        poolclass=StaticPool,
+    )
+    Base.metadata.create_all(bind=engine)
+    factory = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+    with factory() as s:
+        # موجودون قبل إنشاء الفهرس ⇒ يُملأ بالـbackfill
+        s.add_all([Patient(full_name=n) for n in ("محمد أحمد", "أحمد علي", "فاطمة الزهراء")])
+        s.commit()
+    assert ensure_patient_search_index(engine)
+    monkeypatch.setattr(_db_session, "SessionLocal", factory)
+    return factory
+
+
+def _names(s, query):
+    return [s.get(Patient, i).full_name for i in search_patient_ids(s, query)]
+
+
+def test_search_folds_arabic_variants_and_ranks_prefix_first(session_factory):
+    with session_factory() as s:
+        assert _names(s, "احمد") == ["أحمد علي", "محمد أحمد"]
+        assert _names(s, "فاطمه") == ["فاطمة الزهراء"]
+        assert _names(s, "علي احمد") == ["أحمد علي"]
+        assert _names(s, "خالد") == []
+
+
+def test_triggers_keep_index_in_sync(session_factory):
+    with session_factory() as s:
+        p = Patient(full_name="مصطفى كمال")
+        s.add(p)
+        s.commit()
+        assert _names(s, "مصطفي") == ["مصطفى كمال"]
+
+        p.full_name = "إبراهيم كمال"
+        s.commit()
+        assert _names(s, "مصطفي") == []
+        assert _names(s, "ابراهيم") == ["إبراهيم كمال"]
+
+        s.delete(p)
+        s.commit()
+        assert search_patient_ids(s, "ابراهيم") == []
+
+
+def test_selector_search_uses_index(session_factory):
+    from shared.selectors.patient_selector._data import search
+
+    assert [r.name for r in search("احمد")] == ["أحمد علي", "محمد أحمد"]
@@ -0,0 +1,112 @@
+# tests/test_pharmacy_ledger.py
+# services/pharmacy_evacuation_service.py: المسير استعلام JOIN واحد كتدفّق —
+# آخر سجل مالي غير محذوف، فلاتر النوع/العزل/المختص، الترتيب، والملخص في SQL.
+# services/pharmacy_evacuation_excel.py: write-only يستهلك التدفّق مباشرة.
+# Uses a throwaway SQLite file (tmp_path).
+
+import io
+import os
+import sys
+from datetime import date, datetime
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+import db.session as _db_session
+import services.pharmacy_evacuation_service as pes
+from db.models import Base, MedicationRecord, PharmacyFinancialRecord, SuppliesRecord
+
+_DAY = date(2026, 5, 10)
+
+
+@pytest.fixture
+def session_factory(tmp_path, monkeypatch):
+    engine = create_engine(f"sqlite:///{tmp_path / 'ledger.db'}")
+    Base.metadata.create_all(bind=engine)
+    factory = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+    monkeypatch.setattr(_db_session, "SessionLocal", factory)
+    return factory
+
+
+def _seed(factory):
+    with factory() as s:
+        # نفس المعرّف (1) في الجدولين — لا يجوز أن يتقاطع السجل المالي بينهما
+        s.add_all([
+            MedicationRecord(id=1, patient_name="أ", item_count="3", dispense_source="الصيدلية",
+                             specialist_name="س", created_by=7, created_at=datetime(2026, 5, 10, 12)),
+            SuppliesRecord(id=1, patient_name="ب", item_count="شاش", dispense_source="الصيدلية",
+                           specialist_name="ص", created_by=8, created_at=datetime(2026, 5, 10, 9)),
+            MedicationRecord(id=2, patient_name=None, item_count=None, dispense_source="الصيدلية",
+                             specialist_name="س", created_by=8, created_at=datetime(2026, 5, 10, 9)),
+            MedicationRecord(id=3, patient_name="مخزن", dispense_source="المخزن", created_at=datetime(2026, 5, 10, 10)),
+            MedicationRecord(id=4, patient_name="بلا مالية", dispense_source="الصيدلية", created_at=datetime(2026, 5, 10, 11)),
+            MedicationRecord(id=5, patient_name="محذوفة", dispense_source="الصيدلية", created_at=datetime(2026, 5, 10, 11)),
+            MedicationRecord(id=6, patient_name="خارج النطاق", dispense_source="الصيدلية", created_at=datetime(2026, 5, 11, 8)),
+        ])
+        s.add_all([
+            PharmacyFinancialRecord(source_type="medication", source_record_id=1, invoice_number="old",
+                                    net_amount=1.0, manifest_type="B"),
+            PharmacyFinancialRecord(source_type="medication", source_record_id=1, invoice_number="M1",
+                                    expense_item="أدوية", net_amount=100.0, manifest_type="B"),   # الأحدث يُعتمد
+            PharmacyFinancialRecord(source_type="supplies", source_record_id=1, invoice_number="S1",
+                                    net_amount=40.5, manifest_type=None),                          # قديم ⇒ "A"
+            PharmacyFinancialRecord(source_type="medication", source_record_id=2, invoice_number="M2",
+                                    net_amount=None, manifest_type="A", is_deleted=None),
+            PharmacyFinancialRecord(source_type="medication", source_record_id=3, net_amount=9.0),
+            PharmacyFinancialRecord(source_type="medication", source_record_id=5, net_amount=9.0, is_deleted=True),
+            PharmacyFinancialRecord(source_type="medication", source_record_id=6, net_amount=9.0),
+        ])
+        s.commit()
+
+
+def test_ledger_join_filters_order_and_summary(session_factory):
+    _seed(session_factory)
+
+    rows = list(pes.iter_evacuation_ledger_rows(_DAY, _DAY, batch_size=2))
+    # الترتيب: التاريخ، ثم الأدوية قبل المستلزمات عند التساوي، ثم المعرّف
+    assert [(r["name"], r["invoice_number"], r["amount"], r["manifest_type"]) for r in rows] == [
+        ("—", "M2", 0.0, "A"),
+        ("ب", "S1", 40.5, "A"),
+        ("أ", "M1", 100.0, "B"),
+    ]
+    assert rows[1]["statement"] == "الأصناف المصروفة: شاش."
+    assert rows[2]["statement"] == "تم صرف 3 أصناف." and rows[2]["date"] == _DAY
+    assert rows[2]["expense_item"] == "أدوية" and rows[0]["expense_item"] == "—"
+
+    names = lambda **kw: [r["name"] for r in pes._get_evacuation_ledger_rows_sync(_DAY, _DAY, **kw)]  # noqa: E731
+    assert names(manifest_type="A") == ["—", "ب"]
+    assert names(manifest_type="B") == ["أ"]
+    assert names(requester_id=8) == ["—", "ب"]
+    assert names(requester_id=8, is_admin=True) == ["—", "ب", "أ"]
+    assert names(specialist_name="س") == ["—", "أ"]
+
+    assert pes._get_evacuation_ledger_summary_sync(_DAY, _DAY) == (3, 140.5)
+    assert pes._get_evacuation_ledger_summary_sync(_DAY, _DAY, "C") == (0, 0.0)
+    assert pes._get_evacuation_ledger_summary_sync(date(2026, 5, 10), date(2026, 5, 11), requester_id=8) == (2, 40.5)
+
+
+def test_excel_streams_rows_from_generator(session_factory):
+    openpyxl = pytest.importorskip("openpyxl")
+    from services.pharmacy_evacuation_excel import build_evacuation_excel
+
+    _seed(session_factory)
+    consumed = []
+
+    def _rows():
+        for row in pes.iter_evacuation_ledger_rows(_DAY, _DAY):
+            consumed.append(row["invoice_number"])
+            yield row
+
+    buf = build_evacuation_excel(_rows(), _DAY, _DAY)
+    assert consumed == ["M2", "S1", "M1"]
+
+    ws = openpyxl.load_workbook(io.BytesIO(buf.getvalue())).active
+    assert ws.sheet_view.rightToLeft
+    assert [ws.cell(row=r, column=3).value for r in (11, 12, 13)] == ["—", "ب", "أ"]
+    assert ws.cell(row=13, column=1).font.name == "Arial"
+    assert "A2:G2" in {str(m) for m in ws.merged_cells.ranges}
+    assert ws.cell(row=14, column=3).value == "إجمالي المبلغ"
+    assert ws.cell(row=14, column=2).value.startswith("140") and ws.cell(row=14, column=2).font.bold
@@ -438,6 +438,36 @@ def test_landing_user_main_kb_has_no_healthcare_button():
     print("user_main_kb no healthcare button OK")
 
 
+# ── Permission snapshot (write-through) ───────────────────────────────────────
+
+def test_permission_snapshot_write_through():
+    from core.access.permission_snapshot import permission_snapshot, set_user_access_state
+    from bot.shared_auth import is_user_approved
+
+    tg = 9_000_200
+    _seed_user(tg, approved=True)
+    permission_snapshot.invalidate()
+    assert is_user_approved(tg)
+    assert "user_reports" in get_user_modules(tg)   # lazy migration, then cached
+
+    grant_module(tg, "healthcare", granted_by=1)
+    assert permission_snapshot.peek_modules(tg) == ("user_reports", "healthcare")
+    revoke_module(tg, "user_reports", revoked_by=1)
+    assert get_user_modules(tg) == ["healthcare"]
+
+    # التجميد يُكتب في DB ثم يُبلَّغ للّقطة — بلا انتظار إعادة تحميل
+    with _TestSessionLocal() as s:
+        s.query(User).filter_by(tg_user_id=tg).update({"is_suspended": True})
+        s.commit()
+    set_user_access_state(tg, False)
+    assert not is_user_approved(tg)
+
+    # الحالة في DB مطابقة للّقطة بعد إعادة تحميل كاملة
+    permission_snapshot.invalidate()
+    assert not is_user_approved(tg)
+    assert get_user_modules(tg) == ["healthcare"]
+    print("permission snapshot write-through OK")
+
 # ── Runner ────────────────────────────────────────────────────────────────────
 
 if __name__ == "__main__":
@@ -465,4 +495,5 @@ if __name__ == "__main__":
     test_landing_both_modules_translator_wins()
     test_landing_no_modules_public()
     test_landing_user_main_kb_has_no_healthcare_button()
+    test_permission_snapshot_write_through()
     print("\nALL RBAC TESTS PASSED")
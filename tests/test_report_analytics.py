@@ -0,0 +1,86 @@
+# tests/test_report_analytics.py
+# services/report_analytics.py: أقسام تحليل البيانات بـGROUP BY تطابق التجميع القديم في Python.
+# Uses an in-memory SQLite database — no production DB touched.
+
+import asyncio
+import os
+import sys
+from datetime import date, datetime
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+
+import db.session as _db_session
+from db.models import Base, Hospital, Report
+from services import reports_repository as repo
+from services.report_analytics import analyze, get_options_in_scope
+
+
+@pytest.fixture
+def session_factory(monkeypatch):
+    engine = create_engine(
+        "sqlite:///:memory:",
+        connect_args={"check_same_thread": False},
+        poolclass=StaticPool,
+    )
+    Base.metadata.create_all(bind=engine)
+    factory = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+    with factory() as s:
+        s.add_all([Hospital(id=1, name="Apollo"), Hospital(id=2, name="Manipal")])
+        s.add_all([
+            Report(
+                # بعض التقارير بلا hospital_name ⇒ الاسم من جدول المستشفيات
+                hospital_id=i % 2 + 1,
+                hospital_name=None if i % 3 == 0 else ("Apollo", "Manipal")[i % 2],
+                department=["Cardiology", "Oncology", ""][i % 3],
+                medical_action=["استشارة", "عملية", None, "متابعة"][i % 4],
+                doctor_name=f"Dr {i % 4}" if i % 5 else "",
+                patient_id=i % 7 + 1,
+                # المريض 1 له تقرير قديم قبل الفترة ⇒ متكرر
+                report_date=datetime(2026, 1, 5) if i == 0 else datetime(2026, 3, 1 + i % 20, 10),
+            )
+            for i in range(45)
+        ])
+        s.commit()
+    monkeypatch.setattr(_db_session, "SessionLocal", factory)
+    monkeypatch.setattr(_db_session, "ReadSessionLocal", factory)
+    return factory
+
+
+START, END = date(2026, 3, 1), date(2026, 3, 31)
+
+
+def test_sections_match_python_aggregation(session_factory):
+    reports = asyncio.run(repo.get_reports(START, END))
+    stats = repo.compute_stats(reports)
+
+    system = asyncio.run(analyze("system", START, END))
+    assert {k: system["stats"][k] for k in stats if k in system["stats"]} == stats
+    assert system["hospitals"] == repo.aggregate_by_hospital(reports)
+    assert system["departments"] == repo.aggregate_by_department(reports)
+    assert system["doctors"] == repo.aggregate_by_doctor(reports)
+    assert system["actions"] == repo.aggregate_by_action(reports)
+
+    actions = asyncio.run(analyze("actions", START, END, hospitals=["Apollo"]))
+    apollo = asyncio.run(repo.get_reports(START, END, hospitals=["Apollo"]))
+    assert actions["cross"]["action_doctor"] == repo.aggregate_cross(apollo, "medical_action", "doctor_name")
+    assert list(actions["cross"]["action_doctor"]) == list(
+        repo.aggregate_cross(apollo, "medical_action", "doctor_name")
+    )
+
+
+def test_patient_counts_and_tier_options(session_factory):
+    patients = asyncio.run(analyze("patients", START, END))
+    assert patients["patients"] == {"total": 7, "new": 6, "returning": 1}
+    assert sum(patients["patients_by_hospital"].values()) >= 7
+
+    options = asyncio.run(get_options_in_scope("hospital", START, END))
+    assert {o["name"]: o["count"] for o in options} == repo.aggregate_by_hospital(
+        asyncio.run(repo.get_reports(START, END))
+    )
+    depts = asyncio.run(get_options_in_scope("department", START, END, hospitals=["Manipal"]))
+    assert {o["name"] for o in depts} <= {"Cardiology", "Oncology"}
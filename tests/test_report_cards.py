@@ -0,0 +1,98 @@
+# tests/test_report_cards.py
+# بطاقة التقرير (services/broadcast_service.py): قالب لكل نوع إجراء، تقسيم
+# مرة واحدة، وذاكرة لكل (report_id, حقول الإدخال).
+# No Telegram, no DB required.
+
+import asyncio
+import os
+import sys
+from datetime import datetime
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+import services.broadcast_service as bs
+from services.caching import get_cache
+
+
+def _report(**overrides):
+    data = {
+        "report_id": 7,
+        "updated_at": datetime(2026, 3, 10, 9, 30),
+        "report_date": "2026-03-10 09:30",
+        "patient_name": "Ali_Hassan",
+        "hospital_name": "Apollo Hospital (Chennai)",
+        "doctor_name": "لم يتم التحديد",
+        "medical_action": "استشارة جديدة",
+        "complaint_text": "ألم *حاد*",
+        "followup_date": "2026-03-25",
+        "followup_reason": "مراجعة النتائج",
+        "translator_name": "مترجم_1",
+        "has_paper_report": 1,
+    }
+    data.update(overrides)
+    return data
+
+
+def test_templates_place_divider_followup_and_escape_header():
+    general = bs.render_report_card(_report())
+    assert general.startswith("🆕 **تقرير جديد**")
+    assert "👤 اسم المريض: Ali\\_Hassan" in general
+    assert "اسم الطبيب" not in general                     # لم يتم التحديد
+    assert "📅 موعد العودة" in general and general.endswith("👨‍⚕️ المترجم: مترجم\\_1")
+
+    radiology = bs.render_report_card(_report(medical_action="أشعة وفحوصات", radiology_type="MRI"))
+    assert "موعد العودة: " not in radiology                 # لا حقول عودة عامة
+    assert radiology.endswith("يوجد تقرير طبي\n\n👨‍⚕️ المترجم: مترجم\\_1")   # سطر فارغ، بلا فاصل
+
+    combined = _report(medical_action="العلاج الكيماوي + جلسة إشعاعي")
+    assert bs._resolve_report_template(combined) is bs._TREATMENT_TEMPLATE
+    assert bs._resolve_report_template(_report(medical_action="غير محدد")) is bs._GENERAL_TEMPLATE
+
+    long_card = bs.render_report_card(_report(complaint_text="سطر طويل\n" * 800))
+    assert isinstance(long_card, str) and len(long_card.chunks) > 1
+    assert "\n".join(long_card.chunks).count("سطر طويل") == 800
+
+
+def test_rendered_once_per_report_version_and_chunks_reused(monkeypatch):
+    get_cache("report_cards", default_ttl=bs.REPORT_RENDER_CACHE_TTL,
+              max_entries=bs.REPORT_RENDER_CACHE_SIZE).clear()
+    renders = []
+    real_render = bs.render_report_card
+    monkeypatch.setattr(bs, "render_report_card", lambda data: renders.append(1) or real_render(data))
+    splits = []
+    real_split = bs._split_telegram_message
+    monkeypatch.setattr(bs, "_split_telegram_message", lambda text, *a: splits.append(1) or real_split(text, *a))
+
+    first = bs.format_report_message(_report())
+    for _ in range(4):                                      # أدمن + مستخدم + إعادة نشر
+        assert bs.format_report_message(_report()) is first
+    assert len(renders) == 1 and len(splits) == 1
+
+    bs.format_report_message(_report(updated_at=datetime(2026, 3, 10, 10, 0)))     # حُفظ تعديل
+    bs.format_report_message(_report(is_edit=True))
+    bs.format_report_message(_report(updated_at=None))                             # ملخص قبل الحفظ
+    bs.format_report_message(_report(updated_at=None))
+    assert len(renders) == 5
+
+    # نفس updated_at لكن اسم المترجم تغيّر بـUPDATE خام / اسم المريض من جدول آخر
+    renamed = bs.format_report_message(_report(translator_name="مترجم_2"))
+    assert str(renamed) != str(first)
+    bs.format_report_message(_report(patient_name="Omar"))
+    bs.format_report_message(_report(medical_attachments=["a.pdf"]))
+    assert bs.format_report_message(_report(translator_name="مترجم_2")) is renamed
+    assert len(renders) == 8
+
+    sent = []
+
+    class _Bot:
+        async def send_message(self, chat_id, text, **kwargs):
+            sent.append(text)
+            return text
+
+    async def _direct(fn, chat_id, priority=None):
+        return await fn()
+
+    monkeypatch.setattr(bs, "send_via_scheduler", _direct)
+    splits.clear()
+    asyncio.run(bs._send_message_in_chunks(_Bot(), 1, first))
+    assert sent == list(first.chunks) and splits == []
@@ -0,0 +1,96 @@
+# tests/test_report_indexes.py
+# reports.ist_day والفهارس المركّبة: الـtriggers تملأ العمود، والاستعلامات
+# الساخنة تستخدم الفهارس (EXPLAIN QUERY PLAN) بدل مسح الجدول.
+# Uses an in-memory SQLite database — no production DB touched.
+
+import os
+import sys
+from datetime import date, datetime
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+import pytest
+from sqlalchemy import create_engine, text
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+
+from db.models import Base, Report
+from db.session import _ensure_schema_compatibility
+from services.stats_service import ACTIVE_IN_RANGE_SQL
+
+
+@pytest.fixture
+def engine_and_factory():
+    engine = create_engine(
+        "sqlite:///:memory:",
+        connect_args={"check_same_thread": False},
+        poolclass=StaticPool,
+    )
+    Base.metadata.create_all(bind=engine)
+    # قاعدة قديمة: العمود يُضاف ويُملأ بالـmigration
+    with engine.begin() as conn:
+        conn.execute(text("DROP INDEX ix_reports_status_ist_day_translator"))
+        conn.execute(text("ALTER TABLE reports DROP COLUMN ist_day"))
+        conn.execute(text(
+            "INSERT INTO reports (translator_id, status, report_date, created_at) "
+            "VALUES (1, 'active', '2026-03-01 09:00:00', '2026-03-31 20:00:00')"
+        ))
+    _ensure_schema_compatibility(engine)
+    return engine, sessionmaker(autocommit=False, autoflush=False, bind=engine)
+
+
+def _plan(conn, sql: str, params: dict) -> str:
+    return " | ".join(row[3] for row in conn.execute(text(f"EXPLAIN QUERY PLAN {sql}"), params))
+
+
+def test_ist_day_backfilled_and_kept_by_triggers(engine_and_factory):
+    engine, factory = engine_and_factory
+    with factory() as s:
+        # 20:00 UTC + 5:30 ⇒ اليوم التالي بتوقيت IST
+        assert s.query(Report.ist_day).scalar() == "2026-04-01"
+
+        report = Report(translator_id=2, report_date=datetime(2026, 5, 1, 10), created_at=datetime(2026, 5, 3, 10))
+        s.add(report)
+        s.commit()
+        assert report.ist_day == "2026-05-03"
+
+        report.created_at = datetime(2026, 5, 3, 20)
+        s.commit()
+        assert report.ist_day == "2026-05-04"
+
+        # بلا created_at ⇒ يوم report_date
+        s.execute(text("UPDATE reports SET created_at = NULL WHERE id = :id"), {"id": report.id})
+        s.commit()
+        assert report.ist_day == "2026-05-01"
+
+
+def test_hot_queries_use_indexes(engine_and_factory):
+    engine, factory = engine_and_factory
+    params = {"start": "2026-03-01", "end": "2026-04-01"}
+    with engine.connect() as conn:
+        plan = _plan(conn, f"SELECT COUNT(*) FROM reports r WHERE {ACTIVE_IN_RANGE_SQL}", params)
+        assert "ix_reports_status_ist_day_translator (status=? AND ist_day>? AND ist_day<?)" in plan
+        assert "ix_reports_report_date" in plan
+        assert "SCAN r" not in plan
+
+    with factory() as s:
+        today = s.query(Report).filter(
+            Report.status == "active",
+            Report.ist_day == date(2026, 4, 1).isoformat(),
+            Report.translator_id == 1,
+        )
+        sql = str(today.statement.compile(engine, compile_kwargs={"literal_binds": True}))
+        plan = _plan(s, sql, {})
+        assert "ix_reports_status_ist_day_translator (status=? AND ist_day=? AND translator_id=?)" in plan
+
+        first_seen = "SELECT patient_id, MIN(report_date) FROM reports GROUP BY patient_id"
+        assert "COVERING INDEX ix_reports_patient_report_date" in _plan(s, first_seen, {})
+
+        tomorrow = (
+            "SELECT id FROM reports WHERE followup_date BETWEEN :a AND :b "
+            "OR app_reschedule_return_date BETWEEN :a AND :b "
+            "OR radiation_therapy_return_date BETWEEN :a AND :b "
+            "OR radiology_delivery_date BETWEEN :a AND :b"
+        )
+        plan = _plan(s, tomorrow, {"a": "2026-04-02", "b": "2026-04-03"})
+        assert plan.startswith("MULTI-INDEX OR") and "SCAN" not in plan
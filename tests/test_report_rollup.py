@@ -0,0 +1,103 @@
+# tests/test_report_rollup.py
+# جدول report_daily_rollup (db/report_rollup.py): الـtriggers تبقيه مطابقاً
+# للمسح الخام في services/stats_service بعد الإدراج/التعديل/الحذف.
+# Uses an in-memory SQLite database — no production DB touched.
+
+import os
+import sys
+from datetime import datetime
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+import pytest
+from sqlalchemy import create_engine, text
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+
+from db.models import Base, Report, TranslatorDirectory
+from db.session import _ensure_schema_compatibility
+from db.report_rollup import ROLLUP_TABLE, ensure_report_rollup, rebuild_report_rollup
+from services import stats_service
+
+
+@pytest.fixture
+def engine_and_factory():
+    engine = create_engine(
+        "sqlite:///:memory:",
+        connect_args={"check_same_thread": False},
+        poolclass=StaticPool,
+    )
+    Base.metadata.create_all(bind=engine)
+    factory = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+    with factory() as s:
+        s.add(TranslatorDirectory(translator_id=1, name="Ahmed"))
+        # موجودة قبل إنشاء الجدول ⇒ تُملأ بإعادة البناء
+        s.add_all([_report(i) for i in range(30)])
+        s.commit()
+    # الـrollup + reports.ist_day (يعتمد عليه المسح الخام)
+    _ensure_schema_compatibility(engine)
+    return engine, factory
+
+
+def _report(i: int) -> Report:
+    return Report(
+        translator_id=[1, 2, 3, None][i % 4],
+        translator_name=["Ahmed", "Sara", "", None][i % 4],
+        medical_action=["استشارة جديدة", "عملية", None][i % 3],
+        hospital_id=i % 2 + 1,
+        has_paper_report=[1, 0, 2, None][i % 4],
+        visit_time=["9:30 PM", "10:00 am", None][i % 3],
+        # آخر الشهر بتوقيت UTC ⇒ يوم IST في الشهر التالي لبعضها
+        report_date=datetime(2026, 3, 1 + i % 31, (i * 5) % 24, 0) if i % 5 else None,
+        created_at=datetime(2026, 3, 31, 20 + i % 4, 0) if i % 6 == 0 else datetime(2026, 3, 1 + i % 28, 8),
+        status="active" if i % 9 else "deleted",
+    )
+
+
+def _both(factory, start, end):
+    with factory() as s:
+        rolled = stats_service._build_results(*stats_service._fetch_from_rollup(s, start, end), start, end)
+        raw = stats_service._build_results(*stats_service._fetch_from_reports(s, start, end), start, end)
+    key = lambda r: r["translator_name"]
+    return sorted(rolled, key=key), sorted(raw, key=key)
+
+
+@pytest.mark.parametrize("start,end", [("2026-03-01", "2026-04-01"), ("2026-04-01", "2026-05-01")])
+def test_rollup_matches_raw_scan_after_writes(engine_and_factory, start, end):
+    engine, factory = engine_and_factory
+    with factory() as s:
+        s.add_all([_report(i) for i in range(30, 45)])
+        s.flush()
+        reports = s.query(Report).order_by(Report.id).all()
+        reports[0].status = "deleted"
+        reports[1].status = "active"
+        reports[2].translator_id = 1
+        reports[3].has_paper_report = 1
+        reports[4].report_date = datetime(2026, 4, 2, 22, 0)
+        reports[5].complaint_text = "لا يلمس الـrollup"
+        s.delete(reports[6])
+        s.commit()
+
+    rolled, raw = _both(factory, start, end)
+    assert rolled == raw
+    assert raw and sum(r["total_reports"] for r in raw) > 0
+
+    with factory() as s:
+        active = s.query(Report).filter(Report.status == "active").count()
+        assert s.execute(text(f"SELECT SUM(report_count) FROM {ROLLUP_TABLE}")).scalar() == active
+
+
+def test_rebuild_is_idempotent_and_stats_use_rollup(engine_and_factory, monkeypatch):
+    engine, factory = engine_and_factory
+    with factory() as s:
+        before = stats_service.get_monthly_stats(s, 2026, 3)
+
+    with engine.begin() as conn:
+        conn.execute(text(f"UPDATE {ROLLUP_TABLE} SET report_count = report_count + 1"))
+    # مجموع لا يطابق عدد التقارير النشطة ⇒ يُعاد البناء
+    assert ensure_report_rollup(engine)
+    assert rebuild_report_rollup(engine) == rebuild_report_rollup(engine)
+
+    monkeypatch.setattr(stats_service, "_fetch_from_reports", None)
+    with factory() as s:
+        assert stats_service.get_monthly_stats(s, 2026, 3) == before
@@ -0,0 +1,91 @@
+# tests/test_reporting_engine.py
+# services/reporting_engine: التوزيعات تُحسب بـGROUP BY في SQL وتطابق العدّ القديم في Python.
+# Uses an in-memory SQLite database — no production DB touched.
+
+import os
+import sys
+from collections import Counter
+from datetime import date, datetime
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+
+import services.reporting_engine.report_data_collector as collector_mod
+from db.models import Base, Report
+from services.reporting_engine import CompositeFilter, ReportEngine
+from services.reporting_engine.filters import DateRangeFilter, HospitalFilter
+from shared.report_constants import ReportType
+
+
+@pytest.fixture
+def session_factory(monkeypatch):
+    engine = create_engine(
+        "sqlite:///:memory:",
+        connect_args={"check_same_thread": False},
+        poolclass=StaticPool,
+    )
+    Base.metadata.create_all(bind=engine)
+    factory = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+    hospitals = ["Apollo", "Manipal", "Fortis"]
+    actions = ["استشارة", "عملية", "", None]
+    with factory() as s:
+        s.add_all([
+            Report(
+                hospital_id=i % 3 + 1,
+                hospital_name=hospitals[i % 3],
+                department="Cardiology" if i % 2 else "Oncology",
+                medical_action=actions[i % 4],
+                doctor_name=f"Dr {i % 5}",
+                translator_name="" if i % 7 == 0 else f"T{i % 2}",
+                patient_id=i % 6 + 1,
+                patient_name=f"P{i % 6}",
+                report_date=datetime(2026, 3, 1 + i % 10, 9 + i % 8),
+                complaint_text="x" * 200,
+            )
+            for i in range(60)
+        ])
+        s.commit()
+    monkeypatch.setattr(collector_mod, "SessionLocal", factory)
+    return factory
+
+
+def test_sql_aggregates_match_python_counts(session_factory):
+    filters = CompositeFilter()
+    filters.add("date", DateRangeFilter(start_date=date(2026, 3, 2), end_date=date(2026, 3, 8)))
+    filters.add("hospital", HospitalFilter(hospital_ids=[1, 2]))
+
+    engine = ReportEngine()
+    report = engine.build_report(ReportType.GLOBAL, filters)
+
+    with session_factory() as s:
+        rows = filters.apply(s.query(Report)).all()
+        expected_hospitals = Counter(r.hospital_name for r in rows if r.hospital_name)
+        expected_actions = Counter(r.medical_action for r in rows if r.medical_action)
+        expected_days = Counter(r.report_date.strftime("%Y-%m-%d") for r in rows)
+        expected_translators = {r.translator_name for r in rows if r.translator_name}
+
+    tables = {t.title: dict(t.rows) for t in report.tables}
+    assert tables["توزيع المستشفيات"] == dict(expected_hospitals)
+    assert tables["توزيع الإجراءات"] == dict(expected_actions)
+    assert {t.date: t.metadata["count"] for t in report.timeline} == dict(expected_days)
+    assert report.key_metrics[0].value == str(len(rows))
+
+    raw = engine.data_collector.collect(ReportType.GLOBAL, filters)
+    summary = engine.stats_calculator._calculate_summary(engine.aggregator.aggregate(raw, "global"))
+    assert summary["total_unique_translators"] == len(expected_translators)
+
+
+def test_detail_rows_stream_lightweight_tuples(session_factory):
+    filters = CompositeFilter()
+    filters.add("hospital", HospitalFilter(hospital_id=3))
+
+    rows = list(collector_mod.ReportDataCollector().iter_detail_rows(filters, batch_size=7))
+
+    assert len(rows) == 20
+    assert all(r["hospital_name"] == "Fortis" for r in rows)
+    assert rows[0]["report_date"] <= rows[-1]["report_date"]
+    assert "patient_disease" not in rows[0]          # أعمدة DETAIL_COLUMNS فقط
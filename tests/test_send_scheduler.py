@@ -0,0 +1,147 @@
+# tests/test_send_scheduler.py
+# services/send_scheduler.py: إرسال متزامن عبر المحادثات، ترتيب داخل المحادثة، وإعادة عند RetryAfter.
+# No Telegram, no DB required — sends are plain coroutines.
+
+import asyncio
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from telegram.error import RetryAfter
+
+from services.send_scheduler import Priority, SendScheduler
+
+
+def test_fan_out_is_concurrent_and_keeps_order_per_chat():
+    delivered = []
+
+    async def _send(chat_id, text):
+        await asyncio.sleep(0.05)
+        delivered.append((chat_id, text))
+        return text
+
+    async def _scenario():
+        scheduler = SendScheduler(global_rate=1000, max_concurrency=20)
+        start = time.perf_counter()
+        results = await scheduler.fan_out(
+            [(cid, lambda cid=cid: _send(cid, f"hi {cid}")) for cid in range(1, 21)]
+        )
+        elapsed = time.perf_counter() - start
+
+        # نفس المحادثة: الأجزاء تصل بترتيبها
+        parts = await asyncio.gather(*[
+            scheduler.send(lambda i=i: _send(99, i), 99) for i in range(3)
+        ])
+        return results, elapsed, parts, scheduler.stats()
+
+    results, elapsed, parts, stats = asyncio.run(_scenario())
+    assert results == [f"hi {cid}" for cid in range(1, 21)]
+    assert elapsed < 0.5                      # 20 × 50ms متتالية = 1s
+    assert parts == [0, 1, 2]
+    assert [t for c, t in delivered if c == 99] == [0, 1, 2]
+    assert stats["sent"] == 23 and stats["failed"] == 0
+
+
+def test_retry_after_requeues_and_priority_goes_first():
+    calls = []
+
+    async def _flaky():
+        calls.append("flaky")
+        if calls.count("flaky") == 1:
+            raise RetryAfter(0.05)
+        return "ok"
+
+    async def _scenario():
+        scheduler = SendScheduler(global_rate=1000, max_concurrency=1)
+        retried = await scheduler.send(_flaky, 5)
+
+        order = []
+
+        async def _record(tag):
+            order.append(tag)
+
+        # كل المحادثات مقيّدة بطلب واحد في نفس الوقت: تقرير قبل الملخص
+        gate = asyncio.Event()
+
+        async def _block():
+            await gate.wait()
+
+        blocker = asyncio.ensure_future(scheduler.send(_block, 1))
+        await asyncio.sleep(0)
+        digest = scheduler.submit(lambda: _record("digest"), 2, Priority.DIGEST)
+        report = scheduler.submit(lambda: _record("report"), 3, Priority.REPORT)
+        gate.set()
+        await asyncio.gather(blocker, digest, report)
+        return retried, order, scheduler.stats()
+
+    retried, order, stats = asyncio.run(_scenario())
+    assert retried == "ok" and calls == ["flaky", "flaky"]
+    assert stats["retried"] == 1
+    assert order == ["report", "digest"]
+
+
+def test_send_to_admins_falls_back_to_plain_and_reports_per_admin():
+    from telegram.error import BadRequest, Forbidden
+
+    from services.send_scheduler import send_to_admins
+
+    sent = []
+
+    class _Bot:
+        async def send_message(self, chat_id, text, parse_mode=None):
+            if chat_id == 2 and parse_mode and text == "b*":
+                raise BadRequest("Can't parse entities")
+            if chat_id == 3:
+                raise Forbidden("bot was blocked by the user")
+            sent.append((chat_id, text, parse_mode))
+            return f"{chat_id}:{text}"
+
+    results = asyncio.run(send_to_admins(_Bot(), "ignored", Priority.DIGEST,
+                                         chunks=["a", "b*"], admin_ids=[1, 2, 3]))
+    assert results[:2] == ["1:b*", "2:b*"] and isinstance(results[2], Forbidden)
+    # الجزء المرفوض وحده يُعاد بلا تنسيق — بلا تكرار للجزء الأول
+    assert [s for s in sent if s[0] == 2] == [(2, "a", "Markdown"), (2, "b*", None)]
+
+
+def test_cancelled_send_does_not_leave_caller_waiting():
+    async def _scenario():
+        scheduler = SendScheduler(global_rate=1000, max_concurrency=2)
+        started = asyncio.Event()
+
+        async def _slow():
+            started.set()
+            await asyncio.sleep(10)
+
+        future = scheduler.submit(_slow, 1)
+        await started.wait()
+        for task in list(scheduler._tasks):          # إيقاف البوت يلغي مهام الإرسال
+            task.cancel()
+        try:
+            await asyncio.wait_for(future, 1)
+        except asyncio.CancelledError:
+            cancelled = 1
+        else:
+            cancelled = 0
+        while scheduler._tasks:                     # (callbacks الإنهاء)
+            await asyncio.sleep(0)
+
+        # مهمة أُلغيت قبل أن تبدأ أصلاً
+        pending = scheduler.submit(_slow, 2)
+        while not scheduler._tasks:
+            await asyncio.sleep(0)
+        for task in list(scheduler._tasks):
+            task.cancel()
+        try:
+            await asyncio.wait_for(pending, 1)
+        except asyncio.CancelledError:
+            cancelled += 1
+        # المحادثتان لم تُحجزا ولا المقاعد: الطلبات التالية تمرّ
+        after = await asyncio.wait_for(asyncio.gather(
+            *[scheduler.send(lambda: asyncio.sleep(0, "ok"), cid) for cid in (1, 2, 3)]), 1)
+        return cancelled, after, scheduler.stats()
+
+    cancelled, after, stats = asyncio.run(_scenario())
+    assert cancelled == 2 and after == ["ok"] * 3
+    assert stats["failed"] == 2 and stats["in_flight"] == 0
@@ -0,0 +1,26 @@
+# tests/test_startup_budget.py
+# ميزانية الإقلاع (bot/startup_profile.py): مفسّر بارد يسجّل كل الـhandlers
+# ويوجّه أول تحديث ضمن STARTUP_BUDGET_SECONDS، دون تحميل حزم PDF/الرسوم/
+# الرؤية الحاسوبية/AI — تلك تنتظر أول استعمال أو التسخين بعد الـpolling.
+
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from bot.startup_profile import STARTUP_BUDGET_SECONDS, measure_cold_start, prewarm_deferred_modules
+
+
+def test_cold_start_within_budget_without_heavy_imports():
+    result = measure_cold_start(importtime=False)
+    assert result["deferred_loaded"] == []
+    assert result["handlers"] > 100
+    assert result["groups_matched"] >= 1
+    assert result["elapsed_s"] < STARTUP_BUDGET_SECONDS, result
+
+
+def test_prewarm_imports_available_modules_and_skips_missing():
+    sys.modules.pop("tabnanny", None)
+    timings = prewarm_deferred_modules(["tabnanny", "json", "no_such_module_for_prewarm"])
+    assert list(timings) == ["tabnanny"]          # json محمَّل مسبقاً، والناقص يُتجاهَل
+    assert "tabnanny" in sys.modules
@@ -0,0 +1,151 @@
+# tests/test_state_persistence.py
+# حفظ user_data/chat_data/bot_data (core/session/persistence.py):
+# الاستعادة بعد إعادة التشغيل، كتابة المفاتيح المتغيّرة فقط، والحذف.
+# Uses a temporary SQLite file — no production state touched, no Telegram.
+
+import asyncio
+import os
+import sqlite3
+import sys
+import threading
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from core.session.persistence import SQLitePersistence
+
+
+def _persistence(path):
+    return SQLitePersistence(path=str(path), flush_delay=0, ttl_days=0)
+
+
+def _rows(path, kind):
+    with sqlite3.connect(str(path)) as conn:
+        return dict(conn.execute(
+            "SELECT owner, COUNT(*) FROM ptb_data WHERE kind = ? GROUP BY owner", (kind,)
+        ).fetchall())
+
+
+def test_roundtrip_writes_only_changed_keys(tmp_path):
+    path = tmp_path / "state.db"
+
+    async def first_run():
+        p = _persistence(path)
+        await p.update_user_data(1, {"draft": {"patient": "Ali", "step": 3}, "nav": ["home", "reports"]})
+        await p.update_user_data(2, {"lang": "ar"})
+        await p.update_bot_data({"version": 7})
+        await p.update_conversation("add_report", (1, 1), 4)
+        await p.flush()
+        return p.stats()
+
+    stats = asyncio.run(first_run())
+    assert stats["written"] == 5 and stats["pending"] == 0
+
+    async def second_run():
+        p = _persistence(path)
+        users = await p.get_user_data()
+        assert users == {1: {"draft": {"patient": "Ali", "step": 3}, "nav": ["home", "reports"]}, 2: {"lang": "ar"}}
+        assert await p.get_bot_data() == {"version": 7}
+        assert await p.get_conversations("add_report") == {(1, 1): 4}
+
+        # تغيير مفتاح واحد ⇒ صف واحد فقط يُكتب
+        users[1]["draft"]["step"] = 4
+        await p.update_user_data(1, users[1])
+        await p.update_user_data(2, users[2])
+        await p.flush()
+        return p.stats()
+
+    stats = asyncio.run(second_run())
+    assert stats["written"] == 1 and stats["deleted"] == 0
+
+    async def third_run():
+        p = _persistence(path)
+        return (await p.get_user_data())[1]["draft"]["step"]
+
+    assert asyncio.run(third_run()) == 4
+
+
+def test_drop_removed_keys_and_unpicklable_values(tmp_path):
+    path = tmp_path / "state.db"
+
+    async def run():
+        p = _persistence(path)
+        await p.update_user_data(1, {"a": 1, "b": 2, "lock": threading.Lock()})
+        await p.update_user_data(2, {"x": 1})
+        await p.update_chat_data(-100, {"pinned": 5})
+        await p.flush()
+        assert p.stats()["skipped"] == 1
+        assert _rows(path, "user") == {1: 2, 2: 1}
+
+        await p.update_user_data(1, {"a": 1})
+        await p.drop_user_data(2)
+        await p.update_conversation("add_report", (1, 1), 4)
+        await p.update_conversation("add_report", (1, 1), None)
+        await p.flush()
+
+    asyncio.run(run())
+    assert _rows(path, "user") == {1: 1}
+    assert _rows(path, "chat") == {-100: 1}
+
+    async def reload():
+        p = _persistence(path)
+        return await p.get_user_data(), await p.get_conversations("add_report")
+
+    users, conversations = asyncio.run(reload())
+    assert users == {1: {"a": 1}}
+    assert conversations == {}
+
+
+class _App:
+    """يكفي register() و_initialize_persistence — Application الحقيقي يحتاج شبكة."""
+
+    def __init__(self, persistence=None):
+        self.persistence = persistence
+        self.handlers = []
+
+    def add_handler(self, handler, group=0):
+        self.handlers.append(handler)
+
+
+def test_report_conversation_resumes_after_restart(tmp_path):
+    from datetime import datetime
+
+    from telegram import Chat, Message, Update, User
+    from telegram.ext import ConversationHandler
+
+    from bot.handlers.user.user_reports_add_new_system import conversation_handler as add_report
+
+    path = tmp_path / "state.db"
+
+    def _conversation(persistence):
+        app = _App(persistence)
+        add_report.register(app)
+        return next(h for h in app.handlers if isinstance(h, ConversationHandler))
+
+    # بلا persistence (الاختبارات، السكربتات) لا يُطلب الحفظ — وإلا رفض add_handler
+    assert not _conversation(None).persistent
+
+    async def first_run():
+        p = _persistence(path)
+        conv = _conversation(p)
+        assert conv.name == "user_add_report" and conv.persistent
+        # ما يكتبه PTB حين ينتقل المستخدم إلى خطوة اختيار المريض
+        await p.update_user_data(5, {"report_tmp": {"report_date": "2026-10-18"}})
+        await p.update_conversation(conv.name, (5, 5), add_report.STATE_SELECT_PATIENT)
+        await p.flush()
+
+    async def second_run():
+        p = _persistence(path)
+        conv = _conversation(p)
+        user = User(id=5, first_name="t", is_bot=False)
+        typed = Update(1, message=Message(1, datetime.now(), Chat(5, "private"), from_user=user, text="Ali"))
+        before = conv.check_update(typed)                  # لا حالة ⇒ نص حر لا يطابق شيئاً
+        await conv._initialize_persistence(_App(p))
+        return (await p.get_user_data())[5], before, conv.check_update(typed)
+
+    asyncio.run(first_run())
+    user_data, before, after = asyncio.run(second_run())
+    assert user_data == {"report_tmp": {"report_date": "2026-10-18"}}
+    assert before is None
+    state, key, handler, _ = after
+    assert state == add_report.STATE_SELECT_PATIENT and key == (5, 5)
+    assert handler.callback.__name__ == "handle_patient"
@@ -0,0 +1,126 @@
+# tests/test_translator_reminders.py
+# تنبيهات المترجمين (services/translator_reminders.py, services/schedule_tracker.py):
+# حالة اليوم باستعلام مجمّع واحد، إرسال متوازٍ، وكتابة التتبع دفعة واحدة —
+# عدد استعلامات ثابت مهما زاد عدد المترجمين.
+# Uses an in-memory SQLite database — no production DB touched, no Telegram.
+
+import asyncio
+import os
+import sys
+from datetime import date, datetime
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+import pytest
+from sqlalchemy import create_engine, event
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+
+import services.schedule_tracker as tracker_mod
+import services.translator_reminders as reminders_mod
+from db.models import Base, DailyReportTracking, Report, TranslatorNotification, User
+from db.session import _ensure_schema_compatibility
+
+TODAY = date(2026, 3, 10)
+
+
+class _FakeBot:
+    def __init__(self):
+        self.sent = []
+
+    async def send_message(self, chat_id, text, **kwargs):
+        self.sent.append(chat_id)
+
+
+def _seed(factory, n):
+    with factory() as s:
+        s.add_all([
+            User(id=i, tg_user_id=1000 + i, full_name=f"T{i}", is_active=True, role="translator")
+            for i in range(1, n + 1)
+        ])
+        # الزوجيون رفعوا تقريراً اليوم (بتوقيت IST)
+        s.add_all([
+            Report(translator_id=i, status="active", report_date=datetime(2026, 3, 10, 9),
+                   created_at=datetime(2026, 3, 10, 4))
+            for i in range(2, n + 1, 2)
+        ])
+        # T1 أخذ التنبيه الأول سابقاً، T3 له سجل بلا تنبيه
+        s.add_all([
+            DailyReportTracking(translator_id=1, translator_name="T1", date=TODAY,
+                                expected_reports=1, reminder_sent=True),
+            DailyReportTracking(translator_id=3, translator_name="T3", date=TODAY,
+                                expected_reports=1, reminder_sent=False),
+        ])
+        s.commit()
+
+
+@pytest.fixture
+def make_db(monkeypatch):
+    def _make(n):
+        engine = create_engine(
+            "sqlite:///:memory:",
+            connect_args={"check_same_thread": False},
+            poolclass=StaticPool,
+        )
+        Base.metadata.create_all(bind=engine)
+        _ensure_schema_compatibility(engine)
+        factory = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+        _seed(factory, n)
+        monkeypatch.setattr(reminders_mod, "SessionLocal", factory)
+        monkeypatch.setattr(tracker_mod, "SessionLocal", factory)
+        statements = []
+        event.listen(engine, "before_cursor_execute", lambda *a: statements.append(a[2]))
+        return factory, statements
+    return _make
+
+
+def test_first_reminder_skips_submitted_and_already_reminded(make_db):
+    round_trips = {}
+    for n in (6, 18):
+        factory, statements = make_db(n)
+        bot = _FakeBot()
+        asyncio.run(reminders_mod.check_and_send_reminders(bot, now=datetime(2026, 3, 10, 15, 0)))
+        round_trips[n] = len(statements)
+
+        # الفرديون فقط، عدا T1 الذي نُبِّه سابقاً
+        assert sorted(bot.sent) == [1000 + i for i in range(3, n + 1, 2)]
+        with factory() as s:
+            reminded = {t.translator_id for t in s.query(DailyReportTracking).filter_by(reminder_sent=True)}
+            assert reminded == set(range(1, n + 1, 2))
+            assert s.query(DailyReportTracking).filter_by(translator_id=3).count() == 1
+
+        # التنبيه الأول لا يتكرر
+        bot.sent.clear()
+        asyncio.run(reminders_mod.check_and_send_reminders(bot, now=datetime(2026, 3, 10, 15, 30)))
+        assert bot.sent == []
+
+    assert round_trips[6] == round_trips[18]
+
+
+def test_schedule_tracker_counts_and_reminds_in_bulk(make_db, monkeypatch):
+    factory, statements = make_db(6)
+    with factory() as s:
+        s.add(DailyReportTracking(translator_id=4, translator_name="T4", date=TODAY, expected_reports=1))
+        s.commit()
+
+    class _Day(date):
+        @classmethod
+        def today(cls):
+            return TODAY
+
+    monkeypatch.setattr(tracker_mod, "date", _Day)
+    tracker = tracker_mod.ScheduleTracker(bot=_FakeBot())
+
+    asyncio.run(tracker.update_daily_reports_count())
+    with factory() as s:
+        done = {t.translator_name: (t.actual_reports, t.is_completed) for t in s.query(DailyReportTracking)}
+    assert done == {"T1": (0, False), "T3": (0, False), "T4": (1, True)}
+
+    asyncio.run(tracker._send_afternoon_reminders(TODAY))
+    assert tracker.bot.sent == [1003]           # T1 نُبِّه سابقاً، T4 مكتمل
+    asyncio.run(tracker._send_final_reminders(TODAY))
+    assert sorted(tracker.bot.sent) == [1001, 1003, 1003]
+    with factory() as s:
+        types = sorted(n.notification_type for n in s.query(TranslatorNotification))
+        assert types == ["final_reminder", "final_reminder", "reminder"]
+        assert s.query(DailyReportTracking).filter_by(translator_name="T3").one().reminder_sent
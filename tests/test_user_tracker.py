@@ -0,0 +1,115 @@
+# tests/test_user_tracker.py
+# services/user_tracker.py: النشاط يُجمَّع في الذاكرة ويُكتب كعبارة upsert واحدة
+# عبر الكاتب الموحَّد؛ القراءات تدمج المعلّق فتبقى دقيقة قبل الكتابة وبعدها.
+# Uses a throwaway SQLite file (tmp_path).
+
+import os
+import sys
+from datetime import datetime, timedelta, timezone
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+import pytest
+from sqlalchemy import create_engine, event
+from sqlalchemy.orm import sessionmaker
+
+import db.session as _db_session
+import services.user_tracker as ut
+from db.write_queue import write_queue_stats
+
+
+@pytest.fixture
+def tracker(tmp_path, monkeypatch):
+    engine = create_engine(
+        f"sqlite:///{tmp_path / 'activity.db'}",
+        connect_args={"check_same_thread": False},
+    )
+    ut.UserActivitySummary.__table__.create(bind=engine)
+    factory = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+    monkeypatch.setattr(_db_session, "SessionLocal", factory)
+    monkeypatch.setattr(ut, "SessionLocal", factory)
+    acc = ut.ActivityAccumulator(interval=3600)        # لا دفع خلفي أثناء الاختبار
+    monkeypatch.setattr(ut, "_accumulator", acc)
+    statements = []
+    event.listen(engine, "before_cursor_execute",
+                 lambda conn, cursor, stmt, *a: statements.append(stmt))
+    return acc, factory, statements
+
+
+def _by_user():
+    return {u["user_id"]: u for u in ut.get_all_users_activity()}
+
+
+def test_events_coalesce_into_one_upsert_and_reads_stay_exact(tracker):
+    acc, factory, statements = tracker
+    with factory() as s:
+        s.add(ut.UserActivitySummary(user_id=1, username="old", full_name="Old Name", total_reports=10,
+                                     last_report_date=datetime(2026, 1, 1), last_activity=datetime(2026, 1, 1)))
+        s.commit()
+    statements.clear()
+
+    for _ in range(50):
+        assert ut.update_user_activity(1)
+    for _ in range(30):
+        ut.update_user_activity(2, "new_user", "New User")
+    assert statements == []                                       # لا شيء يلمس القاعدة
+
+    # قبل الكتابة: القراءة تدمج المعلّق
+    before = _by_user()
+    assert before[1]["total_reports"] == 60 and before[1]["username"] == "old"
+    assert before[2]["total_reports"] == 30 and before[2]["username"] == "new_user"
+    assert ut.get_user_stats(2)["total_reports"] == 30
+    assert ut.get_inactive_users(days_inactive=1) == []          # نشاط معلّق يُخرج المستخدم 1
+
+    jobs_before = write_queue_stats()["jobs"]
+    statements.clear()                                            # (القراءات أعلاه)
+    assert ut.flush_user_activity() == 2
+    assert write_queue_stats()["jobs"] == jobs_before + 1
+    inserts = [q for q in statements if q.lstrip().upper().startswith("INSERT")]
+    assert len(inserts) == 1 and "ON CONFLICT" in inserts[0].upper()
+    assert not any(q.lstrip().upper().startswith("SELECT") for q in statements)
+
+    # بعد الكتابة: نفس الأرقام، بلا عدّ مزدوج
+    assert _by_user() == before
+    assert acc.stats() == {"events": 80, "flushes": 1, "rows_written": 2, "pending_users": 0}
+    assert ut.flush_user_activity() == 0
+
+    ut.update_user_activity(1, full_name="Renamed")
+    merged = ut.get_user_stats(1)
+    assert merged["total_reports"] == 61 and merged["full_name"] == "Renamed" and merged["username"] == "old"
+
+
+def test_failed_flush_keeps_deltas_and_inactive_filter(tracker, monkeypatch):
+    _, factory, _ = tracker
+    stale = datetime.now(timezone.utc).replace(tzinfo=None) - timedelta(days=5)
+    with factory() as s:
+        s.add_all([
+            ut.UserActivitySummary(user_id=7, username="idle", total_reports=3, last_report_date=stale),
+            ut.UserActivitySummary(user_id=8, username="back", total_reports=1, last_report_date=stale),
+        ])
+        s.commit()
+    assert sorted(u[0] for u in ut.get_inactive_users(days_inactive=2)) == [7, 8]
+
+    ut.update_user_activity(8)
+    assert [u[0] for u in ut.get_inactive_users(days_inactive=2)] == [7]
+    # UTC بلا tzinfo مثل أعمدة SQLite — وليس التوقيت المحلي
+    seen = ut._accumulator.pending()[8].last_at
+    assert seen.tzinfo is None
+    assert abs(seen - datetime.now(timezone.utc).replace(tzinfo=None)) < timedelta(minutes=1)
+
+    def _boom(session, batch):
+        raise RuntimeError("disk full")
+
+    upsert = ut._upsert_activity_tx
+    monkeypatch.setattr(ut, "_upsert_activity_tx", _boom)
+    with pytest.raises(RuntimeError):
+        ut.flush_user_activity()
+    ut.update_user_activity(8)                       # يتراكم فوق الدفعة المُعادة
+    assert _by_user()[8]["total_reports"] == 3
+
+    monkeypatch.setattr(ut, "_upsert_activity_tx", upsert)
+    assert ut.flush_user_activity() == 1
+    with factory() as s:
+        row = s.get(ut.UserActivitySummary, 8)
+        assert row.total_reports == 3 and row.last_report_date > stale and row.username == "back"
+    assert [u[0] for u in ut.get_inactive_users(days_inactive=2)] == [7]
@@ -0,0 +1,88 @@
+# tests/test_write_queue.py
+# الكاتب الموحَّد (db/write_queue.py) ومجمّع القراءة فقط (query_only).
+# Uses an in-memory SQLite database — no production DB touched.
+
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+import pytest
+from sqlalchemy import create_engine, text
+from sqlalchemy.exc import IntegrityError, OperationalError
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+
+import db.session as _db_session
+from db.models import Base, UserModuleAccess
+from db.write_queue import SingleWriter
+
+
+@pytest.fixture
+def session_factory(monkeypatch):
+    # StaticPool: خيط الدفع الخلفي يجب أن يرى نفس قاعدة :memory:
+    engine = create_engine(
+        "sqlite:///:memory:",
+        connect_args={"check_same_thread": False},
+        poolclass=StaticPool,
+    )
+    Base.metadata.create_all(bind=engine)
+    factory = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+    monkeypatch.setattr(_db_session, "SessionLocal", factory)
+    return factory
+
+
+def _grant(session, tg_user_id, module_key="user_reports"):
+    session.add(UserModuleAccess(tg_user_id=tg_user_id, module_key=module_key, is_active=True))
+    session.flush()
+    return tg_user_id
+
+
+def _ids(factory):
+    with factory() as s:
+        return sorted(r[0] for r in s.query(UserModuleAccess.tg_user_id).all())
+
+
+def test_write_returns_result_and_commits(session_factory):
+    writer = SingleWriter()
+    assert writer.write(_grant, 1) == 1
+    assert _ids(session_factory) == [1]
+
+
+def test_failed_job_does_not_sink_its_batch(session_factory):
+    writer = SingleWriter()
+    writer.write(_grant, 1)
+
+    jobs = [writer._submit(_grant, (uid,), {}) for uid in (2, 1, 3)]  # 1 = duplicate
+    writer.flush()
+
+    assert jobs[0].future.result() == 2
+    assert isinstance(jobs[1].future.exception(), IntegrityError)
+    assert jobs[2].future.result() == 3
+    assert _ids(session_factory) == [1, 2, 3]
+    stats = writer.stats()
+    assert stats["batches"] == 2 and stats["jobs"] == 4 and stats["failed_jobs"] == 1
+
+
+def test_enqueue_is_flushed_in_background(session_factory):
+    writer = SingleWriter(flush_interval=0.01)
+    futures = [writer.enqueue(_grant, uid) for uid in (10, 11, 12)]
+    for f in futures:
+        f.result(timeout=5)
+    writer.shutdown()
+    assert _ids(session_factory) == [10, 11, 12]
+
+
+def test_read_pool_rejects_writes(tmp_path):
+    path = tmp_path / "ro.db"
+    rw = create_engine(f"sqlite:///{path}")
+    with rw.begin() as conn:
+        conn.execute(text("CREATE TABLE t (x INTEGER)"))
+
+    from sqlalchemy import event
+    ro = create_engine(f"sqlite:///{path}")
+    event.listen(ro, "connect", _db_session._set_sqlite_read_pragmas)
+    with ro.connect() as conn:
+        assert conn.execute(text("SELECT COUNT(*) FROM t")).scalar() == 0
+        with pytest.raises(OperationalError):
+            conn.execute(text("INSERT INTO t VALUES (1)"))